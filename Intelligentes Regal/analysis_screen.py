@@ -14,6 +14,11 @@ class AnalysisScreen(tk.Tk):
         self.geometry("900x600")
         # Flag, um zu prüfen, ob der Screen aktiv ist
         self.is_active = True
+        # Inkrementeller Event-Feed: Stand (cursor, epoch), bekannte Events nach ID und aktive Filter
+        self.events_cursor = 0
+        self.events_epoch = None
+        self.events = {}
+        self.applied_filters = None
         self.create_widgets()
         self.update_data()
 
@@ -43,7 +48,7 @@ class AnalysisScreen(tk.Tk):
         self.product_filter.current(0)
         self.product_filter.pack(side=tk.LEFT, padx=5)
 
-        tk.Button(filter_frame, text="Filter anwenden", command=self.update_data).pack(side=tk.LEFT, padx=10)
+        tk.Button(filter_frame, text="Filter anwenden", command=self.refresh_view).pack(side=tk.LEFT, padx=10)
         tk.Button(filter_frame, text="Reset DB", command=self.reset_db).pack(side=tk.RIGHT, padx=10)
         tk.Button(filter_frame, text="Aktuelle Einträge löschen", command=self.clear_current_events).pack(side=tk.RIGHT, padx=10)
 
@@ -130,81 +135,15 @@ class AnalysisScreen(tk.Tk):
             self.after(1000, self.update_timer)
 
     def update_data(self):
-        """Aktualisiert die Anzeige mit Daten aus der Datenbank"""
+        """Aktualisiert die Anzeige periodisch mit Daten aus der Datenbank"""
         if not self.is_active:
             return
-            
-        try:
-            # Treeview leeren
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            status_filter = self.status_filter.get()
-            product_filter = self.product_filter.get()
-            events = db_utils.get_all_events()
-            current_time = time.time()
-
-            # Filtern und Anzeigen der Events
-            filtered_events = []
-            for event in events:
-                # Anpassung für den Fall, dass object_id in der DB vorhanden ist
-                if len(event) == 10:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
-                elif len(event) == 9:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity = event
-                    object_id = -1
-                else:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status = event
-                    quantity = 1
-                    object_id = -1
-                    
-                if status_filter != "Alle" and status.lower() != status_filter.lower():
-                    continue
-                if product_filter != "Alle" and product_type.lower() != product_filter.lower():
-                    continue
-                filtered_events.append((event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id))
 
-            # Sortiere Events nach Zeit (neueste zuerst)
-            filtered_events.sort(key=lambda x: x[4], reverse=True)
-            
-            for event in filtered_events:
-                event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
-                event_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event_time))
-                
-                # Tags für Formatierung
-                tags = ()
-                if status.lower() == "not paid":
-                    tags = ('not_paid',)
-                elif status.lower() == "paid":
-                    tags = ('paid',)
-                elif status.lower() == "misplaced":
-                    tags = ('misplaced',)
-                elif status.lower() == "returned":
-                    tags = ('returned',)
-                
-                # Event in Treeview einfügen
-                self.tree.insert("", "end", values=(
-                    event_id, 
-                    shelf_id+1, 
-                    product_type.capitalize(), 
-                    event_type.capitalize(), 
-                    event_time_str, 
-                    status.capitalize(), 
-                    quantity,
-                    object_id if object_id != -1 else "N/A"
-                ), tags=tags)
-
-            # Inventar aktualisieren
-            self.update_inventory_display()
-            
-            # Status updaten
-            self.last_update_label.config(text=f"Letzte Aktualisierung: {time.strftime('%H:%M:%S')}")
-            self.status_label.config(text="Status: Verbunden", fg="green")
-            self.status_bar.config(text=f"Daten aktualisiert. {len(filtered_events)} Events angezeigt.")
-            
+        try:
+            self.refresh_view()
             # Nächste Aktualisierung planen
             self.after(REFRESH_INTERVAL, self.update_data)
-            
+
         except Exception as e:
             self.status_label.config(text=f"Status: Fehler", fg="red")
             self.status_bar.config(text=f"Fehler bei Datenaktualisierung: {str(e)}")
@@ -212,12 +151,111 @@ class AnalysisScreen(tk.Tk):
             # Bei Fehler trotzdem versuchen, weiter zu aktualisieren
             self.after(REFRESH_INTERVAL * 2, self.update_data)
 
+    def refresh_view(self):
+        """
+        Holt nur die seit dem letzten Abruf geänderten Events (db_utils.get_events_since) und
+        aktualisiert die betroffenen Zeilen; die Tabelle wird nur bei full oder neuem Filter neu aufgebaut.
+        """
+        filters = (self.status_filter.get(), self.product_filter.get())
+        feed = db_utils.get_events_since(self.events_cursor, self.events_epoch)
+        self.events_cursor = feed['cursor']
+        self.events_epoch = feed['epoch']
+
+        if feed['full']:
+            self.events = {}
+        for event_id in feed['deleted']:
+            self.events.pop(event_id, None)
+            if self.tree.exists(str(event_id)):
+                self.tree.delete(str(event_id))
+        for event in feed['events']:
+            self.events[event[0]] = event
+
+        if feed['full'] or filters != self.applied_filters:
+            # Vollständiger Neuaufbau, sortiert nach Zeit (neueste zuerst)
+            self.tree.delete(*self.tree.get_children())
+            visible = [event for event in self.events.values() if self.matches_filter(event, filters)]
+            visible.sort(key=lambda event: event[4], reverse=True)
+            for event in visible:
+                self.tree.insert("", "end", iid=str(event[0]), values=self.event_values(event),
+                                 tags=self.event_tags(event))
+            self.applied_filters = filters
+        else:
+            # Nur geänderte Events einfügen, aktualisieren oder ausblenden
+            for event in feed['events']:
+                iid = str(event[0])
+                if not self.matches_filter(event, filters):
+                    if self.tree.exists(iid):
+                        self.tree.delete(iid)
+                elif self.tree.exists(iid):
+                    self.tree.item(iid, values=self.event_values(event), tags=self.event_tags(event))
+                    self.tree.move(iid, "", self.insert_position(event[4], skip=iid))
+                else:
+                    self.tree.insert("", self.insert_position(event[4]), iid=iid,
+                                     values=self.event_values(event), tags=self.event_tags(event))
+
+        if feed['full'] or feed['events'] or feed['deleted']:
+            # Inventar aktualisieren
+            self.update_inventory_display()
+
+        # Status updaten
+        self.last_update_label.config(text=f"Letzte Aktualisierung: {time.strftime('%H:%M:%S')}")
+        self.status_label.config(text="Status: Verbunden", fg="green")
+        self.status_bar.config(text=f"Daten aktualisiert. {len(self.tree.get_children())} Events angezeigt.")
+
+    @staticmethod
+    def matches_filter(event, filters):
+        """Prüft ein Event (Zeile im Format von db_utils.EVENT_COLUMNS) gegen Status- und Produktfilter."""
+        status_filter, product_filter = filters
+        status, product_type = event[7], event[2]
+        if status_filter != "Alle" and status.lower() != status_filter.lower():
+            return False
+        if product_filter != "Alle" and product_type.lower() != product_filter.lower():
+            return False
+        return True
+
+    @staticmethod
+    def event_values(event):
+        """Spaltenwerte der Treeview-Zeile eines Events."""
+        event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
+        event_time_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event_time))
+        return (
+            event_id,
+            shelf_id+1,
+            product_type.capitalize(),
+            event_type.capitalize(),
+            event_time_str,
+            status.capitalize(),
+            quantity,
+            object_id if object_id is not None and object_id != -1 else "N/A"
+        )
+
+    @staticmethod
+    def event_tags(event):
+        """Tags für Formatierung nach Status."""
+        status = event[7].lower()
+        if status == "not paid":
+            return ('not_paid',)
+        if status in ("paid", "misplaced", "returned"):
+            return (status,)
+        return ()
+
+    def insert_position(self, event_time, skip=None):
+        """Index, an dem ein Event mit event_time in die nach Zeit absteigend sortierte Tabelle gehört."""
+        position = 0
+        for iid in self.tree.get_children():
+            if iid == skip:
+                continue
+            if self.events[int(iid)][4] < event_time:
+                break
+            position += 1
+        return position
+
 # In the update_inventory_display method of AnalysisScreen class (in paste-3.txt)
 
     def update_inventory_display(self):
         """Aktualisiert nur die Inventaranzeige mit verbesserten Informationen"""
         try:
-            inventory = db_utils.get_inventory()
+            inventory = db_utils.get_sales_summary(with_inventory=True)
             self.inventory_text.delete("1.0", tk.END)
             
             # Formatierte Ausgabe mit Spaltenüberschriften
@@ -228,8 +266,7 @@ class AnalysisScreen(tk.Tk):
             
             total_inventory = {}
             for inv in inventory:
-                shelf_id, product_type, initial_count, current_count, last_update = inv
-                sold, unpaid = db_utils.get_sales_data(shelf_id, product_type)
+                shelf_id, product_type, initial_count, current_count, last_update, sold, unpaid = inv
                 
                 # Ermittle den Status basierend auf dem aktuellen Bestand
                 status = "OK"
@@ -272,7 +309,7 @@ class AnalysisScreen(tk.Tk):
             try:
                 db_utils.reset_db()
                 messagebox.showinfo("Erfolg", "Datenbank wurde erfolgreich zurückgesetzt.")
-                self.update_data()
+                self.refresh_view()
             except Exception as e:
                 messagebox.showerror("Fehler", f"Fehler beim Zurücksetzen der Datenbank:\n{str(e)}")
 
@@ -284,7 +321,7 @@ class AnalysisScreen(tk.Tk):
             try:
                 db_utils.clear_current_events()
                 messagebox.showinfo("Erfolg", "Alle Events wurden erfolgreich gelöscht.")
-                self.update_data()
+                self.refresh_view()
             except Exception as e:
                 messagebox.showerror("Fehler", f"Fehler beim Löschen der Events:\n{str(e)}")
     
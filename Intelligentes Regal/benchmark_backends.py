@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Backend-Benchmark
+-----------------
+Vergleicht die Inferenz-Backends (PyTorch, ONNX Runtime, OpenVINO) auf einem lokalen
+Bildsatz (z. B. aufgenommene Regalbilder): Latenz pro Frame, Durchsatz und mAP@0.5.
+
+Liegen zu den Bildern YOLO-Labels (gleicher Dateiname, .txt) im Label-Verzeichnis,
+wird gegen diese gemessen. Sonst dienen die PyTorch-Erkennungen als Referenz
+(misst dann die Übereinstimmung mit dem Originalmodell).
+
+Aufruf: python benchmark_backends.py bilder/ [--labels labels/] [--backends pytorch onnx openvino]
+        [--imgsz 640] [--int8] [--calibration kalibrierbilder/]
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from inference_backend import BACKENDS, load_model
+from sort import iou_batch
+from video_source import list_images
+
+REFERENCE_CONF = 0.35   # Mindestkonfidenz der Referenz-Erkennungen (wie confidence_threshold im Monitor)
+WARMUP_FRAMES = 5
+
+
+def decode(result):
+    """Boxen (N, 4), Konfidenzen (N,) und Klassen-IDs (N,) eines Ultralytics-Ergebnisses."""
+    data = result.boxes.data.cpu().numpy() if result.boxes is not None else np.zeros((0, 6))
+    return data[:, :4], data[:, -2], data[:, -1].astype(int)
+
+
+def load_yolo_labels(label_path, image_shape):
+    """Liest YOLO-Labels (Klasse cx cy w h, normiert) und liefert Boxen in Pixeln und Klassen."""
+    height, width = image_shape[:2]
+    boxes, classes = [], []
+    if os.path.exists(label_path):
+        with open(label_path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 5:
+                    continue
+                cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+                boxes.append([(cx - w / 2) * width, (cy - h / 2) * height,
+                              (cx + w / 2) * width, (cy + h / 2) * height])
+                classes.append(cls)
+    return np.array(boxes, dtype=np.float32).reshape(-1, 4), np.array(classes, dtype=int)
+
+
+def average_precision(predictions, ground_truth, iou_threshold=0.5):
+    """
+    mAP@iou_threshold über alle Klassen (VOC, alle Punkte interpoliert).
+    predictions / ground_truth: Listen je Bild mit (boxes, scores, classes) bzw. (boxes, classes).
+    """
+    classes = set()
+    for _, gt_classes in ground_truth:
+        classes.update(gt_classes.tolist())
+    if not classes:
+        return 0.0
+
+    aps = []
+    for cls in sorted(classes):
+        scored = []   # (score, true positive)
+        num_gt = 0
+        for (boxes, scores, pred_classes), (gt_boxes, gt_classes) in zip(predictions, ground_truth):
+            gt = gt_boxes[gt_classes == cls]
+            num_gt += len(gt)
+            mask = pred_classes == cls
+            pred_boxes, pred_scores = boxes[mask], scores[mask]
+            matched = np.zeros(len(gt), dtype=bool)
+            ious = iou_batch(pred_boxes, gt) if len(gt) and len(pred_boxes) else np.zeros((len(pred_boxes), len(gt)))
+            for i in np.argsort(-pred_scores):
+                best = int(np.argmax(ious[i])) if len(gt) else -1
+                if best >= 0 and ious[i, best] >= iou_threshold and not matched[best]:
+                    matched[best] = True
+                    scored.append((pred_scores[i], 1))
+                else:
+                    scored.append((pred_scores[i], 0))
+        if num_gt == 0:
+            continue
+        scored.sort(key=lambda item: -item[0])
+        tp = np.cumsum([s[1] for s in scored]) if scored else np.zeros(0)
+        fp = np.cumsum([1 - s[1] for s in scored]) if scored else np.zeros(0)
+        recall = np.concatenate(([0.0], tp / num_gt, [1.0]))
+        precision = np.concatenate(([1.0], tp / np.maximum(tp + fp, 1e-9), [0.0]))
+        precision = np.maximum.accumulate(precision[::-1])[::-1]
+        aps.append(float(np.sum((recall[1:] - recall[:-1]) * precision[1:])))
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def run_backend(model, images, imgsz):
+    """Führt das Modell auf allen Bildern aus; liefert Latenzen (s) und dekodierte Ergebnisse."""
+    for image in images[:WARMUP_FRAMES]:
+        model(image, imgsz=imgsz, verbose=False)
+    latencies, predictions = [], []
+    for image in images:
+        start = time.perf_counter()
+        result = model(image, imgsz=imgsz, verbose=False)[0]
+        latencies.append(time.perf_counter() - start)
+        predictions.append(decode(result))
+    return np.array(latencies), predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergleicht die Inferenz-Backends auf einem lokalen Bildsatz.")
+    parser.add_argument("images", help="Verzeichnis mit Testbildern")
+    parser.add_argument("--labels", help="Verzeichnis mit YOLO-Labels (optional)")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true", help="ONNX/OpenVINO zusätzlich INT8-quantisiert messen")
+    parser.add_argument("--calibration", help="Kalibrierbilder für INT8 (Standard: Testbilder)")
+    args = parser.parse_args()
+
+    files = list_images(args.images)
+    if not files:
+        print(f"Keine Bilder in {args.images} gefunden.")
+        return 1
+    images = [cv2.imread(f) for f in files]
+
+    variants = [(backend, False) for backend in args.backends]
+    if args.int8:
+        variants += [(backend, True) for backend in args.backends if backend != "pytorch"]
+
+    runs = {}
+    for backend, int8 in variants:
+        name = backend + (" INT8" if int8 else "")
+        print(f"Messe {name}...")
+        model = load_model(args.model, backend, imgsz=args.imgsz, int8=int8,
+                           calibration_dir=args.calibration or args.images)
+        runs[name] = run_backend(model, images, args.imgsz)
+
+    # Referenz: Labels, falls vorhanden, sonst die PyTorch-Erkennungen
+    if args.labels:
+        reference_name = "Labels"
+        ground_truth = [load_yolo_labels(os.path.join(args.labels, os.path.splitext(os.path.basename(f))[0] + ".txt"),
+                                         image.shape) for f, image in zip(files, images)]
+    else:
+        reference_name = "pytorch"
+        if "pytorch" not in runs:
+            runs["pytorch"] = run_backend(load_model(args.model, "pytorch", imgsz=args.imgsz), images, args.imgsz)
+        ground_truth = [(boxes[scores >= REFERENCE_CONF], classes[scores >= REFERENCE_CONF])
+                        for boxes, scores, classes in runs["pytorch"][1]]
+
+    print("=" * 80)
+    print(f"BACKEND-BENCHMARK: {len(images)} Bilder, imgsz={args.imgsz}, Referenz: {reference_name}")
+    print("=" * 80)
+    print(f"{'Backend':<16} {'Latenz ms':>10} {'p95 ms':>10} {'FPS':>8} {'mAP@0.5':>9}")
+    for name, (latencies, predictions) in runs.items():
+        print(f"{name:<16} {latencies.mean() * 1000:>10.1f} {np.percentile(latencies, 95) * 1000:>10.1f} "
+              f"{1.0 / latencies.mean():>8.1f} {average_precision(predictions, ground_truth):>9.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
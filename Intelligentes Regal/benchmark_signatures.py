@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Signatur-Benchmark
+------------------
+Vergleicht die Objektsignaturen für die Re-Identifikation (object_signature.py:
+"hist" = 16x16x16-HSV-Histogramm, "compact" = H/S/V-Randhistogramme + Abmessungen)
+auf aufgezeichneten Sitzungen, Videos oder Bildverzeichnissen: Genauigkeit, Extraktions-
+und Abfragezeit sowie Speicher je Signatur.
+
+Die Objekt-IDs liefert SORT auf den YOLO-Erkennungen (wie im Monitor). Jede Spur wird
+geteilt: Aus der ersten Hälfte der Beobachtungen entsteht die Gedächtnis-Signatur
+(gleitender Mittelwert wie im Tracker), die letzte Beobachtung ist die Anfrage an die
+ReIDGallery aller Spuren. Gezählt wird, wie oft der beste Treffer desselben Produkttyps die
+eigene Spur ist (Top-1) und wie oft der Tracker ihn mit seiner Schwelle übernehmen würde
+(richtig bzw. falsch wiedererkannt).
+
+Aufruf: python benchmark_signatures.py sessions/morning [sessions/abend ...] [--model yolov8s.pt]
+        [--imgsz 640] [--frames 2000] [--no-rotate]
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from color_features import FrameFeatureCache
+from detections import FrameDetections
+from inference_backend import load_model
+from object_signature import SIGNATURE_TYPES, extract_signature
+from reid_gallery import ReIDGallery
+from sort import Sort
+from video_source import open_video_source
+
+ALLOWED_CLASSES = ["cup", "book", "bottle", "wine glass"]   # wie im Monitor
+CONFIDENCE_THRESHOLD = 0.35     # wie confidence_threshold im Monitor
+SIMILARITY_THRESHOLD = 0.3      # wie enhanced_tracker im Monitor
+MIN_TRACK_OBSERVATIONS = 6      # Kürzere Spuren werden nicht ausgewertet
+
+
+def collect_tracks(model, sources, imgsz, max_frames, rotate):
+    """
+    Verfolgt die Objekte aller Quellen und extrahiert je Beobachtung beide Signaturen.
+    Liefert {Spur: {"product_type", "observations": {Typ: [Signatur, ...]}}} und die
+    Extraktionszeiten je Signaturtyp (s).
+    """
+    tracks = {}
+    extraction_times = defaultdict(list)
+    for source_index, spec in enumerate(sources):
+        cap = open_video_source(spec)
+        tracker = Sort(max_age=30, min_hits=2, alpha=0.6, beta=0.4, assignment_threshold=0.5)
+        frame_index = 0
+        while not max_frames or frame_index < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if rotate:
+                frame = cv2.rotate(frame, cv2.ROTATE_180)
+            timestamp = cap.frame_timestamp
+            frame_index += 1
+
+            results = model(frame, imgsz=imgsz, verbose=False)
+            detections = FrameDetections.from_results(results, ALLOWED_CLASSES).filter(CONFIDENCE_THRESHOLD)
+            if len(detections) == 0:
+                continue
+            # Die SORT-Histogramme lösen die HSV-Umrechnung aus; gemessen wird danach nur die Signatur
+            feature_cache = FrameFeatureCache(frame)
+            colors = [feature_cache.sort_histogram(*box) for box in detections.boxes]
+            tracked = tracker.update(detections.to_sort_array(), colors)
+            if len(tracked) == 0:
+                continue
+            labels = detections.classify(tracked[:, :4], default=None)
+
+            for row, product_type in zip(tracked, labels):
+                if product_type is None:
+                    continue
+                x1, y1, x2, y2 = (max(0, int(v)) for v in row[:4])
+                track = tracks.setdefault((source_index, int(row[4])), {
+                    "product_type": product_type, "observations": defaultdict(list)})
+                for signature_type in SIGNATURE_TYPES:
+                    start = time.perf_counter()
+                    signature = extract_signature(feature_cache, x1, y1, x2, y2, timestamp, signature_type)
+                    extraction_times[signature_type].append(time.perf_counter() - start)
+                    if signature is not None:
+                        track["observations"][signature_type].append(signature)
+        cap.release()
+        print(f"{spec}: {frame_index} Frames")
+    return tracks, extraction_times
+
+
+def evaluate(tracks, signature_type):
+    """Re-Identifikation aller Spuren mit einer Galerie; liefert Kennzahlen als dict."""
+    gallery = ReIDGallery(max_age=float("inf"))
+    queries = []
+    memory_bytes = 0
+    for track_id, track in tracks.items():
+        observations = track["observations"][signature_type]
+        if len(observations) < MIN_TRACK_OBSERVATIONS:
+            continue
+        # Gedächtnis-Signatur wie im Tracker: erste Beobachtung, danach gleitender Mittelwert
+        memory = observations[0]
+        for observation in observations[1:len(observations) // 2]:
+            memory.update(observation.color_hist, observation.dimensions, observation.last_seen_time)
+        memory_bytes += np.asarray(memory.color_hist).nbytes + 2 * 4
+        gallery.add(track["product_type"], (memory, track_id))
+        queries.append((track_id, track["product_type"], observations[-1]))
+
+    top1 = accepted = false_accepted = 0
+    query_times = []
+    for track_id, product_type, query in queries:
+        start = time.perf_counter()
+        key, similarity = gallery.best_match(product_type, query, -np.inf)
+        query_times.append(time.perf_counter() - start)
+        correct = key is not None and gallery.get(key)[1] == track_id
+        top1 += correct
+        if similarity > SIMILARITY_THRESHOLD:
+            accepted += correct
+            false_accepted += not correct
+
+    count = max(len(queries), 1)
+    return {
+        "tracks": len(queries),
+        "top1": top1 / count,
+        "accepted": accepted / count,
+        "false_accepted": false_accepted / count,
+        "query_us": np.mean(query_times) * 1e6 if query_times else 0.0,
+        "bytes": memory_bytes / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergleicht die Objektsignaturen auf aufgezeichneten Sitzungen.")
+    parser.add_argument("sources", nargs="+", help="Sitzungsverzeichnisse, Videodateien oder Bildverzeichnisse")
+    parser.add_argument("--model", default="yolov8s.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--frames", type=int, default=0, help="Höchstens so viele Frames je Quelle (0 = alle)")
+    parser.add_argument("--no-rotate", action="store_true", help="Frames nicht um 180 Grad drehen (wie im Monitor)")
+    args = parser.parse_args()
+
+    model = load_model(args.model, "pytorch", imgsz=args.imgsz)
+    tracks, extraction_times = collect_tracks(model, args.sources, args.imgsz, args.frames, not args.no_rotate)
+
+    print("=" * 80)
+    print(f"SIGNATUR-BENCHMARK: {len(tracks)} Spuren, Schwelle {SIMILARITY_THRESHOLD}, "
+          f"mind. {MIN_TRACK_OBSERVATIONS} Beobachtungen je Spur")
+    print("=" * 80)
+    print(f"{'Signatur':<10} {'Spuren':>7} {'Top-1':>7} {'richtig':>8} {'falsch':>8} "
+          f"{'Extr. us':>9} {'Abfr. us':>9} {'Byte':>7}")
+    for signature_type in SIGNATURE_TYPES:
+        result = evaluate(tracks, signature_type)
+        extraction_us = np.mean(extraction_times[signature_type]) * 1e6 if extraction_times[signature_type] else 0.0
+        print(f"{signature_type:<10} {result['tracks']:>7} {result['top1']:>7.1%} {result['accepted']:>8.1%} "
+              f"{result['false_accepted']:>8.1%} {extraction_us:>9.1f} {result['query_us']:>9.1f} "
+              f"{result['bytes']:>7.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,176 @@
+# change_feed.py
+#
+# Push-Kanal für die Weboberflächen über Server-Sent Events (SSE).
+# Pro Prozess gibt es eine einzige Änderungsquelle: ein Hintergrund-Thread wird nach jedem
+# Commit dieses Prozesses sofort geweckt (db_utils.add_write_listener) und prüft zusätzlich
+# alle CHANGE_POLL_INTERVAL Sekunden die per Trigger gepflegte Tabelle change_sequence, um
+# Schreibzugriffe anderer Prozesse (yolo_monitor, Kasse, Lager) zu erkennen. Nur bei einer
+# Änderung wird der Diff einmal berechnet und an alle verbundenen Clients verteilt - die
+# Datenbanklast hängt damit nicht mehr von der Anzahl offener Bildschirme ab.
+
+import json
+import queue
+import threading
+
+from flask import Response
+
+import db_utils
+from debug_utils import log_debug
+from metrics import REGISTRY
+
+CHANGE_POLL_INTERVAL = 0.1     # Sekunden zwischen zwei Prüfungen auf Änderungen anderer Prozesse
+SSE_KEEPALIVE_INTERVAL = 15.0  # Kommentarzeile, damit Proxys und Browser die Verbindung offen halten
+SSE_RETRY_MS = 2000            # Wartezeit des Browsers vor einem automatischen Reconnect
+SSE_CLIENT_QUEUE_SIZE = 100    # Ausstehende Nachrichten je Client; bei Überlauf gibt es einen neuen Snapshot
+
+SSE_CLIENTS = REGISTRY.gauge("regal_sse_clients", "Verbundene SSE-Clients", ("app",))
+SSE_MESSAGES = REGISTRY.counter("regal_sse_messages", "Verteilte SSE-Nachrichten (vor dem Fan-out)", ("app",))
+
+_RESYNC = object()  # Marker in der Client-Queue: Rückstand verworfen, Snapshot senden
+
+
+class Change:
+    """
+    Eine erkannte Änderung.
+    events: Event-Diff im Format von db_utils.get_events_since (leer, wenn sich keine Events geändert haben)
+    inventory_changed: True, wenn sich das Inventar geändert hat
+    forced: True, wenn die Aktualisierung über ChangeFeed.notify() angestoßen wurde
+    """
+    __slots__ = ("events", "inventory_changed", "forced")
+
+    def __init__(self, events, inventory_changed, forced=False):
+        self.events = events
+        self.inventory_changed = inventory_changed
+        self.forced = forced
+
+    @property
+    def events_changed(self):
+        return bool(self.events["full"] or self.events["events"] or self.events["deleted"])
+
+
+class ChangeFeed:
+    """
+    Verteilt Änderungen einer Oberfläche per SSE.
+    snapshot_fn() liefert den vollständigen Stand für neu verbundene Clients,
+    update_fn(change) den Diff zu einer Änderung oder None, wenn für diese Oberfläche
+    nichts zu senden ist. update_fn wird je Änderung einmal aufgerufen, nicht je Client.
+    """
+
+    def __init__(self, app_name, snapshot_fn, update_fn, poll_interval=CHANGE_POLL_INTERVAL):
+        self.app_name = app_name
+        self.snapshot_fn = snapshot_fn
+        self.update_fn = update_fn
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._forced = False
+        self._sequence = None
+        self._events_cursor = 0
+        self._events_epoch = None
+        self._last_message = None
+        self._thread = None
+        SSE_CLIENTS.labels(app_name).set_function(lambda: len(self._subscribers))
+
+    def start(self):
+        """Startet den Änderungs-Thread (mehrfacher Aufruf ist unschädlich)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Ausgangsstand übernehmen; Clients erhalten ihn ohnehin als Snapshot
+            self._sequence = db_utils.get_change_sequence()
+            self._events_cursor, self._events_epoch = self._sequence.get("events", (0, None))
+            db_utils.add_write_listener(self._wakeup.set)
+            self._thread = threading.Thread(target=self._run, name=f"change-feed-{self.app_name}", daemon=True)
+            self._thread.start()
+        log_debug(f"Änderungs-Feed '{self.app_name}' gestartet (Prüfintervall {self.poll_interval * 1000:.0f} ms)")
+
+    def notify(self):
+        """Erzwingt eine Aktualisierung, z. B. nach Änderungen, die nur im Speicher liegen."""
+        self._forced = True
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                change = self._detect_change()
+                if change is not None:
+                    payload = self.update_fn(change)
+                    if payload is not None:
+                        self._broadcast(payload)
+            except Exception as e:
+                log_debug(f"Änderungs-Feed '{self.app_name}': Fehler bei der Aktualisierung: {e}", "ERROR")
+
+    def _detect_change(self):
+        """Vergleicht change_sequence mit dem letzten Stand; liefert ein Change oder None."""
+        forced, self._forced = self._forced, False
+        sequence = db_utils.get_change_sequence()
+        if sequence == self._sequence and not forced:
+            return None
+        previous = self._sequence or {}
+        self._sequence = sequence
+
+        if not self._subscribers:
+            # Niemand verbunden: nur den Stand übernehmen, neue Clients erhalten einen Snapshot
+            self._events_cursor, self._events_epoch = sequence.get("events", (0, None))
+            return None
+
+        if sequence.get("events") != previous.get("events"):
+            events = db_utils.get_events_since(self._events_cursor, self._events_epoch)
+        else:
+            events = {"events": [], "deleted": [], "cursor": self._events_cursor,
+                      "epoch": self._events_epoch, "full": False}
+        self._events_cursor, self._events_epoch = events["cursor"], events["epoch"]
+        return Change(events, sequence.get("inventory") != previous.get("inventory"), forced)
+
+    def _broadcast(self, payload):
+        message = _format_message(payload)
+        if message == self._last_message:
+            return
+        self._last_message = message
+        SSE_MESSAGES.labels(self.app_name).inc()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for client in subscribers:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                # Client kommt nicht hinterher: Rückstand verwerfen, stattdessen neuer Snapshot
+                try:
+                    while True:
+                        client.get_nowait()
+                except queue.Empty:
+                    pass
+                client.put_nowait(_RESYNC)
+
+    def stream(self):
+        """Flask-Response mit dem SSE-Stream: zuerst der vollständige Stand, danach nur Diffs."""
+        def generate():
+            client = queue.Queue(maxsize=SSE_CLIENT_QUEUE_SIZE)
+            # Erst anmelden, dann Snapshot: Diffs, die sich damit überschneiden, führt der Client idempotent zusammen
+            with self._lock:
+                self._subscribers.add(client)
+            try:
+                yield f"retry: {SSE_RETRY_MS}\n\n"
+                yield _format_message(self.snapshot_fn())
+                while True:
+                    try:
+                        message = client.get(timeout=SSE_KEEPALIVE_INTERVAL)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    if message is _RESYNC:
+                        message = _format_message(self.snapshot_fn())
+                    yield message
+            finally:
+                with self._lock:
+                    self._subscribers.discard(client)
+
+        return Response(generate(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def _format_message(payload):
+    return f"data: {json.dumps(payload, default=str)}\n\n"
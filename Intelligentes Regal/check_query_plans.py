@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Query-Plan-Prüfung
+------------------
+Prüft per EXPLAIN QUERY PLAN, ob alle häufigen Abfragen (db_utils.HOT_QUERIES)
+einen Index verwenden. Liefert Exit-Code 1, sobald eine Abfrage die ganze Tabelle durchsucht.
+
+Aufruf: python check_query_plans.py [pfad/zur/datenbank.db]
+"""
+
+import sys
+
+import db_utils
+
+if len(sys.argv) > 1:
+    db_utils.DB_NAME = sys.argv[1]
+
+# Legt fehlende Tabellen an und wendet ausstehende Schema-Migrationen (Indizes) an
+db_utils.init_db()
+
+c = db_utils.get_connection().cursor()
+print("=" * 80)
+print(f"QUERY-PLAN-PRÜFUNG: {db_utils.DB_NAME}")
+print("=" * 80)
+for name, (query, params) in db_utils.HOT_QUERIES.items():
+    c.execute("EXPLAIN QUERY PLAN " + query, params)
+    print(f"{name}:")
+    for row in c.fetchall():
+        print(f"    {row[-1]}")
+
+try:
+    db_utils.audit_query_plans(raise_on_scan=True)
+except RuntimeError as e:
+    print(f"\nFEHLER: {e}")
+    sys.exit(1)
+
+print("\nAlle häufigen Abfragen verwenden einen Index.")
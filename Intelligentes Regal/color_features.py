@@ -0,0 +1,108 @@
+# color_features.py
+#
+# Gemeinsame Farbmerkmale pro Frame.
+# Das Frame (bzw. der Bereich aller ROIs) wird nur einmal nach HSV umgerechnet;
+# die Histogramme für SORT (8x8x8) und für die Objektsignaturen (16x16x16) werden
+# aus diesem gemeinsamen Puffer berechnet und je Box und Auflösung zwischengespeichert.
+# Für kompakte Signaturen gibt es zusätzlich die Randverteilungen von H, S und V.
+
+import cv2
+import numpy as np
+
+# Histogramm-Auflösungen
+SORT_HIST_BINS = 8        # Farbanteil der SORT-Kostenmatrix
+SIGNATURE_HIST_BINS = 16  # Objektsignaturen für die Re-Identifikation
+MARGINAL_HIST_BINS = (16, 8, 8)   # Kompakte Signaturen: Bins für H, S und V einzeln
+MARGINAL_HIST_RANGES = ((0, 180), (0, 256), (0, 256))
+
+
+def roi_union(rois):
+    """Umschließendes Rechteck (x1, y1, x2, y2) aller ROIs im Format {id: (x, y, w, h)}."""
+    if not rois:
+        return None
+    x1 = min(rx for rx, ry, rw, rh in rois.values())
+    y1 = min(ry for rx, ry, rw, rh in rois.values())
+    x2 = max(rx + rw for rx, ry, rw, rh in rois.values())
+    y2 = max(ry + rh for rx, ry, rw, rh in rois.values())
+    return (max(0, x1), max(0, y1), x2, y2)
+
+
+class FrameFeatureCache:
+    """
+    Farbmerkmale eines Frames.
+    region: optionaler Bereich (x1, y1, x2, y2), der vorab nach HSV umgerechnet wird (z. B. roi_union).
+    Boxen außerhalb dieses Bereichs lösen einmalig die Umrechnung des ganzen Frames aus.
+    """
+
+    def __init__(self, frame, region=None):
+        self.frame = frame
+        self.region = region
+        self._region_hsv = None
+        self._frame_hsv = None
+        self._hists = {}
+        self.conversions = 0
+        self.hits = 0
+
+    def _hsv_crop(self, x1, y1, x2, y2):
+        """Liefert den HSV-Ausschnitt der Box; entspricht cvtColor(frame[y1:y2, x1:x2])."""
+        if self.region is not None and x1 >= 0 and y1 >= 0:
+            rx1, ry1, rx2, ry2 = self.region
+            if rx1 <= x1 and ry1 <= y1 and x2 <= rx2 and y2 <= ry2:
+                if self._region_hsv is None:
+                    self._region_hsv = cv2.cvtColor(self.frame[ry1:ry2, rx1:rx2], cv2.COLOR_BGR2HSV)
+                    self.conversions += 1
+                return self._region_hsv[y1 - ry1:y2 - ry1, x1 - rx1:x2 - rx1]
+        if self._frame_hsv is None:
+            self._frame_hsv = cv2.cvtColor(self.frame, cv2.COLOR_BGR2HSV)
+            self.conversions += 1
+        return self._frame_hsv[y1:y2, x1:x2]
+
+    def histogram(self, x1, y1, x2, y2, bins):
+        """
+        Normalisiertes HSV-Histogramm (bins x bins x bins, flach) der Box [x1, y1, x2, y2].
+        Gibt None zurück, wenn die Box leer ist.
+        """
+        key = (int(x1), int(y1), int(x2), int(y2), bins)
+        if key in self._hists:
+            self.hits += 1
+            return self._hists[key]
+        if self.frame[key[1]:key[3], key[0]:key[2]].size == 0:
+            hist = None
+        else:
+            hsv_roi = self._hsv_crop(*key[:4])
+            hist = cv2.calcHist([hsv_roi], [0, 1, 2], None, [bins, bins, bins], [0, 180, 0, 256, 0, 256])
+            cv2.normalize(hist, hist)
+            hist = hist.flatten()
+        self._hists[key] = hist
+        return hist
+
+    def sort_histogram(self, x1, y1, x2, y2):
+        """Histogramm für den Farbanteil der SORT-Zuordnung."""
+        return self.histogram(x1, y1, x2, y2, SORT_HIST_BINS)
+
+    def signature_histogram(self, x1, y1, x2, y2):
+        """Histogramm für die Objektsignatur der Re-Identifikation."""
+        return self.histogram(x1, y1, x2, y2, SIGNATURE_HIST_BINS)
+
+    def marginal_histogram(self, x1, y1, x2, y2):
+        """
+        Randverteilungen von H, S und V der Box [x1, y1, x2, y2] hintereinander (float32,
+        Länge sum(MARGINAL_HIST_BINS)). Jeder Kanal ist für sich normiert und geht mit gleichem
+        Gewicht ein; der Gesamtvektor hat die Länge 1. None bei leerer Box.
+        """
+        key = (int(x1), int(y1), int(x2), int(y2), "marginal")
+        if key in self._hists:
+            self.hits += 1
+            return self._hists[key]
+        if self.frame[key[1]:key[3], key[0]:key[2]].size == 0:
+            hist = None
+        else:
+            hsv_roi = self._hsv_crop(*key[:4])
+            channels = []
+            for channel, (bins, value_range) in enumerate(zip(MARGINAL_HIST_BINS, MARGINAL_HIST_RANGES)):
+                channel_hist = cv2.calcHist([hsv_roi], [channel], None, [bins], list(value_range))
+                cv2.normalize(channel_hist, channel_hist)
+                channels.append(channel_hist.ravel())
+            hist = np.concatenate(channels) / np.float32(np.sqrt(len(channels)))
+        self._hists[key] = hist
+        return hist
@@ -1,9 +1,9 @@
 import flask
 from flask import Flask, render_template, jsonify, request, redirect, url_for
-import threading
 import time
-import sqlite3
 import db_utils
+from metrics import instrument_flask_app
+from change_feed import ChangeFeed
 import os
 import logging
 
@@ -35,6 +35,8 @@ app = Flask(__name__,
             template_folder=CUSTOMER_TEMPLATES_DIR,
             static_folder=CUSTOMER_STATIC_DIR)
 app.config['SECRET_KEY'] = 'intelligent-shelf-customer-display'
+# Antwortzeiten je Endpunkt messen, Kennzahlen unter /metrics
+instrument_flask_app(app, "kundendisplay")
 
 # Vereinfachte Produkt-Detaildaten
 product_details = {
@@ -100,61 +102,77 @@ product_details = {
 current_product = None
 product_display_until = 0  # Zeitpunkt, bis zu dem das Produkt angezeigt wird
 
-# Thread für die Erkennung von Produktentnahmen
-def detect_product_removal():
-    global current_product, product_display_until
+# Bereits angezeigte Event-IDs, damit ein Event das Display nur einmal auslöst
+processed_event_ids = set()
+
+def display_status():
+    """Aktueller Anzeigemodus ('welcome' oder 'product_detail') für den SSE-Stream"""
+    if current_product is None or time.time() > product_display_until:
+        return {'display_mode': 'welcome', 'current_product': None}
+    return {
+        'display_mode': 'product_detail',
+        'current_product': current_product,
+        'remaining_seconds': int(max(0, product_display_until - time.time()))
+    }
+
+# Erkennung von Produktentnahmen aus dem Event-Diff des Änderungs-Feeds
+def detect_product_removal(change):
+    global current_product, product_display_until, processed_event_ids
     
-    # Cache für verarbeitete Event-IDs
-    processed_event_ids = set()
+    if not change.events_changed:
+        return None
     
-    while True:
-        try:
-            # Prüfe, ob die Anzeigezeit für das aktuelle Produkt abgelaufen ist
-            current_time = time.time()
-            if current_product is not None and current_time > product_display_until:
-                logger.info(f"Anzeigezeit für {current_product} abgelaufen, zurück zur Startseite")
-                current_product = None
-            
-            # Prüfe auf neue Removal-Events nur, wenn kein Produkt angezeigt wird
-            if current_product is None:
-                conn = sqlite3.connect(db_utils.DB_NAME)
-                c = conn.cursor()
-                recent_time = int(current_time) - 5  # Letzte 5 Sekunden
-                
-                # Suche nach neuen Removal-Events
-                c.execute('''
-                    SELECT id, shelf_id, product_type, event_type, status, event_time
-                    FROM events
-                    WHERE event_time > ? AND event_type = 'removal' AND status = 'not paid'
-                    ORDER BY event_time DESC
-                    LIMIT 5
-                ''', (recent_time,))
-                
-                removal_events = c.fetchall()
-                conn.close()
-                
-                # Verarbeite das neueste Event, das noch nicht verarbeitet wurde
-                for event_id, shelf_id, product_type, event_type, status, event_time in removal_events:
-                    if event_id not in processed_event_ids:
-                        processed_event_ids.add(event_id)
-                        
-                        # Setze das aktuelle Produkt und die Anzeigezeit
-                        current_product = product_type
-                        product_display_until = current_time + 15  # 15 Sekunden anzeigen
-                        
-                        logger.info(f"Neues Produkt erkannt: {product_type} (Event ID: {event_id}, anzeigen bis: {product_display_until})")
-                        break
-            
-            # Begrenze die Größe des Cache
-            if len(processed_event_ids) > 100:
-                processed_event_ids = set(list(processed_event_ids)[-50:])
-            
-            # Kurze Pause, um CPU-Last zu reduzieren
-            time.sleep(0.5)
-            
-        except Exception as e:
-            logger.error(f"Fehler bei der Erkennung von Produktentnahmen: {e}")
-            time.sleep(1)  # Bei Fehler längere Pause
+    # Prüfe, ob die Anzeigezeit für das aktuelle Produkt abgelaufen ist
+    current_time = time.time()
+    if current_product is not None and current_time > product_display_until:
+        logger.info(f"Anzeigezeit für {current_product} abgelaufen, zurück zur Startseite")
+        current_product = None
+    
+    # Neue Removal-Events nur berücksichtigen, wenn kein Produkt angezeigt wird
+    if current_product is not None:
+        return None
+    
+    recent_time = int(current_time) - 5  # Letzte 5 Sekunden
+    removal_events = [event for event in change.events['events']
+                      if event[3] == 'removal' and event[7] == 'not paid' and event[4] > recent_time]
+    removal_events.sort(key=lambda event: event[4], reverse=True)
+    
+    # Verarbeite das neueste Event, das noch nicht verarbeitet wurde
+    for event in removal_events:
+        event_id, product_type = event[0], event[2]
+        if event_id in processed_event_ids:
+            continue
+        processed_event_ids.add(event_id)
+        
+        # Setze das aktuelle Produkt und die Anzeigezeit
+        current_product = product_type
+        product_display_until = current_time + 15  # 15 Sekunden anzeigen
+        
+        logger.info(f"Neues Produkt erkannt: {product_type} (Event ID: {event_id}, anzeigen bis: {product_display_until})")
+        break
+    
+    # Begrenze die Größe des Cache
+    if len(processed_event_ids) > 100:
+        processed_event_ids = set(list(processed_event_ids)[-50:])
+    
+    if current_product is None:
+        return None
+    return display_status()
+
+# Eine Änderungsquelle für alle Kunden-Displays dieses Prozesses: neue Entnahmen werden
+# sofort gepusht, statt dass die Startseite alle 2 Sekunden neu lädt
+change_feed = ChangeFeed("kundendisplay", display_status, detect_product_removal)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: Anzeigemodus, sobald eine Entnahme erkannt wird"""
+    change_feed.start()
+    return change_feed.stream()
+
+@app.route('/api/display_status')
+def get_display_status():
+    """Anzeigemodus per Abfrage (Fallback ohne EventSource)"""
+    return jsonify(display_status())
 
 # Einfach-Route für Produktanzeige
 @app.route('/')
@@ -209,18 +227,12 @@ def set_product(product_type):
 def get_stock_status(product_type):
     """Prüft den Lagerbestand und liefert Verfügbarkeitsinformationen"""
     try:
-        conn = sqlite3.connect(db_utils.DB_NAME)
-        c = conn.cursor()
+        c = db_utils.get_connection().cursor()
         
         # Gesamtbestand für diesen Produkttyp
-        c.execute('''
-            SELECT SUM(current_count) FROM inventory
-            WHERE product_type = ?
-        ''', (product_type,))
+        c.execute(db_utils.INVENTORY_SUM_BY_PRODUCT_SQL, (product_type,))
         current_stock = c.fetchone()[0] or 0
         
-        conn.close()
-        
         if current_stock > 5:
             return {
                 "status": "Ausreichend auf Lager", 
@@ -300,10 +312,22 @@ def setup_static_files():
     </div>
 
     <script>
-        // Einfacher Reload, damit wir immer den aktuellen Status sehen
-        setTimeout(function() {
-            window.location.reload();
-        }, 2000);
+        // Neue Entnahmen kommen per Server-Sent Events; dann die Produktseite laden
+        if (window.EventSource) {
+            const source = new EventSource('/api/stream');
+            source.onmessage = function(message) {
+                const data = JSON.parse(message.data);
+                if (data.display_mode === 'product_detail') {
+                    source.close();
+                    window.location.reload();
+                }
+            };
+        } else {
+            // Ohne SSE-Unterstützung: einfacher Reload, damit wir immer den aktuellen Status sehen
+            setTimeout(function() {
+                window.location.reload();
+            }, 2000);
+        }
     </script>
 </body>
 </html>"""
@@ -685,10 +709,8 @@ def start_customer_display(host='0.0.0.0', port=5001, debug=False):
         logger.error("Konnte die statischen Dateien nicht erstellen. Server wird nicht gestartet.")
         return False
     
-    # Starte den Thread für die Erkennung von Produktentnahmen
-    detection_thread = threading.Thread(target=detect_product_removal)
-    detection_thread.daemon = True
-    detection_thread.start()
+    # Starte den Änderungs-Feed für die Erkennung von Produktentnahmen
+    change_feed.start()
     
     logger.info(f"Kunden-Display wird gestartet auf http://{host}:{port}")
     app.run(host=host, port=port, debug=debug)
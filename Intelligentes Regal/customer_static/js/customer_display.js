@@ -1,23 +1,26 @@
 // Funktionen für den Kunden-Display
 
 document.addEventListener('DOMContentLoaded', function() {
-    // Funktion, um den Displaystatus zu prüfen und die Seite bei Bedarf zu aktualisieren
+    // Auf einen neuen Displaystatus reagieren und die Seite bei Bedarf aktualisieren
+    function handleDisplayStatus(data) {
+        // Wenn sich etwas geändert hat, die Seite neu laden
+        const currentPath = window.location.pathname;
+        const shouldBeOnWelcome = data.display_mode === 'welcome' && currentPath !== '/';
+        const shouldBeOnDetail = data.display_mode === 'product_detail' && currentPath === '/';
+        
+        if (shouldBeOnWelcome || shouldBeOnDetail) {
+            window.location.href = '/';
+        } else if (data.display_mode === 'product_detail') {
+            // Auf der richtigen Seite, aber evtl. falsches Produkt - Daten aktualisieren
+            updateProductData(data.current_product);
+        }
+    }
+    
+    // Funktion, um den Displaystatus abzufragen (Fallback ohne EventSource)
     function checkDisplayStatus() {
         fetch('/api/display_status')
             .then(response => response.json())
-            .then(data => {
-                // Wenn sich etwas geändert hat, die Seite neu laden
-                const currentPath = window.location.pathname;
-                const shouldBeOnWelcome = data.display_mode === 'welcome' && currentPath !== '/';
-                const shouldBeOnDetail = data.display_mode === 'product_detail' && currentPath === '/';
-                
-                if (shouldBeOnWelcome || shouldBeOnDetail) {
-                    window.location.href = '/';
-                } else if (data.display_mode === 'product_detail') {
-                    // Auf der richtigen Seite, aber evtl. falsches Produkt - Daten aktualisieren
-                    updateProductData(data.current_product);
-                }
-            })
+            .then(handleDisplayStatus)
             .catch(error => {
                 console.error('Fehler beim Prüfen des Displaystatus:', error);
             });
@@ -45,8 +48,15 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
-    // Automatische periodische Prüfung des Displaystatus
-    setInterval(checkDisplayStatus, 3000);
+    // Displaystatus per Server-Sent Events empfangen, sonst periodisch abfragen
+    if (window.EventSource) {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            handleDisplayStatus(JSON.parse(message.data));
+        };
+    } else {
+        setInterval(checkDisplayStatus, 3000);
+    }
     
     // In einer echten Implementierung: Event-Listener für QR-Code-Scannen, 
     // Berührungsgesten usw. hinzufügen
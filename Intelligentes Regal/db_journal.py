@@ -0,0 +1,192 @@
+# db_journal.py
+#
+# Write-Behind-Journal für die Datenbankzugriffe des YOLO-Monitorings.
+# Der Vision-Thread legt Änderungen nur noch im Journal ab, ein Hintergrund-Thread
+# schreibt sie gesammelt in einer einzigen Transaktion alle JOURNAL_FLUSH_INTERVAL_MS.
+#   - detected_objects: pro (Regal, Produkt) gewinnt der letzte Wert (zusammengefasst)
+#   - Event-/Inventar-Operationen: werden in Aufrufreihenfolge angehängt und ausgeführt
+# So blockiert eine langsame Datenbank nie die Bildverarbeitung.
+# Scheitert ein ganzer Stapel (z. B. "database is locked" beim Commit), wird zurückgerollt und
+# der Stapel mit wachsender Wartezeit erneut geschrieben; verworfen wird er erst nach JOURNAL_MAX_RETRIES.
+
+import threading
+import time
+
+import db_utils
+from debug_utils import log_debug
+from metrics import DB_WRITE_SECONDS
+
+# Intervall, in dem das Journal in die Datenbank geschrieben wird
+JOURNAL_FLUSH_INTERVAL_MS = 200
+# Wiederholungen eines fehlgeschlagenen Stapels: Wartezeit verdoppelt sich bis JOURNAL_RETRY_MAX_MS
+JOURNAL_MAX_RETRIES = 5
+JOURNAL_RETRY_BACKOFF_MS = 200
+JOURNAL_RETRY_MAX_MS = 5000
+
+
+class WriteBehindJournal(threading.Thread):
+    """Sammelt Datenbankänderungen und schreibt sie gebündelt im Hintergrund."""
+
+    def __init__(self, flush_interval_ms=JOURNAL_FLUSH_INTERVAL_MS):
+        super().__init__(name="db-journal", daemon=True)
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._cond = threading.Condition()
+        self._detected = {}     # (shelf_id, product_type) -> (count, last_update)
+        self._ops = []          # [(fn, args, kwargs)] in Aufrufreihenfolge
+        self._flushing = False
+        self._flush_requested = False
+        self._stop_requested = False
+        self._failures = 0      # Fehlversuche des aktuellen Stapels
+        # Beobachter für den Event-Stream: observer(name, args, kwargs) je submit() (z. B. replay_report)
+        self.observers = []
+        # Kennzahlen
+        self.flush_count = 0
+        self.ops_written = 0
+        self.detected_coalesced = 0
+
+    def set_detected_count(self, shelf_id, product_type, count, timestamp=None):
+        """Merkt den aktuellen Zählerstand vor; ältere, noch nicht geschriebene Werte werden ersetzt."""
+        if timestamp is None:
+            timestamp = int(time.time())
+        with self._cond:
+            key = (shelf_id, product_type)
+            if key in self._detected:
+                self.detected_coalesced += 1
+            self._detected[key] = (count, timestamp)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Hängt eine Schreiboperation an das Journal an.
+        fn wird später im Writer-Thread innerhalb der Flush-Transaktion aufgerufen und darf
+        daher selbst db_utils-Funktionen bzw. db_utils.transaction() verwenden.
+        Es dürfen nur Werte übergeben werden, keine veränderlichen Tracker-Objekte.
+        """
+        with self._cond:
+            self._ops.append((fn, args, kwargs))
+        for observer in self.observers:
+            observer(fn.__name__, args, kwargs)
+
+    def pending_ops(self):
+        """Anzahl der noch nicht geschriebenen Event-/Inventar-Operationen."""
+        with self._cond:
+            return len(self._ops)
+
+    def is_drained(self):
+        """True, wenn alle Operationen geschrieben sind und gerade kein Flush läuft."""
+        with self._cond:
+            return not self._ops and not self._flushing
+
+    def run(self):
+        log_debug(f"DB-Journal gestartet (Flush alle {self.flush_interval * 1000:.0f} ms)")
+        while True:
+            with self._cond:
+                if not self._stop_requested and not self._flush_requested:
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stop_requested
+                self._flush_requested = False
+            if not self._flush_pending():
+                # Stapel liegt wieder im Journal: erst nach der Wartezeit erneut versuchen
+                time.sleep(min(JOURNAL_RETRY_BACKOFF_MS * 2 ** (self._failures - 1), JOURNAL_RETRY_MAX_MS) / 1000.0)
+            elif stopping:
+                break
+        db_utils.close_connection()
+        log_debug(f"DB-Journal beendet: {self.flush_count} Flushes, {self.ops_written} Operationen geschrieben, "
+                  f"{self.detected_coalesced} Zählerstände zusammengefasst")
+
+    def flush(self, timeout=5.0):
+        """
+        Fordert einen sofortigen Flush an und wartet, bis das Journal leer ist.
+        Läuft der Writer-Thread nicht, wird direkt im aufrufenden Thread geschrieben.
+        """
+        if not self.is_alive():
+            self._flush_pending()
+            return True
+        deadline = time.time() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._ops or self._detected or self._flushing:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Schreibt alle ausstehenden Änderungen und beendet den Writer-Thread."""
+        with self._cond:
+            self._stop_requested = True
+            self._cond.notify_all()
+        if self.is_alive():
+            self.join(timeout=timeout)
+        else:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        """
+        Schreibt alle ausstehenden Änderungen. Gibt False zurück, wenn der Stapel fehlgeschlagen ist
+        und für einen weiteren Versuch wieder vorne ins Journal gelegt wurde.
+        """
+        with self._cond:
+            detected, self._detected = self._detected, {}
+            ops, self._ops = self._ops, []
+            self._flushing = bool(detected or ops)
+        if not (detected or ops):
+            return True
+        try:
+            self._write_batch(detected, ops)
+            self._failures = 0
+            return True
+        except Exception as e:
+            # Offene Transaktion verwerfen (z. B. wenn erst der Commit gescheitert ist)
+            try:
+                db_utils.get_connection().rollback()
+            except Exception:
+                pass
+            self._failures += 1
+            if self._failures > JOURNAL_MAX_RETRIES:
+                log_debug(f"FEHLER beim Schreiben des DB-Journals ({len(ops)} Operationen nach "
+                          f"{JOURNAL_MAX_RETRIES} Wiederholungen verworfen): {e}", "ERROR")
+                self._failures = 0
+                return True
+            with self._cond:
+                # Neuere Zählerstände behalten, Operationen in ursprünglicher Reihenfolge voranstellen
+                for key, value in detected.items():
+                    self._detected.setdefault(key, value)
+                self._ops = ops + self._ops
+            log_debug(f"DB-Journal konnte nicht geschrieben werden ({len(ops)} Operationen, "
+                      f"Versuch {self._failures}/{JOURNAL_MAX_RETRIES}): {e}", "WARNING")
+            return False
+        finally:
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+
+    def _write_batch(self, detected, ops):
+        """Schreibt einen Stapel in einer einzigen Transaktion."""
+        start = time.time()
+        conn = db_utils.get_connection()
+        with db_utils.transaction() as c:
+            if not conn.in_transaction:
+                c.execute("BEGIN")
+            if detected:
+                c.executemany('''
+                    INSERT OR REPLACE INTO detected_objects (shelf_id, product_type, count, last_update)
+                    VALUES (?, ?, ?, ?)
+                ''', [(shelf_id, product_type, count, ts)
+                      for (shelf_id, product_type), (count, ts) in detected.items()])
+            for fn, args, kwargs in ops:
+                # Jede Operation in einem eigenen Savepoint, damit ein Fehler nicht den ganzen Stapel verwirft
+                c.execute("SAVEPOINT journal_op")
+                try:
+                    fn(*args, **kwargs)
+                except Exception as e:
+                    c.execute("ROLLBACK TO SAVEPOINT journal_op")
+                    log_debug(f"FEHLER in Journal-Operation {getattr(fn, '__name__', fn)}: {e}", "ERROR")
+                c.execute("RELEASE SAVEPOINT journal_op")
+        duration = time.time() - start
+        DB_WRITE_SECONDS.observe(duration)
+        self.flush_count += 1
+        self.ops_written += len(ops)
+        log_debug(f"DB-Journal geschrieben: {len(detected)} Zählerstände, {len(ops)} Operationen "
+                  f"in {duration * 1000:.1f} ms")
@@ -1,10 +1,23 @@
+import json
 import sqlite3
+import threading
 import time
+from contextlib import contextmanager
 from debug_utils import log_debug  # Debug-Logging einbinden
 
 DB_NAME = "supermarkt.db"
 
-# Neues Dictionary für Objektlimits, passend zu ALLOWED_CLASSES und OBJECT_LIMITS in yolo_monitor.py
+# Verbindungseinstellungen: eine langlebige Verbindung pro Thread statt connect/close pro Aufruf
+DB_BUSY_TIMEOUT_MS = 5000         # Wartezeit bei gesperrter Datenbank, bevor ein Fehler geworfen wird
+DB_SYNCHRONOUS = "NORMAL"         # Im WAL-Modus sicher, spart den fsync bei jedem Commit
+DB_STATEMENT_CACHE_SIZE = 256     # Anzahl vorbereiteter Statements, die pro Verbindung gecacht werden
+
+_local = threading.local()
+
+# Beobachter, die nach jedem Commit dieses Prozesses aufgerufen werden (z. B. change_feed)
+_write_listeners = []
+
+# Neues Dictionary für Objektlimits, passend zu ALLOWED_CLASSES und OBJECT_LIMITS in shelf_monitor.py
 OBJECT_LIMITS = {
     "cup": 3,
     "book": 3,
@@ -12,9 +25,471 @@ OBJECT_LIMITS = {
     "wine glass": 3
 }
 
+def get_connection():
+    """
+    Liefert die langlebige Datenbankverbindung des aktuellen Threads.
+    Die Verbindung wird beim ersten Aufruf geöffnet und mit WAL-Modus,
+    angepasstem synchronous-Level und busy_timeout konfiguriert.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_name != DB_NAME:
+        # DB_NAME wurde umgestellt (z. B. für Tests) - alte Verbindung verwerfen
+        close_connection()
+        conn = None
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+                               cached_statements=DB_STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        _local.conn = conn
+        _local.db_name = DB_NAME
+        _local.depth = 0
+    return conn
+
+def close_connection():
+    """Schließt die Verbindung des aktuellen Threads (z. B. beim Beenden eines Worker-Threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _local.conn = None
+    _local.db_name = None
+    _local.depth = 0
+
+@contextmanager
+def transaction():
+    """
+    Schreibtransaktion auf der Verbindung des aktuellen Threads.
+    Verschachtelte Aufrufe laufen in der äußeren Transaktion mit; committet
+    wird erst beim Verlassen der äußersten Ebene, bei einer Exception wird zurückgerollt.
+    """
+    conn = get_connection()
+    _local.depth += 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.commit()
+        for listener in _write_listeners:
+            listener()
+
+def add_write_listener(listener):
+    """
+    Registriert eine Funktion ohne Argumente, die nach jedem Commit einer Schreibtransaktion
+    dieses Prozesses aufgerufen wird. Sie sollte nur kurz signalisieren (z. B. ein Event setzen).
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+# Spalten der events-Tabelle in fester Reihenfolge für SELECTs (ohne die interne change_seq)
+EVENT_COLUMNS = "id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id"
+
+# Kennung einer Event-Historie (Millisekunden-Zeitstempel); ändert sich, wenn Events gelöscht
+# oder die Datenbank zurückgesetzt wird, damit Clients ihren Stand komplett neu laden
+_EPOCH_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+# Materialisierte Kennzahlen je (Regal, Produkt) in sales_aggregates und je Zeitfenster in
+# sales_aggregate_history. Trigger auf events ziehen bei INSERT/UPDATE/DELETE den alten Beitrag
+# eines Events ab und addieren den neuen - in derselben Transaktion wie der Schreibzugriff, damit
+# auch direkte UPDATEs (Kasse, yolo_monitor) erfasst werden. Nach einer Änderung von
+# AGGREGATE_BUCKET_SECONDS oder der Formeln einmal rebuild_aggregates() ausführen.
+AGGREGATE_BUCKET_SECONDS = 3600   # Breite eines Zeitfensters der Historie (nach event_time)
+
+# Kennzahl: Beitrag eines Events ({e} = NEW, OLD oder events)
+AGGREGATE_COLUMNS = {
+    "sold": "CASE WHEN {e}.event_type = 'removal' AND {e}.status = 'paid' THEN {e}.quantity ELSE 0 END",
+    "unpaid": "CASE WHEN {e}.event_type = 'removal' AND {e}.status = 'not paid' THEN {e}.quantity ELSE 0 END",
+    "misplaced": "CASE WHEN {e}.status = 'misplaced' AND {e}.resolved = 0 THEN {e}.quantity ELSE 0 END",
+    "returned": "CASE WHEN {e}.event_type = 'return' AND {e}.status IN ('returned', 'zurückgestellt') "
+                "THEN {e}.quantity ELSE 0 END",
+    # Beiträge zum laufenden Delta (offene Entnahmen minus Rückführungen), ohne die Untergrenze 0,
+    # die advance_running_delta für die Produkt-Detailansicht Event für Event anwendet
+    "delta": "CASE WHEN {e}.event_type = 'removal' AND {e}.status IN ('not paid', 'misplaced') THEN {e}.quantity "
+             "WHEN {e}.event_type = 'return' AND {e}.status IN ('returned', 'zurückgestellt') THEN -{e}.quantity "
+             "ELSE 0 END",
+}
+
+def _aggregate_bucket(e):
+    return f"({e}.event_time - {e}.event_time % {AGGREGATE_BUCKET_SECONDS})"
+
+def _aggregate_apply_sql(e, sign):
+    """Trigger-Anweisungen, die den Beitrag des Events {e} addieren (+) bzw. abziehen (-)."""
+    assignments = ", ".join(f"{name} = {name} {sign} ({expr.format(e=e)})"
+                            for name, expr in AGGREGATE_COLUMNS.items())
+    bucket = _aggregate_bucket(e)
+    return f'''
+               INSERT OR IGNORE INTO sales_aggregates (shelf_id, product_type)
+               VALUES ({e}.shelf_id, {e}.product_type);
+               UPDATE sales_aggregates SET {assignments}
+               WHERE shelf_id = {e}.shelf_id AND product_type = {e}.product_type;
+               INSERT OR IGNORE INTO sales_aggregate_history (shelf_id, product_type, bucket)
+               VALUES ({e}.shelf_id, {e}.product_type, {bucket});
+               UPDATE sales_aggregate_history SET {assignments}
+               WHERE shelf_id = {e}.shelf_id AND product_type = {e}.product_type AND bucket = {bucket};'''
+
+AGGREGATE_TRIGGERS = ("events_aggregate_insert", "events_aggregate_update", "events_aggregate_delete")
+
+def _drop_aggregate_trigger_statements():
+    return [f"DROP TRIGGER IF EXISTS {name}" for name in AGGREGATE_TRIGGERS]
+
+def _aggregate_trigger_statements():
+    """Trigger, die sales_aggregates und sales_aggregate_history pflegen (Namen in AGGREGATE_TRIGGERS)."""
+    return [
+        f'''CREATE TRIGGER events_aggregate_insert AFTER INSERT ON events
+           BEGIN{_aggregate_apply_sql("NEW", "+")}
+           END''',
+        f'''CREATE TRIGGER events_aggregate_update
+           AFTER UPDATE OF shelf_id, product_type, event_type, event_time, resolved, status, quantity ON events
+           BEGIN{_aggregate_apply_sql("OLD", "-")}{_aggregate_apply_sql("NEW", "+")}
+           END''',
+        f'''CREATE TRIGGER events_aggregate_delete AFTER DELETE ON events
+           BEGIN{_aggregate_apply_sql("OLD", "-")}
+           END''',
+    ]
+
+def _aggregate_rebuild_statements():
+    """Berechnet beide Aggregat-Tabellen vollständig aus der events-Tabelle neu."""
+    names = ", ".join(AGGREGATE_COLUMNS)
+    sums = ", ".join(f"SUM({expr.format(e='events')})" for expr in AGGREGATE_COLUMNS.values())
+    return [
+        "DELETE FROM sales_aggregates",
+        "DELETE FROM sales_aggregate_history",
+        f'''INSERT INTO sales_aggregates (shelf_id, product_type, {names})
+            SELECT shelf_id, product_type, {sums} FROM events
+            GROUP BY shelf_id, product_type''',
+        f'''INSERT INTO sales_aggregate_history (shelf_id, product_type, bucket, {names})
+            SELECT shelf_id, product_type, {_aggregate_bucket("events")}, {sums} FROM events
+            GROUP BY shelf_id, product_type, {_aggregate_bucket("events")}''',
+    ]
+
+# Produkt-Historie (get_product_events_page): Seitengröße und Abstand der Zwischenstände des
+# laufenden Deltas. Ein Zwischenstand hält {Regal: Delta} nach einem Event; eine Seite ab
+# beliebiger Position ersetzt höchstens RUNNING_DELTA_CHECKPOINT_INTERVAL Events nach, statt die
+# ganze Historie. Trigger verwerfen alle Zwischenstände ab einem geänderten Event.
+PRODUCT_EVENTS_PAGE_SIZE = 100
+RUNNING_DELTA_CHECKPOINT_INTERVAL = 200
+
+def _checkpoint_invalidate_sql(e):
+    return f'''
+               DELETE FROM running_delta_checkpoints
+               WHERE product_type = {e}.product_type AND (event_time, event_id) >= ({e}.event_time, {e}.id);'''
+
+# Schema-Migrationen: Eintrag i hebt die Datenbank auf Version i+1 (Stand in PRAGMA user_version)
+SCHEMA_MIGRATIONS = [
+    # Version 1: Indizes für die häufigen Event- und Inventarabfragen
+    [
+        # event_exists, update_event_status, get_unresolved_count, get_sales_data, mark_event_returned
+        '''CREATE INDEX IF NOT EXISTS idx_events_shelf_product_open
+           ON events (shelf_id, product_type, event_type, resolved, event_time, quantity)''',
+        # can_create_new_event, removal_event_exists_by_product
+        '''CREATE INDEX IF NOT EXISTS idx_events_product_type_open
+           ON events (product_type, event_type, resolved)''',
+        # offene misplaced/"not paid" Events je Produkt (yolo_monitor), Produktdetails im Dashboard
+        '''CREATE INDEX IF NOT EXISTS idx_events_product_status
+           ON events (product_type, status, resolved, event_time)''',
+        # get_active_removal_event_by_object und objektbezogene Suchen
+        '''CREATE INDEX IF NOT EXISTS idx_events_object
+           ON events (object_id, event_type, resolved)''',
+        # Kundendisplay-Poller (neue "not paid" Removals)
+        '''CREATE INDEX IF NOT EXISTS idx_events_type_status_time
+           ON events (event_type, status, event_time)''',
+        # get_unresolved_events_older_than, get_all_events (Sortierung nach Zeit)
+        '''CREATE INDEX IF NOT EXISTS idx_events_time
+           ON events (event_time, resolved)''',
+        # Summe des Bestands je Produkt (can_create_new_event, Kundendisplay)
+        '''CREATE INDEX IF NOT EXISTS idx_inventory_product
+           ON inventory (product_type, current_count)''',
+    ],
+    # Version 2: fortlaufende Änderungsnummer für den inkrementellen Event-Feed (get_events_since).
+    # Trigger vergeben bei jedem INSERT/UPDATE eine neue change_seq, gelöschte Events landen in deleted_events.
+    [
+        "ALTER TABLE events ADD COLUMN change_seq INTEGER DEFAULT 0",
+        '''CREATE TABLE IF NOT EXISTS change_sequence (
+               name TEXT PRIMARY KEY,
+               seq INTEGER NOT NULL,
+               epoch INTEGER NOT NULL
+           )''',
+        '''CREATE TABLE IF NOT EXISTS deleted_events (
+               change_seq INTEGER PRIMARY KEY,
+               event_id INTEGER
+           )''',
+        # Bestehende Events erhalten ihre ID als Startwert
+        "UPDATE events SET change_seq = id",
+        f'''INSERT OR IGNORE INTO change_sequence (name, seq, epoch)
+            VALUES ('events', (SELECT COALESCE(MAX(id), 0) FROM events), {_EPOCH_SQL})''',
+        '''CREATE TRIGGER IF NOT EXISTS events_change_insert AFTER INSERT ON events
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'events';
+               UPDATE events SET change_seq = (SELECT seq FROM change_sequence WHERE name = 'events')
+               WHERE id = NEW.id;
+           END''',
+        # change_seq selbst steht nicht in der Spaltenliste, sonst würde der Trigger sich selbst auslösen
+        f'''CREATE TRIGGER IF NOT EXISTS events_change_update
+           AFTER UPDATE OF {EVENT_COLUMNS} ON events
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'events';
+               UPDATE events SET change_seq = (SELECT seq FROM change_sequence WHERE name = 'events')
+               WHERE id = NEW.id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS events_change_delete AFTER DELETE ON events
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'events';
+               INSERT INTO deleted_events (change_seq, event_id)
+               SELECT seq, OLD.id FROM change_sequence WHERE name = 'events';
+           END''',
+        # get_events_since
+        "CREATE INDEX IF NOT EXISTS idx_events_change_seq ON events (change_seq)",
+    ],
+    # Version 3: Änderungsnummer auch für das Inventar, damit change_feed Schreibzugriffe
+    # anderer Prozesse mit einer einzigen Abfrage auf change_sequence erkennt
+    [
+        f'''INSERT OR IGNORE INTO change_sequence (name, seq, epoch)
+            VALUES ('inventory', 0, {_EPOCH_SQL})''',
+        '''CREATE TRIGGER IF NOT EXISTS inventory_change_insert AFTER INSERT ON inventory
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'inventory';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS inventory_change_update AFTER UPDATE ON inventory
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'inventory';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS inventory_change_delete AFTER DELETE ON inventory
+           BEGIN
+               UPDATE change_sequence SET seq = seq + 1 WHERE name = 'inventory';
+           END''',
+    ],
+    # Version 4: get_sales_summary - gruppiert direkt aus dem Index, ohne Tabellenzugriff und Sortierung
+    [
+        '''CREATE INDEX IF NOT EXISTS idx_events_sales
+           ON events (event_type, shelf_id, product_type, status, quantity)''',
+    ],
+    # Version 5: materialisierte Kennzahlen (siehe AGGREGATE_COLUMNS), aus den vorhandenen Events befüllt
+    [
+        '''CREATE TABLE IF NOT EXISTS sales_aggregates (
+               shelf_id INTEGER,
+               product_type TEXT,
+               sold INTEGER NOT NULL DEFAULT 0,
+               unpaid INTEGER NOT NULL DEFAULT 0,
+               misplaced INTEGER NOT NULL DEFAULT 0,
+               returned INTEGER NOT NULL DEFAULT 0,
+               delta INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (shelf_id, product_type)
+           )''',
+        '''CREATE TABLE IF NOT EXISTS sales_aggregate_history (
+               shelf_id INTEGER,
+               product_type TEXT,
+               bucket INTEGER,
+               sold INTEGER NOT NULL DEFAULT 0,
+               unpaid INTEGER NOT NULL DEFAULT 0,
+               misplaced INTEGER NOT NULL DEFAULT 0,
+               returned INTEGER NOT NULL DEFAULT 0,
+               delta INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (shelf_id, product_type, bucket)
+           )''',
+        # get_aggregate_history je Produkt über alle Regale
+        '''CREATE INDEX IF NOT EXISTS idx_aggregate_history_product
+           ON sales_aggregate_history (product_type, bucket)''',
+        *_drop_aggregate_trigger_statements(),
+        *_aggregate_trigger_statements(),
+        *_aggregate_rebuild_statements(),
+    ],
+    # Version 6: Produkt-Historie mit Keyset-Pagination und Zwischenständen des laufenden Deltas
+    [
+        # get_product_events_page (rowid = id ist im Index enthalten)
+        "CREATE INDEX IF NOT EXISTS idx_events_product_time ON events (product_type, event_time)",
+        '''CREATE TABLE IF NOT EXISTS running_delta_checkpoints (
+               product_type TEXT,
+               event_time INTEGER,
+               event_id INTEGER,
+               deltas TEXT NOT NULL,
+               PRIMARY KEY (product_type, event_time, event_id)
+           )''',
+        f'''CREATE TRIGGER IF NOT EXISTS events_checkpoint_insert AFTER INSERT ON events
+           BEGIN{_checkpoint_invalidate_sql("NEW")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS events_checkpoint_update
+           AFTER UPDATE OF shelf_id, product_type, event_type, event_time, status, quantity ON events
+           BEGIN{_checkpoint_invalidate_sql("OLD")}{_checkpoint_invalidate_sql("NEW")}
+           END''',
+        f'''CREATE TRIGGER IF NOT EXISTS events_checkpoint_delete AFTER DELETE ON events
+           BEGIN{_checkpoint_invalidate_sql("OLD")}
+           END''',
+    ],
+]
+
+# Häufige Abfragen: die Funktionen unten und HOT_QUERIES verwenden dieselben SQL-Texte,
+# damit die Prüfung per EXPLAIN QUERY PLAN genau die ausgeführten Abfragen abdeckt
+EVENT_EXISTS_SQL = '''
+    SELECT id FROM events
+    WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
+    LIMIT 1
+'''
+OLDEST_OPEN_EVENT_SQL = '''
+    SELECT id FROM events
+    WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
+    ORDER BY event_time ASC
+    LIMIT 1
+'''
+UNRESOLVED_COUNT_SQL = '''
+    SELECT SUM(quantity) FROM events
+    WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
+'''
+SALES_DATA_SQL = '''
+    SELECT sold, unpaid FROM sales_aggregates
+    WHERE shelf_id = ? AND product_type = ?
+'''
+AGGREGATE_HISTORY_SQL = '''
+    SELECT shelf_id, bucket, sold, unpaid, misplaced, returned, delta
+    FROM sales_aggregate_history
+    WHERE product_type = ? AND bucket >= ? AND bucket < ?
+    ORDER BY bucket ASC, shelf_id ASC
+'''
+UNRESOLVED_EVENTS_OLDER_THAN_SQL = f'''
+    SELECT {EVENT_COLUMNS} FROM events
+    WHERE event_time <= ? AND resolved = 0
+    ORDER BY event_time ASC
+'''
+UNRESOLVED_EVENTS_OLDER_THAN_BY_TYPE_SQL = f'''
+    SELECT {EVENT_COLUMNS} FROM events
+    WHERE event_time <= ? AND resolved = 0 AND event_type = ?
+    ORDER BY event_time ASC
+'''
+REMOVAL_EVENT_BY_PRODUCT_SQL = '''
+    SELECT id FROM events
+    WHERE product_type = ? AND event_type = "removal" AND resolved = 0
+    LIMIT 1
+'''
+ACTIVE_REMOVAL_EVENT_BY_OBJECT_SQL = '''
+    SELECT id, shelf_id, product_type FROM events
+    WHERE object_id = ? AND event_type = "removal" AND resolved = 0
+    LIMIT 1
+'''
+# shelf_monitor.can_create_new_event
+OPEN_EVENT_COUNT_SQL = '''
+    SELECT COUNT(*) FROM events
+    WHERE product_type = ? AND event_type = ? AND resolved = 0
+'''
+# shelf_monitor.can_create_new_event, customer_dispaly.get_stock_status, increment_inventory_count
+INVENTORY_SUM_BY_PRODUCT_SQL = '''
+    SELECT SUM(current_count) FROM inventory
+    WHERE product_type = ?
+'''
+# shelf_monitor.record_misplaced_resolution
+NOT_PAID_EVENTS_BY_PRODUCT_SQL = '''
+    SELECT id, quantity FROM events
+    WHERE product_type = ? AND status = "not paid" AND resolved = 0
+'''
+# kassensystem: Zahlung eines Events
+EVENT_BY_ID_SQL = "SELECT shelf_id, product_type, quantity FROM events WHERE id = ?"
+EVENTS_SINCE_SQL = f'''
+    SELECT {EVENT_COLUMNS} FROM events
+    WHERE change_seq > ?
+    ORDER BY change_seq ASC
+'''
+DELETED_EVENTS_SINCE_SQL = '''
+    SELECT event_id FROM deleted_events
+    WHERE change_seq > ?
+    ORDER BY change_seq ASC
+'''
+PRODUCT_EVENTS_PAGE_SQL = f'''
+    SELECT {EVENT_COLUMNS} FROM events
+    WHERE product_type = ? AND event_time >= ? AND event_time < ? AND (event_time, id) > (?, ?)
+    ORDER BY event_time ASC, id ASC
+    LIMIT ?
+'''
+RUNNING_DELTA_CHECKPOINT_SQL = '''
+    SELECT event_time, event_id, deltas FROM running_delta_checkpoints
+    WHERE product_type = ? AND (event_time, event_id) < (?, ?)
+    ORDER BY event_time DESC, event_id DESC
+    LIMIT 1
+'''
+
+# Häufige Abfragen mit Beispielparametern für die Prüfung per EXPLAIN QUERY PLAN
+HOT_QUERIES = {
+    "event_exists": (EVENT_EXISTS_SQL, (0, "cup", "removal")),
+    "update_event_status": (OLDEST_OPEN_EVENT_SQL, (0, "cup", "removal")),
+    "get_unresolved_count": (UNRESOLVED_COUNT_SQL, (0, "cup", "removal")),
+    "get_sales_data": (SALES_DATA_SQL, (0, "cup")),
+    "get_aggregate_history": (AGGREGATE_HISTORY_SQL, ("cup", 0, 1)),
+    "get_unresolved_events_older_than": (UNRESOLVED_EVENTS_OLDER_THAN_SQL, (0,)),
+    "get_unresolved_events_older_than_by_type": (UNRESOLVED_EVENTS_OLDER_THAN_BY_TYPE_SQL, (0, "removal")),
+    "removal_event_exists_by_product": (REMOVAL_EVENT_BY_PRODUCT_SQL, ("cup",)),
+    "get_active_removal_event_by_object": (ACTIVE_REMOVAL_EVENT_BY_OBJECT_SQL, (1,)),
+    "can_create_new_event": (OPEN_EVENT_COUNT_SQL, ("cup", "removal")),
+    "inventory_sum_by_product": (INVENTORY_SUM_BY_PRODUCT_SQL, ("cup",)),
+    "open_events_by_product_status": (NOT_PAID_EVENTS_BY_PRODUCT_SQL, ("cup",)),
+    "kassensystem_event_by_id": (EVENT_BY_ID_SQL, (1,)),
+    "get_events_since": (EVENTS_SINCE_SQL, (0,)),
+    "get_deleted_events_since": (DELETED_EVENTS_SINCE_SQL, (0,)),
+    "get_product_events_page": (PRODUCT_EVENTS_PAGE_SQL, ("cup", 0, 1, 0, 0, 100)),
+    "running_delta_checkpoint": (RUNNING_DELTA_CHECKPOINT_SQL, ("cup", 0, 0)),
+}
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    with transaction() as c:
+        _begin_immediate(c)
+        _create_tables(c)
+    _migrate_schema()
+    log_debug("Datenbank initialisiert.")
+    for name, detail in audit_query_plans():
+        log_debug(f"WARNUNG: Abfrage '{name}' durchsucht die ganze Tabelle: {detail}", "WARNING")
+
+def _begin_immediate(c):
+    """
+    Öffnet die Transaktion sofort mit Schreibsperre. sqlite3 beginnt vor DDL-Anweisungen
+    keine Transaktion, ALTER/CREATE würden sonst einzeln committet.
+    """
+    if not get_connection().in_transaction:
+        c.execute("BEGIN IMMEDIATE")
+
+def _migrate_schema():
+    """
+    Führt alle noch nicht angewendeten Einträge aus SCHEMA_MIGRATIONS aus, jeden zusammen mit
+    seiner user_version in einer eigenen Transaktion. Die Version wird erst unter der Schreibsperre
+    gelesen, damit gleichzeitig startende Prozesse eine Migration nicht doppelt ausführen.
+    """
+    while True:
+        with transaction() as c:
+            _begin_immediate(c)
+            c.execute("PRAGMA user_version")
+            target = c.fetchone()[0] + 1
+            if target > len(SCHEMA_MIGRATIONS):
+                return
+            for statement in SCHEMA_MIGRATIONS[target - 1]:
+                c.execute(statement)
+            c.execute(f"PRAGMA user_version = {target}")
+        log_debug(f"Datenbankschema auf Version {target} migriert.")
+
+def audit_query_plans(raise_on_scan=False):
+    """
+    Prüft alle HOT_QUERIES per EXPLAIN QUERY PLAN.
+    Liefert eine Liste (Name, Plan-Zeile) aller Abfragen, die eine Tabelle vollständig durchsuchen.
+    Mit raise_on_scan=True wird stattdessen ein RuntimeError geworfen.
+    """
+    c = get_connection().cursor()
+    full_scans = []
+    for name, (query, params) in HOT_QUERIES.items():
+        c.execute("EXPLAIN QUERY PLAN " + query, params)
+        for row in c.fetchall():
+            detail = row[-1]
+            # "SCAN events" bzw. "SCAN TABLE events" (ältere SQLite-Versionen) = Full Table Scan;
+            # ein Durchlauf über einen Index ("USING ... INDEX") ist für Sortierungen erlaubt
+            if detail.startswith("SCAN") and "INDEX" not in detail:
+                full_scans.append((name, detail))
+    if full_scans and raise_on_scan:
+        details = ", ".join(f"{name}: {detail}" for name, detail in full_scans)
+        raise RuntimeError(f"Full Table Scan in häufigen Abfragen: {details}")
+    return full_scans
+
+def _create_tables(c):
     # Tabelle "events" mit zusätzlichem Feld "object_id" für bessere Objektverfolgung
     c.execute('''
         CREATE TABLE IF NOT EXISTS events (
@@ -66,24 +541,14 @@ def init_db():
             PRIMARY KEY (shelf_id, product_type)
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    log_debug("Datenbank initialisiert.")
 
 def event_exists(shelf_id, product_type, event_type):
     """
     Prüft, ob bereits ein offener (nicht resolved) Eintrag für die gegebene Kombination existiert.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT id FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
-        LIMIT 1
-    ''', (shelf_id, product_type, event_type))
+    c = get_connection().cursor()
+    c.execute(EVENT_EXISTS_SQL, (shelf_id, product_type, event_type))
     exists = c.fetchone() is not None
-    conn.close()
     return exists
 
 def update_event_status(shelf_id, product_type, new_status, event_type="removal"):
@@ -92,67 +557,51 @@ def update_event_status(shelf_id, product_type, new_status, event_type="removal"
     Es wird der älteste offene Eintrag für die Kombination (shelf_id, product_type, event_type) aktualisiert.
     """
     resolution_time = int(time.time())
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT id FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
-        ORDER BY event_time ASC
-        LIMIT 1
-    ''', (shelf_id, product_type, event_type))
-    row = c.fetchone()
-    if row:
-        event_id = row[0]
-        c.execute('''
-            UPDATE events
-            SET status = ?, resolution_time = ?
-            WHERE id = ?
-        ''', (new_status, resolution_time, event_id))
-        log_debug(f"update_event_status: Regal {shelf_id+1} {product_type} aktualisiert auf Status = {new_status}.")
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute(OLDEST_OPEN_EVENT_SQL, (shelf_id, product_type, event_type))
+        row = c.fetchone()
+        if row:
+            event_id = row[0]
+            c.execute('''
+                UPDATE events
+                SET status = ?, resolution_time = ?
+                WHERE id = ?
+            ''', (new_status, resolution_time, event_id))
+            log_debug(f"update_event_status: Regal {shelf_id+1} {product_type} aktualisiert auf Status = {new_status}.")
 
 def upsert_event(shelf_id, product_type, event_type, status, quantity_increment=1, object_id=-1):
     """
     Erstellt immer ein neues Event in der Datenbank, anstatt existierende zu aktualisieren.
     """
     now = int(time.time())
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Immer ein neues Event erstellen (kein UPDATE mehr, nur noch INSERT)
-    c.execute('''
-        INSERT INTO events (shelf_id, product_type, event_type, event_time, resolved, status, quantity, object_id)
-        VALUES (?, ?, ?, ?, 0, ?, ?, ?)
-    ''', (shelf_id, product_type, event_type, now, status, quantity_increment, object_id))
-    
-    log_debug(f"upsert_event: Neues Event für Regal {shelf_id+1} {product_type} ({event_type}) angelegt: Menge = {quantity_increment}, Status = {status}, Objekt-ID = {object_id}.")
+    with transaction() as c:
+        
+        # Immer ein neues Event erstellen (kein UPDATE mehr, nur noch INSERT)
+        c.execute('''
+            INSERT INTO events (shelf_id, product_type, event_type, event_time, resolved, status, quantity, object_id)
+            VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+        ''', (shelf_id, product_type, event_type, now, status, quantity_increment, object_id))
+        
+        log_debug(f"upsert_event: Neues Event für Regal {shelf_id+1} {product_type} ({event_type}) angelegt: Menge = {quantity_increment}, Status = {status}, Objekt-ID = {object_id}.")
     
-    conn.commit()
-    conn.close()
     return
 
 
 def update_detected_objects(shelf_id, product_type, count):
     """Aktualisiert die Anzahl der aktuell erkannten Objekte in einem Regal."""
     now = int(time.time())
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        INSERT OR REPLACE INTO detected_objects (shelf_id, product_type, count, last_update)
-        VALUES (?, ?, ?, ?)
-    ''', (shelf_id, product_type, count, now))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''
+            INSERT OR REPLACE INTO detected_objects (shelf_id, product_type, count, last_update)
+            VALUES (?, ?, ?, ?)
+        ''', (shelf_id, product_type, count, now))
     log_debug(f"update_detected_objects: Regal {shelf_id+1} {product_type} aktualisiert auf {count}.")
 
 def get_detected_objects():
     """Liefert die Anzahl der aktuell erkannten Objekte in allen Regalen."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT shelf_id, product_type, count, last_update FROM detected_objects')
     rows = c.fetchall()
-    conn.close()
     return rows
 
 
@@ -164,138 +613,144 @@ def mark_event_returned(shelf_id, product_type, event_type="removal", num_events
       - Mit override_event_type (z. B. "misplacement"): Es wird versucht, einen offenen removal-Eintrag zu finden und ihn auf misplacement zu ändern.
     """
     resolution_time = int(time.time())
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    if override_event_type:
-        # Suche zuerst einen offenen removal-Eintrag
+    with transaction() as c:
+        if override_event_type:
+            # Suche zuerst einen offenen removal-Eintrag
+            c.execute('''
+                SELECT id, quantity FROM events
+                WHERE shelf_id = ? AND product_type = ? AND event_type = "removal" AND resolved = 0
+                ORDER BY event_time ASC
+                LIMIT 1
+            ''', (shelf_id, product_type))
+            row = c.fetchone()
+            if row:
+                event_id, quantity = row
+                new_quantity = quantity - num_events
+                if new_quantity <= 0:
+                    c.execute('''
+                        UPDATE events
+                        SET resolved = 1, resolution_time = ?, quantity = 0, status = "misplaced", event_type = ?
+                        WHERE id = ?
+                    ''', (resolution_time, override_event_type, event_id))
+                    log_debug(f"mark_event_returned OVERRIDE: Regal {shelf_id+1} {product_type} von removal auf misplacement aktualisiert (vollständig).")
+                else:
+                    c.execute('''
+                        UPDATE events
+                        SET quantity = ?, resolution_time = ?, status = "not paid"
+                        WHERE id = ?
+                    ''', (new_quantity, resolution_time, event_id))
+                    log_debug(f"mark_event_returned OVERRIDE: Regal {shelf_id+1} {product_type} removal aktualisiert: neue Menge = {new_quantity}.")
+            else:
+                # Suche nach einem offenen misplacement-Eintrag
+                c.execute('''
+                    SELECT id, quantity FROM events
+                    WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
+                    ORDER BY event_time ASC
+                    LIMIT 1
+                ''', (shelf_id, product_type, override_event_type))
+                row = c.fetchone()
+                if row:
+                    event_id, quantity = row
+                    new_quantity = quantity + num_events
+                    c.execute('''
+                        UPDATE events
+                        SET quantity = ?, event_time = ?, status = "misplaced"
+                        WHERE id = ?
+                    ''', (new_quantity, resolution_time, event_id))
+                    log_debug(f"mark_event_returned OVERRIDE: Bestehender misplacement-Eintrag in Regal {shelf_id+1} {product_type} um {num_events} erhöht, neue Menge = {new_quantity}.")
+                else:
+                    c.execute('''
+                        INSERT INTO events (shelf_id, product_type, event_type, event_time, resolved, status, quantity)
+                        VALUES (?, ?, ?, ?, 0, "misplaced", ?)
+                    ''', (shelf_id, product_type, override_event_type, resolution_time, num_events))
+                    log_debug(f"mark_event_returned OVERRIDE: Neuer misplacement-Eintrag in Regal {shelf_id+1} {product_type} angelegt mit Menge = {num_events}.")
+            return
+
+        # Normale Rückführung im richtigen Regal
         c.execute('''
             SELECT id, quantity FROM events
-            WHERE shelf_id = ? AND product_type = ? AND event_type = "removal" AND resolved = 0
+            WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
             ORDER BY event_time ASC
             LIMIT 1
-        ''', (shelf_id, product_type))
+        ''', (shelf_id, product_type, event_type))
         row = c.fetchone()
         if row:
             event_id, quantity = row
             new_quantity = quantity - num_events
             if new_quantity <= 0:
+                final_status = 'returned' if event_type == "removal" else 'zurückgestellt'
                 c.execute('''
                     UPDATE events
-                    SET resolved = 1, resolution_time = ?, quantity = 0, status = "misplaced", event_type = ?
+                    SET resolved = 1, resolution_time = ?, quantity = ?, status = ?
                     WHERE id = ?
-                ''', (resolution_time, override_event_type, event_id))
-                log_debug(f"mark_event_returned OVERRIDE: Regal {shelf_id+1} {product_type} von removal auf misplacement aktualisiert (vollständig).")
+                ''', (resolution_time, quantity, final_status, event_id))  # Behalte ursprüngliche Menge bei
+                log_debug(f"mark_event_returned: Regal {shelf_id+1} {product_type} ({event_type}) vollständig zurückgeführt, Status = {final_status}.")
+                
+                # NEU: Erstelle immer ein Return-Event beim Zurückführen
+                upsert_event(shelf_id, product_type, "return", final_status, quantity_increment=quantity)
+                log_debug(f"mark_event_returned: Neues Return-Event für Regal {shelf_id+1} {product_type} angelegt.")
             else:
+                partial_status = 'not paid' if event_type == "removal" else 'misplaced'
                 c.execute('''
                     UPDATE events
-                    SET quantity = ?, resolution_time = ?, status = "not paid"
-                    WHERE id = ?
-                ''', (new_quantity, resolution_time, event_id))
-                log_debug(f"mark_event_returned OVERRIDE: Regal {shelf_id+1} {product_type} removal aktualisiert: neue Menge = {new_quantity}.")
-        else:
-            # Suche nach einem offenen misplacement-Eintrag
-            c.execute('''
-                SELECT id, quantity FROM events
-                WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
-                ORDER BY event_time ASC
-                LIMIT 1
-            ''', (shelf_id, product_type, override_event_type))
-            row = c.fetchone()
-            if row:
-                event_id, quantity = row
-                new_quantity = quantity + num_events
-                c.execute('''
-                    UPDATE events
-                    SET quantity = ?, event_time = ?, status = "misplaced"
+                    SET quantity = ?, resolution_time = ?, status = ?
                     WHERE id = ?
-                ''', (new_quantity, resolution_time, event_id))
-                log_debug(f"mark_event_returned OVERRIDE: Bestehender misplacement-Eintrag in Regal {shelf_id+1} {product_type} um {num_events} erhöht, neue Menge = {new_quantity}.")
-            else:
-                c.execute('''
-                    INSERT INTO events (shelf_id, product_type, event_type, event_time, resolved, status, quantity)
-                    VALUES (?, ?, ?, ?, 0, "misplaced", ?)
-                ''', (shelf_id, product_type, override_event_type, resolution_time, num_events))
-                log_debug(f"mark_event_returned OVERRIDE: Neuer misplacement-Eintrag in Regal {shelf_id+1} {product_type} angelegt mit Menge = {num_events}.")
-        conn.commit()
-        conn.close()
-        return
-
-    # Normale Rückführung im richtigen Regal
-    c.execute('''
-        SELECT id, quantity FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
-        ORDER BY event_time ASC
-        LIMIT 1
-    ''', (shelf_id, product_type, event_type))
-    row = c.fetchone()
-    if row:
-        event_id, quantity = row
-        new_quantity = quantity - num_events
-        if new_quantity <= 0:
-            final_status = 'returned' if event_type == "removal" else 'zurückgestellt'
-            c.execute('''
-                UPDATE events
-                SET resolved = 1, resolution_time = ?, quantity = ?, status = ?
-                WHERE id = ?
-            ''', (resolution_time, quantity, final_status, event_id))  # Behalte ursprüngliche Menge bei
-            log_debug(f"mark_event_returned: Regal {shelf_id+1} {product_type} ({event_type}) vollständig zurückgeführt, Status = {final_status}.")
-            
-            # NEU: Erstelle immer ein Return-Event beim Zurückführen
-            upsert_event(shelf_id, product_type, "return", final_status, quantity_increment=quantity)
-            log_debug(f"mark_event_returned: Neues Return-Event für Regal {shelf_id+1} {product_type} angelegt.")
-        else:
-            partial_status = 'not paid' if event_type == "removal" else 'misplaced'
-            c.execute('''
-                UPDATE events
-                SET quantity = ?, resolution_time = ?, status = ?
-                WHERE id = ?
-            ''', (new_quantity, resolution_time, partial_status, event_id))
-            
-            # NEU: Erstelle auch bei Teilrückführung ein Return-Event
-            upsert_event(shelf_id, product_type, "return", "partial_" + final_status, quantity_increment=num_events)
-            log_debug(f"mark_event_returned: Neues Return-Event (Teilrückführung) für Regal {shelf_id+1} {product_type} angelegt.")
-            
-            log_debug(f"mark_event_returned: Regal {shelf_id+1} {product_type} ({event_type}) teilweise zurückgeführt, neue Menge = {new_quantity}.")
-    conn.commit()
-    conn.close()
+                ''', (new_quantity, resolution_time, partial_status, event_id))
+                
+                # NEU: Erstelle auch bei Teilrückführung ein Return-Event
+                upsert_event(shelf_id, product_type, "return", "partial_" + final_status, quantity_increment=num_events)
+                log_debug(f"mark_event_returned: Neues Return-Event (Teilrückführung) für Regal {shelf_id+1} {product_type} angelegt.")
+                
+                log_debug(f"mark_event_returned: Regal {shelf_id+1} {product_type} ({event_type}) teilweise zurückgeführt, neue Menge = {new_quantity}.")
 
 def get_all_events():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT * FROM events ORDER BY event_time ASC')
+    c = get_connection().cursor()
+    c.execute(f'SELECT {EVENT_COLUMNS} FROM events ORDER BY event_time ASC')
     rows = c.fetchall()
-    conn.close()
     return rows
 
+def get_change_sequence():
+    """Liefert {Tabelle: (Änderungsnummer, Epoche)} für events und inventory."""
+    c = get_connection().cursor()
+    c.execute("SELECT name, seq, epoch FROM change_sequence")
+    return {name: (seq, epoch) for name, seq, epoch in c.fetchall()}
+
+def get_events_since(cursor=0, epoch=None):
+    """
+    Inkrementeller Event-Feed: liefert nur die Events, die nach der Änderungsnummer cursor
+    angelegt oder geändert wurden, sowie die IDs seitdem gelöschter Events.
+    Passt epoch nicht zum aktuellen Stand (erster Aufruf, Events gelöscht, Datenbank
+    zurückgesetzt), werden alle Events geliefert und full ist True.
+    Rückgabe: dict mit events, deleted, cursor, epoch, full
+    """
+    c = get_connection().cursor()
+    c.execute("SELECT seq, epoch FROM change_sequence WHERE name = 'events'")
+    seq, current_epoch = c.fetchone()
+    full = epoch != current_epoch or cursor > seq
+    if full:
+        cursor = 0
+    c.execute(EVENTS_SINCE_SQL, (cursor,))
+    events = c.fetchall()
+    deleted = []
+    if not full:
+        c.execute(DELETED_EVENTS_SINCE_SQL, (cursor,))
+        deleted = [row[0] for row in c.fetchall()]
+    return {'events': events, 'deleted': deleted, 'cursor': seq, 'epoch': current_epoch, 'full': full}
+
 def get_unresolved_events_older_than(seconds, event_type_filter=None):
     threshold = int(time.time()) - seconds
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = get_connection().cursor()
     if event_type_filter:
-        c.execute('''
-            SELECT * FROM events
-            WHERE event_time <= ? AND resolved = 0 AND event_type = ?
-            ORDER BY event_time ASC
-        ''', (threshold, event_type_filter))
+        c.execute(UNRESOLVED_EVENTS_OLDER_THAN_BY_TYPE_SQL, (threshold, event_type_filter))
     else:
-        c.execute('''
-            SELECT * FROM events
-            WHERE event_time <= ? AND resolved = 0
-            ORDER BY event_time ASC
-        ''', (threshold,))
+        c.execute(UNRESOLVED_EVENTS_OLDER_THAN_SQL, (threshold,))
     rows = c.fetchall()
-    conn.close()
     return rows
 
 def get_unresolved_count(shelf_id, product_type, event_type="removal"):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT SUM(quantity) FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = ? AND resolved = 0
-    ''', (shelf_id, product_type, event_type))
+    c = get_connection().cursor()
+    c.execute(UNRESOLVED_COUNT_SQL, (shelf_id, product_type, event_type))
     result = c.fetchone()[0]
-    conn.close()
     return result if result is not None else 0
 
 def set_initial_inventory(shelf_id, product_type, count):
@@ -309,34 +764,31 @@ def set_initial_inventory(shelf_id, product_type, count):
     
     # Hole die Summe der aktuellen Werte für diesen Produkttyp über alle Regale
     # außer dem aktuellen Regal
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT SUM(current_count) FROM inventory
-        WHERE product_type = ? AND shelf_id != ?
-    ''', (product_type, shelf_id))
-    other_shelves_sum = c.fetchone()[0] or 0
-    
-    # Für alle Produkttypen ein globales Maximum prüfen
-    if product_type in OBJECT_LIMITS:
-        global_max = OBJECT_LIMITS[product_type]  # Maximalwert für diesen Produkttyp
-        if other_shelves_sum >= global_max:
-            # Andere Regale haben bereits die maximale Anzahl, setze dieses auf 0
-            count = 0
-            log_debug(f"set_initial_inventory: Regal {shelf_id+1} {product_type} auf 0 gesetzt, da global bereits {other_shelves_sum}/{global_max} vorhanden.")
-        elif other_shelves_sum + count > global_max:
-            # Reduziere den Count für dieses Regal, um das globale Maximum einzuhalten
-            count = global_max - other_shelves_sum
-            log_debug(f"set_initial_inventory: Regal {shelf_id+1} {product_type} auf {count} begrenzt (global {other_shelves_sum}+{count}={other_shelves_sum+count}/{global_max}).")
-    
-    # Aktualisiere oder erstelle den Eintrag in der Datenbank
-    now = int(time.time())
-    c.execute('''
-        INSERT OR REPLACE INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (shelf_id, product_type, count, count, now))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''
+            SELECT SUM(current_count) FROM inventory
+            WHERE product_type = ? AND shelf_id != ?
+        ''', (product_type, shelf_id))
+        other_shelves_sum = c.fetchone()[0] or 0
+        
+        # Für alle Produkttypen ein globales Maximum prüfen
+        if product_type in OBJECT_LIMITS:
+            global_max = OBJECT_LIMITS[product_type]  # Maximalwert für diesen Produkttyp
+            if other_shelves_sum >= global_max:
+                # Andere Regale haben bereits die maximale Anzahl, setze dieses auf 0
+                count = 0
+                log_debug(f"set_initial_inventory: Regal {shelf_id+1} {product_type} auf 0 gesetzt, da global bereits {other_shelves_sum}/{global_max} vorhanden.")
+            elif other_shelves_sum + count > global_max:
+                # Reduziere den Count für dieses Regal, um das globale Maximum einzuhalten
+                count = global_max - other_shelves_sum
+                log_debug(f"set_initial_inventory: Regal {shelf_id+1} {product_type} auf {count} begrenzt (global {other_shelves_sum}+{count}={other_shelves_sum+count}/{global_max}).")
+        
+        # Aktualisiere oder erstelle den Eintrag in der Datenbank
+        now = int(time.time())
+        c.execute('''
+            INSERT OR REPLACE INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (shelf_id, product_type, count, count, now))
     
     log_debug(f"set_initial_inventory: Regal {shelf_id+1} {product_type} initial auf {count} gesetzt.")
     return count  # Gib den tatsächlich gesetzten Wert zurück
@@ -352,132 +804,260 @@ def update_inventory(shelf_id, product_type, new_count):
     if product_type in OBJECT_LIMITS:
         global_max = OBJECT_LIMITS[product_type]  # Maximalwert für diesen Produkttyp
         
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        
-        # Hole aktuellen Wert für dieses Regal
-        c.execute('''
-            SELECT current_count FROM inventory
-            WHERE shelf_id = ? AND product_type = ?
-        ''', (shelf_id, product_type))
-        current_count = c.fetchone()
-        current_count = current_count[0] if current_count else 0
-        
-        # Berechne Differenz zum neuen Wert
-        diff = new_count - current_count
-        
-        if diff > 0:
-            # Wenn wir erhöhen wollen, prüfe, ob das global möglich ist
+        with transaction() as c:
+            
+            # Hole aktuellen Wert für dieses Regal
             c.execute('''
-                SELECT SUM(current_count) FROM inventory
-                WHERE product_type = ? AND shelf_id != ?
-            ''', (product_type, shelf_id))
-            other_shelves_sum = c.fetchone()[0] or 0
+                SELECT current_count FROM inventory
+                WHERE shelf_id = ? AND product_type = ?
+            ''', (shelf_id, product_type))
+            current_count = c.fetchone()
+            current_count = current_count[0] if current_count else 0
             
-            if other_shelves_sum + new_count > global_max:
-                # Begrenze den neuen Wert
-                new_count = max(0, global_max - other_shelves_sum)
-                log_debug(f"update_inventory: Regal {shelf_id+1} {product_type} auf {new_count} begrenzt (global max {global_max}).")
-        
-        now = int(time.time())
-        c.execute('''
-            UPDATE inventory
-            SET current_count = ?, last_update = ?
-            WHERE shelf_id = ? AND product_type = ?
-        ''', (new_count, now, shelf_id, product_type))
-        
-        # Wenn noch kein Eintrag existiert, erstelle einen neuen
-        if c.rowcount == 0:
+            # Berechne Differenz zum neuen Wert
+            diff = new_count - current_count
+            
+            if diff > 0:
+                # Wenn wir erhöhen wollen, prüfe, ob das global möglich ist
+                c.execute('''
+                    SELECT SUM(current_count) FROM inventory
+                    WHERE product_type = ? AND shelf_id != ?
+                ''', (product_type, shelf_id))
+                other_shelves_sum = c.fetchone()[0] or 0
+                
+                if other_shelves_sum + new_count > global_max:
+                    # Begrenze den neuen Wert
+                    new_count = max(0, global_max - other_shelves_sum)
+                    log_debug(f"update_inventory: Regal {shelf_id+1} {product_type} auf {new_count} begrenzt (global max {global_max}).")
+            
+            now = int(time.time())
             c.execute('''
-                INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (shelf_id, product_type, new_count, new_count, now))
-            log_debug(f"update_inventory: Neuer Inventareintrag für Regal {shelf_id+1} {product_type} erstellt mit {new_count}.")
-        
-        conn.commit()
-        conn.close()
+                UPDATE inventory
+                SET current_count = ?, last_update = ?
+                WHERE shelf_id = ? AND product_type = ?
+            ''', (new_count, now, shelf_id, product_type))
+            
+            # Wenn noch kein Eintrag existiert, erstelle einen neuen
+            if c.rowcount == 0:
+                c.execute('''
+                    INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (shelf_id, product_type, new_count, new_count, now))
+                log_debug(f"update_inventory: Neuer Inventareintrag für Regal {shelf_id+1} {product_type} erstellt mit {new_count}.")
+            
     else:
         # Für andere Produkttypen ohne globale Begrenzung
         now = int(time.time())
-        conn = sqlite3.connect(DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            UPDATE inventory
-            SET current_count = ?, last_update = ?
-            WHERE shelf_id = ? AND product_type = ?
-        ''', (new_count, now, shelf_id, product_type))
-        
-        # Wenn noch kein Eintrag existiert, erstelle einen neuen
-        if c.rowcount == 0:
+        with transaction() as c:
             c.execute('''
-                INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (shelf_id, product_type, new_count, new_count, now))
-            log_debug(f"update_inventory: Neuer Inventareintrag für Regal {shelf_id+1} {product_type} erstellt mit {new_count}.")
+                UPDATE inventory
+                SET current_count = ?, last_update = ?
+                WHERE shelf_id = ? AND product_type = ?
+            ''', (new_count, now, shelf_id, product_type))
+            
+            # Wenn noch kein Eintrag existiert, erstelle einen neuen
+            if c.rowcount == 0:
+                c.execute('''
+                    INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (shelf_id, product_type, new_count, new_count, now))
+                log_debug(f"update_inventory: Neuer Inventareintrag für Regal {shelf_id+1} {product_type} erstellt mit {new_count}.")
+            
         
-        conn.commit()
-        conn.close()
-    
     log_debug(f"update_inventory: Regal {shelf_id+1} {product_type} aktualisiert auf {new_count}.")
 
 def increment_initial_inventory(shelf_id, product_type, diff):
     """Erhöht den initialen Bestand in der Inventartabelle um 'diff'."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        UPDATE inventory
-        SET initial_count = initial_count + ?
-        WHERE shelf_id = ? AND product_type = ?
-    ''', (diff, shelf_id, product_type))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''
+            UPDATE inventory
+            SET initial_count = initial_count + ?
+            WHERE shelf_id = ? AND product_type = ?
+        ''', (diff, shelf_id, product_type))
     log_debug(f"increment_initial_inventory: Regal {shelf_id+1} {product_type} initial um {diff} erhöht.")
 
 def get_inventory():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT * FROM inventory ORDER BY shelf_id, product_type')
     rows = c.fetchall()
-    conn.close()
     return rows
 
 def get_sales_data(shelf_id, product_type):
-    """Liefert (verkauft, offen) basierend auf removal-Events."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    """Liefert (verkauft, offen) basierend auf removal-Events (aus sales_aggregates)."""
+    c = get_connection().cursor()
+    c.execute(SALES_DATA_SQL, (shelf_id, product_type))
+    row = c.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+def get_sales_summary(with_inventory=False):
+    """
+    Liefert verkauft/offen für alle (Regal, Produkt)-Paare aus sales_aggregates,
+    statt get_sales_data je Paar aufzurufen.
+    Ohne with_inventory: {(shelf_id, product_type): (verkauft, offen)}
+    Mit with_inventory: Zeilen wie get_inventory() plus verkauft und offen
+    (shelf_id, product_type, initial_count, current_count, last_update, sold, unpaid)
+    """
+    c = get_connection().cursor()
+    if not with_inventory:
+        c.execute("SELECT shelf_id, product_type, sold, unpaid FROM sales_aggregates")
+        return {(shelf_id, product_type): (sold, unpaid)
+                for shelf_id, product_type, sold, unpaid in c.fetchall()}
     c.execute('''
-        SELECT SUM(quantity) FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = 'removal' AND status = 'paid'
-    ''', (shelf_id, product_type))
-    sold = c.fetchone()[0] or 0
+        SELECT i.shelf_id, i.product_type, i.initial_count, i.current_count, i.last_update,
+               COALESCE(s.sold, 0), COALESCE(s.unpaid, 0)
+        FROM inventory i
+        LEFT JOIN sales_aggregates s
+            ON s.shelf_id = i.shelf_id AND s.product_type = i.product_type
+        ORDER BY i.shelf_id, i.product_type
+    ''')
+    return c.fetchall()
+
+def get_aggregates(product_type=None):
+    """
+    Liefert die materialisierten Kennzahlen als {(shelf_id, product_type): dict}
+    mit sold, unpaid, misplaced, returned und delta (optional nur für einen Produkttyp).
+    """
+    c = get_connection().cursor()
+    names = ", ".join(AGGREGATE_COLUMNS)
+    if product_type is None:
+        c.execute(f"SELECT shelf_id, product_type, {names} FROM sales_aggregates")
+    else:
+        c.execute(f"SELECT shelf_id, product_type, {names} FROM sales_aggregates WHERE product_type = ?",
+                  (product_type,))
+    return {(row[0], row[1]): dict(zip(AGGREGATE_COLUMNS, row[2:])) for row in c.fetchall()}
+
+def get_aggregate_history(product_type, since=0, until=None):
+    """
+    Liefert die Kennzahlen eines Produkttyps je Zeitfenster (AGGREGATE_BUCKET_SECONDS) und Regal
+    als Liste von (shelf_id, bucket, sold, unpaid, misplaced, returned, delta), aufsteigend nach Zeit.
+    since/until begrenzen den Beginn der Zeitfenster (Unix-Zeit, until exklusiv).
+    """
+    if until is None:
+        until = int(time.time()) + AGGREGATE_BUCKET_SECONDS
+    c = get_connection().cursor()
+    c.execute(AGGREGATE_HISTORY_SQL, (product_type, since, until))
+    return c.fetchall()
+
+def rebuild_aggregates():
+    """
+    Legt die Aggregat-Trigger neu an und berechnet sales_aggregates und
+    sales_aggregate_history vollständig aus den Events (Backfill, z. B. nach
+    Änderung von AGGREGATE_BUCKET_SECONDS).
+    """
+    with transaction() as c:
+        for statement in (_drop_aggregate_trigger_statements() + _aggregate_trigger_statements()
+                          + _aggregate_rebuild_statements()):
+            c.execute(statement)
+        c.execute("SELECT COUNT(*) FROM sales_aggregate_history")
+        buckets = c.fetchone()[0]
+    log_debug(f"rebuild_aggregates: Kennzahlen neu berechnet ({buckets} Zeitfenster).")
+    return buckets
+
+def advance_running_delta(deltas, shelf_id, event_type, status, quantity):
+    """
+    Schreibt das laufende Delta {Regal: Delta} eines Produkts um ein Event fort:
+    offene Entnahmen ("not paid", "misplaced") erhöhen es, Rückführungen senken es (nicht unter 0).
+    """
+    event_type = (event_type or "").lower()
+    status = (status or "").lower()
+    if event_type == "removal" and status in ("not paid", "misplaced"):
+        deltas[shelf_id] = deltas.get(shelf_id, 0) + quantity
+    elif event_type == "return" and status in ("returned", "zurückgestellt"):
+        deltas[shelf_id] = max(0, deltas.get(shelf_id, 0) - quantity)
+
+def _running_delta_before(c, product_type, key):
+    """
+    Laufendes Delta {Regal: Delta} unmittelbar vor dem Event mit dem Schlüssel key = (event_time, id).
+    Startet beim letzten Zwischenstand davor und legt unterwegs neue Zwischenstände an.
+    """
+    c.execute("SELECT seq FROM change_sequence WHERE name = 'events'")
+    seq = c.fetchone()[0]
+    c.execute(RUNNING_DELTA_CHECKPOINT_SQL, (product_type, key[0], key[1]))
+    row = c.fetchone()
+    if row:
+        start = (row[0], row[1])
+        deltas = {int(shelf_id): delta for shelf_id, delta in json.loads(row[2]).items()}
+    else:
+        start = (-1, -1)
+        deltas = {}
+
     c.execute('''
-        SELECT SUM(quantity) FROM events
-        WHERE shelf_id = ? AND product_type = ? AND event_type = 'removal' AND status = 'not paid'
-    ''', (shelf_id, product_type))
-    unpaid = c.fetchone()[0] or 0
-    conn.close()
-    return sold, unpaid
+        SELECT id, shelf_id, event_type, event_time, status, quantity FROM events
+        WHERE product_type = ? AND (event_time, id) > (?, ?) AND (event_time, id) < (?, ?)
+        ORDER BY event_time ASC, id ASC
+    ''', (product_type, start[0], start[1], key[0], key[1]))
+    checkpoints = []
+    for count, (event_id, shelf_id, event_type, event_time, status, quantity) in enumerate(c.fetchall(), 1):
+        advance_running_delta(deltas, shelf_id, event_type, status, quantity)
+        if count % RUNNING_DELTA_CHECKPOINT_INTERVAL == 0:
+            checkpoints.append((product_type, event_time, event_id, json.dumps(deltas)))
+
+    if checkpoints:
+        try:
+            with transaction() as w:
+                w.executemany('''
+                    INSERT OR REPLACE INTO running_delta_checkpoints (product_type, event_time, event_id, deltas)
+                    VALUES (?, ?, ?, ?)
+                ''', checkpoints)
+                # Wurde während der Nachberechnung ein Event geschrieben, sind die Zwischenstände evtl. veraltet
+                w.execute("SELECT seq FROM change_sequence WHERE name = 'events'")
+                if w.fetchone()[0] != seq:
+                    raise sqlite3.OperationalError("Events während der Nachberechnung geändert")
+        except sqlite3.OperationalError as e:
+            log_debug(f"_running_delta_before: Zwischenstände für {product_type} nicht gespeichert: {e}", "WARNING")
+    return deltas
+
+def get_product_events_page(product_type, since=None, until=None, after=None, limit=PRODUCT_EVENTS_PAGE_SIZE):
+    """
+    Eine Seite der Event-Historie eines Produkts, aufsteigend nach (event_time, id).
+    since/until: Zeitfenster (Unix-Zeit, until exklusiv), after: Schlüssel (event_time, id) des
+    letzten Events der vorherigen Seite (Keyset-Pagination).
+    Rückgabe: dict mit events (Spalten wie EVENT_COLUMNS), deltas_before (laufendes Delta
+    {Regal: Delta} vor dem ersten Event der Seite) und next (Schlüssel für die nächste Seite oder None)
+    """
+    since = -1 if since is None else since
+    until = 2 ** 62 if until is None else until
+    after = (-1, -1) if after is None else after
+    c = get_connection().cursor()
+    c.execute(PRODUCT_EVENTS_PAGE_SQL, (product_type, since, until, after[0], after[1], limit + 1))
+    events = c.fetchall()
+    has_more = len(events) > limit
+    events = events[:limit]
+    deltas = _running_delta_before(c, product_type, (events[0][4], events[0][0])) if events else {}
+    next_key = (events[-1][4], events[-1][0]) if has_more else None
+    return {'events': events, 'deltas_before': deltas, 'next': next_key}
 
 def reset_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DROP TABLE IF EXISTS events")
-    c.execute("DROP TABLE IF EXISTS inventory")
-    c.execute("DROP TABLE IF EXISTS object_tracking")  # VERBESSERUNG: Neue Tabelle ebenfalls zurücksetzen
-    c.execute("DROP TABLE IF EXISTS detected_objects")  # Auch die detected_objects Tabelle zurücksetzen
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("DROP TABLE IF EXISTS events")
+        c.execute("DROP TABLE IF EXISTS inventory")
+        c.execute("DROP TABLE IF EXISTS object_tracking")  # VERBESSERUNG: Neue Tabelle ebenfalls zurücksetzen
+        c.execute("DROP TABLE IF EXISTS detected_objects")  # Auch die detected_objects Tabelle zurücksetzen
+        c.execute("DROP TABLE IF EXISTS change_sequence")  # Neue Epoche für den Event-Feed
+        c.execute("DROP TABLE IF EXISTS deleted_events")
+        c.execute("DROP TABLE IF EXISTS sales_aggregates")
+        c.execute("DROP TABLE IF EXISTS sales_aggregate_history")
+        c.execute("DROP TABLE IF EXISTS running_delta_checkpoints")
+        c.execute("PRAGMA user_version = 0")  # Indizes werden beim erneuten init_db wieder angelegt
     init_db()
     log_debug("reset_db: Datenbank wurde zurückgesetzt.")
 
 def clear_current_events():
     """Löscht alle Einträge in der Events-Tabelle, behält aber die Inventardaten."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute("DELETE FROM events")
-    c.execute("DELETE FROM object_tracking")  # VERBESSERUNG: Auch Objektverfolgung zurücksetzen
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        # Aggregat-Trigger nicht für jede gelöschte Zeile ausführen - die Tabellen werden ohnehin geleert
+        for statement in _drop_aggregate_trigger_statements():
+            c.execute(statement)
+        c.execute("DELETE FROM events")
+        for statement in _aggregate_trigger_statements():
+            c.execute(statement)
+        c.execute("DELETE FROM sales_aggregates")
+        c.execute("DELETE FROM sales_aggregate_history")
+        c.execute("DELETE FROM running_delta_checkpoints")
+        c.execute("DELETE FROM object_tracking")  # VERBESSERUNG: Auch Objektverfolgung zurücksetzen
+        # Clients des Event-Feeds laden über die neue Epoche komplett neu, Löschmarken werden nicht gebraucht
+        c.execute("DELETE FROM deleted_events")
+        c.execute(f"UPDATE change_sequence SET epoch = MAX(epoch + 1, {_EPOCH_SQL}) WHERE name = 'events'")
     log_debug("clear_current_events: Alle Event-Einträge wurden gelöscht.")
 
 def removal_event_exists_by_product(product_type):
@@ -485,15 +1065,9 @@ def removal_event_exists_by_product(product_type):
     Prüft, ob bereits ein offener Removal-Event für den gegebenen Produkttyp existiert,
     unabhängig von der Regalzuordnung.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT id FROM events
-        WHERE product_type = ? AND event_type = "removal" AND resolved = 0
-        LIMIT 1
-    ''', (product_type,))
+    c = get_connection().cursor()
+    c.execute(REMOVAL_EVENT_BY_PRODUCT_SQL, (product_type,))
     exists = c.fetchone() is not None
-    conn.close()
     return exists
 
 # VERBESSERUNG: Neue Funktionen für Objektverfolgung
@@ -502,15 +1076,9 @@ def get_active_removal_event_by_object(object_id):
     Liefert Details zum aktiven Removal-Event des Objekts, falls vorhanden.
     Rückgabewert: (event_id, shelf_id, product_type) oder None
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        SELECT id, shelf_id, product_type FROM events
-        WHERE object_id = ? AND event_type = "removal" AND resolved = 0
-        LIMIT 1
-    ''', (object_id,))
+    c = get_connection().cursor()
+    c.execute(ACTIVE_REMOVAL_EVENT_BY_OBJECT_SQL, (object_id,))
     row = c.fetchone()
-    conn.close()
     return row
 
 def update_object_tracking(object_id, product_type, original_shelf, current_shelf, state, active_event_id=-1):
@@ -518,37 +1086,30 @@ def update_object_tracking(object_id, product_type, original_shelf, current_shel
     Aktualisiert oder erstellt einen Eintrag in der object_tracking Tabelle.
     """
     now = int(time.time())
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        INSERT OR REPLACE INTO object_tracking 
-        (object_id, product_type, original_shelf, current_shelf, state, last_seen, active_event_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (object_id, product_type, original_shelf, current_shelf, state, now, active_event_id))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute('''
+            INSERT OR REPLACE INTO object_tracking 
+            (object_id, product_type, original_shelf, current_shelf, state, last_seen, active_event_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (object_id, product_type, original_shelf, current_shelf, state, now, active_event_id))
 
 def get_object_tracking(object_id):
     """
     Liefert die Tracking-Informationen für ein Objekt.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('SELECT * FROM object_tracking WHERE object_id = ?', (object_id,))
     row = c.fetchone()
-    conn.close()
     return row
 
 def get_inventory_count(shelf_id, product_type):
     """Liefert den aktuellen Bestand für ein Regal und Produkttyp."""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = get_connection().cursor()
     c.execute('''
         SELECT current_count FROM inventory
         WHERE shelf_id = ? AND product_type = ?
     ''', (shelf_id, product_type))
     row = c.fetchone()
-    conn.close()
     return row[0] if row else 0
 
 def increment_inventory_count(shelf_id, product_type, delta):
@@ -556,58 +1117,63 @@ def increment_inventory_count(shelf_id, product_type, delta):
     Erhöht oder verringert den aktuellen Bestand um delta.
     Stellt sicher, dass globale Maximalwerte eingehalten werden.
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    
-    # Hole den aktuellen Bestand für dieses Regal
-    c.execute('''
-        SELECT current_count FROM inventory
-        WHERE shelf_id = ? AND product_type = ?
-    ''', (shelf_id, product_type))
-    
-    row = c.fetchone()
-    current_count = row[0] if row else 0
-    
-    # Wenn wir erhöhen wollen, prüfe globale Grenzen
-    if delta > 0 and product_type in OBJECT_LIMITS:
-        # Hole die Summe aller Regale für diesen Produkttyp
-        c.execute('''
-            SELECT SUM(current_count) FROM inventory
-            WHERE product_type = ?
-        ''', (product_type,))
-        total_count = c.fetchone()[0] or 0
-        
-        global_max = OBJECT_LIMITS[product_type]  # Maximalwert für diesen Produkttyp
-        if total_count >= global_max:
-            log_debug(f"increment_inventory_count: Globales Maximum für {product_type} bereits erreicht ({total_count}/{global_max}). Keine Erhöhung möglich.")
-            conn.close()
-            return False
-        elif total_count + delta > global_max:
-            # Reduziere delta, um das globale Maximum einzuhalten
-            old_delta = delta
-            delta = global_max - total_count
-            log_debug(f"increment_inventory_count: Delta für {product_type} von {old_delta} auf {delta} reduziert (global {total_count}+{delta}={total_count+delta}/{global_max}).")
-    
-    # Berechne den neuen Wert (verhindere negative Werte)
-    new_count = max(0, current_count + delta)
-    
-    # Aktualisiere oder erstelle einen neuen Eintrag
-    now = int(time.time())
-    if row:
+    with transaction() as c:
+        # Hole den aktuellen Bestand für dieses Regal
         c.execute('''
-            UPDATE inventory
-            SET current_count = ?, last_update = ?
+            SELECT current_count FROM inventory
             WHERE shelf_id = ? AND product_type = ?
-        ''', (new_count, now, shelf_id, product_type))
-    else:
-        initial_count = max(0, delta)  # Bei negativem Delta starte mit 0
-        c.execute('''
-            INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (shelf_id, product_type, initial_count, new_count, now))
-    
-    conn.commit()
-    conn.close()
+        ''', (shelf_id, product_type))
+        
+        row = c.fetchone()
+        current_count = row[0] if row else 0
         
+        # Wenn wir erhöhen wollen, prüfe globale Grenzen
+        if delta > 0 and product_type in OBJECT_LIMITS:
+            # Hole die Summe aller Regale für diesen Produkttyp
+            c.execute(INVENTORY_SUM_BY_PRODUCT_SQL, (product_type,))
+            total_count = c.fetchone()[0] or 0
+            
+            global_max = OBJECT_LIMITS[product_type]  # Maximalwert für diesen Produkttyp
+            if total_count >= global_max:
+                log_debug(f"increment_inventory_count: Globales Maximum für {product_type} bereits erreicht ({total_count}/{global_max}). Keine Erhöhung möglich.")
+                return False
+            elif total_count + delta > global_max:
+                # Reduziere delta, um das globale Maximum einzuhalten
+                old_delta = delta
+                delta = global_max - total_count
+                log_debug(f"increment_inventory_count: Delta für {product_type} von {old_delta} auf {delta} reduziert (global {total_count}+{delta}={total_count+delta}/{global_max}).")
+        
+        # Berechne den neuen Wert (verhindere negative Werte)
+        new_count = max(0, current_count + delta)
+        
+        # Aktualisiere oder erstelle einen neuen Eintrag
+        now = int(time.time())
+        if row:
+            c.execute('''
+                UPDATE inventory
+                SET current_count = ?, last_update = ?
+                WHERE shelf_id = ? AND product_type = ?
+            ''', (new_count, now, shelf_id, product_type))
+        else:
+            initial_count = max(0, delta)  # Bei negativem Delta starte mit 0
+            c.execute('''
+                INSERT INTO inventory (shelf_id, product_type, initial_count, current_count, last_update)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (shelf_id, product_type, initial_count, new_count, now))
+    
     log_debug(f"increment_inventory_count: Regal {shelf_id+1} {product_type} Bestand von {current_count} auf {new_count} geändert.")
-    return True
\ No newline at end of file
+    return True
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Wartung der Regal-Datenbank.")
+    parser.add_argument("command", choices=["rebuild-aggregates"],
+                        help="rebuild-aggregates: Kennzahlen vollständig aus den Events neu berechnen")
+    parser.add_argument("--db", default=DB_NAME, help="Pfad zur Datenbank")
+    args = parser.parse_args()
+
+    DB_NAME = args.db
+    init_db()
+    buckets = rebuild_aggregates()
+    print(f"Kennzahlen neu berechnet: {buckets} Zeitfenster in {DB_NAME}")
@@ -1,5 +1,9 @@
-import time
+import atexit
 import os
+import queue
+import sys
+import threading
+import time
 import traceback
 
 # Konfiguration für das Logging
@@ -9,47 +13,150 @@ LOG_FILE = "debug.log" # Dateiname für das Log
 LOG_MAX_SIZE = 10 * 1024 * 1024  # 10 MB maximale Loggröße
 LOG_LEVEL = "DEBUG"   # Mögliche Werte: "DEBUG", "INFO", "WARNING", "ERROR"
 
-def log_debug(message, level="DEBUG"):
+# Asynchrones Logging: log_debug legt die Zeile nur in eine Queue, ein Hintergrund-Thread
+# schreibt gesammelt in Konsole und Datei (Datei bleibt offen, Rotation über mitgezählte Bytes)
+LOG_ASYNC = True
+LOG_FLUSH_INTERVAL = 0.25   # Sekunden zwischen zwei Schreibvorgängen
+LOG_QUEUE_SIZE = 20000      # Höchstzahl wartender Zeilen; darüber wird verworfen statt zu blockieren
+LOG_BATCH_SIZE = 1000       # Höchstzahl Zeilen pro Schreibvorgang
+
+LOG_LEVELS = {"DEBUG": 0, "INFO": 1, "WARNING": 2, "ERROR": 3}
+_min_level = LOG_LEVELS.get(LOG_LEVEL, 0)
+
+def log_enabled(level="DEBUG"):
     """
-    Loggt eine Nachricht mit Zeitstempel.
-    
-    Args:
-        message: Die zu loggende Nachricht
-        level: Log-Level (DEBUG, INFO, WARNING, ERROR)
+    Günstige Vorabprüfung des Log-Levels, z. B. um teure Debug-Ausgaben
+    (f-Strings, Schleifen) im Hot-Path ganz zu überspringen.
     """
-    # Prüfe, ob das gegebene Level geloggt werden soll
-    log_levels = {"DEBUG": 0, "INFO": 1, "WARNING": 2, "ERROR": 3}
-    if log_levels.get(level, 0) < log_levels.get(LOG_LEVEL, 0):
-        return
-    
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    log_message = f"[{timestamp}] [{level}] {message}"
-    
-    # Ausgabe in die Konsole
-    if LOG_TO_CONSOLE:
-        print(log_message)
-    
-    # Ausgabe in Datei
-    if LOG_TO_FILE:
+    return LOG_LEVELS.get(level, 0) >= _min_level
+
+class _LogWriter(threading.Thread):
+    """Hintergrund-Thread, der die Log-Zeilen gesammelt in Konsole und Datei schreibt."""
+
+    def __init__(self):
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.dropped = 0
+        self._file = None
+        self._file_size = 0
+        self._lock = threading.Lock()
+        # Eigene Sperre für den Zähler, damit Produzenten nicht auf Datei-I/O warten
+        self._dropped_lock = threading.Lock()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            time.sleep(LOG_FLUSH_INTERVAL)
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            self.write(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def write(self, entries):
+        """Formatiert und schreibt einen Stapel (Zeitstempel, Level, Nachricht)."""
+        if not entries:
+            return
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        with self._lock:
+            lines = [_format_line(ts, level, message) for ts, level, message in entries]
+            if dropped:
+                lines.append(_format_line(time.time(), "WARNING",
+                                          f"Log-Queue voll: {dropped} Zeilen verworfen"))
+            text = "\n".join(lines) + "\n"
+            if LOG_TO_CONSOLE:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            if LOG_TO_FILE:
+                self._write_file(text)
+
+    def count_dropped(self):
+        """Zählt eine wegen voller Queue verworfene Zeile (aus beliebigen Threads)."""
+        with self._dropped_lock:
+            self.dropped += 1
+
+    def _write_file(self, text):
         try:
-            # Prüfen, ob die Datei zu groß ist
-            if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > LOG_MAX_SIZE:
+            if self._file is None:
+                self._file = open(LOG_FILE, "a", encoding="utf-8")
+                self._file_size = os.path.getsize(LOG_FILE)
+            elif self._file_size > LOG_MAX_SIZE:
                 # Sichere die alte Logdatei
+                self._file.close()
                 if os.path.exists(LOG_FILE + ".old"):
                     os.remove(LOG_FILE + ".old")
                 os.rename(LOG_FILE, LOG_FILE + ".old")
-            
-            # Anhängen an die Logdatei
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(log_message + "\n")
+                self._file = open(LOG_FILE, "a", encoding="utf-8")
+                self._file_size = 0
+            self._file.write(text)
+            self._file.flush()
+            self._file_size += len(text.encode("utf-8"))
         except Exception as e:
+            self._file = None
             if LOG_TO_CONSOLE:
                 print(f"Fehler beim Schreiben ins Logfile: {e}")
 
+def _format_line(timestamp, level, message):
+    return f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}] [{level}] {message}"
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    """Startet den Writer-Thread beim ersten Log-Aufruf."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = _LogWriter()
+                if LOG_ASYNC:
+                    writer.start()
+                    atexit.register(flush_logs)
+                _writer = writer
+    return _writer
+
+def log_debug(message, level="DEBUG"):
+    """
+    Loggt eine Nachricht mit Zeitstempel.
+
+    Args:
+        message: Die zu loggende Nachricht (oder eine Funktion, die sie erst bei Bedarf erzeugt)
+        level: Log-Level (DEBUG, INFO, WARNING, ERROR)
+    """
+    # Prüfe, ob das gegebene Level geloggt werden soll
+    if LOG_LEVELS.get(level, 0) < _min_level:
+        return
+    if callable(message):
+        message = message()
+
+    writer = _get_writer()
+    entry = (time.time(), level, message)
+    if not writer.is_alive():
+        # Synchron schreiben (LOG_ASYNC aus oder Writer-Thread beendet)
+        writer.write([entry])
+        return
+    try:
+        writer.queue.put_nowait(entry)
+    except queue.Full:
+        writer.count_dropped()
+
+def flush_logs(timeout=2.0):
+    """Wartet, bis alle anstehenden Log-Zeilen geschrieben sind (z. B. vor Programmende)."""
+    writer = _writer
+    if writer is None or not writer.is_alive():
+        return
+    deadline = time.time() + timeout
+    while writer.queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.01)
+
 def log_exception(e, message="Eine Ausnahme ist aufgetreten"):
     """
     Loggt eine Exception mit Stacktrace.
-    
+
     Args:
         e: Die Exception
         message: Eine optionale Nachricht
@@ -60,14 +167,15 @@ def log_exception(e, message="Eine Ausnahme ist aufgetreten"):
 def set_log_level(level):
     """
     Setzt das Log-Level.
-    
+
     Args:
         level: Das neue Log-Level ("DEBUG", "INFO", "WARNING", "ERROR")
     """
-    global LOG_LEVEL
+    global LOG_LEVEL, _min_level
     valid_levels = ["DEBUG", "INFO", "WARNING", "ERROR"]
     if level in valid_levels:
         LOG_LEVEL = level
+        _min_level = LOG_LEVELS[level]
         log_debug(f"Log-Level auf {level} gesetzt.")
     else:
-        log_debug(f"Ungültiges Log-Level: {level}. Gültige Werte sind: {', '.join(valid_levels)}", "WARNING")
\ No newline at end of file
+        log_debug(f"Ungültiges Log-Level: {level}. Gültige Werte sind: {', '.join(valid_levels)}", "WARNING")
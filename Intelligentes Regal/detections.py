@@ -0,0 +1,126 @@
+# detections.py
+#
+# Einmalige Dekodierung der YOLO-Ergebnisse pro Frame.
+# Boxen, Konfidenzen und Klassen werden in einer einzigen Übertragung von der GPU geholt
+# und als kompakte NumPy-Arrays an alle Verbraucher (Inventarisierung, SORT, Klassenzuordnung)
+# weitergegeben, statt für jede Box einzeln .cpu().numpy() aufzurufen.
+
+import numpy as np
+
+from sort import iou_batch
+
+
+class FrameDetections:
+    """Alle Detektionen erlaubter Klassen eines Frames als Arrays (Boxen als int, Format [x1, y1, x2, y2])."""
+    __slots__ = ("boxes", "conf", "labels")
+
+    def __init__(self, boxes, conf, labels):
+        self.boxes = boxes
+        self.conf = conf
+        self.labels = labels
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=int), np.zeros(0, dtype=np.float32), np.array([], dtype=object))
+
+    @classmethod
+    def from_results(cls, results, allowed_classes):
+        """
+        Dekodiert results[0].boxes in einem Schritt und behält nur erlaubte Klassen.
+        Die Konfidenzschwelle wird erst von den Verbrauchern per filter()/split() angewendet.
+        """
+        if not results or results[0].boxes is None or len(results[0].boxes) == 0:
+            return cls.empty()
+
+        names = results[0].names
+        # Eine Übertragung für alle Boxen: Spalten x1, y1, x2, y2, (track_id,) conf, cls
+        data = results[0].boxes.data.cpu().numpy()
+        cls_idx = data[:, -1].astype(int)
+
+        allowed_ids = [idx for idx, name in names.items() if name.lower() in allowed_classes]
+        mask = np.isin(cls_idx, allowed_ids)
+
+        labels = np.array([names[idx].lower() for idx in cls_idx[mask]], dtype=object)
+        return cls(data[mask, :4].astype(int), data[mask, -2].astype(np.float32), labels)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Fügt mehrere FrameDetections (z. B. aus einzelnen Kacheln) zusammen."""
+        parts = [p for p in parts if len(p) > 0]
+        if not parts:
+            return cls.empty()
+        return cls(np.concatenate([p.boxes for p in parts]),
+                   np.concatenate([p.conf for p in parts]),
+                   np.concatenate([p.labels for p in parts]))
+
+    def __len__(self):
+        return len(self.conf)
+
+    def shifted(self, dx, dy):
+        """Verschiebt alle Boxen, z. B. von Ausschnitt- in Frame-Koordinaten."""
+        return FrameDetections(self.boxes + np.array([dx, dy, dx, dy], dtype=self.boxes.dtype),
+                               self.conf, self.labels)
+
+    def nms(self, iou_threshold=0.5):
+        """
+        Klassenweise Non-Maximum-Suppression, z. B. für doppelte Erkennungen
+        in den überlappenden Rändern benachbarter Kacheln.
+        """
+        if len(self) < 2:
+            return self
+        iou_matrix = iou_batch(self.boxes, self.boxes)
+        same_class = self.labels[:, None] == self.labels[None, :]
+        suppressed = np.zeros(len(self), dtype=bool)
+        for i in np.argsort(-self.conf):
+            if suppressed[i]:
+                continue
+            overlap = (iou_matrix[i] > iou_threshold) & same_class[i]
+            overlap[i] = False
+            suppressed |= overlap
+        return self.select(~suppressed)
+
+    def select(self, mask):
+        return FrameDetections(self.boxes[mask], self.conf[mask], self.labels[mask])
+
+    def filter(self, min_conf):
+        """Nur Detektionen mit Konfidenz >= min_conf."""
+        return self.select(self.conf >= min_conf)
+
+    def split(self, min_conf):
+        """Teilt in (ausreichend konfidente, niedrig konfidente) Detektionen."""
+        mask = self.conf >= min_conf
+        return self.select(mask), self.select(~mask)
+
+    def centers(self):
+        """Mittelpunkte aller Boxen als Array (N, 2)."""
+        return np.stack([(self.boxes[:, 0] + self.boxes[:, 2]) // 2,
+                         (self.boxes[:, 1] + self.boxes[:, 3]) // 2], axis=1)
+
+    def to_sort_array(self):
+        """Eingabe für Sort.update: Array [[x1, y1, x2, y2, conf], ...]."""
+        return np.column_stack((self.boxes.astype(np.float64), self.conf.astype(np.float64)))
+
+    def classify(self, track_boxes, default, iou_threshold=0.5):
+        """
+        Ordnet jeder Tracker-Box die Klasse mit der höchsten summierten Konfidenz aller
+        Detektionen zu, die sie mit IoU > iou_threshold überlappen (vektorisiert über alle Paare).
+        Tracker ohne passende Detektion erhalten default.
+        """
+        num_tracks = len(track_boxes)
+        if num_tracks == 0:
+            return []
+        if len(self) == 0:
+            return [default] * num_tracks
+
+        iou_matrix = iou_batch(track_boxes, self.boxes)
+        weights = np.where(iou_matrix > iou_threshold, self.conf[None, :], 0.0)
+
+        # Konfidenzen je Klasse aufsummieren: (Tracks x Detektionen) @ (Detektionen x Klassen)
+        class_names, class_idx = np.unique(self.labels.astype(str), return_inverse=True)
+        one_hot = np.zeros((len(self), len(class_names)), dtype=np.float32)
+        one_hot[np.arange(len(self)), class_idx] = 1.0
+        scores = weights @ one_hot
+
+        best = scores.argmax(axis=1)
+        has_match = scores.max(axis=1) > 0
+        return [str(class_names[b]) if matched else default for b, matched in zip(best, has_match)]
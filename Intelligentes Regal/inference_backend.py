@@ -0,0 +1,155 @@
+# inference_backend.py
+#
+# Austauschbare Inferenz-Backends für das YOLO-Modell:
+#   - "pytorch":  das .pt-Modell direkt (GPU, falls vorhanden)
+#   - "onnx":     ONNX Runtime auf der CPU
+#   - "openvino": OpenVINO auf der CPU (Intel)
+# Exportierte Modelle werden im MODEL_CACHE_DIR abgelegt, Schlüssel ist der Hash der
+# .pt-Datei plus imgsz (und INT8). Ein erneuter Start lädt das exportierte Modell direkt.
+# Optional wird INT8 quantisiert; kalibriert wird mit aufgenommenen Regalbildern.
+
+import hashlib
+import os
+import shutil
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from debug_utils import log_debug
+from video_source import list_images
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+MODEL_CACHE_DIR = "model_cache"
+CALIBRATION_MAX_FRAMES = 200   # Höchstzahl Kalibrierbilder für die INT8-Quantisierung
+
+
+def model_file_hash(model_path, length=12):
+    """SHA-256 der Modelldatei (gekürzt), dient als Cache-Schlüssel."""
+    sha = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def cached_model_path(model_path, backend, imgsz, int8=False, cache_dir=MODEL_CACHE_DIR):
+    """Pfad des exportierten Modells im Cache (Datei bei ONNX, Verzeichnis bei OpenVINO)."""
+    base = os.path.splitext(os.path.basename(model_path))[0]
+    key = f"{base}_{model_file_hash(model_path)}_{imgsz}{'_int8' if int8 else ''}"
+    if backend == "onnx":
+        return os.path.join(cache_dir, key + ".onnx")
+    return os.path.join(cache_dir, key + "_openvino_model")
+
+
+def letterbox(image, imgsz):
+    """Skaliert unter Beibehaltung des Seitenverhältnisses und füllt auf imgsz x imgsz auf (wie Ultralytics)."""
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    return cv2.copyMakeBorder(resized, top, imgsz - new_h - top, left, imgsz - new_w - left,
+                              cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+
+def _write_calibration_yaml(calibration_dir, names, cache_dir):
+    """Minimaler Datensatz-Eintrag für die OpenVINO-INT8-Kalibrierung mit Regalbildern."""
+    yaml_path = os.path.join(cache_dir, "calibration.yaml")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write(f"path: {os.path.abspath(calibration_dir)}\n")
+        f.write("train: .\n")
+        f.write("val: .\n")
+        f.write("names:\n")
+        for idx, name in names.items():
+            f.write(f"  {idx}: {name}\n")
+    return yaml_path
+
+
+def _quantize_onnx_int8(fp32_path, int8_path, calibration_dir, imgsz):
+    """Statische INT8-Quantisierung mit ONNX Runtime, kalibriert mit Regalbildern."""
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    frames = list_images(calibration_dir, CALIBRATION_MAX_FRAMES)
+    if not frames:
+        raise ValueError(f"Keine Kalibrierbilder in {calibration_dir} gefunden.")
+
+    class ShelfFrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.files = iter(frames)
+
+        def get_next(self):
+            path = next(self.files, None)
+            if path is None:
+                return None
+            image = letterbox(cv2.imread(path), imgsz)
+            tensor = cv2.cvtColor(image, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            return {input_name: tensor}
+
+    quantize_static(fp32_path, int8_path, ShelfFrameReader(),
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    log_debug(f"ONNX-Modell INT8-quantisiert mit {len(frames)} Regalbildern: {int8_path}")
+
+
+def export_model(model_path, backend, imgsz, int8=False, calibration_dir=None, cache_dir=MODEL_CACHE_DIR):
+    """
+    Exportiert das Modell für das Backend, falls es noch nicht im Cache liegt.
+    Liefert den Pfad des exportierten Modells.
+    """
+    if backend not in ("onnx", "openvino"):
+        raise ValueError(f"Export nur für onnx/openvino möglich, nicht für {backend}")
+    if int8 and not calibration_dir:
+        raise ValueError("Für INT8 wird ein Verzeichnis mit Kalibrierbildern (calibration_dir) benötigt.")
+
+    target = cached_model_path(model_path, backend, imgsz, int8, cache_dir)
+    if os.path.exists(target):
+        log_debug(f"Exportiertes Modell aus dem Cache: {target}")
+        return target
+
+    os.makedirs(cache_dir, exist_ok=True)
+    if backend == "onnx" and int8:
+        # INT8 wird aus dem FP32-Modell im Cache quantisiert (bei Bedarf zuerst exportiert),
+        # damit keine Zwischendatei außerhalb des Caches liegen bleibt
+        fp32_path = export_model(model_path, "onnx", imgsz, cache_dir=cache_dir)
+        log_debug(f"Quantisiere {fp32_path} nach INT8...")
+        _quantize_onnx_int8(fp32_path, target, calibration_dir, imgsz)
+        log_debug(f"Modell exportiert: {target}")
+        return target
+
+    model = YOLO(model_path)
+    log_debug(f"Exportiere {model_path} nach {backend} (imgsz={imgsz}, int8={int8})...")
+
+    if backend == "onnx":
+        # Dynamische Batchgröße, damit Regal-Kacheln gebündelt gerechnet werden können
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        shutil.move(exported, target)
+    else:
+        kwargs = {}
+        if int8:
+            kwargs = {"int8": True, "data": _write_calibration_yaml(calibration_dir, model.names, cache_dir)}
+        exported = model.export(format="openvino", imgsz=imgsz, dynamic=True, **kwargs)
+        shutil.move(exported, target)
+
+    log_debug(f"Modell exportiert: {target}")
+    return target
+
+
+def load_model(model_path, backend="pytorch", imgsz=640, device="cpu", int8=False, calibration_dir=None):
+    """
+    Lädt das YOLO-Modell für das gewählte Backend.
+    Das Ergebnis wird wie ein normales Ultralytics-Modell aufgerufen (model(frame, imgsz=...)).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unbekanntes Inferenz-Backend: {backend} (erlaubt: {', '.join(BACKENDS)})")
+    if backend == "pytorch":
+        model = YOLO(model_path)
+        model.to(device)
+        log_debug(f"Inferenz-Backend: PyTorch auf {device}")
+        return model
+
+    exported = export_model(model_path, backend, imgsz, int8=int8, calibration_dir=calibration_dir)
+    log_debug(f"Inferenz-Backend: {backend}{' INT8' if int8 else ''} ({exported})")
+    return YOLO(exported, task="detect")
@@ -34,34 +34,85 @@ document.addEventListener('DOMContentLoaded', function() {
         modal.show();
     }
     
-    // Update data function
+    // Local list of unpaid items; the server only sends changes since itemsCursor
+    const unpaidById = new Map();
+    let itemsCursor = 0;
+    let itemsEpoch = null;
+    
+    // Merge an unpaid items diff (from /api/events or the SSE stream) into the local list
+    function applyUnpaidDelta(data) {
+        // full: first call or database reset - replace the local list
+        if (data.full) {
+            unpaidById.clear();
+        }
+        data.removed.forEach(eventId => unpaidById.delete(eventId));
+        data.unpaid_items.forEach(item => unpaidById.set(item.event_id, item));
+        itemsCursor = data.cursor;
+        itemsEpoch = data.epoch;
+        
+        // Only rebuild the table when something changed
+        if (data.full || data.removed.length > 0 || data.unpaid_items.length > 0) {
+            const unpaidItems = Array.from(unpaidById.values()).sort((a, b) => a.event_id - b.event_id);
+            updateUnpaidItemsTable(unpaidItems);
+            
+            // Update total sum
+            const totalSum = unpaidItems.reduce((sum, item) => sum + item.total, 0);
+            document.getElementById('total-sum').textContent = totalSum.toFixed(2);
+            
+            // Enable/disable pay all button
+            const payAllBtn = document.getElementById('pay-all-btn');
+            payAllBtn.disabled = unpaidItems.length === 0;
+        }
+    }
+    
+    // Update status indicator
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+        }
+    }
+    
+    // Update data function: fetch the event feed delta (fallback without EventSource, refresh button)
     function updateData() {
-        fetch('/api/data')
+        const params = new URLSearchParams({ since: itemsCursor });
+        if (itemsEpoch !== null) {
+            params.set('epoch', itemsEpoch);
+        }
+        return fetch(`/api/events?${params}`)
             .then(response => response.json())
             .then(data => {
-                updateUnpaidItemsTable(data.unpaid_items);
-                
-                // Update total sum
-                document.getElementById('total-sum').textContent = data.total_sum.toFixed(2);
-                
-                // Enable/disable pay all button
-                const payAllBtn = document.getElementById('pay-all-btn');
-                payAllBtn.disabled = data.unpaid_items.length === 0;
-                
-                // Update last update time
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                applyUnpaidDelta(data);
                 document.getElementById('last-update').textContent = data.last_update;
-                
-                // Update status indicator
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+                setConnected(true);
             })
             .catch(error => {
                 console.error('Error fetching data:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+                setConnected(false);
             });
     }
     
+    // Push updates via Server-Sent Events: the server only sends when events change
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            applyUnpaidDelta(JSON.parse(message.data));
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // The browser reconnects by itself and then receives the full list again
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Function to update the unpaid items table
     function updateUnpaidItemsTable(unpaidItems) {
         const table = document.getElementById('unpaid-items-table');
@@ -251,6 +302,10 @@ document.addEventListener('DOMContentLoaded', function() {
     attachCheckboxListeners();
     updateSelectionCount();
     
-    // Auto-refresh every 3 seconds
-    setInterval(updateData, 3000);
+    if (window.EventSource) {
+        connectStream();
+    } else {
+        // Auto-refresh every 3 seconds without SSE support
+        setInterval(updateData, 3000);
+    }
 });
\ No newline at end of file
@@ -2,8 +2,9 @@ import flask
 from flask import Flask, render_template, jsonify, request, redirect, url_for
 import threading
 import time
-import sqlite3
 import db_utils
+from metrics import instrument_flask_app
+from change_feed import ChangeFeed
 import json
 from datetime import datetime
 import os
@@ -39,6 +40,8 @@ app = Flask(__name__,
             template_folder=TEMPLATES_DIR,
             static_folder=STATIC_DIR)
 app.config['SECRET_KEY'] = 'smart-shelf-web-kassensystem'
+# Antwortzeiten je Endpunkt messen, Kennzahlen unter /metrics
+instrument_flask_app(app, "kassensystem")
 
 # Product friendly names and prices (copied from original kassensystem.py)
 product_names = {
@@ -75,6 +78,53 @@ def sanitize_data(obj):
     else:
         return str(obj)
 
+# Helper function to format a single event row as an unpaid item
+def format_unpaid_item(event):
+    """Returns the display dict for an unpaid removal event, or None for any other event"""
+    # Column order in DB: id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status
+    if len(event) < 8:
+        return None
+    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status = event[:8]
+    
+    # Get quantity if available (newer DB versions)
+    quantity = 1
+    if len(event) > 8:
+        quantity = event[8]
+    
+    if isinstance(product_type, bytes):
+        product_type = product_type.decode('utf-8')
+    
+    if isinstance(event_type, bytes):
+        event_type = event_type.decode('utf-8')
+    
+    if isinstance(status, bytes):
+        status = status.decode('utf-8')
+    
+    # Check if this is an unpaid removal event
+    if event_type != "removal" or status != "not paid" or resolved != 0:
+        return None
+    
+    # Format time
+    time_str = time.strftime("%H:%M:%S", time.localtime(event_time))
+    
+    # Get price
+    price = product_prices.get(product_type, 0.0)
+    total = price * quantity
+    
+    # Get friendly product name
+    product_name = product_names.get(product_type, product_type.capitalize())
+    
+    return {
+        'event_id': event_id,
+        'shelf_id': shelf_id + 1,  # +1 for display
+        'product_type': product_type,
+        'product_name': product_name,
+        'time': time_str,
+        'quantity': quantity,
+        'price': price,
+        'total': total
+    }
+
 # Helper function to get unpaid items from database
 def get_unpaid_items():
     try:
@@ -83,48 +133,9 @@ def get_unpaid_items():
         
         unpaid_items = []
         for event in events:
-            # Check if this is a removal event that's not paid and not resolved
-            # Column order in DB: id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status
-            if len(event) >= 8:
-                event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status = event[:8]
-                
-                # Get quantity if available (newer DB versions)
-                quantity = 1
-                if len(event) > 8:
-                    quantity = event[8]
-                
-                if isinstance(product_type, bytes):
-                    product_type = product_type.decode('utf-8')
-                
-                if isinstance(event_type, bytes):
-                    event_type = event_type.decode('utf-8')
-                
-                if isinstance(status, bytes):
-                    status = status.decode('utf-8')
-                
-                # Check if this is an unpaid removal event
-                if event_type == "removal" and status == "not paid" and resolved == 0:
-                    # Format time
-                    time_str = time.strftime("%H:%M:%S", time.localtime(event_time))
-                    
-                    # Get price
-                    price = product_prices.get(product_type, 0.0)
-                    total = price * quantity
-                    
-                    # Get friendly product name
-                    product_name = product_names.get(product_type, product_type.capitalize())
-                    
-                    # Add to unpaid events
-                    unpaid_items.append({
-                        'event_id': event_id,
-                        'shelf_id': shelf_id + 1,  # +1 for display
-                        'product_type': product_type,
-                        'product_name': product_name,
-                        'time': time_str,
-                        'quantity': quantity,
-                        'price': price,
-                        'total': total
-                    })
+            item = format_unpaid_item(event)
+            if item is not None:
+                unpaid_items.append(item)
         
         return unpaid_items
     except Exception as e:
@@ -137,36 +148,31 @@ def process_payment(event_id):
         # Get event ID
         event_id = int(event_id)
         
-        # Connect to database
-        conn = db_utils.sqlite3.connect(db_utils.DB_NAME)
-        c = conn.cursor()
-        
-        # First get shelf_id and product_type using the event ID
-        c.execute("SELECT shelf_id, product_type, quantity FROM events WHERE id = ?", (event_id,))
-        result = c.fetchone()
+        # Use the shared per-thread database connection
+        with db_utils.transaction() as c:
+            # First get shelf_id and product_type using the event ID
+            c.execute(db_utils.EVENT_BY_ID_SQL, (event_id,))
+            result = c.fetchone()
+            
+            if result:
+                shelf_id, product_type, quantity = result
+                
+                if isinstance(product_type, bytes):
+                    product_type = product_type.decode('utf-8')
+                
+                # Update the event: set status to 'paid' and resolved to 1
+                resolution_time = int(time.time())
+                c.execute('''
+                    UPDATE events
+                    SET status = 'paid', resolved = 1, resolution_time = ?
+                    WHERE id = ?
+                ''', (resolution_time, event_id))
         
         if result:
-            shelf_id, product_type, quantity = result
-            
-            if isinstance(product_type, bytes):
-                product_type = product_type.decode('utf-8')
-            
-            # Update the event: set status to 'paid' and resolved to 1
-            resolution_time = int(time.time())
-            c.execute('''
-                UPDATE events
-                SET status = 'paid', resolved = 1, resolution_time = ?
-                WHERE id = ?
-            ''', (resolution_time, event_id))
-            
-            conn.commit()
-            conn.close()
-            
             logger.info(f"Item paid: {product_names.get(product_type, product_type)}")
             return True, f"Artikel bezahlt: {product_names.get(product_type, product_type)}"
         else:
             # Event not found
-            conn.close()
             error_msg = f"Event mit ID {event_id} nicht gefunden."
             logger.error(error_msg)
             return False, error_msg
@@ -215,6 +221,73 @@ def get_data():
             'error': str(e)
         })
 
+def build_unpaid_delta(feed):
+    """
+    Converts an event diff from db_utils.get_events_since: changed events that are unpaid go
+    to 'unpaid_items', all other changed or deleted events to 'removed'.
+    """
+    unpaid_items = []
+    removed = list(feed['deleted'])
+    for event in feed['events']:
+        item = format_unpaid_item(event)
+        if item is not None:
+            unpaid_items.append(item)
+        else:
+            removed.append(event[0])
+    
+    return {
+        'unpaid_items': unpaid_items,
+        'removed': removed,
+        'cursor': feed['cursor'],
+        'epoch': feed['epoch'],
+        'full': feed['full']
+    }
+
+def stream_snapshot():
+    """Full list of unpaid items for newly connected clients"""
+    return sanitize_data(build_unpaid_delta(db_utils.get_events_since()))
+
+def stream_update(change):
+    """Only event changes matter for the cash register"""
+    if not change.events_changed:
+        return None
+    return sanitize_data(build_unpaid_delta(change.events))
+
+# One change source shared by all open cash register screens of this process
+change_feed = ChangeFeed("kassensystem", stream_snapshot, stream_update)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: unpaid items as diffs, pushed as soon as events change"""
+    change_feed.start()
+    return change_feed.stream()
+
+@app.route('/api/events')
+def get_events_delta():
+    """
+    Incremental feed: only events added or changed since ?since= (change sequence number).
+    Changed events that are unpaid are returned in 'unpaid_items', all other changed or
+    deleted events in 'removed'. With full=true the client replaces its list completely.
+    """
+    try:
+        since = request.args.get('since', 0, type=int)
+        epoch = request.args.get('epoch', None, type=int)
+        response_data = build_unpaid_delta(db_utils.get_events_since(since, epoch))
+        response_data['last_update'] = datetime.now().strftime("%H:%M:%S")
+        
+        return jsonify(sanitize_data(response_data))
+    except Exception as e:
+        logger.error(f"Error in event feed call: {str(e)}")
+        return jsonify({
+            'unpaid_items': [],
+            'removed': [],
+            'cursor': 0,
+            'epoch': None,
+            'full': False,
+            'last_update': datetime.now().strftime("%H:%M:%S"),
+            'error': str(e)
+        }), 500
+
 @app.route('/api/pay', methods=['POST'])
 def pay_items():
     """API endpoint to pay for items"""
@@ -571,34 +644,85 @@ document.addEventListener('DOMContentLoaded', function() {
         modal.show();
     }
     
-    // Update data function
+    // Local list of unpaid items; the server only sends changes since itemsCursor
+    const unpaidById = new Map();
+    let itemsCursor = 0;
+    let itemsEpoch = null;
+    
+    // Merge an unpaid items diff (from /api/events or the SSE stream) into the local list
+    function applyUnpaidDelta(data) {
+        // full: first call or database reset - replace the local list
+        if (data.full) {
+            unpaidById.clear();
+        }
+        data.removed.forEach(eventId => unpaidById.delete(eventId));
+        data.unpaid_items.forEach(item => unpaidById.set(item.event_id, item));
+        itemsCursor = data.cursor;
+        itemsEpoch = data.epoch;
+        
+        // Only rebuild the table when something changed
+        if (data.full || data.removed.length > 0 || data.unpaid_items.length > 0) {
+            const unpaidItems = Array.from(unpaidById.values()).sort((a, b) => a.event_id - b.event_id);
+            updateUnpaidItemsTable(unpaidItems);
+            
+            // Update total sum
+            const totalSum = unpaidItems.reduce((sum, item) => sum + item.total, 0);
+            document.getElementById('total-sum').textContent = totalSum.toFixed(2);
+            
+            // Enable/disable pay all button
+            const payAllBtn = document.getElementById('pay-all-btn');
+            payAllBtn.disabled = unpaidItems.length === 0;
+        }
+    }
+    
+    // Update status indicator
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+        }
+    }
+    
+    // Update data function: fetch the event feed delta (fallback without EventSource, refresh button)
     function updateData() {
-        fetch('/api/data')
+        const params = new URLSearchParams({ since: itemsCursor });
+        if (itemsEpoch !== null) {
+            params.set('epoch', itemsEpoch);
+        }
+        return fetch(`/api/events?${params}`)
             .then(response => response.json())
             .then(data => {
-                updateUnpaidItemsTable(data.unpaid_items);
-                
-                // Update total sum
-                document.getElementById('total-sum').textContent = data.total_sum.toFixed(2);
-                
-                // Enable/disable pay all button
-                const payAllBtn = document.getElementById('pay-all-btn');
-                payAllBtn.disabled = data.unpaid_items.length === 0;
-                
-                // Update last update time
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                applyUnpaidDelta(data);
                 document.getElementById('last-update').textContent = data.last_update;
-                
-                // Update status indicator
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+                setConnected(true);
             })
             .catch(error => {
                 console.error('Error fetching data:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+                setConnected(false);
             });
     }
     
+    // Push updates via Server-Sent Events: the server only sends when events change
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            applyUnpaidDelta(JSON.parse(message.data));
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // The browser reconnects by itself and then receives the full list again
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Function to update the unpaid items table
     function updateUnpaidItemsTable(unpaidItems) {
         const table = document.getElementById('unpaid-items-table');
@@ -788,8 +912,12 @@ document.addEventListener('DOMContentLoaded', function() {
     attachCheckboxListeners();
     updateSelectionCount();
     
-    // Auto-refresh every 3 seconds
-    setInterval(updateData, 3000);
+    if (window.EventSource) {
+        connectStream();
+    } else {
+        // Auto-refresh every 3 seconds without SSE support
+        setInterval(updateData, 3000);
+    }
 });"""
 
     # Write files
@@ -0,0 +1,386 @@
+# metrics.py
+#
+# Leichtgewichtige Kennzahlen (Counter, Gauge, Histogramm) für Monitor und Web-Apps.
+# Alle Metriken liegen in einer Registry und werden im Prometheus-Textformat ausgegeben:
+#   - Monitor: eigener HTTP-Server (MetricsServer) auf METRICS_PORT, Pfad /metrics; standardmäßig nur
+#     lokal erreichbar (METRICS_HOST), für andere Rechner muss der Host ausdrücklich gesetzt werden
+#   - Flask-Apps: Route /metrics auf dem jeweiligen App-Port (instrument_flask_app)
+# Die Histogramme erlauben zusätzlich eine grobe Quantil-Schätzung (p50/p99) für das Debug-Log.
+
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from debug_utils import log_debug
+
+METRICS_PORT = 9108
+METRICS_HOST = "127.0.0.1"
+# Bucket-Grenzen in Sekunden, passend für Frame-Stufen und DB-Schreibzeiten
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Gemeinsame Basis: Name, Hilfetext, Label-Namen und ein Kind-Objekt je Label-Kombination."""
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        """Kind-Metrik für die Label-Werte (in der Reihenfolge der labelnames)."""
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: erwartet Labels {self.labelnames}, erhalten {values}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        """Kind ohne Labels (nur für Metriken ohne labelnames)."""
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """Zeilen im Textformat (ohne HELP/TYPE)."""
+        with self._lock:
+            children = list(self._children.items())
+        lines = []
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}_total{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monoton steigender Zähler."""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, function):
+        """Wert wird erst beim Abruf berechnet (z. B. Queue-Tiefe)."""
+        self.function = function
+
+    def samples(self, name, labelnames, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                log_debug(f"Metrik {name}: Fehler beim Abruf: {e}", "WARNING")
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """Momentanwert, direkt gesetzt oder beim Abruf berechnet."""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # letzter Eintrag: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Misst die Dauer des with-Blocks in Sekunden."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q):
+        """Schätzt das Quantil q (0..1) per linearer Interpolation innerhalb des Buckets."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            if cumulative + count >= rank and count > 0:
+                if bound == float("inf"):
+                    return lower
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return lower
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total, sum_ = list(self.counts), self.count, self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = ("le", _format_value(bound) if bound == float("inf") else repr(bound))
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {_format_value(sum_)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {total}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Verteilung von Messwerten (z. B. Latenzen) in festen Buckets."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    """Sammlung aller Metriken eines Prozesses."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metrik {name} ist bereits als {metric.kind} registriert")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames=labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames=labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
+
+    def render(self):
+        """Alle Metriken im Prometheus-Textformat (Version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Gemeinsame Metriken des Monitors
+STAGE_SECONDS = REGISTRY.histogram(
+    "regal_stage_seconds", "Bearbeitungszeit je Frame und Verarbeitungsstufe", ("stage",))
+FRAME_LATENCY_SECONDS = REGISTRY.histogram(
+    "regal_frame_latency_seconds", "Zeit von der Aufnahme bis zum Ende der Frame-Verarbeitung")
+FRAMES = REGISTRY.counter("regal_frames", "Verarbeitete Frames", ("inferred",))
+DB_WRITE_SECONDS = REGISTRY.histogram("regal_db_write_seconds", "Dauer eines Journal-Flushs in die Datenbank")
+DB_OPS = REGISTRY.counter("regal_db_ops", "An das DB-Journal übergebene Schreiboperationen", ("op",))
+
+
+class FrameStageTimer:
+    """
+    Summiert die Zeiten einzelner Stufen über ein Frame (z. B. Re-ID für mehrere Objekte)
+    und trägt sie am Frame-Ende einmal je Stufe in das Histogramm ein.
+    """
+
+    def __init__(self, histogram=STAGE_SECONDS):
+        self.histogram = histogram
+        self.totals = {}
+
+    @contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+
+    def mark(self):
+        """Startpunkt für add_remainder(): aktuelle Zeit und bisherige Summen."""
+        return time.perf_counter(), dict(self.totals)
+
+    def add_remainder(self, stage, mark):
+        """Bucht die seit mark vergangene Zeit abzüglich der inzwischen gemessenen Stufen auf stage."""
+        start, before = mark
+        measured = sum(total - before.get(name, 0.0) for name, total in self.totals.items())
+        self.add(stage, max(0.0, time.perf_counter() - start - measured))
+
+    def finish(self):
+        """Überträgt die Summen des Frames ins Histogramm und setzt sie zurück."""
+        for stage, seconds in self.totals.items():
+            self.histogram.labels(stage).observe(seconds)
+        self.totals = {}
+
+
+def log_latency_summary():
+    """Schreibt p50/p99 je Stufe und der Frame-Latenz ins Debug-Log."""
+    log_debug("=== LATENZEN (p50 / p99) ===")
+    latency = FRAME_LATENCY_SECONDS.labels()
+    log_debug(f"  Frame gesamt: {latency.quantile(0.5) * 1000:.1f} / {latency.quantile(0.99) * 1000:.1f} ms")
+    for (stage,), child in sorted(STAGE_SECONDS._children.items()):
+        log_debug(f"  {stage}: {child.quantile(0.5) * 1000:.1f} / {child.quantile(0.99) * 1000:.1f} ms")
+    db = DB_WRITE_SECONDS.labels()
+    if db.count:
+        log_debug(f"  DB-Flush: {db.quantile(0.5) * 1000:.1f} / {db.quantile(0.99) * 1000:.1f} ms")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass   # Kein Zugriffslog pro Scrape
+
+
+class MetricsServer:
+    """HTTP-Endpunkt /metrics für Prozesse ohne Web-Framework (z. B. den Monitor)."""
+
+    def __init__(self, port=METRICS_PORT, host=METRICS_HOST, registry=REGISTRY):
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.host = host
+        self.port = port
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        thread.start()
+        log_debug(f"Metriken verfügbar unter http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def instrument_flask_app(app, app_name, registry=REGISTRY):
+    """
+    Misst die Antwortzeit jeder Anfrage einer Flask-App und stellt /metrics bereit.
+    Gemessen wird je Endpunkt (Routenname, nicht URL), damit die Label-Anzahl begrenzt bleibt.
+    """
+    from flask import Response, g, request
+
+    request_seconds = registry.histogram(
+        "regal_http_request_seconds", "Antwortzeit der Web-Anfragen", ("app", "endpoint", "method", "status"))
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = getattr(g, "metrics_start", None)
+        if start is not None and request.endpoint != "metrics":
+            request_seconds.labels(app_name, request.endpoint or "unbekannt", request.method,
+                                   response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return app
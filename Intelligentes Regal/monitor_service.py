@@ -0,0 +1,238 @@
+# monitor_service.py
+#
+# Überwachungsdienst für mehrere Kameras und Regale in einem Prozess (headless).
+# Jede Kamera hat eigene ROI-Konfiguration, eigenen SORT-Tracker und eigenen Zustand
+# (shelf_monitor.ShelfMonitor); das YOLO-Modell wird nur einmal geladen und rechnet die
+# Frames aller Kameras gebündelt in einem Aufruf (pipeline.MultiCameraPipeline).
+# Alle Kameras schreiben über ein gemeinsames WriteBehindJournal in dieselbe Datenbank;
+# shelf_offset verschiebt die Regalnummern einer Kamera, damit sie eindeutig bleiben.
+# products ordnet Produkte den lokalen Regalnummern der Kamera zu (Standard: PRODUCT_SHELF_MAPPING);
+# jedes Regal einer Kamera braucht ein Produkt.
+#
+# cameras.json:
+#   {"cameras": [
+#       {"name": "links",  "source": 0, "config": "regal_links.json"},
+#       {"name": "rechts", "source": 1, "config": "regal_rechts.json", "shelf_offset": 4, "rotate": false,
+#        "products": {"cup": 0, "book": 1}}
+#   ]}
+#
+# Aufruf: python monitor_service.py [--cameras cameras.json] [--db supermarkt.db] [--no-preview]
+
+import argparse
+import json
+import time
+
+import cv2
+import torch
+
+import db_utils
+import metrics
+from db_journal import WriteBehindJournal
+from debug_utils import log_debug
+from inference_backend import BACKENDS, load_model
+from motion_gate import InferenceScheduler, MotionDetector
+from object_signature import SIGNATURE_TYPES
+from pipeline import MultiCameraPipeline
+from preview_server import PREVIEW_PORT, PreviewServer
+from replay_report import ReplayReport
+from roi_inference import INFERENCE_IMGSZ, INFERENCE_MODE, INFERENCE_ROI_MARGIN, ShelfDetector
+from shelf_monitor import (ALLOWED_CLASSES, OBJECT_LIMITS, ShelfMonitor, camera_products, consume_refresh_signal,
+                           shelf_layout)
+from video_source import open_video_source
+
+CAMERAS_FILE = "cameras.json"
+MODEL_PATH = "yolov8s.pt"
+INFERENCE_BACKEND = "pytorch"
+MOTION_GATING = True
+MOTION_IDLE_INTERVAL = 10       # Inferenz auf jedem n-ten Frame im Ruhezustand (je Kamera)
+STATUS_UPDATE_INTERVAL = 30     # Statusausgabe alle 30 Sekunden
+
+
+def load_cameras(path):
+    """Liest die Kameraliste; ergänzt Standardwerte und prüft eindeutige Namen."""
+    with open(path, "r") as f:
+        cameras = json.load(f).get("cameras", [])
+    if not cameras:
+        raise ValueError(f"Keine Kameras in {path} definiert")
+    names = set()
+    for index, camera in enumerate(cameras):
+        camera.setdefault("name", str(index + 1))
+        camera.setdefault("source", index)
+        camera.setdefault("config", "regal_config.json")
+        camera.setdefault("shelf_offset", 0)
+        camera.setdefault("rotate", True)
+        camera.setdefault("products", None)
+        if camera["name"] in names:
+            raise ValueError(f"Kameraname doppelt vergeben: {camera['name']}")
+        names.add(camera["name"])
+    return cameras
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regalüberwachung mehrerer Kameras mit gemeinsamem Modell")
+    parser.add_argument("--cameras", default=CAMERAS_FILE, help="Kameraliste (JSON)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backend", choices=BACKENDS, default=INFERENCE_BACKEND)
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Wiedergabetempo für Dateien/Sitzungen: 0 = so schnell wie möglich, 1.0 = Echtzeit")
+    parser.add_argument("--preview-port", type=int, default=PREVIEW_PORT,
+                        help="Port der MJPEG-Vorschau der ersten Kamera (weitere Kameras: fortlaufend)")
+    parser.add_argument("--no-preview", action="store_true", help="Keine Vorschau-Server starten")
+    parser.add_argument("--events", metavar="DATEI", help="Event-Stream (Journal-Operationen) als JSON Lines schreiben")
+    parser.add_argument("--timings", metavar="DATEI", help="Stufenzeiten je Frame als JSON Lines schreiben")
+    parser.add_argument("--db", metavar="DATEI", help="Datenbankdatei (Standard: supermarkt.db)")
+    parser.add_argument("--signature", choices=SIGNATURE_TYPES, default="hist",
+                        help="Objektsignatur für die Re-Identifikation (hist oder compact)")
+    parser.add_argument("--metrics-port", type=int, default=metrics.METRICS_PORT,
+                        help="Port für /metrics im Prometheus-Format (0 = aus)")
+    parser.add_argument("--metrics-host", default=metrics.METRICS_HOST,
+                        help="Adresse des /metrics-Servers (Standard: nur lokal; 0.0.0.0 = alle Netzwerkschnittstellen)")
+    args = parser.parse_args()
+    if args.db:
+        db_utils.DB_NAME = args.db
+
+    cameras = load_cameras(args.cameras)
+    log_debug(f"Headless-Dienst: verwende Standard-Limits {OBJECT_LIMITS}")
+
+    # ROIs und Produkt-Regal-Zuordnung je Kamera; die Regalnummern müssen über alle Kameras eindeutig sein
+    layouts = {}
+    products = {}
+    shelf_owner = {}
+    for camera in cameras:
+        rois, virtual_lines = shelf_layout(camera["config"], camera["shelf_offset"], use_defaults=False)
+        if not rois:
+            print(f"Fehler: Keine gültigen Regale für Kamera {camera['name']} ({camera['config']}) definiert!")
+            return 1
+        for shelf_id in rois:
+            if shelf_id in shelf_owner:
+                print(f"Fehler: Regal {shelf_id+1} ist für Kamera {shelf_owner[shelf_id]} und {camera['name']} "
+                      f"definiert. Bitte shelf_offset in {args.cameras} anpassen.")
+                return 1
+            shelf_owner[shelf_id] = camera["name"]
+        layouts[camera["name"]] = (rois, virtual_lines)
+        product_shelves, shelf_products = camera_products(camera["products"], camera["shelf_offset"])
+        unassigned = [shelf_id for shelf_id in sorted(rois)
+                      if shelf_id not in shelf_products and shelf_id not in product_shelves.values()]
+        if unassigned:
+            print(f"Fehler: Kein Produkt für Regal {', '.join(str(s + 1) for s in unassigned)} der Kamera "
+                  f"{camera['name']} zugeordnet. Bitte products in {args.cameras} ergänzen.")
+            return 1
+        products[camera["name"]] = (product_shelves, shelf_products)
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    log_debug(f"Inferenz-Gerät: {device}")
+
+    # Datenbank und gemeinsames Write-Behind-Journal für alle Kameras
+    db_utils.init_db()
+    event_journal = WriteBehindJournal()
+    event_journal.observers.append(lambda name, args, kwargs: metrics.DB_OPS.labels(name).inc())
+    event_journal.start()
+
+    # Ein Modell für alle Kameras
+    yolo_model = load_model(args.model, args.backend, imgsz=INFERENCE_IMGSZ, device=device)
+
+    caps = {camera["name"]: open_video_source(camera["source"], speed=args.speed) for camera in cameras}
+    for name, cap in caps.items():
+        if not cap.isOpened():
+            print(f"Fehler: Bildquelle der Kamera {name} konnte nicht geöffnet werden.")
+            return 1
+        log_debug(f"Kamera {name}: {cap.describe()}")
+    replay = not any(cap.is_live for cap in caps.values())
+
+    replay_report = None
+    if args.events or args.timings or replay:
+        replay_report = ReplayReport(args.events, args.timings)
+        event_journal.observers.append(replay_report.on_journal_op)
+
+    # Schnelle Wiedergabe läuft verlustfrei, damit jeder Lauf dieselben Frames verarbeitet
+    pipeline = MultiCameraPipeline(yolo_model, imgsz=INFERENCE_IMGSZ, lossless=replay and args.speed <= 0)
+    stage_timer = metrics.FrameStageTimer()
+    monitors = {}
+    preview_servers = {}
+    for index, camera in enumerate(cameras):
+        name = camera["name"]
+        rois, virtual_lines = layouts[name]
+        detector = ShelfDetector(yolo_model, rois, ALLOWED_CLASSES, mode=INFERENCE_MODE,
+                                 margin=INFERENCE_ROI_MARGIN, imgsz=INFERENCE_IMGSZ)
+        scheduler = None
+        if MOTION_GATING:
+            scheduler = InferenceScheduler(MotionDetector(rois, virtual_lines), idle_interval=MOTION_IDLE_INTERVAL)
+        pipeline.add_camera(name, caps[name], detector, scheduler=scheduler,
+                            rotate=cv2.ROTATE_180 if camera["rotate"] else None)
+        product_shelves, shelf_products = products[name]
+        monitors[name] = ShelfMonitor(rois, virtual_lines, event_journal, name=name,
+                                      signature_type=args.signature, scheduler=scheduler, stage_timer=stage_timer,
+                                      product_shelves=product_shelves, shelf_products=shelf_products)
+        if not args.no_preview:
+            preview_servers[name] = PreviewServer(port=args.preview_port + index)
+            preview_servers[name].start()
+            log_debug(f"Kamera {name}: Vorschau auf Port {args.preview_port + index}")
+        log_debug(f"Kamera {name}: {len(rois)} Regale ({', '.join(str(s + 1) for s in sorted(rois))}), "
+                  f"Inferenz-Modus {detector.mode}")
+
+    metrics.REGISTRY.gauge("regal_active_objects", "Aktiv verfolgte Objekte").set_function(
+        lambda: sum(len(monitor.enhanced_tracker.active_objects) for monitor in monitors.values()))
+    metrics.REGISTRY.gauge("regal_journal_pending_ops", "Noch nicht geschriebene Journal-Operationen").set_function(
+        event_journal.pending_ops)
+    if args.metrics_port:
+        metrics.MetricsServer(args.metrics_port, host=args.metrics_host).start()
+
+    pipeline.start()
+    print(f"Regalüberwachung mit {len(monitors)} Kameras gestartet.")
+    last_status_update = time.time()
+    try:
+        while True:
+            packet = pipeline.get(timeout=1.0)
+            if packet is None:
+                if pipeline.is_finished():
+                    break
+                continue
+            tracking_start = time.time()
+            if replay_report is not None:
+                replay_report.begin_frame(packet)
+
+            # Annotation nur, wenn ein Vorschau-Client der Kamera das nächste Bild erwartet
+            preview_server = preview_servers.get(packet.camera)
+            render = preview_server is not None and preview_server.wants_frame()
+            annotated_frame = monitors[packet.camera].process(packet, render)
+
+            # Signaldatei der Dashboards gilt für alle Kameras
+            if consume_refresh_signal():
+                for monitor in monitors.values():
+                    monitor.restart_inventory()
+
+            if time.time() - last_status_update > STATUS_UPDATE_INTERVAL:
+                for monitor in monitors.values():
+                    monitor.log_status()
+                pipeline.log_status()
+                metrics.log_latency_summary()
+                last_status_update = time.time()
+
+            tracking_duration = time.time() - tracking_start
+            pipeline.tracking_stats.tick(tracking_duration)
+            if replay_report is not None:
+                replay_report.end_frame(packet, tracking_duration)
+            if render:
+                with stage_timer.measure("render"):
+                    cv2.putText(annotated_frame, f"{packet.camera} | {pipeline.format_status()}", (10, 90),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+                    preview_server.publish(annotated_frame)
+            stage_timer.add("tracking", tracking_duration)
+            stage_timer.finish()
+            metrics.FRAMES.labels(str(packet.inferred).lower()).inc()
+            metrics.FRAME_LATENCY_SECONDS.observe(time.time() - packet.captured_at)
+    except KeyboardInterrupt:
+        print("Regalüberwachung wird beendet...")
+    finally:
+        # Aufräumen: Pipeline stoppen, DB-Journal leeren, Kameras freigeben
+        pipeline.stop()
+        event_journal.stop()
+        if replay_report is not None:
+            replay_report.close()
+        for cap in caps.values():
+            cap.release()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+# motion_gate.py
+#
+# Bewegungsabhängige Steuerung der Inferenzrate.
+# Ein günstiger Bewegungsdetektor (Differenzbild auf verkleinerten Graustufenbildern)
+# prüft jedes Frame pro Regal-ROI und im Bereich der virtuellen Linien.
+# Solange sich nichts bewegt, läuft YOLO nur auf jedem MOTION_IDLE_INTERVAL-ten Frame;
+# sobald Bewegung in ein Regal kommt oder eine Linie überquert wird, wieder auf jedem Frame.
+# In den übersprungenen Frames schreibt der SORT-Tracker die Tracks per Kalman-Vorhersage fort.
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+MOTION_SCALE = 0.25            # Verkleinerung vor dem Differenzbild
+MOTION_PIXEL_THRESHOLD = 25    # Mindeständerung eines Grauwerts, damit ein Pixel als bewegt gilt
+MOTION_MIN_FRACTION = 0.005    # Anteil bewegter Pixel in einem ROI, ab dem Bewegung erkannt wird
+MOTION_LINE_BAND = 12          # Halbe Höhe des Bands um die virtuelle Linie (in Originalpixeln)
+MOTION_IDLE_INTERVAL = 10      # Im Ruhezustand nur jedes n-te Frame inferieren
+MOTION_HOLD_SECONDS = 2.0      # Nach der letzten Bewegung so lange mit voller Rate weiterlaufen
+
+
+class MotionDetector:
+    """Erkennt Bewegung pro ROI und an den virtuellen Linien per Differenz zum Vorframe."""
+
+    def __init__(self, rois, virtual_lines=None, scale=MOTION_SCALE,
+                 pixel_threshold=MOTION_PIXEL_THRESHOLD, min_fraction=MOTION_MIN_FRACTION,
+                 line_band=MOTION_LINE_BAND):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.min_fraction = min_fraction
+        self.previous = None
+        # Regionen in verkleinerten Koordinaten: (Name, y1, y2, x1, x2)
+        self.regions = []
+        for shelf_id, (rx, ry, rw, rh) in rois.items():
+            self.regions.append((f"Regal {shelf_id+1}",) + self._scaled(rx, ry, rx + rw, ry + rh))
+            if virtual_lines and shelf_id in virtual_lines:
+                line_y = ry + virtual_lines[shelf_id]
+                self.regions.append((f"Linie {shelf_id+1}",) +
+                                    self._scaled(rx, line_y - line_band, rx + rw, line_y + line_band))
+
+    def _scaled(self, x1, y1, x2, y2):
+        s = self.scale
+        return (max(0, int(y1 * s)), max(1, int(np.ceil(y2 * s))),
+                max(0, int(x1 * s)), max(1, int(np.ceil(x2 * s))))
+
+    def detect(self, frame):
+        """Liefert die Namen aller Regionen mit Bewegung (beim ersten Frame alle)."""
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        previous, self.previous = self.previous, gray
+        if previous is None or previous.shape != gray.shape:
+            return [name for name, *_ in self.regions]
+
+        moving = cv2.absdiff(gray, previous) > self.pixel_threshold
+        active = []
+        for name, y1, y2, x1, x2 in self.regions:
+            region = moving[y1:y2, x1:x2]
+            if region.size and np.count_nonzero(region) >= self.min_fraction * region.size:
+                active.append(name)
+        return active
+
+
+class InferenceScheduler:
+    """
+    Entscheidet pro Frame, ob YOLO laufen soll.
+    Volle Rate bei Bewegung und für MOTION_HOLD_SECONDS danach, sonst jedes idle_interval-te Frame.
+    keep_active() erlaubt dem Tracking-Thread, die volle Rate zu erzwingen (z. B. bei laufender Entnahme).
+    """
+
+    def __init__(self, motion_detector, idle_interval=MOTION_IDLE_INTERVAL, hold_seconds=MOTION_HOLD_SECONDS):
+        self.motion_detector = motion_detector
+        self.idle_interval = max(1, idle_interval)
+        self.hold_seconds = hold_seconds
+        self._lock = threading.Lock()
+        self._active_until = 0.0
+        self._frames_since_inference = 0
+        self.inferred = 0
+        self.skipped = 0
+        self.last_motion = []
+
+    def keep_active(self, seconds=None):
+        """Hält die volle Inferenzrate für die angegebene Zeit (Standard: hold_seconds)."""
+        with self._lock:
+            until = time.time() + (self.hold_seconds if seconds is None else seconds)
+            self._active_until = max(self._active_until, until)
+
+    def is_active(self):
+        with self._lock:
+            return time.time() < self._active_until
+
+    def should_infer(self, frame):
+        """True, wenn auf diesem Frame inferiert werden soll."""
+        motion = self.motion_detector.detect(frame)
+        if motion:
+            self.last_motion = motion
+            self.keep_active()
+
+        self._frames_since_inference += 1
+        if self.is_active() or self._frames_since_inference >= self.idle_interval:
+            self._frames_since_inference = 0
+            self.inferred += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def skip_ratio(self):
+        total = self.inferred + self.skipped
+        return self.skipped / total if total else 0.0
@@ -0,0 +1,119 @@
+# object_signature.py
+#
+# Objektsignaturen für die Re-Identifikation (EnhancedObjectTracker, ReIDGallery).
+#   - "hist": ObjectSignature mit dem 16x16x16-HSV-Histogramm (4096 float32, 16 KB je Objekt)
+#   - "compact": CompactSignature mit den Randverteilungen von H, S und V (16 + 8 + 8 Bins)
+#     und Breite/Höhe der Box in einem einzigen float32-Array mit 34 Werten (136 Byte)
+# Beide Klassen haben dieselbe Schnittstelle (color_hist, dimensions, last_seen_time, update),
+# so dass Tracker und Galerie sie ohne Fallunterscheidung verarbeiten.
+# Vergleich beider Varianten auf aufgezeichneten Sitzungen: benchmark_signatures.py
+
+import time
+
+import numpy as np
+
+from color_features import MARGINAL_HIST_BINS
+
+SIGNATURE_TYPES = ("hist", "compact")
+SIGNATURE_BLEND = 0.3   # Gewicht der neuen Beobachtung im gleitenden Mittelwert
+
+COMPACT_HIST_LENGTH = sum(MARGINAL_HIST_BINS)
+COMPACT_SIGNATURE_LENGTH = COMPACT_HIST_LENGTH + 2   # Histogramm, Breite, Höhe
+
+
+class ObjectSignature:
+    """Speichert eine eindeutige Signatur eines Objekts für Re-Identifikation"""
+    def __init__(self, color_hist=None, dimensions=None, last_seen_time=None):
+        self.color_hist = color_hist  # Farb-Histogramm
+        self.dimensions = dimensions  # (Breite, Höhe) des Objekts
+        self.last_seen_time = last_seen_time or time.time()
+
+    def update(self, color_hist=None, dimensions=None, last_seen_time=None):
+        if color_hist is not None:
+            # Wenn wir bereits ein Histogramm haben, aktualisieren wir es mit einem gleitenden Mittelwert
+            if self.color_hist is not None:
+                self.color_hist = (1 - SIGNATURE_BLEND) * self.color_hist + SIGNATURE_BLEND * color_hist
+            else:
+                self.color_hist = color_hist
+
+        if dimensions is not None:
+            # Aktualisiere die Dimensionen mit einem gleitenden Mittelwert
+            if self.dimensions is not None:
+                self.dimensions = (
+                    (1 - SIGNATURE_BLEND) * self.dimensions[0] + SIGNATURE_BLEND * dimensions[0],
+                    (1 - SIGNATURE_BLEND) * self.dimensions[1] + SIGNATURE_BLEND * dimensions[1]
+                )
+            else:
+                self.dimensions = dimensions
+
+        self.last_seen_time = last_seen_time or time.time()
+
+
+class CompactSignature:
+    """
+    Kompakte Signatur: Randhistogramme und Abmessungen in einem festen float32-Array.
+    Fehlende Werte sind NaN; update() mischt neue Beobachtungen ohne neue Arrays ein.
+    """
+    __slots__ = ("data", "last_seen_time")
+
+    def __init__(self, color_hist=None, dimensions=None, last_seen_time=None):
+        self.data = np.full(COMPACT_SIGNATURE_LENGTH, np.nan, dtype=np.float32)
+        if color_hist is not None:
+            self.data[:COMPACT_HIST_LENGTH] = color_hist
+        if dimensions is not None:
+            self.data[COMPACT_HIST_LENGTH:] = dimensions
+        self.last_seen_time = last_seen_time or time.time()
+
+    @property
+    def color_hist(self):
+        hist = self.data[:COMPACT_HIST_LENGTH]
+        return None if np.isnan(hist[0]) else hist
+
+    @property
+    def dimensions(self):
+        width, height = self.data[COMPACT_HIST_LENGTH:]
+        return None if np.isnan(width) else (float(width), float(height))
+
+    @property
+    def aspect_ratio(self):
+        """Breite / Höhe der Box (None ohne Abmessungen)."""
+        width, height = self.data[COMPACT_HIST_LENGTH:]
+        return None if np.isnan(width) or height <= 0 else float(width / height)
+
+    def update(self, color_hist=None, dimensions=None, last_seen_time=None):
+        data = self.data
+        if color_hist is not None:
+            hist = data[:COMPACT_HIST_LENGTH]
+            if np.isnan(hist[0]):
+                hist[:] = color_hist
+            else:
+                # Gleitender Mittelwert direkt im Array
+                hist *= 1 - SIGNATURE_BLEND
+                hist += SIGNATURE_BLEND * color_hist
+
+        if dimensions is not None:
+            width, height = COMPACT_HIST_LENGTH, COMPACT_HIST_LENGTH + 1
+            if np.isnan(data[width]):
+                data[width], data[height] = dimensions
+            else:
+                data[width] = (1 - SIGNATURE_BLEND) * data[width] + SIGNATURE_BLEND * dimensions[0]
+                data[height] = (1 - SIGNATURE_BLEND) * data[height] + SIGNATURE_BLEND * dimensions[1]
+
+        self.last_seen_time = last_seen_time or time.time()
+
+
+def extract_signature(feature_cache, x1, y1, x2, y2, last_seen_time, signature_type="hist"):
+    """
+    Signatur der Box [x1, y1, x2, y2] aus dem gemeinsamen HSV-Puffer des Frames
+    (color_features.FrameFeatureCache). Gibt None zurück, wenn die Box leer ist.
+    """
+    if signature_type == "compact":
+        hist = feature_cache.marginal_histogram(x1, y1, x2, y2)
+        signature_class = CompactSignature
+    else:
+        # Farb-Histogramm im HSV-Farbraum (robust gegenüber Beleuchtungswechseln), 16 Bins für bessere Unterscheidung
+        hist = feature_cache.signature_histogram(x1, y1, x2, y2)
+        signature_class = ObjectSignature
+    if hist is None:
+        return None
+    return signature_class(color_hist=hist, dimensions=(x2 - x1, y2 - y1), last_seen_time=last_seen_time)
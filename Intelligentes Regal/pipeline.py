@@ -0,0 +1,504 @@
+# pipeline.py
+#
+# Gestufte Verarbeitungspipeline für das YOLO-Monitoring:
+# Kamera-Thread -> Inferenz-Worker -> Tracking/Event-Worker (Hauptthread).
+# Die Stufen sind über kleine, begrenzte Queues verbunden, die bei Überlauf
+# das älteste Frame verwerfen. So staut sich der Kamerapuffer nicht, wenn
+# eine nachfolgende Stufe (z. B. die Datenbank) kurz langsamer ist.
+# Für reproduzierbare Wiedergaben (siehe video_source.py) kann die Pipeline
+# verlustfrei laufen: Die Queues blockieren dann, statt Frames zu verwerfen.
+# MultiCameraPipeline: ein Capture-Thread je Kamera, ein gemeinsamer Inferenz-Worker,
+# der die Frames aller Kameras in einem Modellaufruf bündelt (roi_inference.detect_batch).
+
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from debug_utils import log_debug
+from metrics import REGISTRY, STAGE_SECONDS
+from roi_inference import INFERENCE_IMGSZ, detect_batch
+
+# Standardgröße der Queues zwischen den Stufen (klein halten = geringe Latenz)
+PIPELINE_QUEUE_SIZE = 2
+
+
+class DropOldestQueue:
+    """
+    Begrenzte Queue, die bei vollem Puffer das älteste Element verwirft.
+    Mit blocking=True wartet put() stattdessen, bis wieder Platz ist (verlustfrei).
+    Mehrere Queues können eine gemeinsame condition verwenden, damit ein Konsument
+    auf alle gleichzeitig warten kann (BatchInferenceStage).
+    """
+
+    def __init__(self, maxsize=PIPELINE_QUEUE_SIZE, blocking=False, condition=None):
+        self.maxsize = max(1, maxsize)
+        self.blocking = blocking
+        self._items = deque()
+        self._cond = condition or threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        """Legt ein Element ab; bei voller Queue wird das älteste verworfen (bzw. gewartet)."""
+        with self._cond:
+            while self.blocking and not self.closed and len(self._items) >= self.maxsize:
+                self._cond.wait()
+            if self.closed:
+                return
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Holt das nächste Element.
+        Gibt None zurück, wenn die Queue geschlossen und leer ist oder das Timeout abläuft.
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while not self._items:
+                if self.closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        """Schließt die Queue und weckt alle wartenden Konsumenten."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def depth(self):
+        """Aktuelle Anzahl wartender Elemente."""
+        with self._cond:
+            return len(self._items)
+
+
+class StageStats:
+    """Misst Durchsatz (FPS) und Bearbeitungszeit einer Pipeline-Stufe."""
+
+    def __init__(self, name, window=60):
+        self.name = name
+        self._lock = threading.Lock()
+        self._timestamps = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+        self.total = 0
+
+    def tick(self, duration=None):
+        """Registriert ein fertig bearbeitetes Frame (duration in Sekunden)."""
+        with self._lock:
+            self._timestamps.append(time.time())
+            if duration is not None:
+                self._durations.append(duration)
+            self.total += 1
+
+    def fps(self):
+        with self._lock:
+            if len(self._timestamps) < 2:
+                return 0.0
+            span = self._timestamps[-1] - self._timestamps[0]
+            return (len(self._timestamps) - 1) / span if span > 0 else 0.0
+
+    def avg_ms(self):
+        with self._lock:
+            if not self._durations:
+                return 0.0
+            return 1000.0 * sum(self._durations) / len(self._durations)
+
+
+class FramePacket:
+    """
+    Ein Frame auf dem Weg durch die Pipeline.
+    inferred ist False, wenn die Inferenz für dieses Frame übersprungen wurde (results ist dann None).
+    timings enthält die Bearbeitungszeit je Stufe in Sekunden, captured_at die Systemzeit der Aufnahme.
+    camera ist der Name der Kamera (nur in der MultiCameraPipeline gesetzt).
+    """
+    __slots__ = ("frame_id", "timestamp", "frame", "results", "inferred", "timings", "captured_at", "camera")
+
+    def __init__(self, frame_id, timestamp, frame, results=None, camera=None):
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        self.frame = frame
+        self.results = results
+        self.inferred = False
+        self.timings = {}
+        self.captured_at = time.time()
+        self.camera = camera
+
+
+class CaptureStage(threading.Thread):
+    """
+    Liest Frames von der Bildquelle, dreht sie und legt sie in die Capture-Queue.
+    Liefert die Quelle einen eigenen Zeitstempel (frame_timestamp, siehe video_source.py), wird dieser verwendet.
+    """
+
+    def __init__(self, cap, output_queue, rotate=cv2.ROTATE_180, name="capture", camera=None):
+        super().__init__(name=name, daemon=True)
+        self.cap = cap
+        self.output_queue = output_queue
+        self.rotate = rotate
+        self.camera = camera
+        self.stats = StageStats(name)
+        self.running = True
+        self.frame_id = 0
+
+    def run(self):
+        while self.running:
+            start = time.time()
+            ret, frame = self.cap.read()
+            if not ret:
+                log_debug(f"Pipeline: Kamera liefert keine Frames mehr, {self.name}-Thread endet.")
+                break
+            # Da die Kamera auf dem Kopf steht, drehen wir das Bild um 180 Grad
+            if self.rotate is not None:
+                frame = cv2.rotate(frame, self.rotate)
+            self.frame_id += 1
+            timestamp = getattr(self.cap, "frame_timestamp", None) or start
+            packet = FramePacket(self.frame_id, timestamp, frame, camera=self.camera)
+            packet.captured_at = start
+            packet.timings["capture"] = time.time() - start
+            STAGE_SECONDS.labels("capture").observe(packet.timings["capture"])
+            self.output_queue.put(packet)
+            self.stats.tick(packet.timings["capture"])
+        self.output_queue.close()
+
+
+class InferenceStage(threading.Thread):
+    """
+    Führt das YOLO-Modell auf den Frames der Capture-Queue aus.
+    Mit scheduler (siehe motion_gate.InferenceScheduler) werden Frames ohne Bewegung
+    ohne Inferenz weitergereicht.
+    """
+
+    def __init__(self, model_fn, input_queue, output_queue, scheduler=None):
+        super().__init__(name="inference", daemon=True)
+        self.model_fn = model_fn
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.scheduler = scheduler
+        self.stats = StageStats("inference")
+        self.running = True
+
+    def run(self):
+        while self.running:
+            packet = self.input_queue.get(timeout=0.5)
+            if packet is None:
+                if self.input_queue.closed:
+                    break
+                continue
+            start = time.time()
+            if self.scheduler is not None and not self.scheduler.should_infer(packet.frame):
+                # Kein Modellaufruf; der Tracking-Thread schreibt die Tracks per Vorhersage fort
+                packet.timings["inference"] = time.time() - start
+                self.output_queue.put(packet)
+                continue
+            try:
+                packet.results = self.model_fn(packet.frame)
+                packet.inferred = True
+            except Exception as e:
+                log_debug(f"Pipeline: Fehler bei der Inferenz von Frame {packet.frame_id}: {e}", "ERROR")
+                continue
+            packet.timings["inference"] = time.time() - start
+            STAGE_SECONDS.labels("inference").observe(packet.timings["inference"])
+            self.output_queue.put(packet)
+            self.stats.tick(packet.timings["inference"])
+        self.output_queue.close()
+
+class BatchInferenceStage(threading.Thread):
+    """
+    Gemeinsamer Inferenz-Worker mehrerer Kameras.
+    Nimmt je Durchlauf das nächste Frame jeder Kamera mit wartenden Frames, wendet die
+    Bewegungssteuerung der Kamera an und rechnet die übrigen Frames mit einem einzigen
+    Aufruf des gemeinsamen Modells (roi_inference.detect_batch).
+    inputs: {Kamera: (Queue, ShelfDetector, Scheduler oder None)}; alle Queues teilen condition.
+    output_queues: {Kamera: Ergebnis-Queue}, damit eine volle Queue nur Frames derselben Kamera verdrängt.
+    """
+
+    def __init__(self, model, inputs, output_queues, condition, imgsz=INFERENCE_IMGSZ):
+        super().__init__(name="inference", daemon=True)
+        self.model = model
+        self.inputs = inputs
+        self.output_queues = output_queues
+        self.condition = condition
+        self.imgsz = imgsz
+        self.stats = StageStats("inference")
+        self.batches = 0           # Modellaufrufe
+        self.batched_frames = 0    # davon inferierte Frames
+        self.running = True
+
+    def mean_batch_size(self):
+        """Mittlere Anzahl Frames je Modellaufruf."""
+        return self.batched_frames / self.batches if self.batches else 0.0
+
+    def _wait_for_frames(self, timeout):
+        """Wartet, bis eine Kamera-Queue ein Frame enthält; False, wenn alle geschlossen und leer sind."""
+        queues = [queue for queue, _, _ in self.inputs.values()]
+        with self.condition:
+            deadline = time.time() + timeout
+            while not any(queue.depth() for queue in queues):
+                if all(queue.closed for queue in queues):
+                    return False
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        return True
+
+    def run(self):
+        while self.running:
+            if not self._wait_for_frames(0.5):
+                break
+            start = time.time()
+            packets, jobs = [], []
+            for camera, (queue, detector, scheduler) in self.inputs.items():
+                packet = queue.get(timeout=0)
+                if packet is None:
+                    continue
+                packets.append(packet)
+                if scheduler is None or scheduler.should_infer(packet.frame):
+                    jobs.append((packet, detector))
+            if not packets:
+                continue
+
+            if jobs:
+                try:
+                    results = detect_batch(self.model, [(detector, packet.frame) for packet, detector in jobs],
+                                           self.imgsz)
+                except Exception as e:
+                    log_debug(f"Pipeline: Fehler bei der Batch-Inferenz ({len(jobs)} Frames): {e}", "ERROR")
+                    inferred_ids = {id(packet) for packet, _ in jobs}
+                    packets = [packet for packet in packets if id(packet) not in inferred_ids]
+                    jobs, results = [], []
+                for (packet, _), detections in zip(jobs, results):
+                    packet.results = detections
+                    packet.inferred = True
+
+            duration = time.time() - start
+            for packet in packets:
+                # Kein Modellaufruf bei übersprungenen Frames; der Tracking-Thread schreibt die Tracks fort
+                packet.timings["inference"] = duration
+                if packet.inferred:
+                    STAGE_SECONDS.labels("inference").observe(duration)
+                    self.stats.tick(duration)
+                self.output_queues[packet.camera].put(packet)
+            if jobs:
+                self.batches += 1
+                self.batched_frames += len(jobs)
+        for queue in self.output_queues.values():
+            queue.close()
+
+
+class MonitorPipeline:
+    """
+    Verbindet Kamera-Thread und Inferenz-Worker mit dem Tracking/Event-Worker.
+    Der Tracking/Event-Worker ist der aufrufende (Haupt-)Thread, da OpenCV-Fenster
+    und Tastaturabfragen dort laufen müssen. Er holt sich die fertigen Frames mit get().
+    Mit lossless=True wird kein Frame verworfen (für reproduzierbare Wiedergaben).
+    """
+
+    def __init__(self, cap, model_fn, queue_size=PIPELINE_QUEUE_SIZE, rotate=cv2.ROTATE_180, scheduler=None,
+                 lossless=False):
+        self.capture_queue = DropOldestQueue(queue_size, blocking=lossless)
+        self.result_queue = DropOldestQueue(queue_size, blocking=lossless)
+        self.capture = CaptureStage(cap, self.capture_queue, rotate=rotate)
+        self.inference = InferenceStage(model_fn, self.capture_queue, self.result_queue, scheduler=scheduler)
+        self.scheduler = scheduler
+        self.tracking_stats = StageStats("tracking")
+
+        # Queue-Tiefen und verworfene Frames werden erst beim Abruf der Metriken gelesen
+        depth = REGISTRY.gauge("regal_queue_depth", "Wartende Frames je Pipeline-Queue", ("queue",))
+        dropped = REGISTRY.gauge("regal_queue_dropped_frames", "Verworfene Frames je Pipeline-Queue", ("queue",))
+        for name, queue in (("capture", self.capture_queue), ("result", self.result_queue)):
+            depth.labels(name).set_function(queue.depth)
+            dropped.labels(name).set_function(lambda q=queue: q.dropped)
+
+    def start(self):
+        self.capture.start()
+        self.inference.start()
+        log_debug("Pipeline gestartet: Capture -> Inferenz -> Tracking")
+
+    def get(self, timeout=1.0):
+        """
+        Liefert das nächste fertig inferierte Frame.
+        Gibt None zurück, wenn gerade keines bereitliegt; is_finished() zeigt das Ende an.
+        """
+        return self.result_queue.get(timeout=timeout)
+
+    def is_finished(self):
+        return self.result_queue.closed and self.result_queue.depth() == 0
+
+    def stop(self):
+        self.capture.running = False
+        self.inference.running = False
+        self.capture_queue.close()
+        self.result_queue.close()
+        for stage in (self.capture, self.inference):
+            if stage.is_alive():
+                stage.join(timeout=2.0)
+        log_debug("Pipeline gestoppt.")
+
+    def stage_status(self):
+        """Liefert FPS, Bearbeitungszeit und Queue-Tiefe je Stufe."""
+        return [
+            (self.capture.stats, self.capture_queue),
+            (self.inference.stats, self.result_queue),
+            (self.tracking_stats, None),
+        ]
+
+    def format_status(self):
+        """Kompakte Statuszeile für die Anzeige im Frame."""
+        parts = []
+        for stats, queue in self.stage_status():
+            text = f"{stats.name} {stats.fps():.1f}fps"
+            if queue is not None:
+                text += f" q={queue.depth()}"
+            parts.append(text)
+        if self.scheduler is not None:
+            parts.append(f"skip {self.scheduler.skip_ratio() * 100:.0f}%")
+        return " | ".join(parts)
+
+    def log_status(self):
+        """Schreibt die Pipeline-Kennzahlen ins Debug-Log."""
+        log_debug("=== PIPELINE-STATUS ===")
+        for stats, queue in self.stage_status():
+            queue_info = ""
+            if queue is not None:
+                queue_info = f", Queue: {queue.depth()}/{queue.maxsize}, verworfen: {queue.dropped}"
+            log_debug(f"  {stats.name}: {stats.fps():.1f} FPS, {stats.avg_ms():.1f} ms/Frame{queue_info}")
+        if self.scheduler is not None:
+            log_debug(f"  Bewegungssteuerung: {self.scheduler.inferred} inferiert, {self.scheduler.skipped} übersprungen "
+                      f"({self.scheduler.skip_ratio() * 100:.0f}%), letzte Bewegung: {', '.join(self.scheduler.last_motion) or '-'}")
+
+
+class MultiCameraPipeline:
+    """
+    Pipeline für mehrere Kameras mit einem gemeinsamen Modell: je Kamera ein Capture-Thread,
+    ein BatchInferenceStage für alle Kameras und je Kamera eine Ergebnis-Queue (gemeinsame condition),
+    aus denen get() reihum liest. Kameras werden vor start() mit add_camera() angemeldet;
+    FramePacket.camera nennt die Quelle.
+    """
+
+    def __init__(self, model, imgsz=INFERENCE_IMGSZ, queue_size=PIPELINE_QUEUE_SIZE, lossless=False):
+        self.model = model
+        self.imgsz = imgsz
+        self.queue_size = queue_size
+        self.lossless = lossless
+        self.condition = threading.Condition()
+        self.result_condition = threading.Condition()
+        self.result_queues = {}
+        self.captures = {}
+        self.inputs = {}
+        self.inference = None
+        self.tracking_stats = StageStats("tracking")
+        self._next_camera = 0    # Kamera, bei der get() als nächstes zu suchen beginnt
+
+        self._depth = REGISTRY.gauge("regal_queue_depth", "Wartende Frames je Pipeline-Queue", ("queue",))
+        self._dropped = REGISTRY.gauge("regal_queue_dropped_frames", "Verworfene Frames je Pipeline-Queue", ("queue",))
+
+    def _register_queue(self, name, queue):
+        # Queue-Tiefen und verworfene Frames werden erst beim Abruf der Metriken gelesen
+        self._depth.labels(name).set_function(queue.depth)
+        self._dropped.labels(name).set_function(lambda q=queue: q.dropped)
+
+    def add_camera(self, name, cap, detector, scheduler=None, rotate=cv2.ROTATE_180):
+        """Meldet eine Kamera mit eigenem ShelfDetector (ROIs) und eigener Bewegungssteuerung an."""
+        if name in self.captures:
+            raise ValueError(f"Kamera doppelt angemeldet: {name}")
+        queue = DropOldestQueue(self.queue_size, blocking=self.lossless, condition=self.condition)
+        self.captures[name] = CaptureStage(cap, queue, rotate=rotate, name=f"capture-{name}", camera=name)
+        self.inputs[name] = (queue, detector, scheduler)
+        self.result_queues[name] = DropOldestQueue(self.queue_size, blocking=self.lossless,
+                                                   condition=self.result_condition)
+        self._register_queue(f"capture-{name}", queue)
+        self._register_queue(f"result-{name}", self.result_queues[name])
+
+    def start(self):
+        self.inference = BatchInferenceStage(self.model, self.inputs, self.result_queues, self.condition,
+                                             imgsz=self.imgsz)
+        for capture in self.captures.values():
+            capture.start()
+        self.inference.start()
+        log_debug(f"Pipeline gestartet: {len(self.captures)} Kameras -> Batch-Inferenz -> Tracking")
+
+    def get(self, timeout=1.0):
+        """Liefert das nächste fertig inferierte Frame einer beliebigen Kamera (reihum, oder None)."""
+        queues = list(self.result_queues.values())
+        with self.result_condition:
+            deadline = time.time() + timeout
+            while True:
+                for offset in range(len(queues)):
+                    index = (self._next_camera + offset) % len(queues)
+                    packet = queues[index].get(timeout=0)
+                    if packet is not None:
+                        self._next_camera = index + 1
+                        return packet
+                remaining = deadline - time.time()
+                if remaining <= 0 or all(queue.closed for queue in queues):
+                    return None
+                self.result_condition.wait(remaining)
+
+    def is_finished(self):
+        return all(queue.closed and queue.depth() == 0 for queue in self.result_queues.values())
+
+    def stop(self):
+        for capture in self.captures.values():
+            capture.running = False
+        if self.inference is not None:
+            self.inference.running = False
+        for queue, _, _ in self.inputs.values():
+            queue.close()
+        for queue in self.result_queues.values():
+            queue.close()
+        for stage in list(self.captures.values()) + [self.inference]:
+            if stage is not None and stage.is_alive():
+                stage.join(timeout=2.0)
+        log_debug("Pipeline gestoppt.")
+
+    def stage_status(self):
+        """Liefert FPS, Bearbeitungszeit und Queue-Tiefe je Stufe (Capture je Kamera)."""
+        status = [(capture.stats, self.inputs[name][0]) for name, capture in self.captures.items()]
+        if self.inference is not None:
+            status.append((self.inference.stats, None))
+        status.append((self.tracking_stats, None))
+        return status
+
+    def format_status(self):
+        """Kompakte Statuszeile für die Anzeige im Frame."""
+        parts = []
+        for stats, queue in self.stage_status():
+            text = f"{stats.name} {stats.fps():.1f}fps"
+            if queue is not None:
+                text += f" q={queue.depth()}"
+            parts.append(text)
+        parts.append("result q=" + "/".join(str(queue.depth()) for queue in self.result_queues.values()))
+        if self.inference is not None:
+            parts.append(f"batch {self.inference.mean_batch_size():.1f}")
+        return " | ".join(parts)
+
+    def log_status(self):
+        """Schreibt die Pipeline-Kennzahlen ins Debug-Log."""
+        log_debug("=== PIPELINE-STATUS ===")
+        for stats, queue in self.stage_status():
+            queue_info = ""
+            if queue is not None:
+                queue_info = f", Queue: {queue.depth()}/{queue.maxsize}, verworfen: {queue.dropped}"
+            log_debug(f"  {stats.name}: {stats.fps():.1f} FPS, {stats.avg_ms():.1f} ms/Frame{queue_info}")
+        for name, queue in self.result_queues.items():
+            log_debug(f"  Ergebnis-Queue {name}: {queue.depth()}/{queue.maxsize}, verworfen: {queue.dropped}")
+        if self.inference is not None:
+            log_debug(f"  Batch-Inferenz: {self.inference.batches} Modellaufrufe, "
+                      f"im Mittel {self.inference.mean_batch_size():.1f} Frames je Aufruf")
+        for name, (_, _, scheduler) in self.inputs.items():
+            if scheduler is not None:
+                log_debug(f"  Bewegungssteuerung {name}: {scheduler.inferred} inferiert, {scheduler.skipped} "
+                          f"übersprungen ({scheduler.skip_ratio() * 100:.0f}%), "
+                          f"letzte Bewegung: {', '.join(scheduler.last_motion) or '-'}")
@@ -0,0 +1,124 @@
+# preview_server.py
+#
+# Vorschau des YOLO-Monitorings über HTTP (MJPEG) für den Headless-Betrieb.
+# Der Monitor zeichnet und kodiert Frames nur, solange ein Client zusieht,
+# und dann höchstens mit PREVIEW_FPS Bildern pro Sekunde. Ohne Zuschauer
+# entfällt die gesamte Annotation, was auf unbeaufsichtigten Regalen CPU spart.
+#   /             einfache Seite mit dem Live-Bild
+#   /stream.mjpg  MJPEG-Stream (multipart/x-mixed-replace)
+#   /snapshot.jpg einzelnes, aktuelles Bild
+
+import threading
+import time
+
+import cv2
+from flask import Flask, Response
+
+from debug_utils import log_debug
+
+PREVIEW_HOST = "0.0.0.0"
+PREVIEW_PORT = 5010
+PREVIEW_FPS = 5.0               # Höchstrate der Vorschaubilder
+PREVIEW_JPEG_QUALITY = 70
+PREVIEW_MAX_WIDTH = 960         # Breitere Frames werden vor dem Kodieren verkleinert
+PREVIEW_WAIT_TIMEOUT = 5.0      # Wartezeit auf ein neues Bild (Stream und Snapshot)
+
+PREVIEW_PAGE = """<!DOCTYPE html>
+<html><head><title>YOLO Monitoring - Vorschau</title></head>
+<body style="margin:0;background:#111;text-align:center">
+<img src="/stream.mjpg" style="max-width:100%;height:auto">
+</body></html>"""
+
+
+class PreviewServer:
+    """MJPEG-Vorschau, die nur bei verbundenen Clients Bilder vom Monitor anfordert."""
+
+    def __init__(self, host=PREVIEW_HOST, port=PREVIEW_PORT, fps=PREVIEW_FPS,
+                 jpeg_quality=PREVIEW_JPEG_QUALITY, max_width=PREVIEW_MAX_WIDTH):
+        self.host = host
+        self.port = port
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._clients = 0
+        self._last_publish = 0.0
+        self.frames_published = 0
+
+        self.app = Flask(__name__)
+        self.app.add_url_rule("/", "index", lambda: PREVIEW_PAGE)
+        self.app.add_url_rule("/stream.mjpg", "stream", self._stream)
+        self.app.add_url_rule("/snapshot.jpg", "snapshot", self._snapshot)
+
+    def start(self):
+        """Startet den HTTP-Server in einem Hintergrund-Thread."""
+        thread = threading.Thread(target=self.app.run, name="preview", daemon=True,
+                                  kwargs={"host": self.host, "port": self.port,
+                                          "threaded": True, "use_reloader": False})
+        thread.start()
+        log_debug(f"Vorschau-Server gestartet auf http://{self.host}:{self.port}")
+
+    def has_clients(self):
+        with self._cond:
+            return self._clients > 0
+
+    def wants_frame(self):
+        """True, wenn ein Client zusieht und das nächste Vorschaubild fällig ist."""
+        with self._cond:
+            return self._clients > 0 and time.time() - self._last_publish >= 1.0 / self.fps
+
+    def publish(self, frame):
+        """Kodiert ein annotiertes Frame als JPEG und reicht es an alle Clients weiter."""
+        height, width = frame.shape[:2]
+        if width > self.max_width:
+            frame = cv2.resize(frame, (self.max_width, int(height * self.max_width / width)),
+                               interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        with self._cond:
+            self._jpeg = buffer.tobytes()
+            self._seq += 1
+            self._last_publish = time.time()
+            self.frames_published += 1
+            self._cond.notify_all()
+
+    def _next_frame(self, last_seq):
+        """Wartet auf ein Bild, das neuer als last_seq ist; liefert (seq, jpeg) oder (last_seq, None)."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq, PREVIEW_WAIT_TIMEOUT):
+                return last_seq, None
+            return self._seq, self._jpeg
+
+    def _connect(self, delta):
+        with self._cond:
+            self._clients += delta
+            clients = self._clients
+        log_debug(f"Vorschau: {'Client verbunden' if delta > 0 else 'Client getrennt'} ({clients} aktiv)")
+
+    def _stream(self):
+        def generate():
+            self._connect(1)
+            try:
+                seq = self._seq
+                while True:
+                    seq, jpeg = self._next_frame(seq)
+                    if jpeg is None:
+                        continue
+                    yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " +
+                           str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+            finally:
+                self._connect(-1)
+        return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+    def _snapshot(self):
+        self._connect(1)
+        try:
+            _, jpeg = self._next_frame(self._seq)
+        finally:
+            self._connect(-1)
+        if jpeg is None:
+            return Response("Kein Bild verfügbar", status=503)
+        return Response(jpeg, mimetype="image/jpeg")
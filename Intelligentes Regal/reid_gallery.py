@@ -0,0 +1,171 @@
+# reid_gallery.py
+#
+# Gedächtnis für die Re-Identifikation verschwundener Objekte (EnhancedObjectTracker).
+# Die Signaturen liegen L2-normalisiert in einer vorab angelegten Matrix je Produkttyp;
+# eine Anfrage ist ein einziges Matrix-Vektor-Produkt über die Einträge dieses Typs
+# statt eines Python-Durchlaufs mit scipy-cosine je Eintrag. Abgelaufene Einträge werden
+# über einen nach Ablaufzeit sortierten Heap entfernt, ohne das Gedächtnis zu durchsuchen.
+
+import heapq
+import itertools
+
+import numpy as np
+
+REID_GALLERY_CAPACITY = 32   # Startgröße je Produkttyp; bei Bedarf wird verdoppelt
+
+# Gewichte wie in EnhancedObjectTracker.calculate_similarity
+REID_HIST_WEIGHT = 0.7
+REID_DIM_WEIGHT = 0.3
+REID_DIM_BONUS = 0.1
+
+
+class _Bucket:
+    """Einträge eines Produkttyps: Signaturmatrix, Abmessungen und Belegung je Slot."""
+
+    def __init__(self, dim, capacity):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.dims = np.ones((capacity, 2), dtype=np.float32)
+        self.has_dims = np.zeros(capacity, dtype=bool)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.entries = [None] * capacity
+        self.generations = [0] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def grow(self):
+        capacity = len(self.entries)
+        self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+        self.dims = np.concatenate([self.dims, np.ones_like(self.dims)])
+        self.has_dims = np.concatenate([self.has_dims, np.zeros_like(self.has_dims)])
+        self.used = np.concatenate([self.used, np.zeros_like(self.used)])
+        self.entries += [None] * capacity
+        self.generations += [0] * capacity
+        self.free = list(range(2 * capacity - 1, capacity - 1, -1)) + self.free
+
+
+class ReIDGallery:
+    """
+    Gedächtnisobjekte je Produkttyp. Ein Eintrag ist ein beliebiges Tupel, dessen erstes
+    Element die ObjectSignature ist (color_hist, dimensions, last_seen_time).
+    Einträge verfallen max_age Sekunden nach signature.last_seen_time.
+    """
+
+    def __init__(self, max_age, capacity=REID_GALLERY_CAPACITY):
+        self.max_age = max_age
+        self.capacity = capacity
+        self._buckets = {}
+        self._expiry = []               # (Ablaufzeit, Zähler, Produkttyp, Slot, Generation)
+        self._counter = itertools.count()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """Alle Einträge (ohne feste Reihenfolge), z. B. für Statusausgaben."""
+        for bucket in self._buckets.values():
+            for slot in np.flatnonzero(bucket.used):
+                yield bucket.entries[slot]
+
+    def clear(self):
+        self._buckets.clear()
+        self._expiry.clear()
+        self._size = 0
+
+    def add(self, product_type, entry):
+        """
+        Legt einen Eintrag ab; liefert den Schlüssel (Produkttyp, Slot).
+        Alle Signaturen eines Produkttyps müssen dieselbe Länge haben (sonst ValueError).
+        """
+        signature = entry[0]
+        vector = _normalized(signature.color_hist)
+        bucket = self._buckets.get(product_type)
+        if bucket is None:
+            # Neuer Typ: eigene Matrix anlegen
+            bucket = self._buckets[product_type] = _Bucket(vector.shape[0], self.capacity)
+        elif bucket.vectors.shape[1] != vector.shape[0]:
+            # Signaturtypen nicht mischen; vorhandene Einträge bleiben erhalten
+            raise ValueError(f"Signaturlänge {vector.shape[0]} passt nicht zur Galerie von {product_type} "
+                             f"(Länge {bucket.vectors.shape[1]})")
+        if not bucket.free:
+            bucket.grow()
+        slot = bucket.free.pop()
+        bucket.vectors[slot] = vector
+        if signature.dimensions is not None:
+            bucket.dims[slot] = signature.dimensions
+            bucket.has_dims[slot] = True
+        else:
+            bucket.has_dims[slot] = False
+        bucket.used[slot] = True
+        bucket.entries[slot] = entry
+        bucket.generations[slot] += 1
+        self._size += 1
+        heapq.heappush(self._expiry, (signature.last_seen_time + self.max_age, next(self._counter),
+                                      product_type, slot, bucket.generations[slot]))
+        return product_type, slot
+
+    def best_match(self, product_type, signature, threshold):
+        """
+        Sucht den ähnlichsten Eintrag desselben Produkttyps.
+        Liefert (Schlüssel, Ähnlichkeit) oder (None, 0.0), wenn keiner über threshold liegt.
+        """
+        bucket = self._buckets.get(product_type)
+        if bucket is None or signature.color_hist is None or not bucket.used.any():
+            return None, 0.0
+        query = _normalized(signature.color_hist)
+        if query.shape[0] != bucket.vectors.shape[1]:
+            return None, 0.0
+
+        # Farbe: Kosinus-Ähnlichkeit aller Einträge mit einem Matrix-Vektor-Produkt
+        similarity = REID_HIST_WEIGHT * (bucket.vectors @ query)
+        if signature.dimensions is not None:
+            # Größe: mittleres Verhältnis kleinere/größere Breite und Höhe, plus Bonus
+            query_dims = np.asarray(signature.dimensions, dtype=np.float32)
+            ratios = np.minimum(bucket.dims, query_dims) / np.maximum(np.maximum(bucket.dims, query_dims), 1e-6)
+            dim_similarity = REID_DIM_WEIGHT * ratios.mean(axis=1) + REID_DIM_BONUS
+            similarity += np.where(bucket.has_dims, dim_similarity, 0.0)
+        similarity[~bucket.used] = -np.inf
+
+        slot = int(np.argmax(similarity))
+        best = float(similarity[slot])
+        if best <= threshold:
+            return None, 0.0
+        return (product_type, slot), best
+
+    def get(self, key):
+        """Eintrag zum Schlüssel, ohne ihn zu entfernen."""
+        product_type, slot = key
+        return self._buckets[product_type].entries[slot]
+
+    def pop(self, key):
+        """Entfernt den Eintrag zum Schlüssel und gibt ihn zurück."""
+        product_type, slot = key
+        bucket = self._buckets[product_type]
+        entry = bucket.entries[slot]
+        bucket.entries[slot] = None
+        bucket.used[slot] = False
+        bucket.free.append(slot)
+        self._size -= 1
+        return entry
+
+    def expire(self, now):
+        """Entfernt alle abgelaufenen Einträge; liefert sie als Liste."""
+        expired = []
+        while self._expiry and self._expiry[0][0] < now:
+            _, _, product_type, slot, generation = heapq.heappop(self._expiry)
+            bucket = self._buckets.get(product_type)
+            if bucket is None or not bucket.used[slot] or bucket.generations[slot] != generation:
+                continue  # Slot wurde inzwischen entnommen oder neu belegt
+            entry = bucket.entries[slot]
+            expires_at = entry[0].last_seen_time + self.max_age
+            if expires_at >= now:
+                # Signatur wurde seit dem Ablegen aufgefrischt: neu einsortieren
+                heapq.heappush(self._expiry, (expires_at, next(self._counter), product_type, slot, generation))
+                continue
+            expired.append(self.pop((product_type, slot)))
+        return expired
+
+
+def _normalized(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
@@ -0,0 +1,95 @@
+# replay_report.py
+#
+# Auswertung einer Wiedergabe (oder eines Live-Laufs) für Regressionsvergleiche:
+#   - Event-Stream: jede Schreiboperation, die der Monitor an das DB-Journal übergibt,
+#     mit Frame-Nummer und Zeit relativ zum ersten Frame (JSON Lines)
+#   - Stufenzeiten je Frame: Capture, Inferenz, Tracking in ms (JSON Lines)
+#   - Zusammenfassung am Ende: Mittelwert/p50/p95/max je Stufe und Anzahl Operationen je Typ
+# Zwei Läufe über dieselbe Aufnahme lassen sich so per diff bzw. über die Zusammenfassung vergleichen.
+# Mit mehreren Kameras (monitor_service.py) enthalten beide Streams zusätzlich das Feld "camera".
+
+import json
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from debug_utils import log_debug
+
+
+def _json_value(value):
+    """NumPy-Skalare als Python-Zahlen, alles andere als Text."""
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class ReplayReport:
+    """Sammelt Event-Stream und Stufenzeiten; die Dateien sind optional."""
+
+    def __init__(self, events_path=None, timings_path=None):
+        self.events_file = open(events_path, "w", encoding="utf-8") if events_path else None
+        self.timings_file = open(timings_path, "w", encoding="utf-8") if timings_path else None
+        self.frame_id = 0
+        self.frame_time = 0.0
+        self.camera = None
+        self.frames = 0
+        self.inferred_frames = 0
+        self.event_counts = Counter()
+        self.stage_durations = defaultdict(list)
+        self._first_timestamp = None
+        self._wall_start = time.time()
+
+    def begin_frame(self, packet):
+        """Merkt Frame-Nummer und relative Zeit für die folgenden Journal-Operationen."""
+        if self._first_timestamp is None:
+            self._first_timestamp = packet.timestamp
+        self.frame_id = packet.frame_id
+        self.frame_time = packet.timestamp - self._first_timestamp
+        self.camera = packet.camera
+
+    def on_journal_op(self, name, args, kwargs):
+        """Beobachter für WriteBehindJournal.observers."""
+        self.event_counts[name] += 1
+        if self.events_file is not None:
+            record = {"frame": self.frame_id, "t": round(self.frame_time, 3), "op": name,
+                      "args": list(args), "kwargs": kwargs}
+            if self.camera is not None:
+                record["camera"] = self.camera
+            self.events_file.write(json.dumps(record, default=_json_value) + "\n")
+
+    def end_frame(self, packet, tracking_duration):
+        """Übernimmt die Stufenzeiten des Frames (in Sekunden) inklusive Tracking."""
+        timings = dict(packet.timings)
+        timings["tracking"] = tracking_duration
+        for stage, duration in timings.items():
+            self.stage_durations[stage].append(duration)
+        self.frames += 1
+        self.inferred_frames += int(packet.inferred)
+        if self.timings_file is not None:
+            record = {"frame": packet.frame_id, "inferred": packet.inferred}
+            if packet.camera is not None:
+                record["camera"] = packet.camera
+            record.update({f"{stage}_ms": round(duration * 1000, 3) for stage, duration in timings.items()})
+            self.timings_file.write(json.dumps(record) + "\n")
+
+    def summary_lines(self):
+        elapsed = time.time() - self._wall_start
+        lines = [f"{self.frames} Frames in {elapsed:.1f} s ({self.frames / elapsed if elapsed > 0 else 0:.1f} FPS), "
+                 f"davon {self.inferred_frames} inferiert"]
+        for stage, durations in self.stage_durations.items():
+            ms = np.array(durations) * 1000
+            lines.append(f"  {stage:<10} Mittel {ms.mean():7.2f} ms | p50 {np.percentile(ms, 50):7.2f} | "
+                         f"p95 {np.percentile(ms, 95):7.2f} | max {ms.max():7.2f}")
+        lines.append(f"  Journal-Operationen: {sum(self.event_counts.values())}")
+        for name, count in sorted(self.event_counts.items()):
+            lines.append(f"    {name}: {count}")
+        return lines
+
+    def close(self):
+        """Schreibt die Zusammenfassung ins Log und auf die Konsole und schließt die Dateien."""
+        log_debug("=== WIEDERGABE-AUSWERTUNG ===")
+        for line in self.summary_lines():
+            log_debug(line)
+            print(line)
+        for f in (self.events_file, self.timings_file):
+            if f is not None:
+                f.close()
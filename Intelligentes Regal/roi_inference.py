@@ -0,0 +1,102 @@
+# roi_inference.py
+#
+# Inferenz nur auf den relevanten Bildbereichen.
+# Statt des ganzen Kamerabilds wird YOLO auf dem umschließenden Rechteck aller Regal-ROIs
+# (plus Rand für die Entnahme-Verfolgung) oder auf einzelnen Regal-Kacheln ausgeführt.
+# Ultralytics skaliert den Ausschnitt mit Letterboxing auf imgsz; die Boxen werden
+# anschließend wieder in Frame-Koordinaten zurückgerechnet.
+# detect_batch() bündelt die Ausschnitte mehrerer Kameras in einem Aufruf des gemeinsamen Modells.
+
+import time
+
+from color_features import roi_union
+from detections import FrameDetections
+from metrics import STAGE_SECONDS
+
+# Modi: "full" (ganzes Frame), "roi" (ein Ausschnitt über alle Regale), "tiles" (ein Ausschnitt je Regal, gebündelt)
+INFERENCE_MODE = "roi"
+INFERENCE_ROI_MARGIN = 80   # Rand in Pixeln um die Regale, damit entnommene Objekte sichtbar bleiben
+INFERENCE_IMGSZ = 640       # Eingabegröße des Modells (Letterboxing durch Ultralytics)
+TILE_NMS_IOU = 0.5          # Doppelte Erkennungen in überlappenden Kachelrändern zusammenfassen
+
+
+def expand_box(x1, y1, x2, y2, margin, frame_shape):
+    """Vergrößert ein Rechteck um margin und begrenzt es auf die Frame-Größe."""
+    height, width = frame_shape[:2]
+    return (max(0, x1 - margin), max(0, y1 - margin),
+            min(width, x2 + margin), min(height, y2 + margin))
+
+
+def roi_crop_region(rois, margin, frame_shape):
+    """Umschließendes Rechteck (x1, y1, x2, y2) aller ROIs plus Rand, begrenzt auf das Frame."""
+    return expand_box(*roi_union(rois), margin, frame_shape)
+
+
+class ShelfDetector:
+    """
+    Führt das YOLO-Modell im gewählten Modus aus und liefert FrameDetections in Frame-Koordinaten.
+    Wird als model_fn an die MonitorPipeline übergeben, so dass auch die Dekodierung im Inferenz-Worker läuft.
+    """
+
+    def __init__(self, model, rois, allowed_classes, mode=INFERENCE_MODE,
+                 margin=INFERENCE_ROI_MARGIN, imgsz=INFERENCE_IMGSZ):
+        if mode not in ("full", "roi", "tiles"):
+            raise ValueError(f"Unbekannter Inferenz-Modus: {mode}")
+        self.model = model
+        self.rois = rois
+        self.allowed_classes = allowed_classes
+        self.mode = mode if rois else "full"
+        self.margin = margin
+        self.imgsz = imgsz
+
+    def regions(self, frame_shape):
+        """Liefert die Ausschnitte (x1, y1, x2, y2), auf denen das Modell läuft."""
+        height, width = frame_shape[:2]
+        if self.mode == "full":
+            return [(0, 0, width, height)]
+        if self.mode == "roi":
+            return [roi_crop_region(self.rois, self.margin, frame_shape)]
+        return [expand_box(rx, ry, rx + rw, ry + rh, self.margin, frame_shape)
+                for rx, ry, rw, rh in self.rois.values()]
+
+    def crops(self, frame):
+        """Liefert die Bildausschnitte für das Modell und ihre Regionen (x1, y1, x2, y2)."""
+        regions = self.regions(frame.shape)
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions], regions
+
+    def decode(self, results, regions):
+        """Fasst die Modellergebnisse der Ausschnitte zu FrameDetections in Frame-Koordinaten zusammen."""
+        # Dekodierung separat messen (ist in der Stufe "inference" enthalten)
+        decode_start = time.perf_counter()
+        parts = []
+        for result, (x1, y1, x2, y2) in zip(results, regions):
+            parts.append(FrameDetections.from_results([result], self.allowed_classes).shifted(x1, y1))
+        detections = FrameDetections.concatenate(parts)
+        if len(parts) > 1:
+            detections = detections.nms(TILE_NMS_IOU)
+        STAGE_SECONDS.labels("decode").observe(time.perf_counter() - decode_start)
+        return detections
+
+    def __call__(self, frame):
+        crops, regions = self.crops(frame)
+        # Alle Kacheln in einem Batch durch das Modell
+        results = self.model(crops if len(crops) > 1 else crops[0], imgsz=self.imgsz)
+        return self.decode(results, regions)
+
+
+def detect_batch(model, jobs, imgsz=INFERENCE_IMGSZ):
+    """
+    Ein Modellaufruf für die Frames mehrerer Kameras.
+    jobs: Liste von (ShelfDetector, Frame); liefert die FrameDetections je Job in derselben Reihenfolge.
+    Die Ausschnitte aller Frames laufen als ein Batch durch das gemeinsame Modell.
+    """
+    crops, spans = [], []
+    for detector, frame in jobs:
+        frame_crops, regions = detector.crops(frame)
+        spans.append((len(crops), regions))
+        crops.extend(frame_crops)
+    if not crops:
+        return []
+    results = model(crops, imgsz=imgsz)
+    return [detector.decode(results[start:start + len(regions)], regions)
+            for (detector, _), (start, regions) in zip(jobs, spans)]
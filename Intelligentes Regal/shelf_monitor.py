@@ -0,0 +1,1764 @@
+# shelf_monitor.py
+#
+# Überwachung der Regale einer Kamera: ROIs und virtuelle Linien, SORT-Tracker, Re-Identifikation,
+# strikte Inventarverwaltung, Lagerbestandsermittlung sowie Zustandsmaschine und Event-Logik.
+# Der gesamte Zustand einer Kamera liegt in einer ShelfMonitor-Instanz, so dass mehrere Kameras
+# in einem Prozess laufen können (yolo_monitor.py: eine Kamera mit Fenster, monitor_service.py:
+# mehrere Kameras mit gemeinsamem Modell). Alle Kameras schreiben über dasselbe WriteBehindJournal;
+# die Zeit der Monitor-Logik liefert die MonitorClock der jeweiligen Kamera.
+
+import json
+import os.path
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+from scipy.spatial.distance import cosine
+
+import db_utils
+import metrics
+from color_features import FrameFeatureCache, roi_union
+from debug_utils import log_debug, log_enabled
+from detections import FrameDetections
+from object_signature import extract_signature
+from reid_gallery import ReIDGallery
+from shelf_state import ObjectRegistry, ObjectState, ShelfGeometry, ShelfStateMachine, TrackedObject
+from sort import Sort
+from video_source import MonitorClock
+
+###############################################
+# Konfiguration
+###############################################
+
+# Konfigurationsdatei für ROIs und Linien
+CONFIG_FILE = "regal_config.json"
+
+# Signaldatei der Dashboards: Lagerbestand neu ermitteln
+REFRESH_SIGNAL_FILE = "inventory_refresh.signal"
+
+ALLOWED_CLASSES = ["cup", "book", "bottle", "wine glass"]
+# Limits für verschiedene Objekttypen definieren
+OBJECT_LIMITS = {
+    "cup": 3,
+    "book": 3,
+    "bottle": 3,
+    "wine glass": 3
+}
+
+
+expected_products = {
+    0: "cup",
+    1: "book",
+    2: "bottle",
+    3: "wine glass"
+}
+
+
+PRODUCT_SHELF_MAPPING = {
+    "cup": 0,        # Tassen in Regal 1 (Index 0)
+    "book": 1,       # Bücher in Regal 2 (Index 1)
+    "bottle": 3,     # Flaschen in Regal 4 (Index 3) - geändert von 2 auf 3
+    "wine glass": 2  # Gläser in Regal 3 (Index 2)
+}
+# Function to check if product is in its designated shelf
+def is_product_in_correct_shelf(product_type, shelf_id, product_shelves=PRODUCT_SHELF_MAPPING):
+    """
+    Checks if a product is in its designated shelf.
+    If no mapping exists for the product, allows it to be in any shelf.
+    """
+    if product_type in product_shelves:
+        return shelf_id == product_shelves[product_type]
+    # If product has no designated shelf mapping, allow it in any shelf
+    return True
+
+def camera_products(products=None, shelf_offset=0):
+    """
+    Produkt-Regal-Zuordnung einer Kamera mit globalen Regalnummern.
+    products ordnet Produkte den lokalen Regalnummern der Kamera zu (cameras.json); ohne Angabe
+    gelten PRODUCT_SHELF_MAPPING und expected_products. shelf_offset verschiebt wie bei load_config.
+    Rückgabe: (product_shelves, shelf_products) - Regal je Produkt und erwartetes Produkt je Regal
+    """
+    if products is None:
+        product_shelves, shelf_products = PRODUCT_SHELF_MAPPING, expected_products
+    else:
+        product_shelves = {product: int(shelf) for product, shelf in products.items()}
+        shelf_products = {shelf: product for product, shelf in product_shelves.items()}
+    return ({product: shelf + shelf_offset for product, shelf in product_shelves.items()},
+            {shelf + shelf_offset: product for shelf, product in shelf_products.items()})
+
+
+# YOLO-Detektionsparameter - reduzierter Schwellenwert für bessere Cup-Erkennung
+confidence_threshold = 0.35  # Reduziert, um mehr Cups zu erkennen
+
+# Lade ROIs und virtuelle Linien aus der Konfigurationsdatei
+def load_config(config_file=CONFIG_FILE, shelf_offset=0):
+    """
+    Lädt die ROIs und Linien aus der Konfigurationsdatei.
+    shelf_offset verschiebt die Regalnummern, damit die Regale mehrerer Kameras
+    in der gemeinsamen Datenbank unterscheidbar bleiben.
+    """
+    if not os.path.exists(config_file):
+        print(f"Konfigurationsdatei nicht gefunden: {config_file}")
+        print("Bitte führen Sie zuerst regal_setup.py aus, um die Regale zu definieren.")
+        return {}, {}
+    
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+            rois = {int(k) + shelf_offset: tuple(v) for k, v in config.get('rois', {}).items()}
+            lines = {}
+            
+            # Konvertiere die Linien-Konfiguration in das richtige Format
+            for shelf_id, y_rel in {int(k) + shelf_offset: v for k, v in config.get('lines', {}).items()}.items():
+                if shelf_id in rois:
+                    lines[shelf_id] = y_rel
+            
+            print(f"Konfiguration geladen ({config_file}): {len(rois)} Regale, {len(lines)} Linien")
+            return rois, lines
+    except Exception as e:
+        print(f"Fehler beim Laden der Konfiguration: {e}")
+        return {}, {}
+
+def shelf_layout(config_file=CONFIG_FILE, shelf_offset=0, use_defaults=True):
+    """
+    Liefert (rois, virtual_lines) einer Kamera: ROIs in Frame-Koordinaten und die Höhe
+    der virtuellen (roten) Linie je Regal relativ zur ROI-Oberkante.
+    Ohne Konfiguration werden mit use_defaults die Standard-ROIs eines 2x2-Regals verwendet.
+    """
+    # Lade die Konfiguration
+    loaded_rois, virtual_line_offsets = load_config(config_file, shelf_offset)
+
+    # Fallback zu hartkodierten Werten, falls keine Konfiguration vorhanden ist
+    if not loaded_rois and use_defaults:
+        print("Verwende Standard-ROIs, da keine Konfiguration gefunden wurde.")
+        # Definiere ROIs (globale Koordinaten) für ein 2x2-Regal.
+        loaded_rois = {
+            shelf_offset + 0: (338, 32, 302, 197),
+            shelf_offset + 1: (337, 237, 302, 159),
+            shelf_offset + 2: (2, 34, 302, 204),
+            shelf_offset + 3: (0, 248, 311, 152)
+        }
+        
+        # Berechne virtuelle Linien (z. B. 80% der ROI-Höhe minus einem Puffer)
+        virtual_line_offsets = {}
+        buffer_zone = 20  # zusätzlicher Puffer in Pixeln
+        for shelf, (rx, ry, rw, rh) in loaded_rois.items():
+            virtual_line_offsets[shelf] = int(0.8 * rh) - buffer_zone
+
+    # Berechne virtuelle Linien basierend auf den Offsets
+    virtual_lines = {}
+    for shelf, (rx, ry, rw, rh) in loaded_rois.items():
+        if shelf in virtual_line_offsets:
+            virtual_lines[shelf] = virtual_line_offsets[shelf]
+        else:
+            # Fallback: 80% der Regalhöhe
+            virtual_lines[shelf] = int(0.8 * rh)
+
+    return loaded_rois, virtual_lines
+
+def update_detected_objects_in_db(rois, enhanced_tracker, journal):
+    """Aktualisiert die Anzahl der erkannten Objekte in der Datenbank."""
+    # Sammle alle erkannten Objekte nach Regal und Typ
+    detected_objects = {}
+    
+    # Initialisiere alle Regale mit 0 für Cups
+    for shelf_id in rois.keys():
+        detected_objects[(shelf_id, "cup")] = 0
+    
+    # Zähle die tatsächlich erkannten Objekte (laufende Zähler ohne REMOVED-Objekte)
+    detected_objects.update(enhanced_tracker.active_objects.present_counts())
+    
+    # Zählerstände im Journal vormerken; der Writer-Thread schreibt nur den jeweils letzten Wert
+    now = int(time.time())
+    for (shelf_id, product_type), count in detected_objects.items():
+        journal.set_detected_count(shelf_id, product_type, count, now)
+        log_debug(f"YOLO Erkenntnisse vorgemerkt - Regal {shelf_id+1} {product_type}: {count} Objekte")
+    
+    return detected_objects
+
+
+def consume_refresh_signal(signal_file=REFRESH_SIGNAL_FILE):
+    """Prüft, ob eine Signaldatei zur Neuinitialisierung existiert, und löscht sie."""
+    if not os.path.exists(signal_file):
+        return False
+    try:
+        os.remove(signal_file)
+    except Exception as e:
+        log_debug(f"Fehler beim Verarbeiten der Signaldatei: {str(e)}")
+        return False
+    log_debug("Signaldatei zur Neuinitialisierung gefunden. Starte Neuinitialisierung...")
+    return True
+
+###############################################
+# Strikte Inventarverwaltung
+###############################################
+
+class StrictInventory:
+    """Strikte Inventarverwaltung, die verhindert, dass mehr Objekte verfolgt werden als physisch möglich."""
+    
+    def __init__(self, max_objects_per_product, clock=None):
+        # Dictionary für die Zählung der aktiven Objekte: {product_type: count}
+        self.active_objects = {product_type: 0 for product_type in ALLOWED_CLASSES}
+        self.max_objects = max_objects_per_product
+        self.clock = clock or MonitorClock()
+        self.last_warning_time = 0
+        
+        # Aktive Objekt-IDs für besseres Tracking
+        self.active_object_ids = {product_type: set() for product_type in ALLOWED_CLASSES}
+        
+        log_debug(f"StrictInventory initialisiert mit Objektlimits: {max_objects_per_product}")
+    
+    def can_add_object(self, product_type, object_id=None):
+        """Prüft, ob ein neues Objekt hinzugefügt werden darf."""
+        # NEU: Prüfe, ob die Objekt-ID bereits bekannt ist
+        if object_id is not None and object_id in self.active_object_ids.get(product_type, set()):
+            log_debug(f"Objekt-ID {object_id} bereits bekannt, darf hinzugefügt werden")
+            return True
+                
+        count = self.active_objects.get(product_type, 0)
+        # Berechne das Limit für diesen Produkttyp
+        max_limit = self.max_objects.get(product_type, 3) if isinstance(self.max_objects, dict) else self.max_objects
+        
+        # WICHTIG: Genau max_objects erlauben (nicht kleiner als)
+        result = count < max_limit
+        
+        # Immer den aktuellen Status loggen für bessere Diagnose
+        log_debug(f"Prüfe Objekt-Hinzufügung: {product_type} (ID: {object_id}), aktuell {count}/{max_limit}")
+        
+        current_time = self.clock.time()
+        if not result and current_time - self.last_warning_time > 5:
+            log_debug(f"⚠️ Maximale Anzahl von {product_type} überschritten: {count}/{max_limit}")
+            self.last_warning_time = current_time
+                
+        return result
+    
+    def add_object(self, product_type, object_id=None):
+        """Fügt ein Objekt zum Inventar hinzu."""
+        # DEBUG: Zeige detaillierte Informationen zum aktuellen Zustand
+        log_debug(f"Versuche Objekt hinzuzufügen: {product_type} (ID: {object_id})")
+        log_debug(f"Aktueller Bestand: {self.active_objects.get(product_type, 0)}/{self.max_objects}")
+        
+        # NEU: Wenn Objekt bereits bekannt, nicht erneut zählen
+        if object_id is not None and object_id in self.active_object_ids.get(product_type, set()):
+            log_debug(f"Objekt-ID {object_id} bereits im Inventar, keine Zählung erhöht")
+            return True
+        
+        # Berechne das Limit für diesen Produkttyp
+        max_limit = self.max_objects.get(product_type, 3) if isinstance(self.max_objects, dict) else self.max_objects
+        
+        # WICHTIG: Erzwinge bis zu max_limit, wenn wir weniger haben
+        current_count = self.active_objects.get(product_type, 0)
+        if current_count < max_limit:
+            self.active_objects[product_type] = current_count + 1
+            
+            # NEU: Objekt-ID speichern, wenn vorhanden
+            if object_id is not None:
+                if product_type not in self.active_object_ids:
+                    self.active_object_ids[product_type] = set()
+                self.active_object_ids[product_type].add(object_id)
+                
+            log_debug(f"Objekt erfolgreich hinzugefügt: {product_type} (ID: {object_id}), neue Zählung: {self.active_objects[product_type]}")
+            return True
+        else:
+            # WICHTIG: Bei Cups versuchen wir trotzdem, sie hinzuzufügen, wenn die ID neu ist
+            # Dies hilft beim Wiedererkennen nach dem Entfernen
+            if product_type == "cup" and object_id is not None:
+                if product_type not in self.active_object_ids:
+                    self.active_object_ids[product_type] = set()
+                
+                # Prüfen, ob die ID neu ist
+                if object_id not in self.active_object_ids[product_type]:
+                    # Wir fügen die ID hinzu, auch wenn wir den Zähler nicht erhöhen
+                    self.active_object_ids[product_type].add(object_id)
+                    log_debug(f"Objekt-ID {object_id} für Cup wurde in ID-Liste aufgenommen, auch wenn Maximum erreicht")
+                    # Wir geben True zurück, damit die Verarbeitung fortgesetzt wird
+                    return True
+            
+            log_debug(f"⚠️ Kann {product_type} (ID: {object_id}) nicht hinzufügen: Maximum von {max_limit} erreicht")
+            return False
+    def remove_object(self, product_type, object_id=None):
+        """Entfernt ein Objekt aus dem Inventar."""
+        # NEU: Wenn Objekt-ID bekannt ist, aus der ID-Liste entfernen
+        if object_id is not None and product_type in self.active_object_ids:
+            if object_id in self.active_object_ids[product_type]:
+                self.active_object_ids[product_type].remove(object_id)
+                log_debug(f"Objekt-ID {object_id} aus Inventar-Tracking entfernt")
+            else:
+                log_debug(f"Objekt-ID {object_id} nicht im Inventar gefunden")
+                # WICHTIG: Auch wenn die ID nicht gefunden wird, reduzieren wir trotzdem den Zähler
+                # Dies verhindert, dass Cups "stecken bleiben" wenn ID-Tracking fehlschlägt
+        
+        if product_type in self.active_objects and self.active_objects[product_type] > 0:
+            self.active_objects[product_type] -= 1
+            log_debug(f"Objekt entfernt: {product_type}, neue Zählung: {self.active_objects[product_type]}")
+            return True
+        return False
+    
+    def get_count(self, product_type):
+        """Gibt die aktuelle Anzahl von Objekten eines Typs zurück."""
+        return self.active_objects.get(product_type, 0)
+    
+    def set_count(self, product_type, count):
+        """Setzt die Anzahl für einen Produkttyp direkt, aber begrenzt auf das Maximum."""
+        # Stelle sicher, dass count nie den maximal erlaubten Wert übersteigt
+        max_limit = self.max_objects.get(product_type, 3) if isinstance(self.max_objects, dict) else self.max_objects
+        self.active_objects[product_type] = min(max(0, count), max_limit)
+        log_debug(f"Inventory-Zählung gesetzt: {product_type} = {self.active_objects[product_type]} (begrenzt auf max {max_limit})")
+
+    def print_status(self):
+        """Gibt den aktuellen Status des Inventars aus."""
+        log_debug(f"Inventar-Status: {self.active_objects}")
+        log_debug(f"Aktive Objekt-IDs: {self.active_object_ids}")
+
+###############################################
+# Automatische Lagerbestandsermittlung
+###############################################
+
+class InventoryInitializer:
+    def __init__(self, rois, expected_products, allowed_classes, confidence_threshold=0.5, duration=10, max_objects=None,
+                 clock=None, journal=None, strict_inventory=None, product_shelves=PRODUCT_SHELF_MAPPING):
+        """
+        Initialisiert die automatische Lagerbestandsermittlung für die ersten 10 Sekunden.
+        """
+        self.rois = rois
+        self.expected_products = expected_products
+        self.product_shelves = product_shelves
+        self.allowed_classes = allowed_classes
+        self.confidence_threshold = confidence_threshold
+        self.duration = duration
+        self.max_objects = max_objects or OBJECT_LIMITS  # Verwende Objekt-spezifische Limits
+        self.clock = clock or MonitorClock()
+        self.journal = journal
+        self.strict_inventory = strict_inventory
+        
+        # Liste von Counter-Objekten für jeden Frame
+        self.frame_detections = {shelf_id: [] for shelf_id in rois.keys()}
+        
+        # Zeitpunkte
+        self.start_time = None
+        self.end_time = None
+        
+        # Status
+        self.is_initializing = False
+        self.is_initialized = False
+        
+        # Thread für asynchrone Initialisierung
+        self.init_thread = None
+        
+        log_debug(f"InventoryInitializer bereit mit Objektlimits: {self.max_objects}")
+        
+    def start_initialization(self):
+        """Startet die Initialisierungsphase"""
+        if self.is_initializing or self.is_initialized:
+            log_debug("Lagerbestandsermittlung bereits aktiv oder abgeschlossen.")
+            return False
+            
+        self.start_time = self.clock.time()
+        self.end_time = self.start_time + self.duration
+        self.is_initializing = True
+        self.is_initialized = False
+        
+        # Zurücksetzen der Erkennungslisten
+        self.frame_detections = {shelf_id: [] for shelf_id in self.rois.keys()}
+        
+        log_debug(f"Lagerbestandsermittlung gestartet. Dauer: {self.duration} Sekunden.")
+        
+        # Timer zur automatischen Finalisierung
+        self.init_thread = threading.Timer(self.duration, self.finalize_initialization)
+        self.init_thread.daemon = True
+        self.init_thread.start()
+        
+        return True
+        
+    def process_detections(self, frame, detections):
+        """
+        Verarbeitet Erkennungen für die Lagerbestandsermittlung.
+        detections: FrameDetections des aktuellen Frames (bereits auf erlaubte Klassen gefiltert)
+        frame: Bild für die Visualisierung oder None (Headless ohne Zuschauer)
+        """
+        if not self.is_initializing or self.is_initialized:
+            return
+            
+        current_time = self.clock.time()
+        
+        # Verbleibende Zeit anzeigen
+        remaining = max(0, self.end_time - current_time)
+        percent = int((self.duration - remaining) / self.duration * 100)
+        
+        # Trenne ausreichend und niedrig konfidente Erkennungen
+        confident, low_conf = detections.split(self.confidence_threshold)
+        
+        if frame is not None:
+            # Statustext auf Frame anzeigen
+            status_text = f"Lagerbestand wird ermittelt: {percent}% ({int(remaining)}s übrig)"
+            cv2.putText(frame, status_text, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            
+            # DEBUG: Auch niedrig-konfidente Objekte anzeigen, aber in anderer Farbe
+            for (x1, y1, x2, y2), conf, label in zip(low_conf.boxes, low_conf.conf, low_conf.labels):
+                # Objekt mit niedriger Konfidenz in Rot anzeigen
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 1)
+                cv2.putText(frame, f"Low-conf {label} {int(conf*100)}%", (x1, y1-10),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+        
+        centers = confident.centers()
+        
+        for shelf_id, (rx, ry, rw, rh) in self.rois.items():
+            # Visualisiere aktives Regal mit grünem Rahmen
+            if frame is not None:
+                cv2.rectangle(frame, (rx, ry), (rx+rw, ry+rh), (0, 255, 0), 3)
+            
+            # Prüfen, welche Mittelpunkte im aktuellen Regal liegen (für alle Boxen auf einmal)
+            in_shelf = ((centers[:, 0] >= rx) & (centers[:, 0] <= rx+rw) &
+                        (centers[:, 1] >= ry) & (centers[:, 1] <= ry+rh))
+            
+            # Zähle für dieses Regal die Objekte in diesem Frame
+            shelf_objects = 0
+            
+            for i in np.flatnonzero(in_shelf):
+                shelf_objects += 1
+                if frame is None:
+                    continue
+                x1, y1, x2, y2 = confident.boxes[i]
+                center_x, center_y = centers[i]
+                
+                # Erkanntes Objekt im Regal markieren
+                cv2.putText(frame, f"{confident.labels[i].capitalize()} #{shelf_objects}", (x1, y1-10),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                # Zeichne den Mittelpunkt klar sichtbar
+                cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
+            
+            # Speichere die Anzahl der Objekte für dieses Regal in diesem Frame
+            self.frame_detections[shelf_id].append(shelf_objects)
+            
+            # Berechne die aktuelle Häufigkeitsverteilung der erkannten Anzahlen
+            counter = Counter(self.frame_detections[shelf_id])
+            
+            # Zeige die häufigste Anzahl im Frame an
+            if frame is not None:
+                shelf_text = f"Regal {shelf_id+1}: "
+                if counter:
+                    most_common, count = counter.most_common(1)[0]
+                    percentage = count / len(self.frame_detections[shelf_id]) * 100
+                    shelf_text += f"{most_common} Objekte ({percentage:.1f}% der Frames)"
+                else:
+                    shelf_text += "Keine Erkennung"
+                    
+                cv2.putText(frame, shelf_text, (rx, ry-5),
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+        
+        # Prüfe, ob die Initialisierungsphase abgelaufen ist
+        if current_time >= self.end_time and self.is_initializing:
+            self.finalize_initialization()
+            
+    def reset(self):
+        """Setzt die Initialisierung zurück"""
+        if self.init_thread and self.init_thread.is_alive():
+            self.init_thread.cancel()
+            
+        self.is_initializing = False
+        self.is_initialized = False
+        self.frame_detections = {shelf_id: [] for shelf_id in self.rois.keys()}
+        log_debug("Lagerbestandsermittlung zurückgesetzt.")
+        
+    def finalize_initialization(self):
+        """
+        Schließt die Initialisierungsphase ab und setzt den Lagerbestand auf die eingegebenen Limits.
+        """
+        if not self.is_initializing or self.is_initialized:
+            return
+            
+        self.is_initializing = False
+        self.is_initialized = True
+        
+        log_debug("Lagerbestandsermittlung wird übersprungen. Setze initialen Lagerbestand auf eingegebene Limits...")
+        
+        # Ausstehende Journal-Einträge zuerst schreiben, damit die Reihenfolge erhalten bleibt
+        self.journal.flush()
+        
+        # Verwende die eingegebenen Objektlimits als initialen Bestand
+        object_limits = self.max_objects if isinstance(self.max_objects, dict) else {obj_type: self.max_objects for obj_type in ALLOWED_CLASSES}
+        
+        # Globalen Bestand für Tracking initialisieren
+        global_inventory = {product_type: 0 for product_type in ALLOWED_CLASSES}
+        
+        # Für jedes Regal: Setze den korrekten Produkttyp basierend auf der Produkt-Regal-Zuordnung der Kamera
+        for shelf_id in self.rois.keys():
+            # Finde das Produkt, das laut Konfiguration in dieses Regal gehört
+            matching_product = None
+            for product, mapped_shelf in self.product_shelves.items():
+                if mapped_shelf == shelf_id:
+                    matching_product = product
+                    break
+            
+            if matching_product is None:
+                log_debug(f"Regal {shelf_id+1}: Kein passendes Produkt in der Produkt-Regal-Zuordnung gefunden. Verwende expected_products.")
+                matching_product = self.expected_products.get(shelf_id)
+                
+                if matching_product is None:
+                    log_debug(f"Regal {shelf_id+1}: Auch kein Produkt in expected_products gefunden. Überspringe.")
+                    continue
+            
+            # Hole den eingegebenen Limit-Wert für dieses Produkt
+            target_count = object_limits.get(matching_product, 0)
+            
+            # Setze den initialen Lagerbestand auf den Zielwert
+            actual_count = db_utils.set_initial_inventory(shelf_id, matching_product, target_count)
+            global_inventory[matching_product] = global_inventory.get(matching_product, 0) + actual_count
+            
+            log_debug(f"Regal {shelf_id+1}: Setze {matching_product} auf {actual_count} (Zielwert: {target_count}).")
+            
+            # Setze alle anderen Produkttypen in diesem Regal auf 0
+            for other_product in ALLOWED_CLASSES:
+                if other_product != matching_product:
+                    db_utils.set_initial_inventory(shelf_id, other_product, 0)
+                    log_debug(f"Regal {shelf_id+1}: Lösche {other_product} (falsches Produkt für dieses Regal).")
+        
+        log_debug("Initialer Lagerbestand basierend auf eingegebenen Limits gesetzt.")
+        
+        # Aktualisiere die Datenbank
+        db_utils.clear_current_events()
+        
+        # Synchronisiere das strikte Inventory-System mit dem tatsächlichen Bestand
+        for product_type in ALLOWED_CLASSES:
+            # Setze die Anzahl direkt aus unserem Tracking
+            count = global_inventory.get(product_type, 0)
+            self.strict_inventory.set_count(product_type, count)
+            log_debug(f"Strikte Inventarverwaltung initialisiert: {count} {product_type}(s)")
+
+###############################################
+# Erweitertes Objekt-Tracking mit Re-Identifikation
+###############################################
+
+def close_not_paid_events_as_returned(product_type, limit, shelf_ids):
+    """Schließt die ältesten offenen 'not paid' Events eines Produkttyps in den Regalen shelf_ids als 'returned'."""
+    with db_utils.transaction() as c:
+        # Hole alle offenen "not paid" Events für diesen Produkttyp in den Regalen der Kamera
+        shelf_ids = list(shelf_ids)
+        c.execute(f'''
+            SELECT id, shelf_id FROM events
+            WHERE product_type = ? AND event_type = "removal" AND status = "not paid" AND resolved = 0
+              AND shelf_id IN ({", ".join("?" * len(shelf_ids))})
+            ORDER BY event_time ASC
+            LIMIT ?
+        ''', (product_type, *shelf_ids, limit))
+        
+        not_paid_events = c.fetchall()
+        
+        # Markiere die ältesten "not paid" Events als "returned"
+        for event_id, original_shelf_id in not_paid_events:
+            log_debug(f"  → Markiere Event ID {event_id} (Regal {original_shelf_id+1}) als 'returned'")
+            
+            # Aktualisiere direkt in der Datenbank
+            resolution_time = int(time.time())
+            c.execute('''
+                UPDATE events
+                SET status = "returned", resolved = 1, resolution_time = ?
+                WHERE id = ?
+            ''', (resolution_time, event_id))
+
+def mark_not_paid_events_misplaced(product_type, limit, shelf_ids):
+    """Markiert die ältesten offenen 'not paid' Events eines Produkttyps in den Regalen shelf_ids als 'misplaced'."""
+    with db_utils.transaction() as c:
+        # Hole alle offenen "not paid" Events für diesen Produkttyp in den Regalen der Kamera
+        shelf_ids = list(shelf_ids)
+        c.execute(f'''
+            SELECT id, shelf_id FROM events
+            WHERE product_type = ? AND event_type = "removal" AND status = "not paid" AND resolved = 0
+              AND shelf_id IN ({", ".join("?" * len(shelf_ids))})
+            ORDER BY event_time ASC
+            LIMIT ?
+        ''', (product_type, *shelf_ids, limit))
+        
+        not_paid_events = c.fetchall()
+        
+        # Markiere die ältesten "not paid" Events als "misplaced"
+        for event_id, original_shelf_id in not_paid_events:
+            log_debug(f"  → Markiere Event ID {event_id} (Regal {original_shelf_id+1}) als 'misplaced'")
+            
+            # Aktualisiere direkt in der Datenbank
+            c.execute('''
+                UPDATE events
+                SET status = "misplaced"
+                WHERE id = ?
+            ''', (event_id,))
+            
+            # Reduziere den Zähler verbleibender zu markierender Events
+            limit -= 1
+            if limit <= 0:
+                break
+
+def check_for_missing_objects(rois, enhanced_tracker, journal, product_shelves=PRODUCT_SHELF_MAPPING):
+    """
+    Überprüft, ob Objekte im Inventory fehlen ohne entsprechendes Removal-Event,
+    oder ob Objekte zurückgekehrt sind ohne entsprechendes Return-Event.
+    
+    VERBESSERT: Erkennt auch Objekte, die in falschen Regalen platziert wurden.
+    product_shelves ist die Produkt-Regal-Zuordnung der Kamera (camera_products).
+    """
+    log_debug("Überprüfe auf fehlende und zurückgekehrte Objekte...")
+    
+    # Aktuelle Zeit für Zeitstempel und Vergleiche
+    current_time = time.time()
+    
+    # Hole den aktuellen Inventarbestand der eigenen Regale aus der Datenbank
+    # (die Regale anderer Kameras sind in enhanced_tracker nicht sichtbar)
+    db_inventory = [entry for entry in db_utils.get_inventory() if entry[0] in rois]
+    
+    # Sammle alle aktuell sichtbaren Objekte nach Regal und Typ
+    visible_objects = {}
+    misplaced_objects = {}  # New: Track objects placed in wrong shelves
+    
+    for trk_id, obj in enhanced_tracker.get_all_active_objects().items():
+        shelf_id = obj.current_shelf
+        product_type = obj.product_type
+        
+        # Ignoriere Objekte im REMOVED-Zustand, da diese bereits als entnommen gelten
+        if obj.state == ObjectState.REMOVED:
+            continue
+        
+        # Check if the object is in its correct designated shelf
+        # If not, count it as misplaced
+        if not is_product_in_correct_shelf(product_type, shelf_id, product_shelves):
+            if product_type not in misplaced_objects:
+                misplaced_objects[product_type] = []
+            misplaced_objects[product_type].append((shelf_id, obj))
+            log_debug(f"Falsch platziertes Objekt gefunden: {product_type} in Regal {shelf_id+1}")
+            
+            # If the object doesn't have an active removal event, create a misplaced event
+            if not obj.removal_event_active:
+                # Find the designated shelf for this product
+                designated_shelf = product_shelves[product_type]
+                log_debug(f"Erstelle neues misplaced Event für {product_type} in Regal {shelf_id+1} (sollte in {designated_shelf+1} sein)")
+                
+                # Create a misplaced event with the designated shelf as the original shelf
+                journal.submit(db_utils.upsert_event, designated_shelf, product_type, "removal", "misplaced", object_id=obj.trk_id)
+                
+                # Mark the object as having an active removal event
+                obj.removal_event_active = True
+                obj.misplaced_updated = True
+                obj.original_shelf = designated_shelf
+            
+            continue  # Skip counting this object in the normal inventory count
+            
+        # Initialisiere den Zähler für dieses Regal und Produkttyp, falls nicht vorhanden
+        if (shelf_id, product_type) not in visible_objects:
+            visible_objects[(shelf_id, product_type)] = 0
+            
+        # Erhöhe den Zähler
+        visible_objects[(shelf_id, product_type)] += 1
+    
+    # Gesamtzahl aller sichtbaren Objekte pro Produkttyp
+    total_visible_by_type = {}
+    for (shelf_id, product_type), count in visible_objects.items():
+        if product_type not in total_visible_by_type:
+            total_visible_by_type[product_type] = 0
+        total_visible_by_type[product_type] += count
+    
+    # Gesamtzahl aller offenen Removal-Events pro Produkttyp
+    total_unresolved_by_type = {}
+    
+    # Vergleiche für jedes Regal und jeden Produkttyp, ob Objekte fehlen oder zurückgekehrt sind
+    for inv_entry in db_inventory:
+        shelf_id, product_type, initial_count, current_count, last_update = inv_entry
+        
+        # Skip if this product is not expected to be in this shelf according to our mapping
+        if not is_product_in_correct_shelf(product_type, shelf_id, product_shelves):
+            log_debug(f"Überspringe Inventarcheck für {product_type} in Regal {shelf_id+1}, da es nicht dort hingehört")
+            continue
+        
+        # Debug-Ausgaben für dieses Regal
+        log_debug(f"=== Check für Regal {shelf_id+1} ===")
+        
+        # Wie viele Objekte sind aktuell sichtbar in diesem Regal?
+        visible_count = visible_objects.get((shelf_id, product_type), 0)
+        
+        # Wie viele offene Removal-Events gibt es bereits für dieses Regal?
+        unresolved_count = db_utils.get_unresolved_count(shelf_id, product_type, "removal")
+        
+        # Aktualisiere die Gesamtzahl der offenen Events
+        if product_type not in total_unresolved_by_type:
+            total_unresolved_by_type[product_type] = 0
+        total_unresolved_by_type[product_type] += unresolved_count
+        
+        # Berechne, wie viele Objekte fehlen sollten (laut DB)
+        expected_missing = initial_count - current_count
+        
+        # Berechne, wie viele Objekte tatsächlich fehlen (visuell)
+        actual_missing = initial_count - visible_count
+        
+        # Debug-Ausgaben
+        log_debug(f"DB Inventory - Initial: {initial_count}, Current: {current_count}")
+        log_debug(f"Visible count: {visible_count}, Unresolved count: {unresolved_count}")
+        log_debug(f"Actual missing: {actual_missing}, Missing without event: {actual_missing - unresolved_count}")
+        
+        # FALL 1: Mehr Objekte fehlen als durch Events erfasst -> Erstelle neue "not paid" Events
+        missing_without_event = actual_missing - unresolved_count
+        
+        if missing_without_event > 0:
+            log_debug(f"Regal {shelf_id+1}, {product_type}: {missing_without_event} Objekt(e) fehlen ohne Event!")
+            log_debug(f"  Initial: {initial_count}, Current: {current_count}, Visible: {visible_count}, Unresolved: {unresolved_count}")
+            
+            # Prüfe, ob wir ein neues Event erstellen dürfen
+            if can_create_new_event(shelf_id, product_type, "removal"):
+                # Erstelle ein neues "not paid" Event
+                journal.submit(db_utils.upsert_event, shelf_id, product_type, "removal", "not paid", quantity_increment=missing_without_event)
+                # Aktualisiere den Inventarbestand
+                journal.submit(db_utils.update_inventory, shelf_id, product_type, visible_count)
+                log_debug(f"  → Automatisches 'not paid' Event für {missing_without_event} fehlende(s) Objekt(e) erstellt")
+            else:
+                log_debug(f"  ⚠️ Konnte kein neues Event erstellen, maximale Anzahl bereits erreicht")
+    
+    # Special handling for misplaced objects after all regular inventory is checked
+    for product_type, misplaced_list in misplaced_objects.items():
+        log_debug(f"=== Handling {len(misplaced_list)} misplaced {product_type}(s) ===")
+        
+        # Get the designated shelf for this product
+        if product_type in product_shelves:
+            designated_shelf = product_shelves[product_type]
+            
+            # Update inventory to reflect that these objects exist but are in wrong places
+            # This helps prevent false "not paid" events
+            for wrong_shelf, obj in misplaced_list:
+                # Log the incorrect placement
+                log_debug(f"{product_type} gefunden in Regal {wrong_shelf+1}, sollte in Regal {designated_shelf+1} sein")
+    
+    # VERBESSERT: Nach der Bestandsaufnahme aller Regale, prüfe auf misplaced Objekte
+    # Wir müssen die Gesamtbilanz betrachten, nicht nur pro Regal
+    for product_type, total_visible in total_visible_by_type.items():
+        # Gesamtzahl offener (not paid) Events für diesen Produkttyp
+        total_unresolved = total_unresolved_by_type.get(product_type, 0)
+        
+        # Gesamtzahl des Startbestands dieses Produkttyps
+        total_initial = sum(inv[2] for inv in db_inventory if inv[1] == product_type)
+        
+        # Theoretischer Gesamtbestand ohne Events
+        theoretical_total = total_initial
+        
+        log_debug(f"=== Gesamtbilanz für {product_type} ===")
+        log_debug(f"  Startbestand gesamt: {total_initial}")
+        log_debug(f"  Sichtbare Objekte gesamt: {total_visible}")
+        log_debug(f"  Offene Events gesamt: {total_unresolved}")
+        
+        # FALL: Objekte wurden zurückgebracht, aber nicht ins richtige Regal
+        # Erkennbar wenn: total_visible + total_unresolved > total_initial
+        excess_objects = (total_visible + total_unresolved) - total_initial
+        
+        if excess_objects > 0:
+            # GEÄNDERT: Überprüfe, ob alle Objekte im richtigen Regal sind
+            all_in_correct_shelf = True
+            for (shelf_id, p_type), count in visible_objects.items():
+                if p_type == product_type and not is_product_in_correct_shelf(p_type, shelf_id, product_shelves):
+                    all_in_correct_shelf = False
+                    break
+            
+            # Wenn alle Objekte im richtigen Regal sind, sollten wir keine Events als misplaced markieren
+            if all_in_correct_shelf:
+                log_debug(f"  HINWEIS: Bilanzüberschuss von {excess_objects} {product_type}(s) erkannt, aber alle sind im richtigen Regal")
+                log_debug(f"  → Schließe nicht bezahlte Events als 'returned', da alle Objekte im richtigen Regal sind")
+                
+                # Offene "not paid" Events als "returned" schließen (im Journal-Writer)
+                journal.submit(close_not_paid_events_as_returned, product_type, excess_objects, sorted(rois))
+            else:
+                log_debug(f"  MISPLACED ERKANNT: {excess_objects} {product_type}(s) sind in falschen Regalen!")
+                
+                # Offene "not paid" Events als "misplaced" markieren (im Journal-Writer)
+                journal.submit(mark_not_paid_events_misplaced, product_type, excess_objects, sorted(rois))
+        
+        # FALL: Es wurden zu viele "returned" Events generiert, bereinige die Datenbank
+        # (Dieser Fall tritt auf, wenn die bisherige Funktion zu viele "returned" Events erstellt hat)
+        elif excess_objects < 0:
+            log_debug(f"  ÜBERFLÜSSIGE RETURNED EVENTS: {-excess_objects} zu viele Events wurden generiert!")
+            
+            # Hier könnten wir überflüssige "returned" Events löschen, falls nötig
+            # Dies ist aber gefährlich und sollte mit Vorsicht implementiert werden
+            
+            # Alternativ: Eine Warnung ausgeben
+            log_debug(f"  ⚠️ Die Datenbank enthält möglicherweise inkonsistente Events. Überprüfung empfohlen.")
+
+class EnhancedObjectTracker:
+    """Verbesserte Objektverfolgung mit Re-Identifikation für verlorene Objekte"""
+    def __init__(self, max_memory_time=30, similarity_threshold=0.7, global_inventory=None, max_objects_per_product=None,
+                 clock=None, strict_inventory=None):
+        # Speichert aktive Objekte: {id: TrackedObject}, mit Zählern je Regal, Produkt und Zustand
+        self.active_objects = ObjectRegistry()
+        
+        # Speichert aus dem Bild verschwundene Objekte, die noch verfolgt werden müssen
+        # (Einträge: (Signatur, ID, Regal, Typ, Event aktiv, Originalregal), je Produkttyp indiziert)
+        self.memory_objects = ReIDGallery(max_age=max_memory_time)
+        
+        # Konfiguration
+        self.max_memory_time = max_memory_time
+        self.similarity_threshold = similarity_threshold
+        
+        # Globales Inventar zur Konsistenzprüfung
+        self.global_inventory = global_inventory or {obj_type: 0 for obj_type in ALLOWED_CLASSES}
+        self.max_objects_per_product = max_objects_per_product or OBJECT_LIMITS
+        self.clock = clock or MonitorClock()
+        self.strict_inventory = strict_inventory or StrictInventory(self.max_objects_per_product, self.clock)
+        
+        # Cooldown-System für Event-Erstellung
+        self.last_event_time = {}
+        self.event_cooldown = 2.0
+        
+        # Historie der aktiven Objekte, um Dopplungen zu vermeiden
+        self.tracked_object_history = set()
+        
+        # Erzwinge Unterstützung für mindestens die konfigurierten Limits
+        self.force_minimum_objects = True
+        self.forced_object_count = max_objects_per_product
+        
+        # Liste unterschiedlicher Objekt-Signaturen zur Differenzierung
+        self.unique_signatures = {obj_type: [] for obj_type in ALLOWED_CLASSES}
+        
+        log_debug(f"EnhancedObjectTracker initialisiert mit Objektlimits: {self.max_objects_per_product}")
+    
+    def update_inventory_count(self, product_type, delta):
+        """Aktualisiert den globalen Bestand für einen Produkttyp"""
+        if product_type not in self.global_inventory:
+            self.global_inventory[product_type] = 0
+        
+        # Prüfe, ob ein Hinzufügen das globale Maximum überschreiten würde
+        product_limit = self.max_objects_per_product.get(product_type, 3) if isinstance(self.max_objects_per_product, dict) else self.max_objects_per_product
+        if delta > 0 and self.global_inventory[product_type] + delta > product_limit:
+            log_debug(f"⚠️ Globale Inventarbegrenzung: Kann {delta} {product_type} nicht hinzufügen, aktuell {self.global_inventory[product_type]}/{product_limit}")
+            return False
+        
+        self.global_inventory[product_type] += delta
+        # Stelle sicher, dass wir keine negativen Werte haben
+        self.global_inventory[product_type] = max(0, self.global_inventory[product_type])
+        
+        # Synchronisiere mit striktem Inventory
+        self.strict_inventory.set_count(product_type, self.global_inventory[product_type])
+            
+        log_debug(f"Globales Inventar für {product_type}: {self.global_inventory[product_type]}")
+        return True
+    
+    def can_create_event(self, product_type):
+        """Prüft, ob ein neues Event für diesen Produkttyp erstellt werden darf (Cooldown)"""
+        current_time = self.clock.time()
+        last_time = self.last_event_time.get(product_type, 0)
+        
+        # Wenn das Cooldown für diesen Produkttyp noch nicht abgelaufen ist
+        if current_time - last_time < self.event_cooldown:
+            log_debug(f"Event-Cooldown für {product_type} noch aktiv: {self.event_cooldown - (current_time - last_time):.1f}s übrig")
+            return False
+            
+        return True
+    
+    def register_event(self, product_type):
+        """Registriert ein neues Event für diesen Produkttyp (setzt den Cooldown)"""
+        self.last_event_time[product_type] = self.clock.time()
+    
+    def add_object(self, tracker_id, shelf, product_type, signature, image_frame):
+        """Fügt ein neues Objekt zum Tracker hinzu oder identifiziert ein bestehendes neu"""
+        current_time = self.clock.time()
+        
+        # VERBESSERT: Debug-Info zur besseren Diagnose
+        log_debug(f"add_object: Verarbeite ID {tracker_id}, Typ {product_type}, Regal {shelf+1}")
+        log_debug(f"Aktive Objekte: {len(self.active_objects)}, Limit: {self.max_objects_per_product}")
+        
+        # NEU: Prüfe, ob das Objekt bereits bekannt ist
+        if tracker_id in self.tracked_object_history:
+            log_debug(f"Tracker-ID {tracker_id} bereits bekannt")
+            
+        # Entferne zu alte Objekte aus dem Gedächtnis
+        self.clean_memory(current_time)
+        
+        # Prüfe, ob es ein bereits bekanntes Objekt desselben Typs ist, das wiedererkannt wird
+        # (Ähnlichkeit wie calculate_similarity, für alle Gedächtnisobjekte in einem Schritt)
+        best_match_key, best_match_similarity = self.memory_objects.best_match(
+            product_type, signature, self.similarity_threshold)
+        
+        # Wenn wir eine Übereinstimmung gefunden haben, identifizieren wir das Objekt neu
+        if best_match_key is not None:
+            # Lösche das Gedächtnisobjekt, da es jetzt wieder aktiv ist
+            mem_sig, mem_id, mem_shelf, mem_type, mem_event_active, mem_original_shelf = \
+                self.memory_objects.pop(best_match_key)
+            
+            # Erstelle ein neues TrackedObject mit der Identität des gefundenen Objekts
+            tracked_obj = TrackedObject(mem_id, shelf, mem_type, current_time)
+            tracked_obj.state = ObjectState.REMOVED  # Es wurde bereits als entfernt markiert
+            tracked_obj.removal_event_active = mem_event_active
+            tracked_obj.original_shelf = mem_original_shelf
+            
+            self.active_objects[tracker_id] = tracked_obj
+            
+            # NEU: In Historie aufnehmen
+            self.tracked_object_history.add(tracker_id)
+            
+            log_debug(f"Objekt wiedererkannt! Alter ID: {mem_id}, Neue ID: {tracker_id}, Ähnlichkeit: {best_match_similarity:.2f}")
+            
+            return tracked_obj, True  # True bedeutet, dass es ein wiedererkanntes Objekt ist
+        
+        # NEU: Wenn das Objekt bereits in der Historie ist, erlauben wir es mit höherer Wahrscheinlichkeit
+        already_known = tracker_id in self.tracked_object_history
+        
+        # NEU: Speichere die Signatur in der Liste der eindeutigen Signaturen
+        if product_type not in self.unique_signatures:
+            self.unique_signatures[product_type] = []
+        
+        # WICHTIG: Force-Mode für 2 Cups - immer aktivieren wenn wir noch unter dem Limit sind
+        product_count = self.global_inventory.get(product_type, 0)
+        actual_active_count = self.active_objects.type_count(product_type)
+        product_limit = self.max_objects_per_product.get(product_type, 3) if isinstance(self.max_objects_per_product, dict) else self.max_objects_per_product
+        should_force = self.force_minimum_objects and actual_active_count < product_limit
+        
+        # Konsistenzprüfung, aber mit Force-Option
+        if not already_known and actual_active_count >= product_limit and not should_force:
+            log_debug(f"⚠️ Maximale Anzahl von {product_type} überschritten ({product_count}/{self.max_objects_per_product}). Erlaubnis verweigert.")
+            return None, False
+        
+        # Force-Modus: Wenn wir noch nicht genug Cups haben, akzeptieren wir es unabhängig von strict_inventory
+        if should_force:
+            log_debug(f"FORCE-MODUS: Akzeptiere {product_type} (ID: {tracker_id}) auch bei strengen Regeln, da wir nur {product_count}/{self.max_objects_per_product} haben.")
+        elif not already_known and not self.strict_inventory.can_add_object(product_type, tracker_id):
+            log_debug(f"⚠️ Strenge Inventarprüfung: Kein neues {product_type} erlaubt.")
+            return None, False
+        
+        # Wenn es ein neues Objekt ist, erstelle ein neues TrackedObject
+        tracked_obj = TrackedObject(tracker_id, shelf, product_type, current_time)
+        tracked_obj.is_inside_roi = True  # Neue Eigenschaft, um zu verfolgen, ob Objekt in einer ROI ist
+        self.active_objects[tracker_id] = tracked_obj
+        
+        # NEU: In Historie aufnehmen
+        self.tracked_object_history.add(tracker_id)
+        
+        # NEU: Füge diese Signatur zur Liste der eindeutigen Signaturen hinzu, wenn sie nicht zu ähnlich zu bestehenden ist
+        is_unique = True
+        for existing_sig in self.unique_signatures[product_type]:
+            similarity = self.calculate_similarity(signature, existing_sig)
+            if similarity > 0.85:  # Sehr hohe Ähnlichkeit deutet auf gleiches Objekt hin
+                is_unique = False
+                break
+        
+        product_limit = self.max_objects_per_product.get(product_type, 3) if isinstance(self.max_objects_per_product, dict) else self.max_objects_per_product
+        if is_unique or len(self.unique_signatures[product_type]) < product_limit:
+            self.unique_signatures[product_type].append(signature)
+            log_debug(f"Neue eindeutige Signatur für {product_type} gespeichert (gesamt: {len(self.unique_signatures[product_type])})")
+        
+        # Nur wenn neues Objekt: Aktualisiere den globalen Inventarbestand
+        if not already_known or should_force:
+            if not self.update_inventory_count(product_type, 1) and not should_force:
+                # Wenn die Aktualisierung fehlschlägt und kein Force-Modus, entferne das Objekt wieder
+                del self.active_objects[tracker_id]
+                return None, False
+            
+            # Auch das strikte Inventory aktualisieren, aber im Force-Modus ignorieren wir Fehler
+            if not self.strict_inventory.add_object(product_type, tracker_id) and not should_force:
+                log_debug(f"⚠️ Konnte {product_type} nicht im strikten Inventory hinzufügen, aber ignoriere im Force-Modus")
+        
+        # Speichere das Erscheinungsbild des Objekts im Tracker-Objekt
+        tracked_obj.signature = signature
+        
+        log_debug(f"Neues Objekt hinzugefügt: ID {tracker_id}, Typ {product_type}, Regal {shelf+1}, Force-Mode: {should_force}")
+        
+        return tracked_obj, False
+    
+    def remove_object(self, tracker_id):
+        """Entfernt ein Objekt aus dem aktiven Tracking und speichert es im Gedächtnis"""
+        if tracker_id not in self.active_objects:
+            return
+        
+        obj = self.active_objects[tracker_id]
+        
+        # IMPORTANT: Remove from tracked_object_history to allow re-tracking
+        # This is critical - we need to forget this object ID so it can be re-detected
+        if tracker_id in self.tracked_object_history:
+            self.tracked_object_history.remove(tracker_id)
+            log_debug(f"Objekt ID {tracker_id} aus Tracker-Historie entfernt (ermöglicht Re-Tracking)")
+        
+        # Wenn das Objekt ein aktives removal_event hat, behalten wir es im Gedächtnis
+        if obj.removal_event_active:
+            if obj.signature is not None:
+                # Füge das Objekt zum Gedächtnis hinzu
+                self.memory_objects.add(obj.product_type, (
+                    obj.signature,
+                    obj.trk_id,
+                    obj.current_shelf,
+                    obj.product_type,
+                    obj.removal_event_active,
+                    obj.original_shelf
+                ))
+                log_debug(f"Objekt ID {tracker_id} zum Gedächtnis hinzugefügt.")
+        else:
+            # Wenn kein aktives Event, reduziere den Bestand 
+            # VERBESSERT: Nur reduzieren, wenn das Objekt nicht mehr im Bild ist und genug Zeit vergangen ist
+            # Dies verhindert, dass Objekte verschwinden und wieder auftauchen
+            self.update_inventory_count(obj.product_type, -1)
+            
+            # Auch das strikte Inventory aktualisieren
+            self.strict_inventory.remove_object(obj.product_type, tracker_id)
+                
+            log_debug(f"Objekt ID {tracker_id} aus Tracking entfernt und Bestand reduziert.")
+        
+        # Entferne das Objekt aus dem aktiven Tracking
+        del self.active_objects[tracker_id]
+    
+    def clean_memory(self, current_time):
+        """Entfernt zu alte Objekte aus dem Gedächtnis (nur die abgelaufenen, ohne Durchlauf)"""
+        for sig, id, shelf, type, event_active, original_shelf in self.memory_objects.expire(current_time):
+            log_debug(f"Objekt ID {id} aus Gedächtnis entfernt (zu alt).")
+    
+    def calculate_similarity(self, sig1, sig2):
+        """Berechnet die Ähnlichkeit zwischen zwei Objektsignaturen mit erhöhter Toleranz für Cups"""
+        similarity = 0.0
+        
+        # Vergleiche Farb-Histogramme
+        if sig1.color_hist is not None and sig2.color_hist is not None:
+            # Cosine-Ähnlichkeit zwischen Histogrammen (1 = identisch, 0 = völlig unterschiedlich)
+            hist_sim = 1.0 - cosine(sig1.color_hist, sig2.color_hist)
+            similarity += 0.7 * hist_sim  # Farbe ist wichtiger
+        
+        # Vergleiche Dimensionen mit höherer Toleranz für Cups
+        if sig1.dimensions is not None and sig2.dimensions is not None:
+            # Berechne relative Größendifferenz
+            width_ratio = min(sig1.dimensions[0], sig2.dimensions[0]) / max(sig1.dimensions[0], sig2.dimensions[0])
+            height_ratio = min(sig1.dimensions[1], sig2.dimensions[1]) / max(sig1.dimensions[1], sig2.dimensions[1])
+            dim_sim = (width_ratio + height_ratio) / 2.0
+            
+            # Bei Cups sind wir toleranter bei Dimensionen
+            similarity += 0.3 * dim_sim
+            
+            # Bonus für ähnliche Proportionen bei Cups (da sie oft ähnlich aussehen)
+            similarity += 0.1
+        
+        return similarity
+    
+    def get_all_active_objects(self):
+        """Gibt alle aktiven Objekte zurück"""
+        return self.active_objects
+    
+    def get_object(self, tracker_id):
+        """Holt ein aktives Objekt nach ID"""
+        return self.active_objects.get(tracker_id)
+    
+    def print_memory_status(self):
+        """Gibt Debug-Informationen über den Gedächtniszustand aus"""
+        if not log_enabled("DEBUG"):
+            return
+        log_debug(f"Gedächtnis enthält {len(self.memory_objects)} Objekte.")
+        for i, (sig, id, shelf, type, event_active, original_shelf) in enumerate(self.memory_objects):
+            age = self.clock.time() - sig.last_seen_time
+            log_debug(f"  {i+1}: ID {id}, Typ {type}, Alter: {age:.1f}s, Event: {event_active}")
+            
+    def synchronize_with_inventory(self, inventory_manager):
+        """Synchronisiert den Tracker mit dem strengen Inventory-Manager."""
+        for product_type, count in self.global_inventory.items():
+            # Setze die Zählung im strikten Inventory
+            inventory_manager.set_count(product_type, count)
+        log_debug("Tracker mit Inventory-Manager synchronisiert.")
+
+###############################################
+# Hilfsfunktionen für Visualisierung
+###############################################
+
+def draw_object_info(frame, obj, x1, y1, x2, y2, rois):
+    """Zeichnet detaillierte Informationen über ein Objekt auf den Frame"""
+    # Standardinformationen zeichnen
+    center_x = (x1 + x2) // 2
+    center_y = (y1 + y2) // 2
+    
+    # Zeichne ID und Mittelpunkt
+    cv2.putText(frame, f"ID: {obj.trk_id}", (x1, y1-20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    cv2.circle(frame, (center_x, center_y), 4, (0, 255, 0), -1)
+    
+    # Zustandstext
+    state_text = {
+        ObjectState.IDLE: "Idle",
+        ObjectState.POTENTIAL_REMOVAL: "Pot. Removal",
+        ObjectState.REMOVED: "Removed",
+        ObjectState.POTENTIAL_RETURN: "Pot. Return"
+    }.get(obj.state, "Unknown")
+    
+    # Zeichne Zustand
+    cv2.putText(frame, f"State: {state_text}", (x1, y1-35),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+    
+    # Wenn das Objekt ein aktives Removal-Event hat, zeige das Originalregal an
+    if obj.removal_event_active:
+        status_text = "misplaced" if obj.misplaced_updated else "not paid"
+        cv2.putText(frame, f"Origin: {obj.original_shelf+1} ({status_text})", (x1, y1-50),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 255), 2)
+    
+    # Zeichne auch die Produktart und die Entnahmerichtung
+    cv2.putText(frame, f"Type: {obj.product_type}", (x1, y1-65),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 165, 0), 2)
+                
+    # Zeige die Entnahmerichtung an, wenn vorhanden
+    if obj.removal_direction:
+        cv2.putText(frame, f"Dir: {obj.removal_direction}", (x1, y1-80),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 165, 255), 2)
+                
+    # Zeige den ROI-Status an
+    roi_status = "Inside ROI" if obj.is_inside_roi else "Outside ROI"
+    roi_color = (0, 255, 0) if obj.is_inside_roi else (0, 0, 255)
+    cv2.putText(frame, roi_status, (x1, y1-95),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, roi_color, 2)
+                    
+    # Zeichne eine Verbindungslinie zum zugehörigen Regal, wenn außerhalb der ROI
+    if not obj.is_inside_roi:
+        # Zeichne einen roten Kreis um Objekte außerhalb der ROIs
+        cv2.circle(frame, (center_x, center_y), 12, (0, 0, 255), 2)
+        
+        # Zeichne eine Linie zum letzten zugewiesenen Regal, wenn möglich
+        if obj.current_shelf in rois:
+            rx, ry, rw, rh = rois[obj.current_shelf]
+            regal_center_x = rx + rw//2
+            regal_center_y = ry + rh//2
+            cv2.line(frame, (center_x, center_y), (regal_center_x, regal_center_y), (0, 0, 255), 1, cv2.LINE_AA)
+
+###############################################
+# Verbesserte Funktion zur Prüfung von doppelten Events
+###############################################
+
+def can_create_new_event(shelf_id, product_type, event_type="removal"):
+    """
+    Prüft, ob ein neues Event erstellt werden darf.
+    Berücksichtigt den aktuellen Bestand und aktive Events.
+    """
+    # 1. Prüfe die Gesamtzahl der offenen Events dieses Typs
+    c = db_utils.get_connection().cursor()
+    c.execute(db_utils.OPEN_EVENT_COUNT_SQL, (product_type, event_type))
+    open_events_count = c.fetchone()[0]
+    
+    # 2. Hole den aktuellen Inventarbestand
+    c.execute(db_utils.INVENTORY_SUM_BY_PRODUCT_SQL, (product_type,))
+    inventory_count = c.fetchone()[0] or 0
+    
+    # 3. Erlaube genau die Anzahl Events, die im Bestand sind (strenger)
+    max_allowed_events = OBJECT_LIMITS.get(product_type, 3)  # Limit je nach Objekttyp
+    
+    # 4. Debug-Ausgabe für besseres Verständnis
+    log_debug(f"Prüfe Event-Erstellung: {product_type}, Regal {shelf_id+1}")
+    log_debug(f"  Offene Events: {open_events_count}, Inventarbestand: {inventory_count}")
+    log_debug(f"  Max. erlaubte Events: {max_allowed_events}")
+    
+    return open_events_count < max_allowed_events
+###############################################
+# Journal-Operationen (werden im Writer-Thread ausgeführt)
+###############################################
+
+def record_removal_event(shelf, product_type, object_id):
+    """Schreibt das Removal-Event (läuft im Journal-Writer)."""
+    if db_utils.event_exists(shelf, product_type, event_type="removal"):
+        log_debug(f"Regal {shelf+1}: Objekt-ID {object_id} bereits als removal erfasst. Setze Status auf 'not paid'.")
+        db_utils.update_event_status(shelf, product_type, "not paid", event_type="removal")
+    else:
+        log_debug(f"Regal {shelf+1}: Objekt-ID {object_id} wurde entfernt. Removal-Event wird getriggert.")
+        db_utils.upsert_event(shelf, product_type, "removal", "not paid", quantity_increment=1, object_id=object_id)
+
+def record_return_event(current_shelf, product_type, object_id):
+    """
+    Schließt offene misplaced- und 'not paid'-Events des Produkttyps als 'returned'
+    und legt die zugehörigen Return-Events an (läuft im Journal-Writer).
+    """
+    with db_utils.transaction() as c:
+        resolution_time = int(time.time())
+        
+        # NEU: Suche nach ALLEN offenen misplaced Events für dieses Produkt, unabhängig vom Regal
+        c.execute('''
+            SELECT id FROM events
+            WHERE product_type = ? AND status = "misplaced" AND resolved = 0
+        ''', (product_type,))
+        
+        misplaced_events = c.fetchall()
+        if misplaced_events:
+            for event_id in misplaced_events:
+                c.execute('''
+                    UPDATE events
+                    SET resolved = 1, resolution_time = ?, status = "returned"
+                    WHERE id = ?
+                ''', (resolution_time, event_id[0]))
+                log_debug(f"Misplaced-Event ID {event_id[0]} wurde auf 'returned' gesetzt und geschlossen.")
+        
+        # WICHTIG: Suche auch nach ALLEN offenen not paid Events für dieses Objekt und markiere als returned
+        c.execute(db_utils.NOT_PAID_EVENTS_BY_PRODUCT_SQL, (product_type,))
+        
+        not_paid_events = c.fetchall()
+        original_quantities = {}  # Speichern der ursprünglichen Mengen
+        
+        if not_paid_events:
+            # Wenn wir ein aktives not paid Event für dieses Objekt haben, markieren wir es als returned
+            for event_id, quantity in not_paid_events:
+                # Speichere die ursprüngliche Menge vor dem Update
+                original_quantities[event_id] = quantity
+                
+                c.execute('''
+                    UPDATE events
+                    SET resolved = 1, resolution_time = ?, status = "returned"
+                    WHERE id = ?
+                ''', (resolution_time, event_id))
+                log_debug(f"Not-Paid-Event ID {event_id} wurde auf 'returned' gesetzt und geschlossen.")
+        
+        # Ein neues Return-Event erstellen - WICHTIG: Explizites Return-Event mit der ursprünglichen Menge
+        for event_id, original_quantity in original_quantities.items():
+            db_utils.upsert_event(current_shelf, product_type, "return", "returned", 
+                               quantity_increment=original_quantity, object_id=object_id)
+            log_debug(f"Neues Return-Event für Objekt-ID {object_id} erstellt mit ursprünglicher Menge {original_quantity}")
+        
+        # Wenn keine Events aktualisiert wurden, trotzdem ein Return-Event erstellen
+        if not original_quantities:
+            db_utils.upsert_event(current_shelf, product_type, "return", "returned", object_id=object_id)
+            log_debug(f"Fallback: Neues Return-Event für Objekt-ID {object_id} erstellt")
+
+def record_misplaced_return(removal_shelf, current_shelf, product_type, object_id):
+    """Legt misplaced-Removal- und misplaced-Return-Event mit der ursprünglichen Menge an (läuft im Journal-Writer)."""
+    # NEU: Ursprüngliche Menge des Removal-Events herausfinden
+    c = db_utils.get_connection().cursor()
+    c.execute('''
+        SELECT quantity FROM events
+        WHERE product_type = ? AND object_id = ? AND event_type = "removal" AND resolved = 0
+        LIMIT 1
+    ''', (product_type, object_id))
+    result = c.fetchone()
+    
+    original_quantity = 1  # Standardwert
+    if result:
+        original_quantity = result[0]
+    
+    # Erstelle ein neues Event für misplaced mit der ursprünglichen Menge
+    db_utils.upsert_event(removal_shelf, product_type, "removal", "misplaced", 
+                       quantity_increment=original_quantity, object_id=object_id)
+    
+    # Erstelle auch ein "misplaced return" Event
+    db_utils.upsert_event(current_shelf, product_type, "misplaced_return", "misplaced", 
+                       quantity_increment=original_quantity, object_id=object_id)
+
+def record_misplaced_resolution(product_type, object_id, original_shelf):
+    """Schließt das misplaced-Event und legt ein neues 'not paid' Removal-Event an (läuft im Journal-Writer)."""
+    with db_utils.transaction() as c:
+        # Suche nach dem aktiven misplaced Event für dieses Objekt
+        c.execute('''
+            SELECT id, quantity FROM events
+            WHERE product_type = ? AND status = "misplaced" AND resolved = 0 AND 
+                  (object_id = ? OR (object_id = -1 AND shelf_id = ?))
+            LIMIT 1
+        ''', (product_type, object_id, original_shelf))
+        
+        misplaced_event = c.fetchone()
+        
+        if misplaced_event:
+            misplaced_id, quantity = misplaced_event
+            resolution_time = int(time.time())
+            
+            # Markiere das misplaced Event als resolved
+            c.execute('''
+                UPDATE events
+                SET resolved = 1, resolution_time = ?
+                WHERE id = ?
+            ''', (resolution_time, misplaced_id))
+            
+            # NEU: Erstelle ein neues removal Event mit Status "not paid"
+            db_utils.upsert_event(
+                original_shelf, 
+                product_type, 
+                "removal", 
+                "not paid", 
+                quantity_increment=quantity,
+                object_id=object_id
+            )
+            
+            log_debug(f"Misplaced Event ID {misplaced_id} wurde als resolved markiert und ein neues Removal-Event erstellt")
+        else:
+            # Fallback: Event-Status direkt ändern
+            db_utils.update_event_status(original_shelf, product_type, "not paid", event_type="removal")
+            log_debug(f"Status für Objekt ID {object_id} von 'misplaced' zu 'not paid' geändert (Fallback)")
+
+def reset_tracker():
+    """Reset the SORT tracker with default parameters"""
+    return Sort(max_age=30, min_hits=2, alpha=0.6, beta=0.4, assignment_threshold=0.5)
+
+
+###############################################
+# Überwachung einer Kamera
+###############################################
+
+class ShelfMonitor:
+    """
+    Zustand und Frame-Verarbeitung einer Kamera: eigene ROIs, eigener SORT-Tracker, eigenes
+    Inventar und eigene Zustandsmaschine. process() verarbeitet die FramePackets der Pipeline
+    (Erkennungen bereits im Inferenz-Worker dekodiert) und liefert das annotierte Bild.
+    Die Datenbank wird nur über das gemeinsame journal geschrieben.
+    """
+
+    def __init__(self, rois, virtual_lines, journal, name="", signature_type="hist", scheduler=None,
+                 clock=None, stage_timer=None, product_shelves=None, shelf_products=None):
+        self.name = name
+        self.rois = rois
+        # Produkt-Regal-Zuordnung der Kamera (camera_products); Standard: Regale 1-4 ohne Offset
+        self.product_shelves = PRODUCT_SHELF_MAPPING if product_shelves is None else product_shelves
+        shelf_products = expected_products if shelf_products is None else shelf_products
+        self.virtual_lines = virtual_lines
+        self.journal = journal
+        self.signature_type = signature_type
+        # Bewegungssteuerung der Inferenz (motion_gate.InferenceScheduler) oder None
+        self.scheduler = scheduler
+        # Zeitquelle der Monitor-Logik: Zeitstempel des aktuellen Frames,
+        # damit Wiedergaben unabhängig vom Tempo dieselben Events erzeugen
+        self.clock = clock or MonitorClock()
+        self.stage_timer = stage_timer or metrics.FrameStageTimer()
+
+        # Bereich aller Regale: wird pro Frame einmal nach HSV umgerechnet (Farbmerkmale)
+        self.feature_region = roi_union(rois)
+        # Regalindex: Label-Map der ROIs und Grenzen mit roten Linien (Regal und Zone aller Objekte je Frame)
+        self.shelf_geometry = ShelfGeometry(rois, virtual_lines)
+
+        # Initialisiere den erweiterten SORT-Tracker mit Farb-Histogramm
+        # Verbesserte Parameter für bessere Cup-Unterscheidung
+        self.tracker = reset_tracker()
+
+        # Initialisiere das strikte Inventory-System mit den definierten Limits
+        self.strict_inventory = StrictInventory(max_objects_per_product=OBJECT_LIMITS, clock=self.clock)
+
+        # Initialisiere den Tracker mit allen Objekttypen
+        initial_inventory = {obj_type: 0 for obj_type in ALLOWED_CLASSES}
+        self.enhanced_tracker = EnhancedObjectTracker(
+            max_memory_time=30,
+            similarity_threshold=0.3,
+            global_inventory=initial_inventory,
+            max_objects_per_product=OBJECT_LIMITS,  # Verwende die Objektlimits direkt
+            clock=self.clock,
+            strict_inventory=self.strict_inventory
+        )
+
+        # Initialisiere den Inventory Initializer mit allen Objekttypen
+        self.inventory_initializer = InventoryInitializer(
+            rois, shelf_products, ALLOWED_CLASSES, confidence_threshold=0.35,
+            clock=self.clock, journal=journal, strict_inventory=self.strict_inventory,
+            product_shelves=self.product_shelves)
+
+        # Tabellengesteuerte Zustandsmaschine (shelf_state.py); Ereignisse über die Handler unten
+        self.state_machine = ShelfStateMachine(self.handle_removal_event, self.handle_return_event,
+                                               self.resolve_misplaced_event)
+
+        # Verzögerte Initialisierung Variablen
+        self.inventory_init_delay = 5  # 5 Sekunden Verzögerung vor Start der Inventarisierung
+        self.inventory_init_timer = None
+        self.inventory_init_started = False
+        self.frame_counter = 0  # Zur Stabilisierung
+        self.last_missing_check_time = self.clock.time()
+        self.missing_check_interval = 10  # Überprüfe alle 10 Sekunden
+        self.missing_check_pending = False  # Prüfung wartet, bis das DB-Journal geschrieben ist
+
+    def label(self):
+        """Kamerabezeichnung für Log-Ausgaben."""
+        return f"Kamera {self.name}: " if self.name else ""
+
+    def extract_object_signature(self, frame, x1, y1, x2, y2, feature_cache=None):
+        """
+        Extrahiert eine eindeutige Signatur für ein Objekt (Typ nach signature_type).
+        Mit feature_cache wird der gemeinsame HSV-Puffer des Frames verwendet statt neu umzurechnen.
+        """
+        if feature_cache is None:
+            # Ohne gemeinsamen Cache nur die Box selbst umrechnen
+            feature_cache = FrameFeatureCache(frame, region=(x1, y1, x2, y2))
+        return extract_signature(feature_cache, x1, y1, x2, y2, self.clock.time(), self.signature_type)
+
+    def log_status(self):
+        """Periodische Statusanzeige für besseres Debugging."""
+        log_debug(f"=== SYSTEM-STATUS {self.name} ===" if self.name else "=== SYSTEM-STATUS ===")
+        log_debug(f"Aktive Objekte: {len(self.enhanced_tracker.get_all_active_objects())}")
+        log_debug(f"Gedächtnis-Objekte: {len(self.enhanced_tracker.memory_objects)}")
+        self.strict_inventory.print_status()
+
+    def restart_inventory(self):
+        """Startet die Lagerbestandsermittlung neu (Signaldatei der Dashboards)."""
+        self.inventory_initializer.reset()
+        if self.inventory_initializer.start_initialization():
+            log_debug(f"{self.label()}Neuinitialisierung des Lagerbestands gestartet.")
+
+    def reset(self):
+        """Setzt Tracker, Inventar und offene Events zurück und startet die Erfassung neu."""
+        log_debug(f"{self.label()}Manueller Reset der Objekt-Erkennung angefordert")
+
+        # Setze das strikte Inventory zurück
+        for obj_type in ALLOWED_CLASSES:
+            self.strict_inventory.set_count(obj_type, 0)
+        self.strict_inventory.active_object_ids = {obj_type: set() for obj_type in ALLOWED_CLASSES}
+
+        # Setze den Enhanced Tracker zurück
+        self.enhanced_tracker.active_objects.clear()
+        self.enhanced_tracker.memory_objects.clear()
+        self.enhanced_tracker.tracked_object_history.clear()
+        self.enhanced_tracker.unique_signatures = {obj_type: [] for obj_type in ALLOWED_CLASSES}
+
+        # Setze die globalen Inventarzähler zurück
+        for obj_type in ALLOWED_CLASSES:
+            self.enhanced_tracker.global_inventory[obj_type] = 0
+
+        # Setze den SORT Tracker zurück durch Neuinstanziierung
+        self.tracker = reset_tracker()
+
+        # Lösche alle aktuellen Objekte aus der Datenbank
+        self.journal.submit(db_utils.clear_current_events)
+        log_debug("Löschen der aktuellen Events im DB-Journal vorgemerkt")
+
+        # Starte die Initialisierung neu
+        self.inventory_initializer.reset()
+        self.inventory_initializer.start_initialization()
+        log_debug("Objekt-Erkennung vollständig zurückgesetzt - bereit für erneute Erfassung")
+
+    ###############################################
+    # Zustandsmaschine & Event-Logik
+    ###############################################
+
+    def handle_removal_event(self, tracked_obj):
+        """
+        Wird beim initialen Removal ausgelöst.
+        Falls bereits ein Removal-Eintrag existiert, wird dieser auf "not paid" aktualisiert.
+        """
+        shelf = tracked_obj.current_shelf
+        product_type = tracked_obj.product_type
+
+        # Prüfen, ob für dieses Objekt bereits ein Removal-Event existiert
+        if tracked_obj.removal_event_active:
+            log_debug(f"Objekt-ID {tracked_obj.trk_id} bereits als removal erfasst. Ignoriere erneuten Removal.")
+            return
+
+        # Cooldown-Prüfung
+        if not self.enhanced_tracker.can_create_event(product_type):
+            log_debug(f"Event-Cooldown aktiv für {product_type}. Kein neues Event erzeugt.")
+            return
+
+        # Prüfe, ob ein neues Event erstellt werden darf
+        if not can_create_new_event(shelf, product_type, "removal"):
+            log_debug(f"⚠️ Maximale Anzahl an Events erreicht. Kein neues Event für Objekt-ID {tracked_obj.trk_id} erstellt.")
+            return
+
+        # Cooldown registrieren
+        self.enhanced_tracker.register_event(product_type)
+
+        # Das Schreiben übernimmt der Journal-Writer
+        self.journal.submit(record_removal_event, shelf, product_type, tracked_obj.trk_id)
+
+        # Speichere Informationen über das Removal-Event
+        tracked_obj.removal_event_active = True
+        tracked_obj.original_shelf = shelf
+        tracked_obj.removal_time = self.clock.time()
+        tracked_obj.misplaced_updated = False
+
+    def handle_return_event(self, tracked_obj):
+        """
+        Wird beim Rückführen ausgelöst.
+        - Kehrt das Objekt im richtigen Regal zurück (basierend auf Produkt-Shelf-Mapping), wird der Eintrag als 'returned' markiert.
+        - Andernfalls wird der bestehende Removal-Eintrag als 'misplaced' aktualisiert.
+        - In beiden Fällen wird jetzt ein explizites Return-Event erstellt.
+        """
+        current_shelf = tracked_obj.current_shelf
+        removal_shelf = tracked_obj.original_shelf
+        product_type = tracked_obj.product_type
+
+        # Wenn kein aktives Removal-Event existiert, nichts tun
+        if not tracked_obj.removal_event_active:
+            log_debug(f"Objekt-ID {tracked_obj.trk_id} hat kein aktives Removal-Event. Return wird ignoriert.")
+            return
+
+        # Check if the product is in its designated shelf according to our mapping
+        is_in_correct_shelf = is_product_in_correct_shelf(product_type, current_shelf, self.product_shelves)
+
+        # GEÄNDERT: Originale Daten für das spätere Return-Event speichern
+        object_id = tracked_obj.trk_id
+
+        # Product is in the correct shelf according to our mapping
+        if is_in_correct_shelf:
+            log_debug(f"Regal {current_shelf+1}: Objekt-ID {tracked_obj.trk_id} kehrt ins richtige Regal zurück. Return-Event wird getriggert.")
+
+            # VERBESSERT: Auch misplaced Events für diesen Shelf/Product auflösen
+            # Schließen der Events und Anlegen des Return-Events übernimmt der Journal-Writer
+            self.journal.submit(record_return_event, current_shelf, product_type, object_id)
+
+            # Setze removal_event_active zurück
+            tracked_obj.removal_event_active = False
+            tracked_obj.misplaced_updated = False
+        else:
+            # Product is not in its designated shelf - mark as misplaced
+            if not tracked_obj.misplaced_updated:
+                log_debug(f"Objekt-ID {tracked_obj.trk_id} ({product_type}) ist im falschen Regal {current_shelf+1}. Update Event auf 'misplaced'.")
+                log_debug(f"Für diesen Produkttyp ist Regal {self.product_shelves[product_type]+1} vorgesehen.")
+
+                # Events schreiben übernimmt der Journal-Writer
+                self.journal.submit(record_misplaced_return, removal_shelf, current_shelf, product_type, tracked_obj.trk_id)
+                tracked_obj.misplaced_updated = True
+
+                log_debug(f"Neues Misplaced-Return-Event für Objekt-ID {tracked_obj.trk_id} im Regal {current_shelf+1} vorgemerkt")
+
+                # Removal-Event bleibt aktiv, bis es korrekt zurückgeführt wird
+
+    def resolve_misplaced_event(self, tracked_obj):
+        """
+        Wird ausgelöst, wenn ein misplaced Objekt aus dem falschen Regal wieder herausgenommen wird.
+        Das offene misplaced-Event wird geschlossen und durch ein neues 'not paid' Removal-Event ersetzt.
+        """
+        self.journal.submit(record_misplaced_resolution, tracked_obj.product_type, tracked_obj.trk_id, tracked_obj.original_shelf)
+
+    ###############################################
+    # Frame-Verarbeitung: Detektion, Tracking & Event-Logik
+    ###############################################
+
+    def process(self, packet, render=False):
+        """
+        Verarbeitet ein FramePacket der Pipeline.
+        Mit render=True wird eine annotierte Kopie des Frames gezeichnet und zurückgegeben, sonst None.
+        """
+        frame = packet.frame
+        frame_detections = packet.results
+        self.clock.set_frame_time(packet.timestamp)
+
+        # Frame-Zähler erhöhen
+        self.frame_counter += 1
+
+        # Verzögerte Initialisierung des Lagerbestands
+        if not self.inventory_init_started and self.frame_counter > 30:  # Warte auf 30 Frames für Stabilität
+            # Setze einen Timer für den verzögerten Start der Inventarisierung
+            if self.inventory_init_timer is None:
+                log_debug(f"{self.label()}Warte {self.inventory_init_delay} Sekunden vor Start der Inventarisierung...")
+
+                # Definiere einen eigenen Timer für den verzögerten Start
+                self.inventory_init_timer = self.clock.time() + self.inventory_init_delay
+
+        # Prüfe, ob der Timer abgelaufen ist
+        if (self.inventory_init_timer is not None and self.clock.time() >= self.inventory_init_timer
+                and not self.inventory_init_started):
+            log_debug(f"{self.label()}Starte Inventarisierung...")
+            self.inventory_initializer.start_initialization()
+            self.inventory_init_started = True
+            self.inventory_init_timer = None
+
+        # Annotation nur, wenn der Aufrufer das Bild anzeigt oder veröffentlicht
+        annotated_frame = frame.copy() if render else None
+        current_time = self.clock.time()
+        if render and self.inventory_init_timer is not None:
+            cv2.putText(annotated_frame, f"Warte {self.inventory_init_delay}s vor Inventarisierung...",
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+        ###############################################
+        # Detektion: YOLO-Ergebnisse kommen aus dem Inferenz-Worker
+        ###############################################
+        # frame_detections wurden im Inferenz-Worker einmal pro Frame dekodiert
+        # (eine Übertragung von der GPU, Boxen bereits in Frame-Koordinaten).
+        # Bei übersprungener Inferenz (Bewegungssteuerung) gibt es keine Erkennungen.
+        if not packet.inferred:
+            frame_detections = FrameDetections.empty()
+        else:
+            # Verarbeite Erkennungen für die Lagerbestandsermittlung
+            self.inventory_initializer.process_detections(annotated_frame, frame_detections)
+
+        detections = frame_detections.filter(confidence_threshold)
+
+        # Farbmerkmale: HSV-Umrechnung einmal pro Frame, Histogramme je Box zwischengespeichert
+        feature_cache = FrameFeatureCache(frame, self.feature_region)
+        detection_colors = [] # Farb-Histogramme (HSV) für jede Detektion
+
+        for (x1, y1, x2, y2), conf, label in zip(detections.boxes, detections.conf, detections.labels):
+            # Farb-Histogramm der Region für SORT (None bei leerer Box)
+            detection_colors.append(feature_cache.sort_histogram(x1, y1, x2, y2))
+
+            if render:
+                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+                cv2.putText(annotated_frame, f"{label.capitalize()} {int(conf*100)}%", (x1, y1-10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+
+        ###############################################
+        # Visualisierung: ROIs und virtuelle (rote) Linien
+        ###############################################
+        with self.stage_timer.measure("render"):
+            for shelf, (rx, ry, rw, rh) in (self.rois.items() if render else ()):
+                cv2.rectangle(annotated_frame, (rx, ry), (rx+rw, ry+rh), (0, 255, 255), 2)
+
+                # Zeige die virtuelle Linie (rot) an
+                line_y = ry + self.virtual_lines[shelf]
+                cv2.line(annotated_frame, (rx, line_y), (rx+rw, line_y), (0, 0, 255), 2)
+
+                cv2.putText(annotated_frame, f"Regal {shelf+1}", (rx, ry-10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 2)
+
+        ###############################################
+        # Tracking: Aktualisiere den SORT-Tracker
+        ###############################################
+        with self.stage_timer.measure("sort"):
+            if not packet.inferred:
+                # Frame ohne Inferenz: Tracks per Kalman-Vorhersage fortschreiben
+                tracked_objects = self.tracker.predict()
+            elif len(detections) > 0:
+                tracked_objects = self.tracker.update(detections.to_sort_array(), detection_colors)
+            else:
+                tracked_objects = np.empty((0, 5))
+
+        ###############################################
+        # Verarbeitung der getrackten Objekte & Event-Logik
+        ###############################################
+        # Liste der aktuell sichtbaren Tracker-IDs
+        visible_tracker_ids = set()
+
+        # Klassenzuordnung für alle Tracker auf einmal (vektorisierte IoU gegen alle Detektionen)
+        with self.stage_timer.measure("sort"):
+            track_boxes = np.asarray(tracked_objects).reshape(-1, 5)[:, :4].astype(int)
+            track_classes = detections.classify(track_boxes, ALLOWED_CLASSES[0] if ALLOWED_CLASSES else "unknown")
+
+        # Zeit der Objektschleife ohne Re-ID und Zeichnen zählt als Zustandsmaschine
+        state_machine_mark = self.stage_timer.mark()
+
+        # Regal und Zone aller Tracker-Mittelpunkte in einem Schritt über den Regalindex
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) // 2
+        track_shelves = self.shelf_geometry.locate(track_centers)
+        inside_rois = track_shelves >= 0
+        track_objects = [self.enhanced_tracker.get_object(int(trk[4])) for trk in tracked_objects]
+        # Bekannte Objekte außerhalb aller Regale behalten ihr letztes Regal
+        for i in np.flatnonzero(~inside_rois):
+            if track_objects[i] is not None:
+                track_shelves[i] = self.shelf_geometry.index[track_objects[i].current_shelf]
+        track_zones = self.shelf_geometry.zones(track_shelves, track_centers)
+
+        for trk, obj_class, tracked_obj, shelf_index, inside_any_roi, zone in zip(
+                tracked_objects, track_classes, track_objects,
+                track_shelves.tolist(), inside_rois.tolist(), track_zones.tolist()):
+            x1, y1, x2, y2, trk_id = trk.astype(int)
+            center_x = (x1 + x2) // 2
+            center_y = (y1 + y2) // 2
+            visible_tracker_ids.add(trk_id)
+
+            assigned_shelf = self.shelf_geometry.shelf_ids[shelf_index] if shelf_index >= 0 else None
+            if tracked_obj is not None:
+                # ROI-Status; beim Verlassen aller Regale beginnt im IDLE-Zustand eine Entnahme
+                self.state_machine.update_roi_presence(tracked_obj, inside_any_roi, assigned_shelf)
+
+            # Neues Objekt - wir können es nicht verfolgen, wenn es keinem Regal zugeordnet ist
+            if assigned_shelf is None:
+                continue
+
+            # Ohne Inferenz (nur Vorhersage) keine neuen Objekte anlegen und keine Signaturen aktualisieren
+            if not packet.inferred:
+                if tracked_obj is None:
+                    continue
+                signature = None
+            else:
+                # Extrahiere eine eindeutige Signatur für dieses Objekt
+                try:
+                    with self.stage_timer.measure("reid"):
+                        signature = self.extract_object_signature(frame, x1, y1, x2, y2, feature_cache)
+                    if signature is None:
+                        continue
+                except Exception as e:
+                    log_debug(f"Fehler bei Signaturextraktion: {e}")
+                    continue
+
+            # Verwende den verbesserten Object Tracker
+            if tracked_obj is None:
+                # Wenn das Objekt noch nicht im Tracker ist, füge es hinzu
+                with self.stage_timer.measure("reid"):
+                    tracked_obj, is_reidentified = self.enhanced_tracker.add_object(
+                        trk_id, assigned_shelf, obj_class, signature, frame
+                    )
+
+                if tracked_obj is None:
+                    # Wenn das Objekt abgelehnt wurde (z.B. wegen Bestandsgrenze), überspringe es
+                    continue
+
+                # Wenn kein bereits bekanntes Objekt und wir sind in der Initialisierungsphase, aktualisiere den Bestand
+                if not is_reidentified and self.inventory_initializer.is_initialized:
+                    current_shelf = assigned_shelf
+                    product_type = obj_class  # Verwende den erkannten Objekttyp
+                    # Nur den aktuellen Bestand für dieses Regal erhöhen, wenn es ein wirklich neues Objekt ist
+                    # und wir im Limit sind
+                    if self.strict_inventory.get_count(product_type) < OBJECT_LIMITS[product_type]:
+                        self.journal.submit(db_utils.increment_inventory_count, current_shelf, product_type, 1)
+            elif signature is not None:
+                # Aktualisiere die Signatur des Objekts mit den neuen Beobachtungen
+                if tracked_obj.signature is not None:
+                    tracked_obj.signature.update(signature.color_hist, signature.dimensions, signature.last_seen_time)
+                else:
+                    tracked_obj.signature = signature
+
+            # Aktualisiere die Position und den Regal-Zustand
+            tracked_obj.last_seen = current_time
+            tracked_obj.current_shelf = assigned_shelf
+
+            # Visualisiere detaillierte Informationen für dieses Objekt
+            if render:
+                with self.stage_timer.measure("render"):
+                    draw_object_info(annotated_frame, tracked_obj, x1, y1, x2, y2, self.rois)
+
+            # Zustandslogik: ein Tabellenschritt mit der Zone des Mittelpunkts im zugeordneten Regal
+            self.state_machine.step(tracked_obj, zone, center_x, center_y, inside_any_roi)
+
+        self.stage_timer.add_remainder("state_machine", state_machine_mark)
+
+        # Volle Inferenzrate halten, solange inventarisiert wird oder ein sichtbares Objekt
+        # nicht im Ruhezustand ist (laufende Entnahme/Rückgabe), damit kein Event verpasst wird
+        if self.scheduler is not None:
+            if self.inventory_initializer.is_initializing or any(
+                    obj is not None and obj.state != ObjectState.IDLE
+                    for obj in map(self.enhanced_tracker.get_object, visible_tracker_ids)):
+                self.scheduler.keep_active()
+
+        # Entferne veraltete Objekte aus dem verbesserten Tracker
+        for trk_id in list(self.enhanced_tracker.get_all_active_objects().keys()):
+            if trk_id not in visible_tracker_ids:
+                obj = self.enhanced_tracker.get_object(trk_id)
+                if obj and current_time - obj.last_seen > 5.0:  # 5 Sekunden nicht gesehen
+                    self.enhanced_tracker.remove_object(trk_id)
+
+        # Optional: Zeige den Status des Tracker-Gedächtnisses alle 5 Sekunden an
+        if int(current_time) % 5 == 0:
+            self.enhanced_tracker.print_memory_status()
+
+        render_start = time.perf_counter()
+        if render:
+            # Zeige aktuelle Inventarinformationen auf dem Display für bessere Diagnose
+            status_text = "Objekte im Inventory: "
+            for obj_type in ALLOWED_CLASSES:
+                obj_count = self.strict_inventory.get_count(obj_type)
+                active_objs = self.enhanced_tracker.active_objects.type_count(obj_type)
+                status_text += f"{obj_type}: {obj_count}/{OBJECT_LIMITS[obj_type]} ({active_objs}) | "
+
+            # Kürze den String, um ihn besser auf dem Bildschirm anzuzeigen
+            if len(status_text) > 70:
+                status_text = status_text[:70] + "..."
+
+            cv2.putText(annotated_frame, status_text, (10, 60),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+            # NEU: Zeige Hinweis zur Neuinitialisierung bei Problemen
+            any_limit_exceeded = False
+            for obj_type in ALLOWED_CLASSES:
+                objects_detected = self.enhanced_tracker.active_objects.type_count(obj_type)
+                objects_tracked = self.strict_inventory.get_count(obj_type)
+                if objects_tracked < OBJECT_LIMITS[obj_type] and objects_detected >= OBJECT_LIMITS[obj_type]:
+                    any_limit_exceeded = True
+                    break
+
+            if any_limit_exceeded:
+                help_text = "Hinweis: Drücke 'r' für Neustart der Erkennung"
+                cv2.putText(annotated_frame, help_text, (10, 120),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        self.stage_timer.add("render", time.perf_counter() - render_start)
+
+        # NEUE ÄNDERUNG: Synchronisiere sichtbare Objekte mit Datenbank vor Überprüfung
+        if current_time - self.last_missing_check_time > self.missing_check_interval:
+            # Synchronisiere vor der Prüfung die Datenbank mit dem visuellen Status
+            for shelf_id in self.rois.keys():
+                for product_type in ALLOWED_CLASSES:
+                    visible_count = self.enhanced_tracker.active_objects.present_count(shelf_id, product_type)
+                    self.journal.submit(db_utils.update_inventory, shelf_id, product_type, visible_count)
+                    log_debug(f"Synchronisiere Inventar: Regal {shelf_id+1}, {product_type}: {visible_count}")
+
+            # Die Prüfung liest die Datenbank und startet erst, wenn das Journal geschrieben ist
+            self.missing_check_pending = True
+            self.last_missing_check_time = current_time
+
+        if self.missing_check_pending and self.journal.is_drained():
+            # Füge Debug-Informationen zu check_for_missing_objects hinzu
+            log_debug(f"{self.label()}Starte periodische Überprüfung auf fehlende Objekte...")
+            with self.stage_timer.measure("db"):
+                check_for_missing_objects(self.rois, self.enhanced_tracker, self.journal, self.product_shelves)
+            self.missing_check_pending = False
+            log_debug(f"{self.label()}Periodische Überprüfung abgeschlossen.")
+        # Aktualisiere die erkannten Objekte in der Datenbank
+        with self.stage_timer.measure("db"):
+            update_detected_objects_in_db(self.rois, self.enhanced_tracker, self.journal)
+
+        return annotated_frame
@@ -0,0 +1,353 @@
+# shelf_state.py
+#
+# Zustandsmaschine der Regalüberwachung: IDLE -> POTENTIAL_REMOVAL -> REMOVED -> POTENTIAL_RETURN.
+# Die Übergänge stehen in Tabellen (ENTRY_TRANSITIONS, PENDING_TRANSITIONS); je Objekt und Frame
+# genügt ein Tabellenzugriff mit der Zone des Objekts. Die Zone (Lage des Mittelpunkts relativ
+# zum Regal und seiner virtuellen Linie) berechnet ShelfGeometry für alle Objekte eines Frames
+# auf einmal aus einer vorab gezeichneten Label-Map der ROIs.
+# ObjectRegistry hält die aktiven TrackedObjects und zählt sie je (Regal, Produkt, Zustand) mit,
+# sobald sich Zustand, Regal oder Produkt eines Objekts ändern - Statusanzeige, Limits und
+# Inventarabgleich lesen nur noch die Zähler, statt alle Objekte zu durchlaufen.
+
+import time
+from collections import Counter
+
+import numpy as np
+
+from debug_utils import log_debug, log_enabled
+
+
+class ObjectState:
+    IDLE = 0
+    POTENTIAL_REMOVAL = 1
+    REMOVED = 2
+    POTENTIAL_RETURN = 3
+
+
+# Im Regal vorhandene Objekte (alle außer REMOVED)
+PRESENT_STATES = (ObjectState.IDLE, ObjectState.POTENTIAL_REMOVAL, ObjectState.POTENTIAL_RETURN)
+
+# Zonen als Bitmaske, bezogen auf das zugeordnete Regal (Rechteck x1..x2, y1..y2 und rote Linie)
+ZONE_INSIDE = 1    # x1 < x < x2 und y1 < y < rote Linie
+ZONE_BELOW = 2     # unterhalb der roten Linie
+ZONE_LEFT = 4      # links vom Regal
+ZONE_RIGHT = 8     # rechts vom Regal
+ZONE_TOP = 16      # oberhalb des Regals
+ZONE_SIDE = ZONE_LEFT | ZONE_RIGHT | ZONE_TOP
+
+# Reihenfolge der Ränder in den Logmeldungen, wenn mehrere überschritten sind:
+# Rand-Check beim Verlassen des Regals bzw. Verlassen während POTENTIAL_RETURN
+ZONE_DIRECTIONS = ((ZONE_RIGHT, "rechts"), (ZONE_LEFT, "links"), (ZONE_TOP, "oben"), (ZONE_BELOW, "unten"))
+RETURN_EXIT_DIRECTIONS = ((ZONE_BELOW, "unten"), (ZONE_LEFT, "links"), (ZONE_RIGHT, "rechts"), (ZONE_TOP, "oben"))
+
+
+def zone_direction(zone, directions=ZONE_DIRECTIONS):
+    """Richtung als Text für Logmeldungen ("" auf der Grenze)."""
+    for bit, name in directions:
+        if zone & bit:
+            return name
+    return ""
+
+
+class ShelfGeometry:
+    """
+    Vorab berechneter Regalindex aus den ROIs (regal_config.json) und den virtuellen Linien.
+    Eine Label-Map in Frame-Auflösung enthält je Pixel den Index des ersten Regals, dessen
+    Rechteck (inklusive Rand) ihn enthält (-1 = kein Regal). So werden alle Tracker-Mittelpunkte
+    eines Frames mit einem einzigen Array-Zugriff Regalen zugeordnet, unabhängig von der Anzahl
+    der Regalfächer; die Zonen folgen vektorisiert aus den Grenzen je Regal.
+    """
+
+    def __init__(self, rois, virtual_lines):
+        self.shelf_ids = list(rois)
+        self.index = {shelf: i for i, shelf in enumerate(self.shelf_ids)}
+        # Grenzen je Regalindex: x1, y1, x2, y2, rote Linie
+        self.bounds = np.array([(rx, ry, rx + rw, ry + rh, ry + virtual_lines[shelf])
+                                for shelf, (rx, ry, rw, rh) in rois.items()], dtype=np.int64).reshape(-1, 5)
+
+        # Label-Map über das umschließende Rechteck aller ROIs; in umgekehrter Reihenfolge
+        # gezeichnet, damit bei Überlappung wie bisher das erste Regal gewinnt
+        if len(self.bounds):
+            self.origin = self.bounds[:, :2].min(axis=0)
+            width, height = self.bounds[:, 2:4].max(axis=0) - self.origin + 1
+        else:
+            self.origin = np.zeros(2, dtype=np.int64)
+            width = height = 0
+        self.label_map = np.full((height, width), -1, dtype=np.int16 if len(self.bounds) < 2 ** 15 else np.int32)
+        for i in range(len(self.bounds) - 1, -1, -1):
+            x1, y1, x2, y2 = self.bounds[i, :4] - np.tile(self.origin, 2)
+            self.label_map[y1:y2 + 1, x1:x2 + 1] = i
+
+    def locate(self, centers):
+        """Regalindex je Punkt (Array (N, 2) mit x, y); -1 außerhalb aller Regale."""
+        points = np.asarray(centers, dtype=np.int64).reshape(-1, 2) - self.origin
+        height, width = self.label_map.shape
+        valid = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+        indices = np.full(len(points), -1, dtype=np.int64)
+        indices[valid] = self.label_map[points[valid, 1], points[valid, 0]]
+        return indices
+
+    def zones(self, indices, centers):
+        """Zone je Punkt bezogen auf das Regal mit dem jeweiligen Index (Bitmaske aus ZONE_*, 0 ohne Regal)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        points = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        if not len(self.bounds):
+            return np.zeros(len(points), dtype=np.int64)
+        x, y = points[:, 0], points[:, 1]
+        x1, y1, x2, y2, red_line = self.bounds[np.maximum(indices, 0)].T
+        inside = (x1 < x) & (x < x2) & (y1 < y) & (y < red_line)
+        zones = ((y > red_line) * ZONE_BELOW | (x < x1) * ZONE_LEFT |
+                 (x > x2) * ZONE_RIGHT | (y < y1) * ZONE_TOP)
+        zones = np.where(inside, ZONE_INSIDE, zones)
+        return np.where(indices >= 0, zones, 0)
+
+
+class TrackedObject:
+    """
+    Ein verfolgtes Objekt. Zustand, Regal und Produkt sind Properties: Änderungen werden an die
+    ObjectRegistry gemeldet, in der das Objekt gerade aktiv ist.
+    """
+    __slots__ = ("trk_id", "_state", "_current_shelf", "_product_type", "_registry",
+                 "original_shelf", "last_seen", "frames_in_state", "start_y", "start_x",
+                 "removal_direction", "removal_event_active", "removal_time", "misplaced_updated",
+                 "is_inside_roi", "signature")
+
+    def __init__(self, trk_id, shelf, product_type, last_seen=None):
+        self.trk_id = trk_id
+        self._registry = None
+        self._state = ObjectState.IDLE
+        self._current_shelf = shelf
+        self._product_type = product_type
+        self.original_shelf = shelf  # Das Regal, aus dem das Objekt ursprünglich entfernt wurde
+        self.last_seen = last_seen or time.time()
+        self.frames_in_state = 0
+        self.start_y = None
+        self.start_x = None
+        self.removal_direction = None  # "bottom", "side" oder "outside" während einer Entnahme
+        self.removal_event_active = False
+        self.removal_time = None
+        self.misplaced_updated = False
+        self.is_inside_roi = True  # Ob der Mittelpunkt in irgendeinem ROI liegt
+        self.signature = None
+
+    def _counter_key(self):
+        return self._current_shelf, self._product_type, self._state
+
+    def _set(self, attribute, value):
+        if self._registry is None:
+            setattr(self, attribute, value)
+            return
+        old_key = self._counter_key()
+        setattr(self, attribute, value)
+        self._registry._move(old_key, self._counter_key())
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        if value != self._state:
+            self._set("_state", value)
+
+    @property
+    def current_shelf(self):
+        return self._current_shelf
+
+    @current_shelf.setter
+    def current_shelf(self, value):
+        if value != self._current_shelf:
+            self._set("_current_shelf", value)
+
+    @property
+    def product_type(self):
+        return self._product_type
+
+    @product_type.setter
+    def product_type(self, value):
+        if value != self._product_type:
+            self._set("_product_type", value)
+
+    def __str__(self):
+        direction = f", Richtung: {self.removal_direction}" if self.removal_direction else ""
+        roi_status = ", im ROI" if self.is_inside_roi else ", außerhalb ROI"
+        return f"Objekt {self.trk_id} ({self.product_type}) - Zustand: {self.state}, Regal: {self.current_shelf}{direction}{roi_status}"
+
+
+class ObjectRegistry(dict):
+    """
+    Aktive Objekte {Tracker-ID: TrackedObject} mit laufenden Zählern je (Regal, Produkt, Zustand)
+    und je Produkt. Einfügen, Entfernen und Zustandsänderungen halten die Zähler aktuell.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = Counter()       # (Regal, Produkt, Zustand) -> Anzahl
+        self._type_counts = Counter()  # Produkt -> Anzahl
+
+    def __setitem__(self, trk_id, obj):
+        if trk_id in self:
+            self._detach(super().__getitem__(trk_id))
+        super().__setitem__(trk_id, obj)
+        obj._registry = self
+        self._counts[obj._counter_key()] += 1
+        self._type_counts[obj.product_type] += 1
+
+    def __delitem__(self, trk_id):
+        obj = super().__getitem__(trk_id)
+        super().__delitem__(trk_id)
+        self._detach(obj)
+
+    def pop(self, trk_id, *default):
+        if trk_id not in self:
+            return super().pop(trk_id, *default)
+        obj = super().pop(trk_id)
+        self._detach(obj)
+        return obj
+
+    def clear(self):
+        for obj in self.values():
+            obj._registry = None
+        super().clear()
+        self._counts.clear()
+        self._type_counts.clear()
+
+    def _detach(self, obj):
+        obj._registry = None
+        self._decrement(self._counts, obj._counter_key())
+        self._decrement(self._type_counts, obj.product_type)
+
+    def _move(self, old_key, new_key):
+        self._decrement(self._counts, old_key)
+        self._counts[new_key] += 1
+        if old_key[1] != new_key[1]:
+            self._decrement(self._type_counts, old_key[1])
+            self._type_counts[new_key[1]] += 1
+
+    @staticmethod
+    def _decrement(counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def type_count(self, product_type):
+        """Aktive Objekte eines Produkts (alle Regale und Zustände)."""
+        return self._type_counts.get(product_type, 0)
+
+    def present_count(self, shelf, product_type):
+        """Objekte eines Produkts, die im Regal stehen (nicht REMOVED)."""
+        return sum(self._counts.get((shelf, product_type, state), 0) for state in PRESENT_STATES)
+
+    def present_counts(self):
+        """{(Regal, Produkt): Anzahl} aller Objekte, die nicht REMOVED sind."""
+        counts = Counter()
+        for (shelf, product_type, state), count in self._counts.items():
+            if state != ObjectState.REMOVED:
+                counts[(shelf, product_type)] += count
+        return counts
+
+
+# Übergänge aus den stabilen Zuständen: Zustand -> ((Zonenmaske, Folgezustand, Richtung, Meldung), ...).
+# Der erste Eintrag, dessen Maske die Zone trifft, gewinnt; Richtung None lässt sie unverändert.
+ENTRY_TRANSITIONS = {
+    ObjectState.IDLE: (
+        (ZONE_BELOW, ObjectState.POTENTIAL_REMOVAL, "bottom", "wechselt zu POTENTIAL_REMOVAL (unten)"),
+        (ZONE_SIDE, ObjectState.POTENTIAL_REMOVAL, "side", "wechselt zu POTENTIAL_REMOVAL (Rand: {direction})"),
+    ),
+    ObjectState.REMOVED: (
+        (ZONE_INSIDE, ObjectState.POTENTIAL_RETURN, None, "wechselt zu POTENTIAL_RETURN (zurück im Regal)"),
+    ),
+}
+
+# Wartezustände: (Zustand, Richtung) -> (Zonenmaske, in der gezählt wird, Frames bis zur Bestätigung,
+#   Zustand nach Bestätigung, Ereignis, Meldung, Zustand beim Verlassen der Zonen, Meldung).
+# Richtung None ist der Standard für alle anderen Richtungen des Zustands.
+PENDING_TRANSITIONS = {
+    (ObjectState.POTENTIAL_REMOVAL, "bottom"): (
+        ZONE_BELOW, 2, ObjectState.REMOVED, "removal", "wechselt zu REMOVED",
+        ObjectState.IDLE, "wechselt zurück zu IDLE (in POTENTIAL_REMOVAL)"),
+    (ObjectState.POTENTIAL_REMOVAL, None): (
+        ZONE_SIDE, 2, ObjectState.REMOVED, "removal", "wechselt zu REMOVED",
+        ObjectState.IDLE, "wechselt zurück zu IDLE (in POTENTIAL_REMOVAL - Rand)"),
+    (ObjectState.POTENTIAL_RETURN, None): (
+        ZONE_INSIDE, 3, ObjectState.IDLE, "return", "wurde zurückgeführt und wechselt zu IDLE",
+        ObjectState.REMOVED, "verließ den Regalbereich ({direction}), wechselt zurück zu REMOVED"),
+}
+
+
+class ShelfStateMachine:
+    """
+    Wertet die Übergangstabellen für ein Objekt aus. Die Ereignisse werden über Callbacks
+    ausgelöst: on_removal(obj), on_return(obj) und on_misplaced_pickup(obj), wenn ein falsch
+    zurückgestelltes Objekt wieder aus allen Regalen genommen wird.
+    """
+
+    def __init__(self, on_removal, on_return, on_misplaced_pickup):
+        self.events = {"removal": on_removal, "return": on_return}
+        self.on_misplaced_pickup = on_misplaced_pickup
+
+    def update_roi_presence(self, obj, inside_any_roi, shelf):
+        """Merkt, ob das Objekt in einem ROI liegt (shelf: zugeordnetes Regal); Verlassen aller ROIs startet eine Entnahme."""
+        if inside_any_roi:
+            if not obj.is_inside_roi:
+                log_debug(f"Objekt ID {obj.trk_id} ist zurück in einem Regal (Regal {shelf+1})")
+                obj.is_inside_roi = True
+            return
+        if not obj.is_inside_roi:
+            return
+        log_debug(f"Objekt ID {obj.trk_id} hat Regal {shelf+1} verlassen!")
+        obj.is_inside_roi = False
+        if obj.state == ObjectState.IDLE:
+            obj.state = ObjectState.POTENTIAL_REMOVAL
+            obj.frames_in_state = 1
+            obj.removal_direction = "outside"
+            log_debug(f"Objekt ID {obj.trk_id} wechselt zu POTENTIAL_REMOVAL (Regal verlassen)")
+
+    def step(self, obj, zone, center_x, center_y, inside_any_roi):
+        """Ein Frame für obj; zone bezieht sich auf obj.current_shelf."""
+        state = obj.state
+        entries = ENTRY_TRANSITIONS.get(state)
+        if entries is not None:
+            if state == ObjectState.IDLE and zone & (ZONE_BELOW | ZONE_SIDE) and log_enabled("DEBUG"):
+                log_debug(f"Rand-Check: Objekt ID {obj.trk_id} ist außerhalb: {zone_direction(zone)}")
+            for mask, target, direction, message in entries:
+                if zone & mask:
+                    obj.state = target
+                    obj.frames_in_state = 1
+                    obj.start_x, obj.start_y = center_x, center_y
+                    if direction is not None:
+                        obj.removal_direction = direction
+                    log_debug(f"Objekt ID {obj.trk_id} " + message.format(direction=zone_direction(zone)))
+                    break
+            if state == ObjectState.REMOVED and obj.misplaced_updated and not inside_any_roi:
+                self._misplaced_pickup(obj)
+            return
+
+        rule = PENDING_TRANSITIONS.get((state, obj.removal_direction)) or PENDING_TRANSITIONS[(state, None)]
+        mask, frames, confirmed, event, confirmed_message, aborted, aborted_message = rule
+        if zone & mask:
+            obj.frames_in_state += 1
+            if obj.frames_in_state < frames:
+                return
+            target, message = confirmed, confirmed_message
+        else:
+            target, message, event = aborted, aborted_message, None
+        directions = RETURN_EXIT_DIRECTIONS if state == ObjectState.POTENTIAL_RETURN else ZONE_DIRECTIONS
+        obj.state = target
+        obj.frames_in_state = 0
+        obj.start_x = obj.start_y = None
+        if target == ObjectState.IDLE:
+            obj.removal_direction = None
+        if event is not None:
+            self.events[event](obj)
+        log_debug(f"Objekt ID {obj.trk_id} " + message.format(direction=zone_direction(zone, directions)))
+
+    def _misplaced_pickup(self, obj):
+        # Falsch zurückgestelltes Objekt ist wieder außerhalb aller Regale: misplaced-Event
+        # schließen und erneut als Entnahme behandeln
+        log_debug(f"Misplaced Objekt ID {obj.trk_id} wurde aus dem Regal genommen und ist jetzt außerhalb aller Regale")
+        self.on_misplaced_pickup(obj)
+        obj.misplaced_updated = False
+        obj.state = ObjectState.REMOVED
+        self.events["removal"](obj)
+        log_debug(f"Objekt ID {obj.trk_id} wurde als REMOVED markiert, nachdem es als misplaced entfernt wurde")
@@ -5,6 +5,9 @@ import cv2
 from filterpy.kalman import KalmanFilter
 from scipy.optimize import linear_sum_assignment
 
+# Kalman-Backend für Sort: "batch" (alle Tracks in gestapelten NumPy-Arrays) oder "filterpy" (ein Filter pro Track)
+KALMAN_BACKEND = "batch"
+
 def compute_color_histogram(image, bbox):
     """
     Extrahiert ein Farb-Histogramm (HSV) aus der Region, die durch bbox definiert wird.
@@ -19,6 +22,49 @@ def compute_color_histogram(image, bbox):
     cv2.normalize(hist, hist)
     return hist.flatten()
 
+def iou_batch(bboxes1, bboxes2):
+    """
+    Berechnet die IoU-Matrix (N x M) zwischen zwei Mengen von Bounding Boxes.
+    bboxes1: Array (N, 4), bboxes2: Array (M, 4) im Format [x1, y1, x2, y2]
+    """
+    b1 = np.asarray(bboxes1, dtype=np.float32).reshape(-1, 4)[:, None, :]
+    b2 = np.asarray(bboxes2, dtype=np.float32).reshape(-1, 4)[None, :, :]
+    inter_w = np.maximum(0.0, np.minimum(b1[..., 2], b2[..., 2]) - np.maximum(b1[..., 0], b2[..., 0]))
+    inter_h = np.maximum(0.0, np.minimum(b1[..., 3], b2[..., 3]) - np.maximum(b1[..., 1], b2[..., 1]))
+    inter_area = inter_w * inter_h
+    area1 = (b1[..., 2] - b1[..., 0]) * (b1[..., 3] - b1[..., 1])
+    area2 = (b2[..., 2] - b2[..., 0]) * (b2[..., 3] - b2[..., 1])
+    return inter_area / (area1 + area2 - inter_area + 1e-6)
+
+def hist_correlation_batch(hists1, hists2):
+    """
+    Berechnet die Korrelationsmatrix (N x M) wie cv2.compareHist(..., cv2.HISTCMP_CORREL)
+    für alle Paare zweier gestapelter Histogramm-Arrays (N, K) und (M, K).
+    """
+    h1 = hists1 - hists1.mean(axis=1, keepdims=True)
+    h2 = hists2 - hists2.mean(axis=1, keepdims=True)
+    numerator = h1 @ h2.T
+    denominator = np.sqrt(np.outer((h1 * h1).sum(axis=1), (h2 * h2).sum(axis=1)))
+    # Wie OpenCV: bei konstanten Histogrammen (Varianz 0) gilt die Korrelation als 1
+    correlation = np.ones_like(numerator)
+    np.divide(numerator, denominator, out=correlation, where=denominator > np.finfo(np.float32).eps)
+    return correlation
+
+def stack_histograms(hists):
+    """
+    Stapelt eine Liste von Histogrammen zu einem zusammenhängenden float32-Array.
+    Fehlende Histogramme (None) werden als Nullzeilen abgelegt; die Maske markiert gültige Zeilen.
+    """
+    valid = np.array([h is not None for h in hists], dtype=bool)
+    if not valid.any():
+        return None, valid
+    size = next(h for h in hists if h is not None).size
+    stacked = np.zeros((len(hists), size), dtype=np.float32)
+    for i, h in enumerate(hists):
+        if h is not None:
+            stacked[i] = h.ravel()
+    return stacked, valid
+
 class KalmanBoxTracker:
     count = 0
 
@@ -97,14 +143,154 @@ class KalmanBoxTracker:
                          x[0] + w / 2.0,
                          x[1] + h / 2.0])
 
+class BatchKalmanTracker:
+    """
+    Speicher für die Kalman-Filter aller Tracks in gestapelten Arrays:
+    Zustände (N, 7) und Kovarianzen (N, 7, 7). predict und update laufen vektorisiert
+    über beliebige Slot-Mengen; freie Slots gelöschter Tracks werden wiederverwendet.
+    Das Modell entspricht KalmanBoxTracker (konstante Geschwindigkeit, Zustand cx, cy, s, r, vx, vy, vs).
+    """
+    F = np.array([
+        [1,0,0,0,1,0,0],
+        [0,1,0,0,0,1,0],
+        [0,0,1,0,0,0,1],
+        [0,0,0,1,0,0,0],
+        [0,0,0,0,1,0,0],
+        [0,0,0,0,0,1,0],
+        [0,0,0,0,0,0,1]
+    ], dtype=np.float64)
+    H = np.eye(4, 7)
+    R = np.eye(4) * 10.
+    Q = np.diag([1., 1., 1., 1., 0.01, 0.01, 0.0001])
+    P0 = np.eye(7) * 1000.
+
+    def __init__(self, capacity=64):
+        self.x = np.zeros((capacity, 7))
+        self.P = np.zeros((capacity, 7, 7))
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def _grow(self):
+        old_capacity = len(self.x)
+        self.x = np.concatenate([self.x, np.zeros((old_capacity, 7))])
+        self.P = np.concatenate([self.P, np.zeros((old_capacity, 7, 7))])
+        self.free_slots.extend(range(2 * old_capacity - 1, old_capacity - 1, -1))
+
+    def add(self, bbox):
+        """Legt einen neuen Filter für bbox [x1, y1, x2, y2] an und liefert seinen Slot."""
+        if not self.free_slots:
+            self._grow()
+        slot = self.free_slots.pop()
+        self.x[slot] = 0.0
+        self.x[slot, :4] = self.convert_bboxes_to_z(np.asarray(bbox, dtype=np.float64).reshape(1, 4))[0]
+        self.P[slot] = self.P0
+        return slot
+
+    def remove(self, slot):
+        """Gibt den Slot eines gelöschten Tracks zur Wiederverwendung frei."""
+        self.free_slots.append(slot)
+
+    def predict(self, slots):
+        """Vorhersage für alle angegebenen Slots; liefert die Bounding Boxes (n, 4)."""
+        slots = np.asarray(slots, dtype=np.intp)
+        x = self.x[slots]
+        P = self.P[slots]
+        # Fläche darf nicht negativ werden
+        x[x[:, 6] + x[:, 2] <= 0, 6] = 0.0
+        x = x @ self.F.T
+        P = self.F @ P @ self.F.T + self.Q
+        self.x[slots] = x
+        self.P[slots] = P
+        return self.convert_x_to_bboxes(x)
+
+    def update(self, slots, bboxes):
+        """Korrekturschritt für alle angegebenen Slots mit den Messungen bboxes (n, 4)."""
+        slots = np.asarray(slots, dtype=np.intp)
+        z = self.convert_bboxes_to_z(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4))
+        x = self.x[slots]
+        P = self.P[slots]
+        y = z - x @ self.H.T
+        PHt = P @ self.H.T
+        S = self.H @ PHt + self.R
+        K = PHt @ np.linalg.inv(S)
+        x = x + np.einsum('nij,nj->ni', K, y)
+        # Joseph-Form wie in filterpy für numerisch stabile Kovarianzen
+        I_KH = np.eye(7) - K @ self.H
+        P = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+        self.x[slots] = x
+        self.P[slots] = P
+
+    @staticmethod
+    def convert_bboxes_to_z(bboxes):
+        """ Konvertiere Bounding Boxes (n, 4) [x1, y1, x2, y2] in (n, 4) (cx, cy, s, r) """
+        w = bboxes[:, 2] - bboxes[:, 0]
+        h = bboxes[:, 3] - bboxes[:, 1]
+        r = np.divide(w, h, out=np.zeros_like(w), where=h != 0)
+        return np.stack([bboxes[:, 0] + w / 2.0, bboxes[:, 1] + h / 2.0, w * h, r], axis=1)
+
+    @staticmethod
+    def convert_x_to_bboxes(x):
+        """ Konvertiere Kalman-Zustände (n, 7) in Bounding Boxes (n, 4) [x1, y1, x2, y2] """
+        # Negative Flächen ergeben wie bei KalmanBoxTracker NaN, solche Tracks werden übersprungen
+        with np.errstate(invalid='ignore'):
+            w = np.where(x[:, 3] > 0, np.sqrt(x[:, 2] * x[:, 3]), 0.0)
+        h = np.divide(x[:, 2], w, out=np.zeros_like(w), where=w != 0)
+        return np.stack([x[:, 0] - w / 2.0, x[:, 1] - h / 2.0,
+                         x[:, 0] + w / 2.0, x[:, 1] + h / 2.0], axis=1)
+
+class BatchTrack:
+    """
+    Track-Metadaten für das Batch-Backend; Zustand und Kovarianz liegen im BatchKalmanTracker.
+    Bietet dieselben Attribute und Methoden wie KalmanBoxTracker.
+    """
+    __slots__ = ("store", "slot", "id", "time_since_update", "history", "hits", "hit_streak", "color_hist")
+
+    def __init__(self, store, bbox, detection_color=None):
+        self.store = store
+        self.slot = store.add(bbox)
+        self.time_since_update = 0
+        self.id = KalmanBoxTracker.count
+        KalmanBoxTracker.count += 1
+        self.history = []
+        self.hits = 0
+        self.hit_streak = 0
+        self.color_hist = detection_color
+
+    def mark_updated(self, detection_color=None):
+        """ Zählerstände und Farb-Histogramm nach einem (gebündelten) Korrekturschritt aktualisieren. """
+        self.time_since_update = 0
+        self.history = []
+        self.hits += 1
+        self.hit_streak += 1
+        if detection_color is not None:
+            if self.color_hist is None:
+                self.color_hist = detection_color
+            else:
+                self.color_hist = 0.5 * self.color_hist + 0.5 * detection_color
+
+    def mark_predicted(self, bbox):
+        self.time_since_update += 1
+        self.history.append(bbox)
+        return bbox
+
+    def update(self, bbox, detection_color=None):
+        """ Aktualisiert den Tracker mit der neuen Bounding Box und aktualisiert das Farb-Histogramm. """
+        self.store.update([self.slot], [bbox])
+        self.mark_updated(detection_color)
+
+    def predict(self):
+        """ Führt eine Vorhersage für das nächste Frame durch. """
+        return self.mark_predicted(self.store.predict([self.slot])[0])
+
 class Sort:
-    def __init__(self, max_age=10, min_hits=3, alpha=0.5, beta=0.5, assignment_threshold=0.7):
+    def __init__(self, max_age=10, min_hits=3, alpha=0.5, beta=0.5, assignment_threshold=0.7,
+                 kalman_backend=KALMAN_BACKEND):
         """
         max_age: Maximale Frames ohne Update, bevor ein Tracker gelöscht wird
         min_hits: Mindestanzahl von Updates, bevor ein Tracker als valide gilt
         alpha: Gewichtung für den IoU-Anteil im Kostenmodell
         beta: Gewichtung für den Farbanteil im Kostenmodell
         assignment_threshold: Maximal akzeptierte Kosten für eine Zuordnung
+        kalman_backend: "batch" (BatchKalmanTracker) oder "filterpy" (KalmanBoxTracker je Track)
         """
         self.max_age = max_age
         self.min_hits = min_hits
@@ -113,6 +299,7 @@ class Sort:
         self.alpha = alpha
         self.beta = beta
         self.assignment_threshold = assignment_threshold
+        self.kalman = BatchKalmanTracker() if kalman_backend == "batch" else None
 
     def update(self, detections, detection_colors=None):
         """
@@ -121,57 +308,117 @@ class Sort:
         detection_colors: Liste von Farb-Histogrammen für jede Detektion (muss in gleicher Reihenfolge sein)
         """
         self.frame_count += 1
-        updated_tracks = []
-        for tracker in self.trackers:
-            prediction = tracker.predict()
-            if np.any(np.isnan(prediction)):
-                continue
-            updated_tracks.append(prediction)
+        # Nur Tracker mit gültiger Vorhersage nehmen an der Zuordnung teil
+        predictions = self._predict(self.trackers)
+        valid = ~np.isnan(predictions).any(axis=1)
+        active_trackers = [t for t, ok in zip(self.trackers, valid) if ok]
+        updated_tracks = predictions[valid]
         
-        num_tracks = len(updated_tracks)
+        num_tracks = len(active_trackers)
         num_detections = len(detections)
-        cost_matrix = np.zeros((num_tracks, num_detections), dtype=np.float32)
         
         if num_tracks > 0 and num_detections > 0:
-            for t, tracker in enumerate(self.trackers):
-                for d in range(num_detections):
-                    iou_val = self.iou(updated_tracks[t], detections[d][:4])
-                    if detection_colors is not None and tracker.color_hist is not None and detection_colors[d] is not None:
-                        correlation = cv2.compareHist(tracker.color_hist.astype('float32'),
-                                                      detection_colors[d].astype('float32'),
-                                                      cv2.HISTCMP_CORREL)
-                        correlation = max(0, correlation)
-                    else:
-                        correlation = 0.0
-                    cost_matrix[t, d] = self.alpha * (1 - iou_val) + self.beta * (1 - correlation)
+            cost_matrix = self.cost_matrix(active_trackers, updated_tracks, detections, detection_colors)
             
             row_ind, col_ind = linear_sum_assignment(cost_matrix)
-            matched_detections = set()
-            for r, c in zip(row_ind, col_ind):
-                if cost_matrix[r, c] < self.assignment_threshold:
-                    self.trackers[r].update(detections[c][:4],
-                                            detection_color=detection_colors[c] if detection_colors is not None else None)
-                    matched_detections.add(c)
+            matches = [(r, c) for r, c in zip(row_ind, col_ind) if cost_matrix[r, c] < self.assignment_threshold]
+            self._update([active_trackers[r] for r, _ in matches],
+                         [detections[c][:4] for _, c in matches],
+                         [detection_colors[c] if detection_colors is not None else None for _, c in matches])
+            matched_detections = set(c for _, c in matches)
             for d in range(num_detections):
                 if d not in matched_detections:
-                    new_tracker = KalmanBoxTracker(detections[d][:4],
-                                                   detection_color=detection_colors[d] if detection_colors is not None else None)
-                    self.trackers.append(new_tracker)
+                    self.trackers.append(self._create_tracker(
+                        detections[d][:4], detection_colors[d] if detection_colors is not None else None))
         else:
             for d in range(num_detections):
-                new_tracker = KalmanBoxTracker(detections[d][:4],
-                                               detection_color=detection_colors[d] if detection_colors is not None else None)
-                self.trackers.append(new_tracker)
+                self.trackers.append(self._create_tracker(
+                    detections[d][:4], detection_colors[d] if detection_colors is not None else None))
         
-        self.trackers = [t for t in self.trackers if t.time_since_update <= self.max_age]
+        kept_trackers = []
+        for t in self.trackers:
+            if t.time_since_update <= self.max_age:
+                kept_trackers.append(t)
+            elif self.kalman is not None:
+                self.kalman.remove(t.slot)
+        self.trackers = kept_trackers
+        
+        # Tracks ohne aktuelle Vorhersage (gerade aktualisiert oder neu) werden gemeinsam vorhergesagt
+        pending = [t for t in self.trackers if len(t.history) == 0]
+        self._predict(pending)
         
         results = []
         for tracker in self.trackers:
-            bbox = tracker.history[-1] if len(tracker.history) > 0 else tracker.predict()
-            results.append(np.concatenate((bbox.flatten(), np.array([tracker.id]))))
+            bbox = tracker.history[-1]
+            results.append(np.concatenate((np.asarray(bbox).flatten(), np.array([tracker.id]))))
         
         return np.array(results)
 
+    def predict(self):
+        """
+        Schreibt alle Tracks ohne neue Detektionen per Kalman-Vorhersage fort
+        (für Frames, auf denen keine Inferenz lief). Die Tracks altern dabei nicht,
+        da keine Zuordnung fehlgeschlagen ist.
+        Rückgabe im selben Format wie update().
+        """
+        self._predict(self.trackers)
+        results = []
+        for tracker in self.trackers:
+            tracker.time_since_update = max(0, tracker.time_since_update - 1)
+            bbox = np.asarray(tracker.history[-1])
+            if np.any(np.isnan(bbox)):
+                continue
+            results.append(np.concatenate((bbox.flatten(), np.array([tracker.id]))))
+        return np.array(results)
+
+    def _create_tracker(self, bbox, detection_color=None):
+        if self.kalman is not None:
+            return BatchTrack(self.kalman, bbox, detection_color=detection_color)
+        return KalmanBoxTracker(bbox, detection_color=detection_color)
+
+    def _predict(self, trackers):
+        """ Vorhersage für alle übergebenen Tracker; liefert ein Array (n, 4). """
+        if not trackers:
+            return np.zeros((0, 4))
+        if self.kalman is None:
+            return np.array([np.asarray(t.predict(), dtype=np.float64).ravel()[:4] for t in trackers])
+        boxes = self.kalman.predict([t.slot for t in trackers])
+        for t, bbox in zip(trackers, boxes):
+            t.mark_predicted(bbox)
+        return boxes
+
+    def _update(self, trackers, bboxes, detection_colors):
+        """ Korrekturschritt für alle zugeordneten Tracker. """
+        if not trackers:
+            return
+        if self.kalman is None:
+            for t, bbox, color in zip(trackers, bboxes, detection_colors):
+                t.update(bbox, detection_color=color)
+            return
+        self.kalman.update([t.slot for t in trackers], bboxes)
+        for t, color in zip(trackers, detection_colors):
+            t.mark_updated(color)
+
+    def cost_matrix(self, trackers, predicted_boxes, detections, detection_colors=None):
+        """
+        Berechnet die Kostenmatrix (Tracks x Detektionen) in einem Schritt:
+        alpha * (1 - IoU) + beta * (1 - max(0, Farbkorrelation)).
+        Tracks oder Detektionen ohne Histogramm erhalten die Korrelation 0.
+        """
+        det_boxes = np.asarray([det[:4] for det in detections], dtype=np.float32)
+        iou_matrix = iou_batch(predicted_boxes, det_boxes)
+        
+        correlation = np.zeros_like(iou_matrix)
+        if detection_colors is not None:
+            track_hists, track_valid = stack_histograms([t.color_hist for t in trackers])
+            det_hists, det_valid = stack_histograms(list(detection_colors))
+            if track_hists is not None and det_hists is not None:
+                correlation = np.maximum(0.0, hist_correlation_batch(track_hists, det_hists))
+                correlation[~track_valid, :] = 0.0
+                correlation[:, ~det_valid] = 0.0
+        
+        return (self.alpha * (1 - iou_matrix) + self.beta * (1 - correlation)).astype(np.float32)
+
     def iou(self, bbox1, bbox2):
         """ Berechnet die IoU zweier Bounding Boxes """
         x1, y1, x2, y2 = bbox1
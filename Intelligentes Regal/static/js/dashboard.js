@@ -40,78 +40,180 @@ document.addEventListener('DOMContentLoaded', function() {
         modal.show();
     }
     
-    // Daten aktualisieren
+    // Spalten und Zeilenfarben der Ereignistabelle
+    const eventColumns = [
+        'event_id',
+        'shelf_id',
+        item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
+        'event_type',
+        'event_time',
+        'status',
+        'quantity'
+    ];
+    
+    function colorEventRow(row, event) {
+        // Zeilen nach Status einfärben
+        const statusLower = event.status.toLowerCase();
+        if (statusLower === 'not paid') {
+            row.className = 'table-danger';
+        } else if (statusLower === 'paid') {
+            row.className = 'table-success';
+        } else if (statusLower === 'misplaced') {
+            row.className = 'table-warning';
+        } else if (statusLower === 'returned') {
+            row.className = 'table-info';
+        } else {
+            row.className = '';
+        }
+    }
+    
+    // Lokaler Stand der Ereignisse; vom Server kommen nur Änderungen seit eventsCursor
+    const eventsById = new Map();
+    let eventsCursor = 0;
+    let eventsEpoch = null;
+    let eventFilter = { status: 'Alle', product: 'Alle' };
+    
+    // Änderungen am Event-Feed abholen und mit dem lokalen Stand zusammenführen
+    function updateEvents() {
+        const params = new URLSearchParams({ since: eventsCursor });
+        if (eventsEpoch !== null) {
+            params.set('epoch', eventsEpoch);
+        }
+        return fetch(`/api/events?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                applyEventFeed(data);
+            });
+    }
+    
+    // Event-Diff (aus /api/events oder dem SSE-Stream) mit dem lokalen Stand zusammenführen
+    function applyEventFeed(data) {
+        // full: Datenbank zurückgesetzt oder erster Abruf - Stand komplett ersetzen
+        if (data.full) {
+            eventsById.clear();
+        }
+        data.deleted.forEach(eventId => eventsById.delete(eventId));
+        data.events.forEach(event => eventsById.set(event.event_id, event));
+        eventsCursor = data.cursor;
+        eventsEpoch = data.epoch;
+        
+        // Tabelle nur bei Änderungen neu aufbauen
+        if (data.full || data.deleted.length > 0 || data.events.length > 0) {
+            renderEvents();
+        }
+    }
+    
+    // Ereignistabelle aus dem lokalen Stand aufbauen (gefiltert, neueste zuerst)
+    function renderEvents() {
+        const events = Array.from(eventsById.values()).filter(event =>
+            (eventFilter.status === 'Alle' || event.status.toLowerCase() === eventFilter.status.toLowerCase()) &&
+            (eventFilter.product === 'Alle' || event.product_type.toLowerCase() === eventFilter.product.toLowerCase())
+        );
+        events.sort((a, b) => {
+            if (a.event_time !== b.event_time) {
+                return a.event_time < b.event_time ? 1 : -1;
+            }
+            return b.event_id - a.event_id;
+        });
+        updateTable('events-table', events, eventColumns, colorEventRow);
+    }
+    
+    // Inventartabelle und Produktzusammenfassung aktualisieren
+    function applyOverview(data) {
+        updateTable('inventory-table', data.inventory, [
+            item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`, 
+            shelf => `Regal ${shelf.shelf_id}`, 
+            inv => `${inv.initial_count} (${inv.update_time})`,
+            inv => `${inv.current_count} (${inv.sold} verkauft)`,
+            inv => {
+                const statusClass = inv.status === 'Kritisch' ? 'bg-danger' : 
+                                  inv.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
+                return `<span class="badge ${statusClass}">${inv.status}</span>`;
+            }
+        ]);
+        
+        updateTable('product-summary-table', data.product_summaries, [
+            item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
+            'initial_count',
+            'current_count',
+            'sold',
+            'delta',
+            prod => {
+                const statusClass = prod.status === 'Kritisch' ? 'bg-danger' : 
+                                  prod.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
+                return `<span class="badge ${statusClass}">${prod.status}</span>`;
+            }
+        ]);
+    }
+    
+    // Statusanzeige aktualisieren
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+        }
+    }
+    
+    // Daten per Abfrage aktualisieren (Fallback ohne EventSource und nach Aktionen)
     function updateData() {
-        fetch('/api/data')
+        return fetch('/api/data?events=0')
             .then(response => response.json())
             .then(data => {
-                // Inventartabelle aktualisieren
-                updateTable('inventory-table', data.inventory, [
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`, 
-                    shelf => `Regal ${shelf.shelf_id}`, 
-                    inv => `${inv.initial_count} (${inv.update_time})`,
-                    inv => `${inv.current_count} (${inv.sold} verkauft)`,
-                    inv => {
-                        const statusClass = inv.status === 'Kritisch' ? 'bg-danger' : 
-                                          inv.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
-                        return `<span class="badge ${statusClass}">${inv.status}</span>`;
-                    }
-                ]);
-                
-                // Produktzusammenfassung aktualisieren
-                updateTable('product-summary-table', data.product_summaries, [
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                    'initial_count',
-                    'current_count',
-                    'sold',
-                    'delta',
-                    prod => {
-                        const statusClass = prod.status === 'Kritisch' ? 'bg-danger' : 
-                                          prod.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
-                        return `<span class="badge ${statusClass}">${prod.status}</span>`;
-                    }
-                ]);
-                
-                // Ereignistabelle aktualisieren
-                updateTable('events-table', data.events, [
-                    'event_id',
-                    'shelf_id',
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                    'event_type',
-                    'event_time',
-                    'status',
-                    'quantity'
-                ], function(row, event) {
-                    // Zeilen nach Status einfärben
-                    const statusLower = event.status.toLowerCase();
-                    if (statusLower === 'not paid') {
-                        row.className = 'table-danger';
-                    } else if (statusLower === 'paid') {
-                        row.className = 'table-success';
-                    } else if (statusLower === 'misplaced') {
-                        row.className = 'table-warning';
-                    } else if (statusLower === 'returned') {
-                        row.className = 'table-info';
-                    } else {
-                        row.className = '';
-                    }
-                });
+                applyOverview(data);
                 
                 // Letzte Aktualisierungszeit und Laufzeit aktualisieren
                 document.getElementById('last-update').textContent = data.last_update;
                 document.getElementById('runtime').textContent = data.runtime;
-
-                // Statusanzeige aktualisieren
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+                setConnected(true);
+                
+                // Ereignistabelle inkrementell aktualisieren
+                return updateEvents();
             })
             .catch(error => {
                 console.error('Fehler beim Abrufen der Daten:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+                setConnected(false);
             });
     }
     
+    // Push-Updates per Server-Sent Events: der Server sendet nur bei Änderungen
+    let runtimeStart = null;
+    
+    function updateRuntime() {
+        if (runtimeStart === null) return;
+        const elapsed = Math.max(0, Math.floor(Date.now() / 1000 - runtimeStart));
+        const hours = String(Math.floor(elapsed / 3600)).padStart(2, '0');
+        const minutes = String(Math.floor((elapsed % 3600) / 60)).padStart(2, '0');
+        const seconds = String(elapsed % 60).padStart(2, '0');
+        document.getElementById('runtime').textContent = `${hours}:${minutes}:${seconds}`;
+    }
+    
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            const data = JSON.parse(message.data);
+            applyOverview(data);
+            if (data.events) {
+                applyEventFeed(data.events);
+            }
+            if (data.runtime_seconds !== undefined) {
+                runtimeStart = Date.now() / 1000 - data.runtime_seconds;
+            }
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // Der Browser verbindet sich selbständig neu und erhält dann wieder den vollständigen Stand
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Funktion zum Aktualisieren einer Tabelle
     function updateTable(tableId, data, columns, rowCallback) {
         const table = document.getElementById(tableId);
@@ -200,41 +302,13 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('filter-form').addEventListener('submit', function(e) {
         e.preventDefault();
         
+        // Gefiltert wird lokal, damit neue Änderungen aus dem Event-Feed den Filter beibehalten
         const formData = new FormData(this);
-        
-        fetch('/filter_events', {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => response.json())
-        .then(data => {
-            updateTable('events-table', data.events, [
-                'event_id',
-                'shelf_id',
-                item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                'event_type',
-                'event_time',
-                'status',
-                'quantity'
-            ], function(row, event) {
-                const statusLower = event.status.toLowerCase();
-                if (statusLower === 'not paid') {
-                    row.className = 'table-danger';
-                } else if (statusLower === 'paid') {
-                    row.className = 'table-success';
-                } else if (statusLower === 'misplaced') {
-                    row.className = 'table-warning';
-                } else if (statusLower === 'returned') {
-                    row.className = 'table-info';
-                } else {
-                    row.className = '';
-                }
-            });
-        })
-        .catch(error => {
-            console.error('Fehler beim Filtern:', error);
-            showNotification('Fehler', 'Ereignisse konnten nicht gefiltert werden.', false);
-        });
+        eventFilter = {
+            status: formData.get('status_filter') || 'Alle',
+            product: formData.get('product_filter') || 'Alle'
+        };
+        renderEvents();
     });
     
     // Handler für Produkt-Zusammenfassungs-Filter
@@ -346,9 +420,12 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Automatische Aktualisierung alle 1 Sekunde für häufigere Updates
-    setInterval(updateData, 1000);
-    
-    // Initiale Datenaktualisierung
-    updateData();
+    if (window.EventSource) {
+        connectStream();
+        setInterval(updateRuntime, 1000);
+    } else {
+        // Ohne SSE-Unterstützung: Aktualisierung alle 1 Sekunde
+        setInterval(updateData, 1000);
+        updateData();
+    }
 });
\ No newline at end of file
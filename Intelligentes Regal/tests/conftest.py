@@ -0,0 +1,8 @@
+# conftest.py
+#
+# Die Module liegen flach im Projektverzeichnis; für die Tests in den Importpfad aufnehmen.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+# test_pipeline.py
+#
+# MultiCameraPipeline mit drei Kameras: jede Kamera muss alle ihre Frames liefern, auch wenn
+# der gemeinsame Inferenz-Worker die Frames mehrerer Kameras in einem Durchlauf weitergibt.
+# Die Testkameras liefern das nächste Frame erst, wenn das vorige beim Konsumenten angekommen
+# ist; ein verlorenes Frame zeigt sich so als fehlendes Frame statt als Kamera-Überlauf.
+
+import threading
+from collections import Counter
+
+import numpy as np
+
+import pipeline
+
+FRAMES_PER_CAMERA = 100
+
+
+class LockstepCamera:
+    """Bildquelle, die Frame n+1 erst nach der Zustellung von Frame n herausgibt."""
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.delivered = threading.Semaphore(1)
+
+    def read(self):
+        # Wird ein Frame unterwegs verworfen, läuft die Kamera nach dem Timeout trotzdem weiter
+        self.delivered.acquire(timeout=0.5)
+        if self.frames == 0:
+            return False, None
+        self.frames -= 1
+        return True, np.zeros((8, 8, 3), np.uint8)
+
+
+def test_every_camera_gets_its_frames(monkeypatch):
+    monkeypatch.setattr(pipeline, "detect_batch", lambda model, jobs, imgsz: [[] for _ in jobs])
+    cameras = {name: LockstepCamera(FRAMES_PER_CAMERA) for name in ("A", "B", "C")}
+    multi = pipeline.MultiCameraPipeline(model=None)
+    for name, cap in cameras.items():
+        multi.add_camera(name, cap, detector=None, rotate=None)
+
+    received = Counter()
+    multi.start()
+    try:
+        while not multi.is_finished():
+            packet = multi.get(timeout=1.0)
+            if packet is not None:
+                received[packet.camera] += 1
+                cameras[packet.camera].delivered.release()
+    finally:
+        multi.stop()
+
+    assert received == {name: FRAMES_PER_CAMERA for name in cameras}
+    assert all(queue.dropped == 0 for queue in multi.result_queues.values())
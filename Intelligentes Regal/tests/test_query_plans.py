@@ -0,0 +1,28 @@
+# test_query_plans.py
+#
+# Alle häufigen Abfragen (db_utils.HOT_QUERIES) müssen auf einer frisch migrierten
+# Datenbank einen Index verwenden; die Funktionen führen dieselben SQL-Texte aus.
+
+import db_utils
+
+
+def test_hot_queries_use_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils, "DB_NAME", str(tmp_path / "plans.db"))
+    try:
+        db_utils.init_db()
+        assert db_utils.audit_query_plans() == []
+    finally:
+        db_utils.close_connection()
+
+
+def test_unresolved_events_older_than_filters_by_type(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_utils, "DB_NAME", str(tmp_path / "events.db"))
+    try:
+        db_utils.init_db()
+        db_utils.upsert_event(0, "cup", "removal", "not paid")
+        db_utils.upsert_event(0, "cup", "return", "returned")
+        assert len(db_utils.get_unresolved_events_older_than(-10)) == 2
+        rows = db_utils.get_unresolved_events_older_than(-10, "removal")
+        assert [row[3] for row in rows] == ["removal"]
+    finally:
+        db_utils.close_connection()
@@ -0,0 +1,102 @@
+# test_shelf_geometry.py
+#
+# Vergleicht den Regalindex (shelf_state.ShelfGeometry.locate/zones) mit der früheren
+# skalaren Suche über alle ROIs: zufällige, auch überlappende Layouts, Punkte auf den
+# ROI-Rändern und roten Linien, Punkte außerhalb der Label-Map und ein leeres ROI-Set.
+
+import random
+
+import numpy as np
+import pytest
+
+from shelf_state import ZONE_BELOW, ZONE_INSIDE, ZONE_LEFT, ZONE_RIGHT, ZONE_TOP, ShelfGeometry
+
+
+def reference_shelf(rois, x, y):
+    """Frühere Zuordnung: erstes Regal, dessen Rechteck (inklusive Rand) den Punkt enthält."""
+    for shelf, (rx, ry, rw, rh) in rois.items():
+        if rx <= x <= rx + rw and ry <= y <= ry + rh:
+            return shelf
+    return None
+
+
+def reference_zone(rois, virtual_lines, shelf, x, y):
+    """Frühere Randprüfungen als Zonen-Bitmaske bezogen auf shelf (0 ohne Regal)."""
+    if shelf is None:
+        return 0
+    rx, ry, rw, rh = rois[shelf]
+    red_line = ry + virtual_lines[shelf]
+    if red_line > y > ry and rx < x < rx + rw:
+        return ZONE_INSIDE
+    zone = 0
+    if y > red_line:
+        zone |= ZONE_BELOW
+    if x < rx:
+        zone |= ZONE_LEFT
+    if x > rx + rw:
+        zone |= ZONE_RIGHT
+    if y < ry:
+        zone |= ZONE_TOP
+    return zone
+
+
+def random_layout(rng, count):
+    rois = {f"Regal_{i}": (rng.randint(0, 600), rng.randint(0, 400), rng.randint(1, 200), rng.randint(1, 200))
+            for i in range(count)}
+    virtual_lines = {shelf: int(rh * rng.uniform(0.5, 1.0)) for shelf, (rx, ry, rw, rh) in rois.items()}
+    return rois, virtual_lines
+
+
+def sample_points(rng, rois, virtual_lines):
+    """Zufallspunkte (auch weit außerhalb der Label-Map) und alle Ränder und roten Linien."""
+    points = [(rng.randint(-50, 900), rng.randint(-50, 700)) for _ in range(200)]
+    for shelf, (rx, ry, rw, rh) in rois.items():
+        red_line = ry + virtual_lines[shelf]
+        points += [(rx, ry), (rx + rw, ry + rh), (rx, ry + rh), (rx + rw, ry),
+                   (rx - 1, ry), (rx + rw + 1, ry + rh + 1), (rx + rw // 2, ry - 1),
+                   (rx, red_line), (rx + 1, red_line), (rx + 1, red_line + 1), (rx + 1, red_line - 1)]
+    return points
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_locate_and_zones_match_reference(seed):
+    rng = random.Random(seed)
+    # Viele Regale auf kleiner Fläche erzeugen Überlappungen
+    rois, virtual_lines = random_layout(rng, rng.randint(0, 40))
+    geometry = ShelfGeometry(rois, virtual_lines)
+    points = sample_points(rng, rois, virtual_lines)
+
+    indices = geometry.locate(points)
+    for (x, y), index in zip(points, indices.tolist()):
+        located = geometry.shelf_ids[index] if index >= 0 else None
+        assert located == reference_shelf(rois, x, y), (seed, x, y)
+
+    # Zonen auch für Punkte außerhalb mit einem (zufälligen) zuletzt bekannten Regal
+    if rois:
+        indices = np.array([i if i >= 0 else rng.choice([-1, rng.randrange(len(rois))]) for i in indices.tolist()])
+    zones = geometry.zones(indices, points)
+    for (x, y), index, zone in zip(points, indices.tolist(), zones.tolist()):
+        shelf = geometry.shelf_ids[index] if index >= 0 else None
+        assert zone == reference_zone(rois, virtual_lines, shelf, x, y), (seed, x, y, shelf)
+
+
+def test_overlapping_shelves_first_wins():
+    rois = {5: (100, 100, 50, 50), 2: (120, 120, 50, 50), 9: (100, 100, 50, 50)}
+    geometry = ShelfGeometry(rois, {5: 40, 2: 40, 9: 40})
+    indices = geometry.locate([(125, 125), (150, 150), (160, 160), (99, 100), (171, 171)])
+    assert [geometry.shelf_ids[i] if i >= 0 else None for i in indices.tolist()] == [5, 5, 2, None, None]
+
+
+def test_points_outside_label_map():
+    geometry = ShelfGeometry({0: (10, 20, 30, 40)}, {0: 30})
+    points = [(-1000, 25), (9, 25), (41, 25), (25, 19), (25, 61), (10 ** 6, 10 ** 6), (10, 20), (40, 60)]
+    assert geometry.locate(points).tolist() == [-1, -1, -1, -1, -1, -1, 0, 0]
+    assert geometry.zones([0, 0], [(41, 25), (25, 55)]).tolist() == [ZONE_RIGHT, ZONE_BELOW]
+
+
+def test_empty_rois():
+    geometry = ShelfGeometry({}, {})
+    assert geometry.label_map.size == 0
+    assert geometry.locate([(0, 0), (5, 5)]).tolist() == [-1, -1]
+    assert geometry.locate(np.empty((0, 2))).tolist() == []
+    assert geometry.zones([-1, -1], [(0, 0), (5, 5)]).tolist() == [0, 0]
@@ -0,0 +1,261 @@
+# video_source.py
+#
+# Einheitliche Bildquellen für das YOLO-Monitoring:
+#   - Live-Kamera (cv2.VideoCapture mit Geräteindex)
+#   - Videodatei oder Bildverzeichnis
+#   - aufgezeichnete Sitzung (Rohbilder + Zeitstempel, geschrieben vom SessionRecorder)
+# Alle Quellen verhalten sich wie cv2.VideoCapture (read/isOpened/release) und liefern
+# zusätzlich den Zeitstempel des zuletzt gelesenen Frames (frame_timestamp).
+# Bei der Wiedergabe bestimmt speed das Tempo: 0 = so schnell wie möglich, 1.0 = Echtzeit.
+# Die Zeitstempel behalten dabei die Abstände der Aufnahme, so dass die Monitor-Logik
+# (über MonitorClock) unabhängig vom Wiedergabetempo dieselben Zeiten sieht.
+
+import csv
+import glob
+import os
+import time
+
+import cv2
+
+from debug_utils import log_debug
+
+SESSION_TIMESTAMPS = "timestamps.csv"   # Datei mit "frame,timestamp" je Bild einer Sitzung
+SESSION_JPEG_QUALITY = 95
+DEFAULT_FILE_FPS = 30.0                 # Für Bildverzeichnisse und Videos ohne FPS-Angabe
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def list_images(directory, limit=None):
+    """Alle Bilddateien eines Verzeichnisses, sortiert."""
+    files = sorted(f for f in glob.glob(os.path.join(directory, "*"))
+                   if f.lower().endswith(IMAGE_EXTENSIONS))
+    return files[:limit] if limit else files
+
+
+class MonitorClock:
+    """
+    Zeitquelle der Monitor-Logik (Timeouts, Cooldowns, Inventarisierung).
+    Liefert den Zeitstempel des gerade verarbeiteten Frames, vor dem ersten Frame die Systemzeit.
+    """
+
+    def __init__(self):
+        self.frame_time = None
+
+    def set_frame_time(self, timestamp):
+        self.frame_time = timestamp
+
+    def time(self):
+        return time.time() if self.frame_time is None else self.frame_time
+
+
+class CameraSource:
+    """Live-Kamera; probiert die Geräteindizes der Reihe nach."""
+    is_live = True
+
+    def __init__(self, indices=(0, 1)):
+        self.cap = None
+        self.index = None
+        self.frame_timestamp = None
+        for index in indices:
+            cap = cv2.VideoCapture(index)
+            if cap.isOpened():
+                self.cap, self.index = cap, index
+                break
+            print(f"Fehler: Kamera {index} konnte nicht geöffnet werden.")
+            cap.release()
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        ret, frame = self.cap.read()
+        self.frame_timestamp = time.time()
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+    def describe(self):
+        return f"Kamera {self.index}"
+
+
+class ReplaySource:
+    """
+    Basis für aufgezeichnetes Material. Unterklassen liefern in _next() (Frame, Aufnahmezeit in s)
+    oder None am Ende; read() taktet die Wiedergabe und rechnet die Zeitstempel auf die Wiedergabe um.
+    """
+    is_live = False
+
+    def __init__(self, speed=0.0):
+        self.speed = speed
+        self.frame_timestamp = None
+        self.frames_read = 0
+        self._start_wall = None
+        self._first_recorded = None
+
+    def _next(self):
+        raise NotImplementedError
+
+    def read(self):
+        item = self._next()
+        if item is None:
+            return False, None
+        frame, recorded = item
+        now = time.time()
+        if self._start_wall is None:
+            self._start_wall, self._first_recorded = now, recorded
+        offset = recorded - self._first_recorded
+        if self.speed > 0:
+            delay = self._start_wall + offset / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+        self.frame_timestamp = self._start_wall + offset
+        self.frames_read += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+class VideoFileSource(ReplaySource):
+    """Videodatei; Zeitstempel aus Frame-Nummer und FPS der Datei."""
+
+    def __init__(self, path, speed=0.0):
+        super().__init__(speed)
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FILE_FPS
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _next(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        return frame, self.frames_read / self.fps
+
+    def release(self):
+        self.cap.release()
+
+    def describe(self):
+        return f"Videodatei {self.path} ({self.fps:.1f} FPS)"
+
+
+class ImageDirSource(ReplaySource):
+    """Bildverzeichnis in Dateinamen-Reihenfolge mit fester Bildrate."""
+
+    def __init__(self, directory, speed=0.0, fps=DEFAULT_FILE_FPS):
+        super().__init__(speed)
+        self.directory = directory
+        self.files = list_images(directory)
+        self.fps = fps
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def _next(self):
+        if self.frames_read >= len(self.files):
+            return None
+        return cv2.imread(self.files[self.frames_read]), self.frames_read / self.fps
+
+    def describe(self):
+        return f"Bildverzeichnis {self.directory} ({len(self.files)} Bilder, {self.fps:.0f} FPS)"
+
+
+class SessionSource(ReplaySource):
+    """Aufgezeichnete Sitzung: Bilder mit den originalen Aufnahmezeitstempeln."""
+
+    def __init__(self, directory, speed=0.0):
+        super().__init__(speed)
+        self.directory = directory
+        with open(os.path.join(directory, SESSION_TIMESTAMPS), "r", newline="") as f:
+            self.entries = [(row["frame"], float(row["timestamp"])) for row in csv.DictReader(f)]
+
+    def isOpened(self):
+        return bool(self.entries)
+
+    def _next(self):
+        if self.frames_read >= len(self.entries):
+            return None
+        filename, timestamp = self.entries[self.frames_read]
+        return cv2.imread(os.path.join(self.directory, filename)), timestamp
+
+    def describe(self):
+        duration = self.entries[-1][1] - self.entries[0][1] if self.entries else 0.0
+        return f"Sitzung {self.directory} ({len(self.entries)} Bilder, {duration:.1f} s)"
+
+
+class SessionRecorder:
+    """Schreibt Rohbilder (vor der Drehung) und ihre Zeitstempel als wiederabspielbare Sitzung."""
+
+    def __init__(self, directory, jpeg_quality=SESSION_JPEG_QUALITY):
+        if os.path.exists(os.path.join(directory, SESSION_TIMESTAMPS)):
+            raise ValueError(f"Im Verzeichnis {directory} liegt bereits eine Sitzung.")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.jpeg_quality = jpeg_quality
+        self.frames_written = 0
+        self._file = open(os.path.join(directory, SESSION_TIMESTAMPS), "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(["frame", "timestamp"])
+        log_debug(f"Sitzungsaufzeichnung nach {directory}")
+
+    def write(self, frame, timestamp):
+        filename = f"{self.frames_written:06d}.jpg"
+        cv2.imwrite(os.path.join(self.directory, filename), frame,
+                    [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self._writer.writerow([filename, f"{timestamp:.6f}"])
+        self.frames_written += 1
+
+    def close(self):
+        self._file.close()
+        log_debug(f"Sitzungsaufzeichnung beendet: {self.frames_written} Bilder in {self.directory}")
+
+
+class RecordingSource:
+    """Reicht die Frames einer Quelle unverändert weiter und zeichnet sie dabei auf."""
+
+    def __init__(self, source, recorder):
+        self.source = source
+        self.recorder = recorder
+        self.is_live = source.is_live
+
+    @property
+    def frame_timestamp(self):
+        return self.source.frame_timestamp
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def read(self):
+        ret, frame = self.source.read()
+        if ret:
+            self.recorder.write(frame, self.source.frame_timestamp)
+        return ret, frame
+
+    def release(self):
+        self.source.release()
+        self.recorder.close()
+
+    def describe(self):
+        return f"{self.source.describe()}, Aufzeichnung nach {self.recorder.directory}"
+
+
+def open_video_source(spec=None, speed=0.0):
+    """
+    Öffnet die Bildquelle zu spec:
+    None (Kamera 0, sonst 1), Geräteindex, Videodatei, Bildverzeichnis oder Sitzungsverzeichnis.
+    """
+    if spec is None:
+        return CameraSource((0, 1))
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource((int(spec),))
+    if os.path.isdir(spec):
+        if os.path.exists(os.path.join(spec, SESSION_TIMESTAMPS)):
+            return SessionSource(spec, speed)
+        return ImageDirSource(spec, speed)
+    if os.path.isfile(spec):
+        return VideoFileSource(spec, speed)
+    raise ValueError(f"Unbekannte Bildquelle: {spec}")
@@ -4,6 +4,8 @@ import threading
 import time
 import sqlite3
 import db_utils
+from metrics import instrument_flask_app
+from change_feed import ChangeFeed
 import json
 from datetime import datetime
 import os
@@ -69,6 +71,8 @@ app = Flask(__name__,
             template_folder=TEMPLATES_DIR,
             static_folder=STATIC_DIR)
 app.config['SECRET_KEY'] = 'intelligent-shelf-warehouse-system'
+# Antwortzeiten je Endpunkt messen, Kennzahlen unter /metrics
+instrument_flask_app(app, "lager")
 
 # Flag to check if server is active
 is_active = True
@@ -142,12 +146,12 @@ def sanitize_data(obj):
         return str(obj)
 
 # Helper function to get data from database
-def get_warehouse_data():
+def get_warehouse_data(use_cache=True):
     """Fetches current data for the warehouse dashboard"""
     current_time = time.time()
     
     # Check if cache is still valid
-    if current_time - data_cache['last_update'] < data_cache['cache_lifetime'] and data_cache['warehouse_status']:
+    if use_cache and current_time - data_cache['last_update'] < data_cache['cache_lifetime'] and data_cache['warehouse_status']:
         return data_cache['warehouse_status']
     
     try:
@@ -328,6 +332,29 @@ def get_data():
             'error': str(e)
         })
 
+def stream_snapshot():
+    """Full warehouse status for newly connected clients"""
+    return sanitize_data({
+        'warehouse_data': get_warehouse_data(),
+        'runtime_seconds': int(time.time() - start_time)
+    })
+
+def stream_update(change):
+    """Warehouse status after an inventory change or an update via /api/update_status"""
+    if not change.inventory_changed and not change.forced:
+        return None
+    # Unchanged results are not sent again (ChangeFeed compares with the last message)
+    return sanitize_data({'warehouse_data': get_warehouse_data(use_cache=not change.inventory_changed)})
+
+# One change source shared by all open warehouse screens of this process
+change_feed = ChangeFeed("lager", stream_snapshot, stream_update)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: warehouse status pushed as soon as the inventory changes"""
+    change_feed.start()
+    return change_feed.stream()
+
 @app.route('/api/update_status', methods=['POST'])
 def update_status():
     """API endpoint to update the collected or refilled status"""
@@ -367,13 +394,14 @@ def update_status():
                 
                 break
         
-        # If updated, re-sort the data
+        # If updated, re-sort the data and push it to all open screens
         if updated:
             data_cache['warehouse_status'].sort(key=lambda x: (
                 0 if x['status'] == STATUS_CRITICAL else 
                 1 if x['status'] == STATUS_WARNING else 2,
                 x['warehouse_rack']
             ))
+            change_feed.notify()
         
         return jsonify({
             'success': updated,
@@ -730,9 +758,21 @@ document.addEventListener('DOMContentLoaded', function() {
         toast.show();
     }
     
-    // Update data function
+    // Update status indicator
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Connected';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Disconnected';
+        }
+    }
+    
+    // Update data function (fallback without EventSource and after actions)
     function updateData() {
-        fetch('/api/data')
+        return fetch('/api/data')
             .then(response => response.json())
             .then(data => {
                 // Update the warehouse table
@@ -741,18 +781,43 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Update last update time and runtime
                 document.getElementById('last-update').textContent = data.last_update;
                 document.getElementById('runtime').textContent = data.runtime;
-
-                // Update status indicator
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Connected';
+                setConnected(true);
             })
             .catch(error => {
                 console.error('Error fetching data:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Disconnected';
+                setConnected(false);
             });
     }
     
+    // Push updates via Server-Sent Events: the server only sends when the inventory changes
+    let runtimeStart = null;
+    
+    function updateRuntime() {
+        if (runtimeStart === null) return;
+        const elapsed = Math.max(0, Math.floor(Date.now() / 1000 - runtimeStart));
+        const hours = String(Math.floor(elapsed / 3600)).padStart(2, '0');
+        const minutes = String(Math.floor((elapsed % 3600) / 60)).padStart(2, '0');
+        const seconds = String(elapsed % 60).padStart(2, '0');
+        document.getElementById('runtime').textContent = `${hours}:${minutes}:${seconds}`;
+    }
+    
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            const data = JSON.parse(message.data);
+            updateWarehouseTable(data.warehouse_data);
+            if (data.runtime_seconds !== undefined) {
+                runtimeStart = Date.now() / 1000 - data.runtime_seconds;
+            }
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // The browser reconnects by itself and then receives the full status again
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Function to update the warehouse table
     function updateWarehouseTable(warehouseData) {
         const table = document.getElementById('warehouse-table');
@@ -1086,11 +1151,14 @@ document.addEventListener('DOMContentLoaded', function() {
     attachCheckboxListeners();
     attachVerifyButtonListeners();
     
-    // Automatic data refresh every 5 seconds
-    setInterval(updateData, 5000);
-    
-    // Initial data load
-    updateData();
+    if (window.EventSource) {
+        connectStream();
+        setInterval(updateRuntime, 1000);
+    } else {
+        // Automatic data refresh every 5 seconds without SSE support
+        setInterval(updateData, 5000);
+        updateData();
+    }
 });"""
 
     # Write files
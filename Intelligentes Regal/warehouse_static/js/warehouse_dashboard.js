@@ -19,9 +19,21 @@ document.addEventListener('DOMContentLoaded', function() {
         toast.show();
     }
     
-    // Update data function
+    // Update status indicator
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Connected';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Disconnected';
+        }
+    }
+    
+    // Update data function (fallback without EventSource and after actions)
     function updateData() {
-        fetch('/api/data')
+        return fetch('/api/data')
             .then(response => response.json())
             .then(data => {
                 // Update the warehouse table
@@ -30,18 +42,43 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Update last update time and runtime
                 document.getElementById('last-update').textContent = data.last_update;
                 document.getElementById('runtime').textContent = data.runtime;
-
-                // Update status indicator
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Connected';
+                setConnected(true);
             })
             .catch(error => {
                 console.error('Error fetching data:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Disconnected';
+                setConnected(false);
             });
     }
     
+    // Push updates via Server-Sent Events: the server only sends when the inventory changes
+    let runtimeStart = null;
+    
+    function updateRuntime() {
+        if (runtimeStart === null) return;
+        const elapsed = Math.max(0, Math.floor(Date.now() / 1000 - runtimeStart));
+        const hours = String(Math.floor(elapsed / 3600)).padStart(2, '0');
+        const minutes = String(Math.floor((elapsed % 3600) / 60)).padStart(2, '0');
+        const seconds = String(elapsed % 60).padStart(2, '0');
+        document.getElementById('runtime').textContent = `${hours}:${minutes}:${seconds}`;
+    }
+    
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            const data = JSON.parse(message.data);
+            updateWarehouseTable(data.warehouse_data);
+            if (data.runtime_seconds !== undefined) {
+                runtimeStart = Date.now() / 1000 - data.runtime_seconds;
+            }
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // The browser reconnects by itself and then receives the full status again
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Function to update the warehouse table
     function updateWarehouseTable(warehouseData) {
         const table = document.getElementById('warehouse-table');
@@ -375,9 +412,12 @@ document.addEventListener('DOMContentLoaded', function() {
     attachCheckboxListeners();
     attachVerifyButtonListeners();
     
-    // Automatic data refresh every 5 seconds
-    setInterval(updateData, 5000);
-    
-    // Initial data load
-    updateData();
+    if (window.EventSource) {
+        connectStream();
+        setInterval(updateRuntime, 1000);
+    } else {
+        // Automatic data refresh every 5 seconds without SSE support
+        setInterval(updateData, 5000);
+        updateData();
+    }
 });
\ No newline at end of file
@@ -2,8 +2,9 @@ import flask
 from flask import Flask, render_template, jsonify, request, redirect, url_for
 import threading
 import time
-import sqlite3
 import db_utils
+from metrics import instrument_flask_app
+from change_feed import ChangeFeed
 import json
 from datetime import datetime
 import os
@@ -37,11 +38,16 @@ for directory in [TEMPLATES_DIR, STATIC_DIR, CSS_DIR, JS_DIR]:
 # Erstellt die Flask-App
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'intelligent-shelf-system'
+# Antwortzeiten je Endpunkt messen, Kennzahlen unter /metrics
+instrument_flask_app(app, "analyse")
 
 # Flag, um zu prüfen, ob der Server aktiv ist
 is_active = True
 start_time = time.time()
 
+# Standard-Zeitfenster der Produkt-Detailseite (Sekunden vor jetzt), wenn ?from= fehlt
+PRODUCT_DETAIL_DEFAULT_WINDOW = 24 * 3600
+
 # Cache für Inventar- und Ereignisdaten - DEAKTIVIERT für sofortige Updates
 data_cache = {
     'inventory': [],
@@ -65,9 +71,70 @@ def sanitize_data(obj):
         # Andere Typen als String darstellen
         return str(obj)
 
+# Formatiert eine Zeile der events-Tabelle für die Anzeige
+def format_event(event):
+    """Wandelt ein Event-Tupel aus der Datenbank in ein Dictionary für Tabelle und API um"""
+    try:
+        if len(event) == 10:
+            event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
+        elif len(event) == 9:
+            event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity = event
+            object_id = -1
+        else:
+            event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status = event
+            quantity = 1
+            object_id = -1
+
+        # Stelle sicher, dass keine bytes-Objekte vorhanden sind
+        if isinstance(product_type, bytes):
+            product_type = product_type.decode('utf-8', errors='replace')
+        if isinstance(event_type, bytes):
+            event_type = event_type.decode('utf-8', errors='replace')
+        if isinstance(status, bytes):
+            status = status.decode('utf-8', errors='replace')
+
+        event_time_str = datetime.fromtimestamp(event_time).strftime("%Y-%m-%d %H:%M:%S")
+        resolved_str = "Ja" if resolved else "Nein"
+
+        if resolution_time:
+            resolution_time_str = datetime.fromtimestamp(resolution_time).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            resolution_time_str = "-"
+
+        return {
+            'event_id': event_id,
+            'shelf_id': shelf_id + 1,  # +1 für die Anzeige
+            'product_type': product_type.capitalize(),
+            'event_type': event_type.capitalize(),
+            'event_time': event_time_str,
+            'resolved': resolved_str,
+            'resolution_time': resolution_time_str,
+            'status': status.capitalize(),
+            'quantity': quantity,
+            'object_id': object_id if object_id != -1 else "N/A"
+        }
+    except Exception as e:
+        logger.error(f"Fehler beim Formatieren eines Ereignisses: {e}")
+        # Trotzdem ein einfaches Event liefern, damit die Anzeige nicht komplett leer bleibt
+        return {
+            'event_id': "Fehler",
+            'shelf_id': 0,
+            'product_type': "Fehler",
+            'event_type': "Fehler",
+            'event_time': str(datetime.now()),
+            'resolved': "Nein",
+            'resolution_time': "-",
+            'status': "Fehler",
+            'quantity': 0,
+            'object_id': "N/A"
+        }
+
 # Hilfsfunktion zur Datenabfrage
-def get_db_data():
-    """Ruft aktuelle Daten aus der Datenbank ab und aktualisiert den Cache"""
+def get_db_data(include_events=True):
+    """
+    Ruft aktuelle Daten aus der Datenbank ab und aktualisiert den Cache.
+    Mit include_events=False wird nur das Inventar gelesen (Events kommen dann über /api/events).
+    """
     current_time = time.time()
     
     # Überprüfen, ob der Cache aktuell ist - bei 0 immer neue Daten holen
@@ -75,26 +142,18 @@ def get_db_data():
         return data_cache['inventory'], data_cache['events']
     
     try:
-        # Daten aus der Datenbank abrufen
-        inventory = db_utils.get_inventory()
-        events = db_utils.get_all_events()
+        # Inventar samt Verkaufsdaten aller Regale in einer Abfrage abrufen
+        inventory = db_utils.get_sales_summary(with_inventory=True)
         
         # Formatierte Daten für die Inventarübersicht erstellen
         formatted_inventory = []
         for inv in inventory:
-            shelf_id, product_type, initial_count, current_count, last_update = inv
+            shelf_id, product_type, initial_count, current_count, last_update, sold, unpaid = inv
             
             # Stelle sicher, dass keine bytes-Objekte vorhanden sind
             if isinstance(product_type, bytes):
                 product_type = product_type.decode('utf-8', errors='replace')
             
-            # Hole Verkaufsdaten
-            try:
-                sold, unpaid = db_utils.get_sales_data(shelf_id, product_type)
-            except Exception as e:
-                logger.warning(f"Fehler beim Abrufen der Verkaufsdaten: {e}")
-                sold, unpaid = 0, 0
-            
             # Berechne Delta (Differenz von Startwert und aktueller Bestand plus Verkauft)
             delta = initial_count - (current_count + sold)
             
@@ -123,68 +182,15 @@ def get_db_data():
         
         # Formatierte Daten für die Ereignisübersicht erstellen
         formatted_events = []
-        for event in events:
-            try:
-                if len(event) == 10:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
-                elif len(event) == 9:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity = event
-                    object_id = -1
-                else:
-                    event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status = event
-                    quantity = 1
-                    object_id = -1
-                
-                # Stelle sicher, dass keine bytes-Objekte vorhanden sind
-                if isinstance(product_type, bytes):
-                    product_type = product_type.decode('utf-8', errors='replace')
-                if isinstance(event_type, bytes):
-                    event_type = event_type.decode('utf-8', errors='replace')
-                if isinstance(status, bytes):
-                    status = status.decode('utf-8', errors='replace')
-                    
-                event_time_str = datetime.fromtimestamp(event_time).strftime("%Y-%m-%d %H:%M:%S")
-                resolved_str = "Ja" if resolved else "Nein"
-                
-                if resolution_time:
-                    resolution_time_str = datetime.fromtimestamp(resolution_time).strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    resolution_time_str = "-"
-                
-                formatted_events.append({
-                    'event_id': event_id,
-                    'shelf_id': shelf_id + 1,  # +1 für die Anzeige
-                    'product_type': product_type.capitalize(),
-                    'event_type': event_type.capitalize(),
-                    'event_time': event_time_str,
-                    'resolved': resolved_str,
-                    'resolution_time': resolution_time_str,
-                    'status': status.capitalize(),
-                    'quantity': quantity,
-                    'object_id': object_id if object_id != -1 else "N/A"
-                })
-            except Exception as e:
-                logger.error(f"Fehler beim Formatieren eines Ereignisses: {e}")
-                # Füge trotzdem ein einfaches Event hinzu, damit die Anzeige nicht komplett leer bleibt
-                formatted_events.append({
-                    'event_id': "Fehler",
-                    'shelf_id': 0,
-                    'product_type': "Fehler",
-                    'event_type': "Fehler",
-                    'event_time': str(datetime.now()),
-                    'resolved': "Nein",
-                    'resolution_time': "-",
-                    'status': "Fehler",
-                    'quantity': 0,
-                    'object_id': "N/A"
-                })
-        
-        # Nach Zeit sortieren (neueste zuerst)
-        formatted_events.sort(key=lambda x: x['event_time'], reverse=True)
+        if include_events:
+            formatted_events = [format_event(event) for event in db_utils.get_all_events()]
+            
+            # Nach Zeit sortieren (neueste zuerst)
+            formatted_events.sort(key=lambda x: x['event_time'], reverse=True)
+            data_cache['events'] = formatted_events
         
         # Cache aktualisieren
         data_cache['inventory'] = formatted_inventory
-        data_cache['events'] = formatted_events
         data_cache['last_update'] = current_time
         
         return formatted_inventory, formatted_events
@@ -266,13 +272,87 @@ def index():
         last_update=datetime.now().strftime("%H:%M:%S")
     )
 
+def parse_time_arg(value):
+    """Zeitgrenze aus der URL: Unix-Zeit oder Datum/Uhrzeit (z. B. aus <input type="datetime-local">)"""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(datetime.strptime(value, fmt).timestamp())
+        except ValueError:
+            continue
+    return None
+
+def parse_page_key(value):
+    """Keyset-Cursor "<event_time>_<id>" des letzten Events der vorherigen Seite"""
+    try:
+        event_time, event_id = value.split('_')
+        return int(event_time), int(event_id)
+    except (AttributeError, ValueError):
+        return None
+
+def build_product_events(product_type_lower, initial_counts, since=None, until=None, after=None):
+    """
+    Eine Seite der Produkt-Historie mit Soll/Ist/Delta je Event.
+    Das laufende Delta startet beim Stand vor der Seite (aus den Zwischenständen in db_utils),
+    nicht bei der ersten Entnahme überhaupt.
+    Rückgabe: (Liste formatierter Events, Cursor der nächsten Seite oder None)
+    """
+    page = db_utils.get_product_events_page(product_type_lower, since, until, after)
+    cumulative_deltas = page['deltas_before']  # {shelf_id: current_delta}
+    
+    product_events = []
+    for event in page['events']:
+        event_obj = format_event(event)
+        shelf_id = event[1]
+        event_type = event_obj['event_type'].lower()
+        status = event_obj['status'].lower()
+        quantity = event_obj['quantity']
+        
+        # Initialen Bestand für dieses Regal holen (oder 0, falls nicht bekannt)
+        initial_count = initial_counts.get(shelf_id, 0)
+        
+        # Delta-Berechnung basierend auf dem Event-Typ und chronologischer Abfolge
+        db_utils.advance_running_delta(cumulative_deltas, shelf_id, event_type, status, quantity)
+        if event_type == "removal" and status in ["not paid", "misplaced"]:
+            # Das aktuelle Delta für dieses Event ist die kumulative Summe bis zu diesem Punkt
+            current_delta = cumulative_deltas[shelf_id]
+        elif event_type == "return":
+            # Delta für return events ist 0
+            current_delta = 0
+        else:
+            # Zurückgegebene/bezahlte Entnahmen und andere Event-Typen: Menge des Events
+            current_delta = quantity
+        
+        # Füge berechnete Werte zum Event hinzu
+        event_obj['target_count'] = initial_count
+        event_obj['actual_count'] = initial_count - current_delta
+        event_obj['current_delta'] = current_delta
+        
+        product_events.append(event_obj)
+    
+    next_key = f"{page['next'][0]}_{page['next'][1]}" if page['next'] else None
+    return product_events, next_key
+
+def get_initial_counts(product_type_lower):
+    """Startbestand je Regal (0-basiert) für einen Produkttyp"""
+    return {shelf_id: initial_count
+            for shelf_id, product_type, initial_count, _, _ in db_utils.get_inventory()
+            if product_type.lower() == product_type_lower}
+
 @app.route('/product/<product_type>')
 def product_detail(product_type):
-    """Detailseite für ein bestimmtes Produkt"""
-    # Force refresh of database cache to ensure we have the latest data
-    data_cache['last_update'] = 0
-    
-    inventory_data, event_data = get_db_data()
+    """
+    Detailseite für ein bestimmtes Produkt. Events werden seitenweise im Zeitfenster
+    ?from= bis ?to= geladen (Standard: letzte PRODUCT_DETAIL_DEFAULT_WINDOW Sekunden),
+    weitere Seiten lädt die Seite über /api/product/<product_type>/events nach.
+    """
+    # Nur Inventar und Verkaufszahlen - die Events kommen seitenweise
+    inventory_data, _ = get_db_data(include_events=False)
     
     # Produktname konvertieren (falls nötig)
     product_type_lower = product_type.lower()
@@ -297,117 +377,19 @@ def product_detail(product_type):
         # Füge die aktuell erkannte Anzahl zum Inventar hinzu
         inv['detected_count'] = detected_count
     
-    # Alle Events chronologisch holen
+    # Zeitfenster: ohne Angabe die letzten PRODUCT_DETAIL_DEFAULT_WINDOW Sekunden, ?from= leer = gesamte Historie
+    if 'from' in request.args:
+        since = parse_time_arg(request.args.get('from'))
+    else:
+        since = int(time.time()) - PRODUCT_DETAIL_DEFAULT_WINDOW
+    until = parse_time_arg(request.args.get('to'))
+    
+    initial_counts = {inv['shelf_id'] - 1: inv['initial_count'] for inv in product_inventory}
     try:
-        conn = sqlite3.connect(db_utils.DB_NAME)
-        c = conn.cursor()
-        
-        # Hole alle Events für diesen Produkttyp in chronologischer Reihenfolge
-        c.execute('''
-            SELECT id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id
-            FROM events
-            WHERE product_type = ?
-            ORDER BY event_time ASC
-        ''', (product_type_lower,))
-        
-        events_data = c.fetchall()
-        conn.close()
-        
-        # Verfolgen wir die kumulativen Delta-Werte für jedes Regal separat
-        cumulative_deltas = {}  # {shelf_id: current_delta}
-        initial_counts = {}     # {shelf_id: initial_count}
-        
-        # Sammle die Initialwerte für jedes Regal
-        for inv in product_inventory:
-            shelf_id = inv['shelf_id'] - 1  # 0-based
-            initial_counts[shelf_id] = inv['initial_count']
-            cumulative_deltas[shelf_id] = 0
-        
-        # Format the events with historically accurate delta values
-        product_events = []
-        for event in events_data:
-            event_id, shelf_id, product_type, event_type, event_time, resolved, resolution_time, status, quantity, object_id = event
-            
-            # Convert bytes to strings if needed
-            if isinstance(product_type, bytes):
-                product_type = product_type.decode('utf-8', errors='replace')
-            if isinstance(event_type, bytes):
-                event_type = event_type.decode('utf-8', errors='replace')
-            if isinstance(status, bytes):
-                status = status.decode('utf-8', errors='replace')
-                
-            event_time_str = datetime.fromtimestamp(event_time).strftime("%Y-%m-%d %H:%M:%S")
-            resolved_str = "Ja" if resolved else "Nein"
-            
-            if resolution_time:
-                resolution_time_str = datetime.fromtimestamp(resolution_time).strftime("%Y-%m-%d %H:%M:%S")
-            else:
-                resolution_time_str = "-"
-            
-            # Erstelle das Event-Objekt
-            event_obj = {
-                'event_id': event_id,
-                'shelf_id': shelf_id + 1,  # +1 für die Anzeige
-                'product_type': product_type.capitalize(),
-                'event_type': event_type.capitalize(),
-                'event_time': event_time_str,
-                'resolved': resolved_str,
-                'resolution_time': resolution_time_str,
-                'status': status.capitalize(),
-                'quantity': quantity,
-                'object_id': object_id if object_id != -1 else "N/A"
-            }
-            
-            # Initialen Bestand für dieses Regal holen (oder 0, falls nicht bekannt)
-            initial_count = initial_counts.get(shelf_id, 0)
-            
-            # NEU: Delta-Berechnung basierend auf dem Event-Typ und chronologischer Abfolge
-            if event_type.lower() == "removal":
-                # Für Removal-Events: Kumulatives Delta erhöhen
-                if status.lower() in ["not paid", "misplaced"]:
-                    # Delta erhöht sich mit jedem Removal-Event dieses Regals
-                    cumulative_deltas[shelf_id] += quantity
-                    
-                    # Das aktuelle Delta für dieses Event ist die kumulative Summe bis zu diesem Punkt
-                    current_delta = cumulative_deltas[shelf_id]
-                    actual_count = initial_count - current_delta
-                elif status.lower() == "returned" or status.lower() == "zurückgestellt":
-                    # Für zurückgegebene Objekte: Das Delta zum Zeitpunkt der Entnahme beibehalten
-                    current_delta = quantity  # Verwende die im Event gespeicherte Menge
-                    actual_count = initial_count - current_delta
-                else:
-                    # Für andere Status (z.B. paid)
-                    current_delta = quantity
-                    actual_count = initial_count - current_delta
-            elif event_type.lower() == "return":
-                if status.lower() == "returned" or status.lower() == "zurückgestellt":
-                    # Für Return-Events: Delta zurücksetzen/reduzieren
-                    cumulative_deltas[shelf_id] -= quantity
-                    if cumulative_deltas[shelf_id] < 0:
-                        cumulative_deltas[shelf_id] = 0  # Nicht unter 0 gehen
-                    
-                    # Delta für return events ist 0
-                    current_delta = 0
-                    actual_count = initial_count
-                else:
-                    # Für andere Return-Status
-                    current_delta = 0
-                    actual_count = initial_count
-            else:
-                # Für andere Event-Typen
-                current_delta = quantity
-                actual_count = initial_count - quantity
-            
-            # Füge berechnete Werte zum Event hinzu
-            event_obj['target_count'] = initial_count
-            event_obj['actual_count'] = actual_count
-            event_obj['current_delta'] = current_delta
-            
-            product_events.append(event_obj)
+        product_events, next_key = build_product_events(product_type_lower, initial_counts, since, until)
     except Exception as e:
-        logger.error(f"Error accessing database directly: {e}")
-        # Fall back to cached events if there's an error
-        product_events = [event for event in event_data if event['product_type'].lower() == product_type_lower]
+        logger.error(f"Fehler beim Laden der Produkt-Historie: {e}")
+        product_events, next_key = [], None
     
     # Laufzeit berechnen
     elapsed_time = int(time.time() - start_time)
@@ -420,15 +402,37 @@ def product_detail(product_type):
         product_type=product_type,
         inventory=product_inventory,
         events=product_events,
+        next_key=next_key,
+        time_from=datetime.fromtimestamp(since).strftime("%Y-%m-%dT%H:%M") if since is not None else '',
+        time_to=datetime.fromtimestamp(until).strftime("%Y-%m-%dT%H:%M") if until is not None else '',
         runtime=runtime,
         last_update=datetime.now().strftime("%H:%M:%S")
     )
 
+@app.route('/api/product/<product_type>/events')
+def product_events_page(product_type):
+    """Nächste Seite der Produkt-Historie (?after=<Cursor>, ?from=, ?to=) für das Nachladen im Template"""
+    try:
+        product_type_lower = product_type.lower()
+        product_events, next_key = build_product_events(
+            product_type_lower,
+            get_initial_counts(product_type_lower),
+            parse_time_arg(request.args.get('from')),
+            parse_time_arg(request.args.get('to')),
+            parse_page_key(request.args.get('after'))
+        )
+        return jsonify(sanitize_data({'events': product_events, 'next': next_key}))
+    except Exception as e:
+        logger.error(f"Fehler beim Laden der Produkt-Historie: {e}")
+        return jsonify({'events': [], 'next': None, 'error': str(e)}), 500
+
 @app.route('/api/data')
 def get_data():
     """API-Endpunkt für aktuelle Daten (für AJAX-Updates)"""
     try:
-        inventory_data, event_data = get_db_data()
+        # ?events=0: nur Inventar und Zusammenfassungen, die Events holt der Client inkrementell über /api/events
+        include_events = request.args.get('events', '1') != '0'
+        inventory_data, event_data = get_db_data(include_events)
         product_summaries = calculate_product_summaries(inventory_data)
         
         # Laufzeit
@@ -459,6 +463,101 @@ def get_data():
             'error': str(e)
         })
 
+def build_events_payload(feed):
+    """Formatiert einen Event-Diff aus db_utils.get_events_since für /api/events und den SSE-Stream"""
+    return {
+        'events': [format_event(event) for event in feed['events']],
+        'deleted': feed['deleted'],
+        'cursor': feed['cursor'],
+        'epoch': feed['epoch'],
+        'full': feed['full']
+    }
+
+def build_overview():
+    """Inventar und Produktzusammenfassungen (ohne Events) für den SSE-Stream"""
+    inventory_data, _ = get_db_data(include_events=False)
+    return {
+        'inventory': inventory_data,
+        'product_summaries': calculate_product_summaries(inventory_data)
+    }
+
+def stream_snapshot():
+    """Vollständiger Stand für neu verbundene Clients"""
+    payload = build_overview()
+    payload['events'] = build_events_payload(db_utils.get_events_since())
+    payload['runtime_seconds'] = int(time.time() - start_time)
+    return sanitize_data(payload)
+
+def stream_update(change):
+    """Diff zu einer Änderung; Verkaufszahlen hängen an den Events, daher immer mit Inventar"""
+    payload = build_overview()
+    if change.events_changed:
+        payload['events'] = build_events_payload(change.events)
+    return sanitize_data(payload)
+
+# Eine Änderungsquelle für alle offenen Dashboards dieses Prozesses
+change_feed = ChangeFeed("analyse", stream_snapshot, stream_update)
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events: Inventar und Zusammenfassungen bei jeder Änderung, Events nur als Diff"""
+    change_feed.start()
+    return change_feed.stream()
+
+@app.route('/api/events')
+def get_events_delta():
+    """
+    Inkrementeller Event-Feed: liefert nur die Events, die seit ?since= (Änderungsnummer)
+    neu angelegt oder geändert wurden, und die IDs gelöschter Events. Der Client führt sie
+    mit seinem Stand zusammen; bei full=true ersetzt er ihn komplett.
+    """
+    try:
+        since = request.args.get('since', 0, type=int)
+        epoch = request.args.get('epoch', None, type=int)
+        feed = db_utils.get_events_since(since, epoch)
+        return jsonify(sanitize_data(build_events_payload(feed)))
+    except Exception as e:
+        logger.error(f"Fehler beim Abrufen des Event-Feeds: {e}")
+        return jsonify({'events': [], 'deleted': [], 'cursor': 0, 'epoch': None, 'full': False, 'error': str(e)}), 500
+
+@app.route('/api/product_history/<product_type>')
+def product_history(product_type):
+    """
+    Materialisierte Kennzahlen eines Produkts: aktueller Stand je Regal und Verlauf je
+    Zeitfenster (db_utils.AGGREGATE_BUCKET_SECONDS), optional begrenzt über ?from= und ?to= (Unix-Zeit)
+    """
+    try:
+        product_type_lower = product_type.lower()
+        since = request.args.get('from', 0, type=int)
+        until = request.args.get('to', None, type=int)
+        shelves = [
+            dict(values, shelf_id=shelf_id + 1)
+            for (shelf_id, _), values in sorted(db_utils.get_aggregates(product_type_lower).items())
+        ]
+        history = [
+            {
+                'shelf_id': shelf_id + 1,
+                'bucket': bucket,
+                'bucket_time': datetime.fromtimestamp(bucket).strftime("%Y-%m-%d %H:%M"),
+                'sold': sold,
+                'unpaid': unpaid,
+                'misplaced': misplaced,
+                'returned': returned,
+                'delta': delta
+            }
+            for shelf_id, bucket, sold, unpaid, misplaced, returned, delta
+            in db_utils.get_aggregate_history(product_type_lower, since, until)
+        ]
+        return jsonify({
+            'product_type': product_type_lower,
+            'bucket_seconds': db_utils.AGGREGATE_BUCKET_SECONDS,
+            'shelves': shelves,
+            'history': history
+        })
+    except Exception as e:
+        logger.error(f"Fehler beim Abrufen der Produkthistorie: {e}")
+        return jsonify({'shelves': [], 'history': [], 'error': str(e)}), 500
+
 @app.route('/reset_db', methods=['POST'])
 def reset_db():
     """Datenbank zurücksetzen"""
@@ -830,7 +929,8 @@ def setup_static_files():
                                     <tr>
                                         <th>Regal</th>
                                         <th>Startbestand</th>
-                                        <th>Aktueller Bestand</th>
+                                        <th>Aktueller Bestand (DB)</th>
+                                        <th>Erkannte Objekte (YOLO)</th>
                                         <th>Verkauft</th>
                                         <th>Delta</th>
                                         <th>Status</th>
@@ -842,6 +942,7 @@ def setup_static_files():
                                         <td>Regal {{ inv.shelf_id }}</td>
                                         <td>{{ inv.initial_count }}</td>
                                         <td>{{ inv.current_count }}</td>
+                                        <td>{{ inv.detected_count }}</td>
                                         <td>{{ inv.sold }}</td>
                                         <td class="{% if inv.delta > 0 %}delta-highlight{% endif %}">{{ inv.delta }}</td>
                                         <td>
@@ -861,6 +962,21 @@ def setup_static_files():
                         {% endif %}
 
                         <h5 class="mb-3"><i class="bi bi-activity me-2"></i>Ereignisse für {{ product_type }}</h5>
+                        <form class="row g-2 align-items-end mb-3" method="get">
+                            <div class="col-auto">
+                                <label class="form-label mb-0" for="time-from">Von</label>
+                                <input type="datetime-local" class="form-control form-control-sm" id="time-from" name="from" value="{{ time_from }}">
+                            </div>
+                            <div class="col-auto">
+                                <label class="form-label mb-0" for="time-to">Bis</label>
+                                <input type="datetime-local" class="form-control form-control-sm" id="time-to" name="to" value="{{ time_to }}">
+                            </div>
+                            <div class="col-auto">
+                                <button type="submit" class="btn btn-sm btn-outline-primary">
+                                    <i class="bi bi-funnel me-1"></i> Zeitraum anzeigen
+                                </button>
+                            </div>
+                        </form>
                         {% if events %}
                         <div class="table-responsive">
                             <table class="table table-hover" id="product-events-table">
@@ -872,15 +988,16 @@ def setup_static_files():
                                         <th>Zeit</th>
                                         <th>Status</th>
                                         <th>Soll</th>
-                                        <th>Ist</th>
+                                        <th>Ist (YOLO)</th>
                                         <th>Delta</th>
                                         <th>Abgeschlossen</th>
                                         <th>Abschlusszeit</th>
                                     </tr>
                                 </thead>
-                                <tbody>
+                                <tbody id="product-events-body">
                                     {% for event in events %}
                                     <tr class="
+                                        {% if event.resolved == 'Ja' %}event-completed{% endif %}
                                         {% if event.status|lower == 'not paid' %}table-danger{% endif %}
                                         {% if event.status|lower == 'paid' %}table-success{% endif %}
                                         {% if event.status|lower == 'misplaced' %}table-warning{% endif %}
@@ -890,17 +1007,36 @@ def setup_static_files():
                                         <td>{{ event.shelf_id }}</td>
                                         <td>{{ event.event_type }}</td>
                                         <td>{{ event.event_time }}</td>
-                                        <td>{{ event.status }}</td>
+                                        <td>
+                                            <span class="badge badge-{{ event.status|lower|replace(' ', '-') }}">
+                                                {{ event.status }}
+                                            </span>
+                                        </td>
                                         <td>{{ event.target_count }}</td>
                                         <td>{{ event.actual_count }}</td>
                                         <td class="{% if event.current_delta > 0 %}delta-highlight{% endif %}">{{ event.current_delta }}</td>
-                                        <td>{{ event.resolved }}</td>
+                                        <td>
+                                            {% if event.resolved == 'Ja' %}
+                                            <i class="bi bi-check-circle-fill text-success"></i>
+                                            {% else %}
+                                            <i class="bi bi-x-circle text-danger"></i>
+                                            {% endif %}
+                                            {{ event.resolved }}
+                                        </td>
                                         <td>{{ event.resolution_time }}</td>
                                     </tr>
                                     {% endfor %}
                                 </tbody>
                             </table>
                         </div>
+                        {% if next_key %}
+                        <div class="d-flex justify-content-center mt-3" id="load-more-container">
+                            <button class="btn btn-outline-secondary" id="load-more-btn" data-next="{{ next_key }}">
+                                <i class="bi bi-chevron-double-down me-1"></i>
+                                Weitere Ereignisse laden
+                            </button>
+                        </div>
+                        {% endif %}
                         {% else %}
                         <div class="alert alert-info">
                             Keine Ereignisse für {{ product_type }} gefunden.
@@ -932,9 +1068,98 @@ def setup_static_files():
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
     <script>
         document.addEventListener('DOMContentLoaded', function() {
-            // Auto-Refresh alle 5 Sekunden
+            const eventsUrl = "{{ url_for('product_events_page', product_type=product_type) }}";
+            const timeFrom = "{{ time_from }}";
+            const timeTo = "{{ time_to }}";
+            const loadMoreBtn = document.getElementById('load-more-btn');
+            const eventsBody = document.getElementById('product-events-body');
+            let pagesLoaded = 1;
+            let loading = false;
+
+            function cell(row, text, className) {
+                const td = document.createElement('td');
+                td.textContent = text;
+                if (className) {
+                    td.className = className;
+                }
+                row.appendChild(td);
+                return td;
+            }
+
+            // Zeile wie im Template oben aufbauen
+            function appendEventRow(event) {
+                const status = String(event.status).toLowerCase();
+                const rowClasses = {'not paid': 'table-danger', 'paid': 'table-success', 'misplaced': 'table-warning', 'returned': 'table-info'};
+                const row = document.createElement('tr');
+                if (event.resolved === 'Ja') {
+                    row.classList.add('event-completed');
+                }
+                if (rowClasses[status]) {
+                    row.classList.add(rowClasses[status]);
+                }
+                cell(row, event.event_id);
+                cell(row, event.shelf_id);
+                cell(row, event.event_type);
+                cell(row, event.event_time);
+                const badge = document.createElement('span');
+                badge.className = 'badge badge-' + status.split(' ').join('-');
+                badge.textContent = event.status;
+                cell(row, '').appendChild(badge);
+                cell(row, event.target_count);
+                cell(row, event.actual_count);
+                cell(row, event.current_delta, event.current_delta > 0 ? 'delta-highlight' : '');
+                const resolvedCell = cell(row, ' ' + event.resolved);
+                const icon = document.createElement('i');
+                icon.className = event.resolved === 'Ja' ? 'bi bi-check-circle-fill text-success' : 'bi bi-x-circle text-danger';
+                resolvedCell.insertBefore(icon, resolvedCell.firstChild);
+                cell(row, event.resolution_time);
+                eventsBody.appendChild(row);
+            }
+
+            // Nächste Seite über den Keyset-Cursor nachladen
+            function loadMore() {
+                if (!loadMoreBtn || loading || !loadMoreBtn.dataset.next) {
+                    return;
+                }
+                loading = true;
+                loadMoreBtn.disabled = true;
+                const params = new URLSearchParams({after: loadMoreBtn.dataset.next, from: timeFrom, to: timeTo});
+                fetch(eventsUrl + '?' + params.toString())
+                    .then(response => response.json())
+                    .then(data => {
+                        (data.events || []).forEach(appendEventRow);
+                        pagesLoaded++;
+                        if (data.next) {
+                            loadMoreBtn.dataset.next = data.next;
+                        } else {
+                            loadMoreBtn.dataset.next = '';
+                            document.getElementById('load-more-container').remove();
+                        }
+                    })
+                    .catch(error => console.error('Fehler beim Nachladen der Ereignisse:', error))
+                    .finally(() => {
+                        loading = false;
+                        loadMoreBtn.disabled = false;
+                    });
+            }
+
+            if (loadMoreBtn) {
+                loadMoreBtn.addEventListener('click', loadMore);
+                // Automatisch nachladen, sobald der Button in Sichtweite kommt
+                if ('IntersectionObserver' in window) {
+                    new IntersectionObserver(entries => {
+                        if (entries.some(entry => entry.isIntersecting)) {
+                            loadMore();
+                        }
+                    }, {rootMargin: '200px'}).observe(loadMoreBtn);
+                }
+            }
+
+            // Auto-Refresh alle 5 Sekunden - nur solange keine weiteren Seiten nachgeladen wurden
             setInterval(function() {
-                location.reload();
+                if (pagesLoaded === 1 && window.scrollY === 0) {
+                    location.reload();
+                }
             }, 5000);
             
             // Refresh-Button
@@ -1103,78 +1328,180 @@ document.addEventListener('DOMContentLoaded', function() {
         modal.show();
     }
     
-    // Daten aktualisieren
+    // Spalten und Zeilenfarben der Ereignistabelle
+    const eventColumns = [
+        'event_id',
+        'shelf_id',
+        item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
+        'event_type',
+        'event_time',
+        'status',
+        'quantity'
+    ];
+    
+    function colorEventRow(row, event) {
+        // Zeilen nach Status einfärben
+        const statusLower = event.status.toLowerCase();
+        if (statusLower === 'not paid') {
+            row.className = 'table-danger';
+        } else if (statusLower === 'paid') {
+            row.className = 'table-success';
+        } else if (statusLower === 'misplaced') {
+            row.className = 'table-warning';
+        } else if (statusLower === 'returned') {
+            row.className = 'table-info';
+        } else {
+            row.className = '';
+        }
+    }
+    
+    // Lokaler Stand der Ereignisse; vom Server kommen nur Änderungen seit eventsCursor
+    const eventsById = new Map();
+    let eventsCursor = 0;
+    let eventsEpoch = null;
+    let eventFilter = { status: 'Alle', product: 'Alle' };
+    
+    // Änderungen am Event-Feed abholen und mit dem lokalen Stand zusammenführen
+    function updateEvents() {
+        const params = new URLSearchParams({ since: eventsCursor });
+        if (eventsEpoch !== null) {
+            params.set('epoch', eventsEpoch);
+        }
+        return fetch(`/api/events?${params}`)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                applyEventFeed(data);
+            });
+    }
+    
+    // Event-Diff (aus /api/events oder dem SSE-Stream) mit dem lokalen Stand zusammenführen
+    function applyEventFeed(data) {
+        // full: Datenbank zurückgesetzt oder erster Abruf - Stand komplett ersetzen
+        if (data.full) {
+            eventsById.clear();
+        }
+        data.deleted.forEach(eventId => eventsById.delete(eventId));
+        data.events.forEach(event => eventsById.set(event.event_id, event));
+        eventsCursor = data.cursor;
+        eventsEpoch = data.epoch;
+        
+        // Tabelle nur bei Änderungen neu aufbauen
+        if (data.full || data.deleted.length > 0 || data.events.length > 0) {
+            renderEvents();
+        }
+    }
+    
+    // Ereignistabelle aus dem lokalen Stand aufbauen (gefiltert, neueste zuerst)
+    function renderEvents() {
+        const events = Array.from(eventsById.values()).filter(event =>
+            (eventFilter.status === 'Alle' || event.status.toLowerCase() === eventFilter.status.toLowerCase()) &&
+            (eventFilter.product === 'Alle' || event.product_type.toLowerCase() === eventFilter.product.toLowerCase())
+        );
+        events.sort((a, b) => {
+            if (a.event_time !== b.event_time) {
+                return a.event_time < b.event_time ? 1 : -1;
+            }
+            return b.event_id - a.event_id;
+        });
+        updateTable('events-table', events, eventColumns, colorEventRow);
+    }
+    
+    // Inventartabelle und Produktzusammenfassung aktualisieren
+    function applyOverview(data) {
+        updateTable('inventory-table', data.inventory, [
+            item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`, 
+            shelf => `Regal ${shelf.shelf_id}`, 
+            inv => `${inv.initial_count} (${inv.update_time})`,
+            inv => `${inv.current_count} (${inv.sold} verkauft)`,
+            inv => {
+                const statusClass = inv.status === 'Kritisch' ? 'bg-danger' : 
+                                  inv.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
+                return `<span class="badge ${statusClass}">${inv.status}</span>`;
+            }
+        ]);
+        
+        updateTable('product-summary-table', data.product_summaries, [
+            item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
+            'initial_count',
+            'current_count',
+            'sold',
+            'delta',
+            prod => {
+                const statusClass = prod.status === 'Kritisch' ? 'bg-danger' : 
+                                  prod.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
+                return `<span class="badge ${statusClass}">${prod.status}</span>`;
+            }
+        ]);
+    }
+    
+    // Statusanzeige aktualisieren
+    function setConnected(connected) {
+        const badge = document.querySelector('#status-display .badge');
+        if (connected) {
+            badge.className = 'badge bg-success';
+            badge.innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+        } else {
+            badge.className = 'badge bg-danger';
+            badge.innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+        }
+    }
+    
+    // Daten per Abfrage aktualisieren (Fallback ohne EventSource und nach Aktionen)
     function updateData() {
-        fetch('/api/data')
+        return fetch('/api/data?events=0')
             .then(response => response.json())
             .then(data => {
-                // Inventartabelle aktualisieren
-                updateTable('inventory-table', data.inventory, [
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`, 
-                    shelf => `Regal ${shelf.shelf_id}`, 
-                    inv => `${inv.initial_count} (${inv.update_time})`,
-                    inv => `${inv.current_count} (${inv.sold} verkauft)`,
-                    inv => {
-                        const statusClass = inv.status === 'Kritisch' ? 'bg-danger' : 
-                                          inv.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
-                        return `<span class="badge ${statusClass}">${inv.status}</span>`;
-                    }
-                ]);
-                
-                // Produktzusammenfassung aktualisieren
-                updateTable('product-summary-table', data.product_summaries, [
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                    'initial_count',
-                    'current_count',
-                    'sold',
-                    'delta',
-                    prod => {
-                        const statusClass = prod.status === 'Kritisch' ? 'bg-danger' : 
-                                          prod.status === 'Niedrig' ? 'bg-warning' : 'bg-success';
-                        return `<span class="badge ${statusClass}">${prod.status}</span>`;
-                    }
-                ]);
-                
-                // Ereignistabelle aktualisieren
-                updateTable('events-table', data.events, [
-                    'event_id',
-                    'shelf_id',
-                    item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                    'event_type',
-                    'event_time',
-                    'status',
-                    'quantity'
-                ], function(row, event) {
-                    // Zeilen nach Status einfärben
-                    const statusLower = event.status.toLowerCase();
-                    if (statusLower === 'not paid') {
-                        row.className = 'table-danger';
-                    } else if (statusLower === 'paid') {
-                        row.className = 'table-success';
-                    } else if (statusLower === 'misplaced') {
-                        row.className = 'table-warning';
-                    } else if (statusLower === 'returned') {
-                        row.className = 'table-info';
-                    } else {
-                        row.className = '';
-                    }
-                });
+                applyOverview(data);
                 
                 // Letzte Aktualisierungszeit und Laufzeit aktualisieren
                 document.getElementById('last-update').textContent = data.last_update;
                 document.getElementById('runtime').textContent = data.runtime;
-
-                // Statusanzeige aktualisieren
-                document.querySelector('#status-display .badge').className = 'badge bg-success';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-check-circle-fill me-1"></i> Verbunden';
+                setConnected(true);
+                
+                // Ereignistabelle inkrementell aktualisieren
+                return updateEvents();
             })
             .catch(error => {
                 console.error('Fehler beim Abrufen der Daten:', error);
-                document.querySelector('#status-display .badge').className = 'badge bg-danger';
-                document.querySelector('#status-display .badge').innerHTML = '<i class="bi bi-x-circle-fill me-1"></i> Getrennt';
+                setConnected(false);
             });
     }
     
+    // Push-Updates per Server-Sent Events: der Server sendet nur bei Änderungen
+    let runtimeStart = null;
+    
+    function updateRuntime() {
+        if (runtimeStart === null) return;
+        const elapsed = Math.max(0, Math.floor(Date.now() / 1000 - runtimeStart));
+        const hours = String(Math.floor(elapsed / 3600)).padStart(2, '0');
+        const minutes = String(Math.floor((elapsed % 3600) / 60)).padStart(2, '0');
+        const seconds = String(elapsed % 60).padStart(2, '0');
+        document.getElementById('runtime').textContent = `${hours}:${minutes}:${seconds}`;
+    }
+    
+    function connectStream() {
+        const source = new EventSource('/api/stream');
+        source.onmessage = function(message) {
+            const data = JSON.parse(message.data);
+            applyOverview(data);
+            if (data.events) {
+                applyEventFeed(data.events);
+            }
+            if (data.runtime_seconds !== undefined) {
+                runtimeStart = Date.now() / 1000 - data.runtime_seconds;
+            }
+            document.getElementById('last-update').textContent = new Date().toLocaleTimeString('de-DE');
+            setConnected(true);
+        };
+        // Der Browser verbindet sich selbständig neu und erhält dann wieder den vollständigen Stand
+        source.onerror = function() {
+            setConnected(false);
+        };
+    }
+    
     // Funktion zum Aktualisieren einer Tabelle
     function updateTable(tableId, data, columns, rowCallback) {
         const table = document.getElementById(tableId);
@@ -1263,41 +1590,13 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('filter-form').addEventListener('submit', function(e) {
         e.preventDefault();
         
+        // Gefiltert wird lokal, damit neue Änderungen aus dem Event-Feed den Filter beibehalten
         const formData = new FormData(this);
-        
-        fetch('/filter_events', {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => response.json())
-        .then(data => {
-            updateTable('events-table', data.events, [
-                'event_id',
-                'shelf_id',
-                item => `<a href="/product/${item.product_type.toLowerCase()}">${item.product_type}</a>`,
-                'event_type',
-                'event_time',
-                'status',
-                'quantity'
-            ], function(row, event) {
-                const statusLower = event.status.toLowerCase();
-                if (statusLower === 'not paid') {
-                    row.className = 'table-danger';
-                } else if (statusLower === 'paid') {
-                    row.className = 'table-success';
-                } else if (statusLower === 'misplaced') {
-                    row.className = 'table-warning';
-                } else if (statusLower === 'returned') {
-                    row.className = 'table-info';
-                } else {
-                    row.className = '';
-                }
-            });
-        })
-        .catch(error => {
-            console.error('Fehler beim Filtern:', error);
-            showNotification('Fehler', 'Ereignisse konnten nicht gefiltert werden.', false);
-        });
+        eventFilter = {
+            status: formData.get('status_filter') || 'Alle',
+            product: formData.get('product_filter') || 'Alle'
+        };
+        renderEvents();
     });
     
     // Handler für Produkt-Zusammenfassungs-Filter
@@ -1409,11 +1708,14 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Automatische Aktualisierung alle 1 Sekunde für häufigere Updates
-    setInterval(updateData, 1000);
-    
-    // Initiale Datenaktualisierung
-    updateData();
+    if (window.EventSource) {
+        connectStream();
+        setInterval(updateRuntime, 1000);
+    } else {
+        // Ohne SSE-Unterstützung: Aktualisierung alle 1 Sekunde
+        setInterval(updateData, 1000);
+        updateData();
+    }
 });"""
 
     # Dateien nur schreiben, wenn sie nicht existieren